@@ -6,20 +6,48 @@ import logging
 import asyncio
 import time
 import signal
+from datetime import datetime, timezone
 import sys
 from telegram import Update
 from telegram.ext import Application
+from telegram.error import NetworkError, TimedOut
 from fastapi import FastAPI, Request, Response, HTTPException
 import uvicorn
 import time
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from avap_bot.utils.logging_config import setup_logging
-from avap_bot.services.supabase_service import init_supabase
+from avap_bot.services.supabase_service import init_supabase, verified_user_cache
+from avap_bot.services.postgrest_client import close_async_postgrest, get_async_postgrest_stats
+from avap_bot.services.stats_service import bot_stats_snapshot, STATS_REFRESH_SECONDS
+from avap_bot.services.leaderboard_service import leaderboard_engine
+from avap_bot.services.identity_service import get_identity_stats
+from avap_bot.services.matching_service import matching_engine, MATCH_EXPIRE_INTERVAL
+from avap_bot.services.broadcast_service import broadcast_engine
+from avap_bot.services.broadcast_jobs import broadcast_jobs
+from avap_bot.services.outbound_limiter import outbound_limiter
+from avap_bot.services.recipient_health import recipient_health, RECIPIENT_HEALTH_FLUSH_SECONDS
+from avap_bot.services.counter_service import flush_counters, get_counter_stats, COUNTER_FLUSH_SECONDS
+from avap_bot.services.supabase_service import insert_buffer
+from avap_bot.services.sheets_service import (
+    FALLBACK_REPLAY_SECONDS,
+    fallback_store,
+    get_append_queue_stats,
+    get_fallback_stats,
+    get_replay_stats,
+    get_snapshot_stats,
+    replay_fallback,
+    sheets_gateway,
+    stop_append_queues
+)
 from avap_bot.services.systeme_service import validate_api_key
-from avap_bot.services.notifier import send_admin_notification
+from avap_bot.services.notifier import attach_bot, close_notifier_clients, send_admin_notification
 from avap_bot.handlers import register_all
 from avap_bot.utils.cancel_registry import CancelRegistry
+from avap_bot.utils.run_blocking import bulkheads, get_bulkhead_stats
+from avap_bot.utils.update_queue import UpdateQueue
+from avap_bot.utils.update_dispatcher import UpdateDispatcher
+from avap_bot.utils.update_dedup import UpdateDeduplicator
 from avap_bot.features.cancel_feature import register_cancel_handlers, register_test_handlers
 # AI features disabled
 from avap_bot.utils.memory_monitor import monitor_memory, cleanup_resources, enable_detailed_memory_monitoring, get_memory_usage, log_memory_usage, ultra_aggressive_cleanup, start_memory_watchdog, graceful_restart
@@ -117,11 +145,40 @@ except Exception as e:
     logger.warning(f"Failed to register admin endpoints: {e}")
 
 # Create the Telegram bot application
-bot_app = Application.builder().token(BOT_TOKEN).build()
+# Every send goes through one priority-aware limiter (interactive > notify > bulk)
+bot_app = Application.builder().token(BOT_TOKEN).rate_limiter(outbound_limiter).build()
+attach_bot(bot_app.bot)
 
 # Initialize cancel registry and store in bot data
 cancel_registry = CancelRegistry()
 bot_app.bot_data['cancel_registry'] = cancel_registry
+broadcast_jobs.cancel_registry = cancel_registry
+
+# Update dispatcher - one ordered lane per user, lanes run concurrently
+UPDATE_MAX_CONCURRENCY = int(os.getenv("UPDATE_MAX_CONCURRENCY", "8"))
+UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", "500"))
+update_dispatcher = UpdateDispatcher(
+    bot_app.process_update,
+    max_concurrency=UPDATE_MAX_CONCURRENCY,
+    max_pending=UPDATE_MAX_PENDING
+)
+
+# Replay protection - Telegram redelivers updates that were not acknowledged
+# in time; remember recent update_ids (optionally persisted across restarts)
+UPDATE_DEDUP_WINDOW = int(os.getenv("UPDATE_DEDUP_WINDOW", "5000"))
+UPDATE_DEDUP_FILE = os.getenv("UPDATE_DEDUP_FILE")
+update_dedup = UpdateDeduplicator(window=UPDATE_DEDUP_WINDOW, persist_path=UPDATE_DEDUP_FILE)
+
+# Webhook ingestion queue - updates are acknowledged immediately and handed
+# to the dispatcher by background consumers. A single consumer is enough
+# since dispatching never waits for handlers (only for backpressure).
+UPDATE_QUEUE_MAXSIZE = int(os.getenv("UPDATE_QUEUE_MAXSIZE", "1000"))
+UPDATE_QUEUE_WORKERS = int(os.getenv("UPDATE_QUEUE_WORKERS", "1"))
+update_queue = UpdateQueue(
+    update_dispatcher.dispatch,
+    maxsize=UPDATE_QUEUE_MAXSIZE,
+    workers=UPDATE_QUEUE_WORKERS
+)
 
 # Register all handlers
 logger.info("🔧 Registering all handlers...")
@@ -368,18 +425,53 @@ async def health_check():
             "timestamp": time.time()
         }
 
-async def telegram_webhook(request: Request):
-    """Handle incoming Telegram updates."""
+def _ingest_update(data) -> int:
+    """
+    De-duplicate, decode and enqueue a raw update received from Telegram.
+
+    Args:
+        data: Update JSON as a dict
+
+    Returns:
+        HTTP status code to answer the delivery with
+    """
+    update_id = data.get("update_id") if isinstance(data, dict) else None
+    if update_id is None:
+        return 400
+
+    if not update_dedup.check_and_add(update_id):
+        logger.info(f"Skipping duplicate update {update_id}")
+        return 200
+
     try:
-        logger.debug(f"Received webhook request to: {request.url.path}")
-        data = await request.json()
         update = Update.de_json(data, bot_app.bot)
-        await bot_app.process_update(update)
-        logger.debug("Successfully processed webhook update")
-        return Response(status_code=200)
     except Exception as e:
-        logger.error(f"Error in webhook: {e}", exc_info=True)
-        return Response(status_code=500)
+        logger.error(f"Failed to decode update {update_id}: {e}")
+        return 400
+
+    if not update_queue.enqueue(update):
+        # Forget the id so Telegram's redelivery is not treated as a duplicate
+        update_dedup.discard(update_id)
+        return 503
+
+    logger.debug(f"Queued update {update_id}")
+    return 200
+
+
+async def telegram_webhook(request: Request, bot_token: str):
+    """Validate and enqueue incoming Telegram updates, acknowledging immediately."""
+    if BOT_TOKEN and bot_token != BOT_TOKEN:
+        logger.warning("Rejected webhook request with invalid bot token")
+        return Response(status_code=403)
+
+    try:
+        data = await request.json()
+    except Exception as e:
+        logger.error(f"Invalid webhook payload: {e}")
+        return Response(status_code=400)
+
+    # A non-2xx status (503 when the queue is full) makes Telegram redeliver later
+    return Response(status_code=_ingest_update(data))
 
 # Handle webhook with bot token in path (Telegram standard format)
 app.post("/webhook/{bot_token}")(telegram_webhook)
@@ -432,6 +524,41 @@ async def cleanup_memory():
             "error": str(e)
         }
 
+# Runtime metrics endpoint
+ADMIN_RESET_TOKEN = os.getenv("ADMIN_RESET_TOKEN")
+
+@app.get("/admin/metrics")
+async def admin_metrics(request: Request):
+    """Expose internal queue and pipeline metrics."""
+    token = request.headers.get("X-Admin-Reset-Token")
+    if not ADMIN_RESET_TOKEN or token != ADMIN_RESET_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return {
+        "update_queue": update_queue.get_stats(),
+        "update_dispatcher": update_dispatcher.get_stats(),
+        "update_dedup": update_dedup.get_stats(),
+        "supabase_async": get_async_postgrest_stats(),
+        "verified_user_cache": verified_user_cache.get_stats(),
+        "stats_snapshot": bot_stats_snapshot.get_stats(),
+        "leaderboard": leaderboard_engine.get_stats(),
+        "identity_index": get_identity_stats(),
+        "matching": matching_engine.get_stats(),
+        "counters": get_counter_stats(),
+        "insert_buffer": insert_buffer.get_stats(),
+        "sheet_snapshots": get_snapshot_stats(),
+        "sheet_appends": get_append_queue_stats(),
+        "sheets_gateway": sheets_gateway.get_stats(),
+        "fallback_store": get_fallback_stats(),
+        "fallback_replay": get_replay_stats(),
+        "bulkheads": get_bulkhead_stats(),
+        "broadcast": broadcast_engine.get_stats(),
+        "broadcast_jobs": broadcast_jobs.get_stats(),
+        "recipient_health": recipient_health.get_stats(),
+        "outbound_limiter": outbound_limiter.get_stats(),
+        "timestamp": time.time()
+    }
+
 # Root endpoint for basic health check
 @app.get("/")
 async def root():
@@ -606,6 +733,113 @@ async def initialize_services():
         else:
             logger.warning("Scheduler not available - some keep-alive features disabled")
 
+        # Keep the statistics snapshot warm for /stats and the admin API
+        if SCHEDULER_AVAILABLE and scheduler:
+            try:
+                scheduler.add_job(
+                    bot_stats_snapshot.refresh,
+                    'interval',
+                    seconds=STATS_REFRESH_SECONDS,
+                    id='stats_snapshot_refresh',
+                    replace_existing=True,
+                    max_instances=1,
+                    coalesce=True,
+                    misfire_grace_time=STATS_REFRESH_SECONDS,
+                    next_run_time=datetime.now(timezone.utc)
+                )
+                logger.info(f"Stats snapshot refresh scheduled every {STATS_REFRESH_SECONDS} seconds")
+            except Exception as e:
+                logger.warning(f"Failed to schedule stats snapshot refresh: {e}")
+
+        # Expire match requests nobody claimed within the TTL
+        if SCHEDULER_AVAILABLE and scheduler:
+            try:
+                scheduler.add_job(
+                    matching_engine.expire,
+                    'interval',
+                    seconds=MATCH_EXPIRE_INTERVAL,
+                    args=[bot_app.bot],
+                    id='match_queue_expire',
+                    replace_existing=True,
+                    max_instances=1,
+                    coalesce=True,
+                    misfire_grace_time=MATCH_EXPIRE_INTERVAL
+                )
+                logger.debug(f"Match queue expiry scheduled every {MATCH_EXPIRE_INTERVAL} seconds")
+            except Exception as e:
+                logger.warning(f"Failed to schedule match queue expiry: {e}")
+
+        # Write batched counter increments (tip sends, broadcast deliveries)
+        if SCHEDULER_AVAILABLE and scheduler:
+            try:
+                scheduler.add_job(
+                    flush_counters,
+                    'interval',
+                    seconds=COUNTER_FLUSH_SECONDS,
+                    id='counter_flush',
+                    replace_existing=True,
+                    max_instances=1,
+                    coalesce=True,
+                    misfire_grace_time=COUNTER_FLUSH_SECONDS
+                )
+                logger.debug(f"Counter flush scheduled every {COUNTER_FLUSH_SECONDS} seconds")
+            except Exception as e:
+                logger.warning(f"Failed to schedule counter flush: {e}")
+
+        # Save unreachable-recipient marks so fan-out keeps skipping them after a restart
+        if SCHEDULER_AVAILABLE and scheduler:
+            try:
+                scheduler.add_job(
+                    recipient_health.flush,
+                    'interval',
+                    seconds=RECIPIENT_HEALTH_FLUSH_SECONDS,
+                    id='recipient_health_flush',
+                    replace_existing=True,
+                    max_instances=1,
+                    coalesce=True,
+                    misfire_grace_time=RECIPIENT_HEALTH_FLUSH_SECONDS
+                )
+                logger.debug(f"Recipient health flush scheduled every {RECIPIENT_HEALTH_FLUSH_SECONDS} seconds")
+            except Exception as e:
+                logger.warning(f"Failed to schedule recipient health flush: {e}")
+
+        # Write rows kept in the fallback store back to Sheets once it is reachable
+        if SCHEDULER_AVAILABLE and scheduler:
+            try:
+                # Own single-thread pool without a timeout: catching up after
+                # an outage can take minutes
+                scheduler.add_job(
+                    bulkheads["replay"].run,
+                    'interval',
+                    seconds=FALLBACK_REPLAY_SECONDS,
+                    args=[replay_fallback],
+                    id='fallback_replay',
+                    replace_existing=True,
+                    max_instances=1,
+                    coalesce=True,
+                    misfire_grace_time=FALLBACK_REPLAY_SECONDS
+                )
+                logger.debug(f"Fallback replay scheduled every {FALLBACK_REPLAY_SECONDS} seconds")
+            except Exception as e:
+                logger.warning(f"Failed to schedule fallback replay: {e}")
+
+        # Persist the update de-duplication window so it survives restarts
+        if SCHEDULER_AVAILABLE and scheduler and update_dedup.persist_path:
+            try:
+                scheduler.add_job(
+                    update_dedup.save,
+                    'interval',
+                    seconds=30,
+                    id='update_dedup_save',
+                    replace_existing=True,
+                    max_instances=1,
+                    coalesce=True,
+                    misfire_grace_time=30
+                )
+                logger.debug("Update de-duplication window saved every 30 seconds")
+            except Exception as e:
+                logger.warning(f"Failed to schedule update dedup persistence: {e}")
+
         # Schedule periodic memory cleanup every 10 minutes (if scheduler available)
         if SCHEDULER_AVAILABLE and scheduler:
             try:
@@ -700,7 +934,42 @@ async def main_polling():
     """Main function to start the bot in polling mode."""
     await initialize_services()
     logger.info("Starting bot in polling mode for local development...")
-    await bot_app.run_polling(allowed_updates=["message", "callback_query"])
+
+    # Raw getUpdates loop so polled updates go through the same
+    # de-duplication, queue and dispatcher as webhook deliveries
+    await bot_app.bot.delete_webhook()
+    await update_queue.start()
+    await recipient_health.load()
+    await broadcast_jobs.resume_all(bot_app.bot)
+    offset = None
+    try:
+        while True:
+            try:
+                raw_updates = await bot_app.bot.do_api_request(
+                    "getUpdates",
+                    api_kwargs={
+                        "offset": offset,
+                        "timeout": 30,
+                        "allowed_updates": ["message", "callback_query"]
+                    },
+                    read_timeout=40
+                )
+            except (TimedOut, NetworkError) as e:
+                logger.warning(f"Polling request failed: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for data in raw_updates or []:
+                status = _ingest_update(data)
+                if status == 503:
+                    # Queue full - wait for room, then fetch this update again
+                    await update_queue.wait_for_room()
+                    break
+                offset = data["update_id"] + 1
+    finally:
+        # Same drain and flush sequence as webhook mode
+        await on_shutdown()
+        await bot_app.shutdown()
 
 # Background task to continuously ping health endpoint
 def _periodic_memory_cleanup():
@@ -933,6 +1202,20 @@ async def on_startup():
     # Initialize services first (including Telegram Application)
     await initialize_services()
 
+    # Start consuming webhook updates before the webhook is (re)registered
+    await update_queue.start()
+    await insert_buffer.start()
+
+    # Load unreachable recipients before any fan-out, then pick up broadcasts
+    # interrupted by the last restart from their checkpoints
+    await recipient_health.load()
+    try:
+        resumed = await broadcast_jobs.resume_all(bot_app.bot)
+        if resumed:
+            logger.info(f"Resumed {resumed} interrupted broadcast(s)")
+    except Exception as e:
+        logger.warning(f"Failed to resume broadcasts: {e}")
+
     # Start ULTRA-AGGRESSIVE background keepalive task
     asyncio.create_task(background_keepalive())
     logger.info("🚀 ULTRA-AGGRESSIVE background keepalive task started")
@@ -974,6 +1257,16 @@ async def on_shutdown():
     """Actions to perform on application shutdown."""
     logger.info("Shutting down...")
 
+    # Drain already acknowledged updates before tearing anything down
+    try:
+        await update_queue.stop()
+        await update_dispatcher.stop()
+        update_dedup.save()
+    except asyncio.CancelledError:
+        logger.info("Update queue stop cancelled during shutdown")
+    except Exception as e:
+        logger.warning(f"Error stopping update queue: {e}")
+
     # Stop the job queue first
     try:
         await bot_app.job_queue.stop()
@@ -991,6 +1284,41 @@ async def on_shutdown():
     except Exception as e:
         logger.warning(f"Error during resource cleanup: {e}")
 
+    # Stop running broadcasts at a checkpoint; they resume on the next start
+    try:
+        await broadcast_jobs.shutdown()
+    except Exception as e:
+        logger.warning(f"Error stopping broadcast jobs: {e}")
+
+    # Write buffered question inserts and pending counter increments
+    # while the Supabase client is still open
+    try:
+        await insert_buffer.stop()
+    except Exception as e:
+        logger.warning(f"Error flushing insert buffer: {e}")
+    try:
+        await flush_counters()
+    except Exception as e:
+        logger.warning(f"Error flushing counters: {e}")
+    await recipient_health.flush()
+
+    # Write rows still queued for Google Sheets (falls back to CSV on failure)
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, stop_append_queues)
+    except Exception as e:
+        logger.warning(f"Error flushing Sheets append queues: {e}")
+    fallback_store.close()
+
+    # Close pooled Supabase and notifier connections
+    try:
+        await close_async_postgrest()
+    except Exception as e:
+        logger.warning(f"Error closing async Supabase client: {e}")
+    try:
+        await close_notifier_clients()
+    except Exception as e:
+        logger.warning(f"Error closing notifier clients: {e}")
+
     # Delete webhook if configured
     if os.getenv("WEBHOOK_URL"):
         try:
@@ -13,16 +13,20 @@ from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, Mess
 from telegram.constants import ParseMode, ChatType
 
 from avap_bot.services.supabase_service import (
-    add_pending_verification, find_pending_by_email_or_phone,
-    promote_pending_to_verified, remove_verified_by_identifier,
-    find_verified_by_email_or_phone, find_verified_by_name,
-    get_broadcast_history, delete_broadcast, add_broadcast_history,
-    get_all_students, get_student_submissions_by_username, 
-    get_student_submissions_by_module, get_bot_statistics,
-    get_top_students_by_submissions, get_all_tips, add_tip,
-    get_random_tip, update_tip_sent_count, get_all_verified_telegram_ids
+    add_pending_verification,
+    promote_pending_to_verified, remove_student_record_async,
+    get_broadcast_history, delete_broadcast,
+    get_student_submissions_by_username, 
+    get_student_submissions_by_module,
+    add_tip,
+    get_random_tip, update_tip_sent_count,
+    get_all_students_async, count_verified_users_async
 )
 from avap_bot.services.sheets_service import append_pending_verification, update_verification_status, test_sheets_connection
+from avap_bot.services.stats_service import bot_stats_snapshot
+from avap_bot.services.leaderboard_service import leaderboard_engine
+from avap_bot.services.broadcast_jobs import broadcast_jobs
+from avap_bot.services.identity_service import find_identity_conflicts, remember_identity, resolve_student
 from avap_bot.services.systeme_service import create_contact_and_tag, untag_or_remove_contact
 from avap_bot.utils.validators import validate_email, validate_phone
 from avap_bot.utils.run_blocking import run_blocking
@@ -116,21 +120,8 @@ async def add_student_email(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         # IMPORTANT: Check for duplicates in both pending and verified tables
         # This prevents multiple students from using the same email or phone
-        pending_by_email = find_pending_by_email_or_phone(email=email, phone=None)
-        pending_by_phone = find_pending_by_email_or_phone(email=None, phone=phone)
-        verified_by_email = find_verified_by_email_or_phone(email=email, phone=None)
-        verified_by_phone = find_verified_by_email_or_phone(email=None, phone=phone)
-        
-        # Combine all potential duplicates
-        all_existing = []
-        if pending_by_email:
-            all_existing.extend(pending_by_email)
-        if pending_by_phone:
-            all_existing.extend(pending_by_phone)
-        if verified_by_email:
-            all_existing.extend(verified_by_email)
-        if verified_by_phone:
-            all_existing.extend(verified_by_phone)
+        # (one round trip for email OR phone across both tables)
+        all_existing = await find_identity_conflicts(email=email, phone=phone)
         
         if all_existing:
             # Get the first existing record for the error message
@@ -169,6 +160,7 @@ async def add_student_email(update: Update, context: ContextTypes.DEFAULT_TYPE)
         result = add_pending_verification(pending_data)
         if not result:
             raise Exception("Failed to add pending verification to Supabase")
+        remember_identity(result, "pending_verifications")
         
         # Background tasks
         asyncio.create_task(_background_add_student_tasks(pending_data))
@@ -302,7 +294,7 @@ async def remove_student_identifier(update: Update, context: ContextTypes.DEFAUL
     
     # Find student
     try:
-        student = _find_student_by_identifier(identifier)
+        student = await _find_student_by_identifier(identifier)
         if not student:
             await update.message.reply_text(
                 f"❌ No student found with identifier: {identifier}"
@@ -310,6 +302,9 @@ async def remove_student_identifier(update: Update, context: ContextTypes.DEFAUL
             return ConversationHandler.END
         
         context.user_data['student_to_remove'] = student
+        # The confirm step deletes exactly this row
+        context.user_data['remove_source'] = student['source']
+        context.user_data['remove_row_id'] = student['id']
 
         # Check if inline keyboards should be disabled (when message comes from group)
         if should_disable_inline_keyboards(update, allow_admin_operations=True):
@@ -364,7 +359,10 @@ async def remove_student_confirm(update: Update, context: ContextTypes.DEFAULT_T
         # Remove from all systems
         logger.info(f"Attempting to remove student with identifier: {identifier}")
         try:
-            success = remove_verified_by_identifier(identifier)
+            # Remove the row that was confirmed, not whatever the identifier resolves to now
+            success = await remove_student_record_async(
+                context.user_data['remove_source'], context.user_data['remove_row_id']
+            )
             if not success:
                 # Check if this is a "user not found" case vs actual error
                 logger.warning(f"Student removal failed for identifier: {identifier}")
@@ -443,46 +441,13 @@ async def remove_student_confirm(update: Update, context: ContextTypes.DEFAULT_T
         return ConversationHandler.END
 
 
-def _find_student_by_identifier(identifier: str) -> Optional[Dict[str, Any]]:
-    """Find student by email, phone, or name in verified_users and pending_verifications tables."""
-    from avap_bot.services.supabase_service import find_pending_by_email_or_phone
-    
-    # Try as email first - check pending_verifications first (where admin-added students go)
-    if validate_email(identifier):
-        # Check pending_verifications first (including those with status 'verified')
-        pending_results = find_pending_by_email_or_phone(email=identifier)
-        if pending_results:
-            return pending_results[0]
-        
-        # Then check verified_users
-        results = find_verified_by_email_or_phone(email=identifier)
-        if results:
-            return results[0]
-
-    # Try as phone - check pending_verifications first
-    if validate_phone(identifier):
-        # Check pending_verifications first (including those with status 'verified')
-        pending_results = find_pending_by_email_or_phone(phone=identifier)
-        if pending_results:
-            return pending_results[0]
-        
-        # Then check verified_users
-        results = find_verified_by_email_or_phone(phone=identifier)
-        if results:
-            return results[0]
-
-    # Try as name in pending_verifications first
-    from avap_bot.services.supabase_service import find_pending_by_name
-    pending_results = find_pending_by_name(identifier)
-    if pending_results:
-        return pending_results[0]
-
-    # Then try as name in verified users
-    results = find_verified_by_name(identifier)
-    if results:
-        return results[0]
-
-    return None
+async def _find_student_by_identifier(identifier: str) -> Optional[Dict[str, Any]]:
+    """Find student by email, phone, or name in pending_verifications and verified_users tables."""
+    # Pending first (where admin-added students go); names may match partially
+    match = await resolve_student(
+        identifier, tables=("pending_verifications", "verified_users"), partial_names=True
+    )
+    return match.as_record() if match else None
 
 
 async def cancel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -604,17 +569,18 @@ async def list_students_handler(update: Update, context: ContextTypes.DEFAULT_TY
         return
 
     try:
-        # Get all students
-        students = get_all_students()
+        # Count all students, but only fetch the ones shown
+        total = await count_verified_users_async()
+        students = await get_all_students_async(limit=20)  # Limit to 20 for readability
         
         if not students:
             await update.message.reply_text("👥 No students found.")
             return
 
         # Format the message
-        message = f"👥 **Student List** ({len(students)} total)\n\n"
+        message = f"👥 **Student List** ({max(total, len(students))} total)\n\n"
         
-        for i, student in enumerate(students[:20], 1):  # Limit to 20 for readability
+        for i, student in enumerate(students, 1):
             username = student.get('username', 'N/A')
             telegram_id = student.get('telegram_id', 'N/A')
             name = student.get('name', 'Unknown')
@@ -626,8 +592,8 @@ async def list_students_handler(update: Update, context: ContextTypes.DEFAULT_TY
             message += f"   🆔 Telegram ID: {telegram_id}\n"
             message += f"   ✅ Status: {student.get('status', 'Unknown')}\n\n"
 
-        if len(students) > 20:
-            message += f"... and {len(students) - 20} more students."
+        if total > len(students):
+            message += f"... and {total - len(students)} more students."
 
         await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
 
@@ -643,9 +609,10 @@ async def stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        # Get statistics
-        stats = get_bot_statistics()
-        top_students = get_top_students_by_submissions(limit=5)
+        # Get statistics from the background-refreshed snapshot
+        snapshot = await bot_stats_snapshot.get()
+        stats = snapshot["stats"]
+        top_students = await leaderboard_engine.top(limit=5)
         
         # Format the message
         message = "📊 **Bot Statistics**\n\n"
@@ -675,6 +642,9 @@ async def stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             for i, student in enumerate(top_students, 1):
                 message += f"{i}. {student.get('name', 'Unknown')} - {student.get('submissions', 0)} submissions\n"
 
+        if snapshot["age_seconds"] is not None:
+            message += f"\n🕒 Updated {int(snapshot['age_seconds'])}s ago"
+
         await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
 
     except Exception as e:
@@ -830,10 +800,10 @@ async def broadcast_content(update: Update, context: ContextTypes.DEFAULT_TYPE)
     message_type = context.user_data.get('broadcast_type', 'text')
     
     try:
-        # Get all verified users
-        verified_users = get_all_verified_telegram_ids()
+        # Count verified users; their IDs are streamed page by page while sending
+        total_users = await count_verified_users_async()
         
-        if not verified_users:
+        if not total_users:
             await update.message.reply_text("👥 No verified users found.")
             return ConversationHandler.END
         
@@ -860,51 +830,18 @@ async def broadcast_content(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text("❌ Invalid message type.")
             return ConversationHandler.END
         
-        # Send to all verified users
-        success_count = 0
-        failure_count = 0
-        
-        await update.message.reply_text(f"📤 Sending broadcast to {len(verified_users)} users...")
-        
-        for user_id in verified_users:
-            try:
-                if message_type == 'text':
-                    await context.bot.send_message(user_id, content)
-                elif message_type == 'audio':
-                    await context.bot.send_audio(user_id, file_id, caption=content)
-                elif message_type == 'video':
-                    await context.bot.send_video(user_id, file_id, caption=content)
-                
-                success_count += 1
-                
-                # Rate limiting
-                await asyncio.sleep(0.03)
-                
-            except Exception as e:
-                logger.warning(f"Failed to send to user {user_id}: {e}")
-                failure_count += 1
-        
-        # Log broadcast to database
-        try:
-            add_broadcast_history(
-                admin_id=update.effective_user.id,
-                message_type=message_type,
-                content=content,
-                recipients_count=success_count,
-                failures_count=failure_count
-            )
-        except Exception as e:
-            logger.warning(f"Failed to log broadcast: {e}")
-        
-        # Send completion message
-        await update.message.reply_text(
-            f"✅ **Broadcast Complete!**\n\n"
-            f"📤 Sent: {success_count}\n"
-            f"❌ Failed: {failure_count}\n"
-            f"📊 Total: {len(verified_users)}",
-            parse_mode=ParseMode.MARKDOWN
+        # Sent in the background so the admin's conversation ends right away; the job
+        # posts its own progress message and survives restarts
+        await broadcast_jobs.submit(
+            context.bot,
+            admin_id=update.effective_user.id,
+            admin_chat_id=update.effective_chat.id,
+            message_type=message_type,
+            content=content,
+            file_id=file_id,
+            total=total_users
         )
-        
+
     except Exception as e:
         logger.exception("Broadcast command failed: %s", e)
         await update.message.reply_text("❌ Error occurred during broadcast.")
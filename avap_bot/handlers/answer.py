@@ -15,6 +15,7 @@ from avap_bot.services.supabase_service import update_question_answer, get_faqs
 from avap_bot.services.sheets_service import update_question_status
 from avap_bot.utils.run_blocking import run_blocking
 from avap_bot.services.notifier import notify_admin_telegram
+from avap_bot.services.recipient_health import recipient_health
 from avap_bot.utils.chat_utils import should_disable_inline_keyboards
 from avap_bot.features.cancel_feature import get_cancel_fallback_handler
 
@@ -174,6 +175,7 @@ async def answer_content(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                         f"📝 **Answer to your question:**\n\n{answer_content}",
                         parse_mode=ParseMode.MARKDOWN
                     )
+                recipient_health.record_success(student_id)
                 
                 await update.message.reply_text(
                     f"✅ **Answer sent successfully!**\n\n"
@@ -185,6 +187,7 @@ async def answer_content(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 
             except Exception as e:
                 logger.exception("Failed to send answer to student: %s", e)
+                recipient_health.record_failure(student_id, e)
                 await update.message.reply_text(
                     f"⚠️ Answer saved but failed to send to student: {str(e)}"
                 )
@@ -12,9 +12,10 @@ from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, Mess
 from telegram.constants import ParseMode
 
 from avap_bot.services.sheets_service import update_submission_grade, add_grade_comment, get_student_submissions
-from avap_bot.services.supabase_service import update_assignment_grade, check_verified_user
+from avap_bot.services.supabase_service import update_assignment_grade, check_verified_user_async
 from avap_bot.utils.run_blocking import run_blocking
 from avap_bot.services.notifier import notify_admin_telegram
+from avap_bot.services.recipient_health import recipient_health
 from avap_bot.utils.chat_utils import should_disable_inline_keyboards, create_keyboard_for_chat
 from avap_bot.features.cancel_feature import get_cancel_fallback_handler
 
@@ -223,6 +224,7 @@ async def _notify_student_grade(context: ContextTypes.DEFAULT_TYPE, submission_i
         # Send the main notification text
         logger.info(f"Sending grade notification to student {telegram_id}")
         await context.bot.send_message(chat_id=telegram_id, text=message, parse_mode=ParseMode.MARKDOWN)
+        recipient_health.record_success(telegram_id)
 
         # If there is a file comment, send it as a separate message
         if comment_file_id and comment_file_type:
@@ -238,6 +240,7 @@ async def _notify_student_grade(context: ContextTypes.DEFAULT_TYPE, submission_i
 
     except Exception as e:
         logger.exception(f"Failed to notify student {telegram_id} (@{username}) about grade: {e}")
+        recipient_health.record_failure(telegram_id, e)
         await notify_admin_telegram(context.bot, f"Failed to notify student {telegram_id} (@{username}) about grade. Error: {e}")
 
 
@@ -246,7 +249,7 @@ async def view_grades_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_id = update.effective_user.id
 
     # Check if user is verified
-    verified_user = check_verified_user(user_id)
+    verified_user = await check_verified_user_async(user_id)
     if not verified_user:
         await update.message.reply_text("❌ You need to be verified to view your grades. Use /start to begin verification.")
         return
@@ -2,6 +2,7 @@
 Student matching handlers for peer connections, using a robust Supabase backend.
 """
 import os
+import asyncio
 import logging
 
 from telegram import Update
@@ -9,16 +10,41 @@ from telegram.ext import ContextTypes, CommandHandler
 from telegram.constants import ParseMode
 
 from avap_bot.services.supabase_service import (
-    check_verified_user,
-    add_match_request,
-    pop_match_request,
-    find_verified_by_telegram
+    check_verified_user_async,
+    find_verified_by_telegram_async
 )
+from avap_bot.services.matching_service import matching_engine
 from avap_bot.services.notifier import notify_admin_telegram
+from avap_bot.services.recipient_health import recipient_health
 from avap_bot.utils.run_blocking import run_blocking
 
 logger = logging.getLogger(__name__)
 
+
+def _match_message(partner_username: str) -> str:
+    """Text sent to a student who has been paired."""
+    return (
+        f"🎉 **Match Found!**\n\n"
+        f"You've been matched with: @{partner_username}\n\n"
+        f"You can now start chatting and collaborating!"
+    )
+
+
+async def _notify_pair(bot, first_id: int, first_partner: str, second_id: int, second_partner: str):
+    """Tell both students about the match at the same time."""
+    results = await asyncio.gather(
+        bot.send_message(chat_id=first_id, text=_match_message(first_partner), parse_mode=ParseMode.MARKDOWN),
+        bot.send_message(chat_id=second_id, text=_match_message(second_partner), parse_mode=ParseMode.MARKDOWN),
+        return_exceptions=True
+    )
+    for chat_id, result in zip((first_id, second_id), results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to send match notification to {chat_id}: {result}")
+            recipient_health.record_failure(chat_id, result)
+        else:
+            recipient_health.record_success(chat_id)
+
+
 async def match_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /match command for student pairing."""
     user = update.effective_user
@@ -26,7 +52,7 @@ async def match_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # 1. Check if user is verified
     logger.info(f"Checking verification for user {user.id}")
-    verified_user = check_verified_user(user.id)
+    verified_user = await check_verified_user_async(user.id)
     logger.info(f"Verification result for user {user.id}: {verified_user is not None}")
     
     if not verified_user:
@@ -39,54 +65,34 @@ async def match_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        # 2. Add the current user to the matching queue
-        logger.info(f"Adding user {user.id} to match queue...")
-        match_id = add_match_request(user.id, user.username or "unknown")
-        logger.info(f"User {user.id} added to match queue with ID: {match_id}")
-
-        # 3. Try to find another student in the queue
-        logger.info(f"Searching for matches for user {user.id}...")
-        matched_user_record = pop_match_request(exclude_id=user.id)
-        logger.info(f"Match search result for user {user.id}: {matched_user_record is not None}")
-
-        if matched_user_record:
-            matched_user_id = matched_user_record['telegram_id']
+        # 2. Claim the longest-waiting partner, or join the queue
+        logger.info(f"Requesting a match for user {user.id}...")
+        result = await matching_engine.request(user.id, user.username or "unknown")
+        logger.info(f"Match result for user {user.id}: {result.partner is not None}")
+
+        if result.partner:
+            matched_user_id = result.partner.telegram_id
             logger.info(f"Found a match for user {user.id} with user {matched_user_id}.")
 
-            # 4. If a match is found, notify both users
-            current_user_details = verified_user
-            matched_user_details = find_verified_by_telegram(matched_user_id)
-
-            current_username = user.username or current_user_details.get('name')
-            
-            matched_user_chat = await context.bot.get_chat(matched_user_id)
-            matched_username = matched_user_chat.username or (matched_user_details and matched_user_details.get('name'))
-
-            # Notify current user
-            await context.bot.send_message(
-                chat_id=user.id,
-                text=(
-                    f"🎉 **Match Found!**\n\n"
-                    f"You've been matched with: @{matched_username}\n\n"
-                    f"You can now start chatting and collaborating!"
-                ),
-                parse_mode=ParseMode.MARKDOWN
-            )
+            # 3. Notify both users
+            current_username = user.username or verified_user.get('name')
+            matched_username = result.partner.username
+            if not matched_username or matched_username == "unknown":
+                matched_user_details = await find_verified_by_telegram_async(matched_user_id)
+                matched_username = matched_user_details and matched_user_details.get('name')
+
+            await _notify_pair(context.bot, user.id, matched_username, matched_user_id, current_username)
+            logger.info(f"Successfully notified both users of the match: {user.id} and {matched_user_id}")
 
-            # Notify the other user
-            await context.bot.send_message(
-                chat_id=matched_user_id,
-                text=(
-                    f"🎉 **Match Found!**\n\n"
-                    f"You've been matched with: @{current_username}\n\n"
-                    f"You can now start chatting and collaborating!"
-                ),
+        elif result.already_waiting:
+            await update.message.reply_text(
+                "⏳ **You're already in the matching queue.**\n\n"
+                "I'll notify you as soon as another student is available to be matched.",
                 parse_mode=ParseMode.MARKDOWN
             )
-            logger.info(f"Successfully notified both users of the match: {user.id} and {matched_user_id}")
 
         else:
-            # 5. If no match is found, inform the user they are in the queue
+            # 4. If no match is found, inform the user they are in the queue
             logger.info(f"No immediate match found for user {user.id}. They are now in the queue.")
             await update.message.reply_text(
                 "🔍 **You've been added to the matching queue!**\n\n"
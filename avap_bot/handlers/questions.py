@@ -13,6 +13,7 @@ from telegram.constants import ParseMode
 from avap_bot.services.sheets_service import update_question_status
 from avap_bot.utils.run_blocking import run_blocking
 from avap_bot.services.notifier import notify_admin_telegram
+from avap_bot.services.recipient_health import recipient_health
 
 logger = logging.getLogger(__name__)
 
@@ -253,6 +254,7 @@ async def _send_answer_to_student(
         )
         
         logger.info(f"Successfully sent text answer to student {telegram_id}")
+        recipient_health.record_success(telegram_id)
         
         # If there is a file answer, send it as a separate message
         if answer_file_id and answer_file_type:
@@ -268,6 +270,7 @@ async def _send_answer_to_student(
         
     except Exception as e:
         logger.exception(f"Failed to send answer to student {telegram_id}: {e}")
+        recipient_health.record_failure(telegram_id, e)
         return False
 
 
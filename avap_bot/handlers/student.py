@@ -13,8 +13,8 @@ from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, Mess
 from telegram.constants import ParseMode, ChatType
 
 from avap_bot.services.supabase_service import (
-    find_verified_by_telegram, check_verified_user,
-    find_pending_by_email_or_phone, promote_pending_to_verified, add_question
+    find_verified_by_telegram, check_verified_user_async,
+    find_pending_by_email_or_phone_async, promote_pending_to_verified, add_question_async
 )
 from avap_bot.services.sheets_service import (
     append_submission, append_win, append_question,
@@ -79,7 +79,7 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> O
         logger.info(f"Start command received from user {user_id} ({user.username})")
 
         # Check if user is already verified
-        verified_user = check_verified_user(user_id)
+        verified_user = await check_verified_user_async(user_id)
         if verified_user:
             logger.info(f"User {user_id} is already verified, showing main menu")
             await _show_main_menu(update, context, verified_user)
@@ -140,7 +140,7 @@ async def verify_identifier_handler(update: Update, context: ContextTypes.DEFAUL
         email = identifier if is_email else None
         phone = identifier if is_phone else None
         logger.info(f"Searching for pending verification: email={email}, phone={phone}")
-        pending_records = find_pending_by_email_or_phone(email=email, phone=phone)
+        pending_records = await find_pending_by_email_or_phone_async(email=email, phone=phone)
 
         logger.info(f"Found {len(pending_records)} pending records")
         if not pending_records:
@@ -466,7 +466,7 @@ async def submit_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         
         # Clear conversation state and show main menu
         context.user_data.clear()
-        verified_user = check_verified_user(user_id)
+        verified_user = await check_verified_user_async(user_id)
         if verified_user:
             await _show_main_menu(update, context, verified_user)
 
@@ -484,7 +484,7 @@ async def submit_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
             logger.error(f"Failed to send assignment error message: {reply_error}")
 
         # Show main menu after failure
-        verified_user = check_verified_user(update.effective_user.id)
+        verified_user = await check_verified_user_async(update.effective_user.id)
         if verified_user:
             await _show_main_menu(update, context, verified_user)
 
@@ -670,7 +670,7 @@ async def share_win_file(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         # Clear conversation state and show main menu
         context.user_data.clear()
-        verified_user = check_verified_user(user_id)
+        verified_user = await check_verified_user_async(user_id)
         if verified_user:
             await _show_main_menu(update, context, verified_user)
 
@@ -688,7 +688,7 @@ async def share_win_file(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             logger.error(f"Failed to send share win error message: {reply_error}")
 
         # Show main menu after failure
-        verified_user = check_verified_user(update.effective_user.id)
+        verified_user = await check_verified_user_async(update.effective_user.id)
         if verified_user:
             await _show_main_menu(update, context, verified_user)
 
@@ -710,24 +710,20 @@ async def status_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         username = update.effective_user.username or "unknown"
         
-        # Get student data with error handling
-        try:
-            submissions = await run_blocking(get_student_submissions, username, None, user_id)
-            wins = await run_blocking(get_student_wins, username)
-            # Use Supabase version for questions (requires telegram_id)
-            from avap_bot.services.supabase_service import get_student_questions as get_supabase_questions
-            questions = await run_blocking(get_supabase_questions, user_id)
-        except Exception as e:
-            logger.exception(f"Failed to get student data: {e}")
-            # Use empty lists as fallback
-            submissions = []
-            wins = []
-            questions = []
-            # Initialize status_text for the warning case
-            status_text = ""
-
-            # Show a warning in the status message
-            status_text += "\n\n⚠️ **Note:** Unable to retrieve some data. Please try again later."
+        # Get student data; Sheets and Supabase run in separate pools, so one
+        # slow or overloaded backend only blanks its own part of the status
+        # Use Supabase version for questions (requires telegram_id)
+        from avap_bot.services.supabase_service import get_student_questions as get_supabase_questions
+        results = await asyncio.gather(
+            run_blocking(get_student_submissions, username, None, user_id),
+            run_blocking(get_student_wins, username),
+            run_blocking(get_supabase_questions, user_id),
+            return_exceptions=True
+        )
+        failed = [r for r in results if isinstance(r, BaseException)]
+        for error in failed:
+            logger.warning(f"Failed to get student data: {type(error).__name__}: {error}")
+        submissions, wins, questions = [[] if isinstance(r, BaseException) else r for r in results]
 
         # Calculate stats
         total_submissions = len(submissions)
@@ -771,6 +767,10 @@ async def status_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if len(modules_left) <= 6:
             status_text += f"\n📖 Left to complete: {', '.join(sorted(modules_left)) if modules_left else 'All done! 🎉'}"
 
+        # Show a warning in the status message
+        if failed:
+            status_text += "\n\n⚠️ **Note:** Unable to retrieve some data. Please try again later."
+
         await update.message.reply_text(status_text, parse_mode=ParseMode.MARKDOWN)
 
     except Exception as e:
@@ -844,10 +844,8 @@ async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         
         # AI features disabled - questions go directly to admin
 
-        # Store question in database for future FAQ matching
-        def _add_question_pending():
-            return add_question(user_id, username, question_text, file_id, file_name, None, 'pending')
-        await run_blocking(_add_question_pending)
+        # Store question in database for future FAQ matching (written in the next bulk insert)
+        await add_question_async(user_id, username, question_text, file_id, file_name, None, 'pending')
         
         # AI features disabled
         log_memory_usage("after question processing")
@@ -989,7 +987,7 @@ async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         
         # Clear conversation state and show main menu
         context.user_data.clear()
-        verified_user = check_verified_user(user_id)
+        verified_user = await check_verified_user_async(user_id)
         if verified_user:
             await _show_main_menu(update, context, verified_user)
 
@@ -1007,7 +1005,7 @@ async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             logger.error(f"Failed to send question error message: {reply_error}")
 
         # Show main menu after failure
-        verified_user = check_verified_user(update.effective_user.id)
+        verified_user = await check_verified_user_async(update.effective_user.id)
         if verified_user:
             await _show_main_menu(update, context, verified_user)
 
@@ -1019,7 +1017,7 @@ async def cancel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await update.message.reply_text("❌ Operation cancelled.")
 
     # Show main menu after cancellation
-    verified_user = check_verified_user(update.effective_user.id)
+    verified_user = await check_verified_user_async(update.effective_user.id)
     if verified_user:
         await _show_main_menu(update, context, verified_user)
 
@@ -1051,7 +1049,7 @@ async def support_group_ask_handler(update: Update, context: ContextTypes.DEFAUL
     
     # Check if user is verified
     logger.info(f"Checking verification for user {user_id} ({username})")
-    verified_user = check_verified_user(user_id)
+    verified_user = await check_verified_user_async(user_id)
     if not verified_user:
         logger.warning(f"User {user_id} is not verified, rejecting /ask command")
         await update.message.reply_text(
@@ -1141,10 +1139,8 @@ async def support_group_ask_handler(update: Update, context: ContextTypes.DEFAUL
                     reply_to_message_id=update.message.message_id
                 )
 
-                # Store question in database for future FAQ matching
-                def _add_question_with_answer():
-                    return add_question(user_id, username, question_text, None, None, answer, 'answered')
-                await run_blocking(_add_question_with_answer)
+                # Store question in database for future FAQ matching (written in the next bulk insert)
+                await add_question_async(user_id, username, question_text, None, None, answer, 'answered')
 
                 # Save the question for tracking
                 question_data = {
@@ -1256,7 +1252,7 @@ async def support_group_ask_handler(update: Update, context: ContextTypes.DEFAUL
 
 async def _is_verified(update: Update) -> bool:
     """Check if user is verified by checking Supabase."""
-    return check_verified_user(update.effective_user.id) is not None
+    return await check_verified_user_async(update.effective_user.id) is not None
 
 
 async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1265,7 +1261,7 @@ async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = user.id
 
     # Check if user is verified
-    verified_user = check_verified_user(user_id)
+    verified_user = await check_verified_user_async(user_id)
 
     if verified_user:
         help_text = (
@@ -1304,10 +1300,15 @@ async def faq_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        from avap_bot.services.supabase_service import get_faqs
+        from avap_bot.services.supabase_service import iter_faqs_async
 
-        # Get FAQs from database
-        faqs = get_faqs()
+        # Stream FAQs from the database, keeping only the ones shown
+        faqs = []
+        total_faqs = 0
+        async for faq in iter_faqs_async():
+            total_faqs += 1
+            if len(faqs) < 5:
+                faqs.append(faq)
 
         if not faqs:
             await update.message.reply_text(
@@ -1321,12 +1322,12 @@ async def faq_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Show first few FAQs with option to browse more
         faq_text = "📚 **Frequently Asked Questions**\n\n"
 
-        for i, faq in enumerate(faqs[:5], 1):  # Show first 5 FAQs
+        for i, faq in enumerate(faqs, 1):  # Show first 5 FAQs
             faq_text += f"**{i}. {faq['question']}**\n"
             faq_text += f"{faq['answer'][:100]}{'...' if len(faq['answer']) > 100 else ''}\n\n"
 
-        if len(faqs) > 5:
-            faq_text += f"📖 And {len(faqs) - 5} more FAQs available.\n"
+        if total_faqs > 5:
+            faq_text += f"📖 And {total_faqs - 5} more FAQs available.\n"
             faq_text += "Contact admin for specific questions!"
 
         await update.message.reply_text(faq_text, parse_mode=ParseMode.MARKDOWN)
@@ -12,9 +12,12 @@ from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, Mess
 from telegram.constants import ParseMode
 
 from avap_bot.services.supabase_service import (
-    add_tip, get_all_tips, get_random_tip, update_tip_sent_count,
-    get_all_verified_telegram_ids
+    add_tip, get_random_tip_async, get_recent_tips_async, count_tips_async,
+    iter_verified_telegram_ids_async, count_verified_users_async
 )
+from avap_bot.services.counter_service import tip_sent_counter
+from avap_bot.services.broadcast_service import broadcast_engine
+from avap_bot.services.outbound_limiter import BULK
 from avap_bot.features.cancel_feature import get_cancel_fallback_handler
 
 logger = logging.getLogger(__name__)
@@ -91,51 +94,41 @@ async def send_tip_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         # Get random tip
-        tip = get_random_tip()
+        tip = await get_random_tip_async()
         
         if not tip:
             await update.message.reply_text("📭 No tips available. Add some tips first using /add_tip")
             return
         
-        # Get all verified users
-        verified_users = get_all_verified_telegram_ids()
+        # Count verified users; their IDs are streamed page by page while sending
+        total_users = await count_verified_users_async()
         
-        if not verified_users:
+        if not total_users:
             await update.message.reply_text("👥 No verified users found.")
             return
         
         # Send tip to all verified users
-        success_count = 0
-        failure_count = 0
-        
-        await update.message.reply_text(f"📤 Sending tip to {len(verified_users)} users...")
+        await update.message.reply_text(f"📤 Sending tip to {total_users} users...")
         
         tip_message = f"💡 **Daily Tip**\n\n{tip.get('text', '')}"
         
-        for user_id in verified_users:
-            try:
-                await context.bot.send_message(user_id, tip_message, parse_mode=ParseMode.MARKDOWN)
-                success_count += 1
-                
-                # Rate limiting
-                await asyncio.sleep(0.03)
-                
-            except Exception as e:
-                logger.warning(f"Failed to send tip to user {user_id}: {e}")
-                failure_count += 1
+        report = await broadcast_engine.broadcast(
+            iter_verified_telegram_ids_async(),
+            lambda user_id: context.bot.send_message(
+                user_id, tip_message, parse_mode=ParseMode.MARKDOWN, rate_limit_args=BULK
+            )
+        )
         
-        # Update tip sent count
-        try:
-            update_tip_sent_count(tip.get('id'))
-        except Exception as e:
-            logger.warning(f"Failed to update tip sent count: {e}")
+        # Count the send; flushed to the database in batches
+        tip_sent_counter.add(tip.get('id'))
         
         # Send completion message
         await update.message.reply_text(
             f"✅ **Tip Sent Successfully!**\n\n"
-            f"📤 Sent: {success_count}\n"
-            f"❌ Failed: {failure_count}\n"
-            f"📊 Total: {len(verified_users)}\n\n"
+            f"📤 Sent: {report.sent}\n"
+            f"❌ Failed: {report.failed}\n"
+            f"⏭️ Skipped (unreachable): {report.skipped}\n"
+            f"📊 Total: {report.sent + report.failed + report.skipped}\n\n"
             f"**Tip:** {tip.get('text', '')[:100]}{'...' if len(tip.get('text', '')) > 100 else ''}",
             parse_mode=ParseMode.MARKDOWN
         )
@@ -153,7 +146,7 @@ async def test_tip_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         # Get random tip
-        tip = get_random_tip()
+        tip = await get_random_tip_async()
         
         if not tip:
             await update.message.reply_text("📭 No tips available. Add some tips first using /add_tip")
@@ -186,17 +179,17 @@ async def list_tips_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        # Get all tips
-        tips = get_all_tips()
+        # Newest 10 for readability, plus the total count
+        tips, total = await asyncio.gather(get_recent_tips_async(10), count_tips_async())
         
         if not tips:
             await update.message.reply_text("📭 No tips found. Add some tips using /add_tip")
             return
 
         # Format the message
-        message = f"💡 **All Tips** ({len(tips)} total)\n\n"
+        message = f"💡 **All Tips** ({total} total)\n\n"
         
-        for i, tip in enumerate(tips[:10], 1):  # Limit to 10 for readability
+        for i, tip in enumerate(tips, 1):
             created_at = tip.get('created_at', 'Unknown')
             if created_at != 'Unknown':
                 try:
@@ -215,8 +208,8 @@ async def list_tips_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             message += f"📤 Sent: {tip.get('sent_count', 0)} times\n"
             message += f"💬 Text: {text_preview}\n\n"
 
-        if len(tips) > 10:
-            message += f"... and {len(tips) - 10} more tips."
+        if total > len(tips):
+            message += f"... and {total - len(tips)} more tips."
 
         await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
 
@@ -232,44 +225,27 @@ async def send_daily_tip():
         from avap_bot.bot import bot_app
         
         # Get random tip
-        tip = get_random_tip()
+        tip = await get_random_tip_async()
         
         if not tip:
             logger.warning("No tips available for daily sending")
             return
         
-        # Get all verified users
-        verified_users = get_all_verified_telegram_ids()
-        
-        if not verified_users:
-            logger.warning("No verified users found for daily tip")
-            return
-        
         # Send tip to all verified users
-        success_count = 0
-        failure_count = 0
-        
         tip_message = f"💡 **Daily Tip**\n\n{tip.get('text', '')}"
         
-        for user_id in verified_users:
-            try:
-                await bot_app.bot.send_message(user_id, tip_message, parse_mode=ParseMode.MARKDOWN)
-                success_count += 1
-                
-                # Rate limiting
-                await asyncio.sleep(0.03)
-                
-            except Exception as e:
-                logger.warning(f"Failed to send daily tip to user {user_id}: {e}")
-                failure_count += 1
+        report = await broadcast_engine.broadcast(
+            iter_verified_telegram_ids_async(),
+            lambda user_id: bot_app.bot.send_message(
+                user_id, tip_message, parse_mode=ParseMode.MARKDOWN, rate_limit_args=BULK
+            )
+        )
         
-        # Update tip sent count
-        try:
-            update_tip_sent_count(tip.get('id'))
-        except Exception as e:
-            logger.warning(f"Failed to update tip sent count: {e}")
+        # Count the send; flushed to the database in batches
+        tip_sent_counter.add(tip.get('id'))
         
-        logger.info(f"Daily tip sent: {success_count} success, {failure_count} failures")
+        logger.info(f"Daily tip sent: {report.sent} success, {report.failed} failures, "
+                    f"{report.skipped} unreachable skipped")
         
     except Exception as e:
         logger.exception("Daily tip sending failed: %s", e)
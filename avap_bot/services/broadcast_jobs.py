@@ -0,0 +1,319 @@
+"""
+Broadcast jobs - Background broadcasts that survive restarts and can be cancelled
+
+A broadcast is a row in broadcast_history with status "running". The job
+streams verified users in id order and sends through the broadcast engine.
+As sends complete it advances a cursor: the last user id such that every
+recipient up to it has been handled. The cursor and the counts are saved
+every few seconds. After a restart, including the nightly graceful
+restart, running jobs pick up after their cursor. Only sends made since
+the last checkpoint can be repeated.
+
+The admin gets one progress message that is edited as the job goes. The
+job is registered with the CancelRegistry, so /cancel stops it: sends
+already in flight finish and nothing new is started.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from telegram.constants import ParseMode
+
+from avap_bot.services.broadcast_service import BroadcastEngine, DeliveryResult, broadcast_engine
+from avap_bot.services.outbound_limiter import BULK
+from avap_bot.services.supabase_service import (
+    count_verified_users_async,
+    create_broadcast_job_async,
+    get_running_broadcasts_async,
+    iter_verified_users_async,
+    update_broadcast_history_async
+)
+
+logger = logging.getLogger(__name__)
+
+RUNNING, COMPLETED, CANCELLED, FAILED = "running", "completed", "cancelled", "failed"
+
+
+@dataclass
+class BroadcastJob:
+    """A broadcast being delivered"""
+    id: str
+    admin_id: int
+    admin_chat_id: int
+    message_type: str
+    content: str
+    file_id: Optional[str] = None
+    total: int = 0
+    cursor: Optional[str] = None
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+    progress_message_id: Optional[int] = None
+    status: str = RUNNING
+    cancel_requested: bool = False
+    stopping: bool = False
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "BroadcastJob":
+        """Rebuild a job from its broadcast_history row"""
+        return cls(
+            id=row["id"],
+            admin_id=row.get("admin_id"),
+            admin_chat_id=row.get("admin_chat_id") or row.get("admin_id"),
+            message_type=row.get("message_type", "text"),
+            content=row.get("content", ""),
+            file_id=row.get("file_id"),
+            total=row.get("total_count") or 0,
+            cursor=row.get("cursor"),
+            sent=row.get("recipients_count") or 0,
+            failed=row.get("failures_count") or 0,
+            skipped=row.get("skipped_count") or 0,
+            progress_message_id=row.get("progress_message_id")
+        )
+
+
+class BroadcastJobManager:
+    """Starts, checkpoints, resumes and cancels broadcast jobs."""
+
+    def __init__(
+        self,
+        engine: BroadcastEngine,
+        checkpoint_seconds: float = 5.0,
+        checkpoint_every: int = 200,
+        progress_seconds: float = 5.0
+    ):
+        """
+        Initialize the manager.
+
+        Args:
+            engine: Engine doing the sending
+            checkpoint_seconds: Longest time between saved checkpoints
+            checkpoint_every: Also save after this many recipients are handled
+            progress_seconds: Shortest time between progress message edits
+
+        The bot sets cancel_registry at startup so jobs can be stopped with /cancel.
+        """
+        self.engine = engine
+        self.checkpoint_seconds = checkpoint_seconds
+        self.checkpoint_every = checkpoint_every
+        self.progress_seconds = progress_seconds
+        self.jobs: Dict[str, BroadcastJob] = {}
+        self.cancel_registry = None
+
+        self.started = 0
+        self.resumed = 0
+        self.checkpoints = 0
+
+    async def submit(self, bot, admin_id: int, admin_chat_id: int, message_type: str,
+                     content: str, file_id: Optional[str] = None,
+                     total: Optional[int] = None) -> Optional[BroadcastJob]:
+        """
+        Record a broadcast and start sending it in the background.
+
+        Args:
+            bot: Bot used for sending and progress edits
+            admin_id: Admin who started the broadcast (/cancel stops it)
+            admin_chat_id: Chat that gets the progress message
+            message_type: 'text', 'audio' or 'video'
+            content: Text, or caption for media
+            file_id: Telegram file id for media
+            total: Number of verified users, if already counted
+
+        Returns:
+            The job, or None if there is nobody to send to
+        """
+        if total is None:
+            total = await count_verified_users_async()
+        if not total:
+            return None
+        row = await create_broadcast_job_async(admin_id, admin_chat_id, message_type, content, file_id, total)
+        if not row:
+            raise RuntimeError("Broadcast job was not recorded")
+        job = BroadcastJob.from_row(row)
+        try:
+            message = await bot.send_message(admin_chat_id, self._progress_text(job))
+            job.progress_message_id = message.message_id
+            await update_broadcast_history_async(job.id, {"progress_message_id": job.progress_message_id})
+        except Exception as e:
+            logger.warning(f"Could not post broadcast progress message: {e}")
+        self.started += 1
+        self._start(bot, job)
+        return job
+
+    async def resume_all(self, bot) -> int:
+        """
+        Restart every broadcast that was still running when the bot stopped.
+
+        Returns:
+            Number of jobs resumed
+        """
+        rows = await get_running_broadcasts_async()
+        for row in rows:
+            if row.get("id") in self.jobs:
+                continue
+            job = BroadcastJob.from_row(row)
+            logger.info(f"Resuming broadcast {job.id} after {job.sent + job.failed} recipients")
+            self.resumed += 1
+            self._start(bot, job)
+        return len(rows)
+
+    def _start(self, bot, job: BroadcastJob) -> None:
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(bot, job), name=f"broadcast-{job.id}")
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop a job after the sends already in flight."""
+        job = self.jobs.get(job_id)
+        if not job or job.status != RUNNING:
+            return False
+        job.cancel_requested = True
+        return True
+
+    async def shutdown(self, timeout: float = 10.0) -> None:
+        """Stop every job for a restart, leaving it running in the database with a fresh checkpoint."""
+        running = [job for job in self.jobs.values() if job.task and not job.task.done()]
+        for job in running:
+            job.stopping = True
+        if running:
+            await asyncio.wait([job.task for job in running], timeout=timeout)
+
+    def _send(self, bot, job: BroadcastJob):
+        async def send(user_id: int):
+            if job.message_type == 'text':
+                await bot.send_message(user_id, job.content, rate_limit_args=BULK)
+            elif job.message_type == 'audio':
+                await bot.send_audio(user_id, job.file_id, caption=job.content, rate_limit_args=BULK)
+            elif job.message_type == 'video':
+                await bot.send_video(user_id, job.file_id, caption=job.content, rate_limit_args=BULK)
+        return send
+
+    def _progress_text(self, job: BroadcastJob) -> str:
+        done = job.sent + job.failed + job.skipped
+        if job.status == RUNNING:
+            percent = f" ({done * 100 // job.total}%)" if job.total else ""
+            return (f"📤 Sending broadcast to {job.total} users...\n"
+                    f"✅ Sent: {job.sent}   ❌ Failed: {job.failed}   ⏭️ Skipped: {job.skipped}{percent}\n"
+                    f"Send /cancel to stop it.")
+        title = {COMPLETED: "✅ **Broadcast Complete!**", CANCELLED: "🛑 **Broadcast Cancelled**",
+                 FAILED: "❌ **Broadcast Failed**"}[job.status]
+        return (f"{title}\n\n📤 Sent: {job.sent}\n❌ Failed: {job.failed}\n"
+                f"⏭️ Skipped (unreachable): {job.skipped}\n📊 Total: {done}")
+
+    async def _show_progress(self, bot, job: BroadcastJob) -> None:
+        text = self._progress_text(job)
+        parse_mode = None if job.status == RUNNING else ParseMode.MARKDOWN
+        try:
+            if job.progress_message_id:
+                await bot.edit_message_text(text, chat_id=job.admin_chat_id, message_id=job.progress_message_id,
+                                            parse_mode=parse_mode)
+            elif job.status != RUNNING:
+                await bot.send_message(job.admin_chat_id, text, parse_mode=parse_mode)
+        except Exception as e:
+            # "Message is not modified" and deleted progress messages are harmless
+            logger.debug(f"Broadcast progress update failed: {e}")
+
+    async def _checkpoint(self, job: BroadcastJob) -> None:
+        values = {"cursor": job.cursor, "recipients_count": job.sent, "failures_count": job.failed,
+                  "skipped_count": job.skipped, "status": job.status}
+        if await update_broadcast_history_async(job.id, values):
+            self.checkpoints += 1
+
+    async def _run(self, bot, job: BroadcastJob) -> None:
+        """Deliver a job from its cursor, checkpointing as the low-water mark advances."""
+        token = None
+        if self.cancel_registry is not None:
+            token = await self.cancel_registry.register_job(job.admin_id, lambda: self.cancel(job.id))
+
+        # Recipients in stream order -> result (None while the send is in flight)
+        outstanding: "OrderedDict[str, Optional[DeliveryResult]]" = OrderedDict()
+        keys_by_chat: Dict[int, List[str]] = {}
+        handled_since_checkpoint = 0
+        last_checkpoint = last_progress = time.monotonic()
+        saving = asyncio.Lock()
+
+        async def recipients():
+            async for user in iter_verified_users_async("telegram_id", after=job.cursor):
+                if job.cancel_requested or job.stopping:
+                    return
+                if not user.get("telegram_id"):
+                    continue
+                outstanding[user["id"]] = None
+                keys_by_chat.setdefault(user["telegram_id"], []).append(user["id"])
+                yield user["telegram_id"]
+
+        async def on_result(result: DeliveryResult) -> None:
+            nonlocal handled_since_checkpoint, last_checkpoint, last_progress
+            keys = keys_by_chat.get(result.chat_id)
+            if not keys:
+                return
+            outstanding[keys.pop(0)] = result
+            if not keys:
+                del keys_by_chat[result.chat_id]
+            # Advance the cursor over the finished prefix of the stream
+            while outstanding:
+                key, done = next(iter(outstanding.items()))
+                if done is None:
+                    break
+                outstanding.popitem(last=False)
+                job.cursor = key
+                if done.ok:
+                    job.sent += 1
+                elif done.skipped:
+                    job.skipped += 1
+                else:
+                    job.failed += 1
+                handled_since_checkpoint += 1
+
+            now = time.monotonic()
+            due = handled_since_checkpoint >= self.checkpoint_every or now - last_checkpoint >= self.checkpoint_seconds
+            if due and not saving.locked():
+                async with saving:
+                    handled_since_checkpoint, last_checkpoint = 0, now
+                    await self._checkpoint(job)
+            if now - last_progress >= self.progress_seconds:
+                last_progress = now
+                await self._show_progress(bot, job)
+
+        try:
+            await self.engine.broadcast(recipients(), self._send(bot, job), on_result=on_result)
+            if job.cancel_requested:
+                job.status = CANCELLED
+            elif not job.stopping:
+                job.status = COMPLETED
+        except Exception as e:
+            logger.exception("Broadcast %s failed: %s", job.id, e)
+            job.status = FAILED
+        finally:
+            async with saving:
+                await self._checkpoint(job)
+            if job.status != RUNNING:
+                await self._show_progress(bot, job)
+                self.jobs.pop(job.id, None)
+            if token and self.cancel_registry is not None:
+                await self.cancel_registry.unregister_job(job.admin_id, token)
+            logger.info(f"Broadcast {job.id} {job.status}: {job.sent} sent, {job.failed} failed, "
+                        f"{job.skipped} unreachable skipped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get job counters and the progress of running jobs."""
+        return {
+            "started": self.started,
+            "resumed": self.resumed,
+            "checkpoints": self.checkpoints,
+            "running": {
+                job_id: {"sent": job.sent, "failed": job.failed, "skipped": job.skipped, "total": job.total,
+                         "cancel_requested": job.cancel_requested}
+                for job_id, job in self.jobs.items()
+            }
+        }
+
+
+broadcast_jobs = BroadcastJobManager(
+    broadcast_engine,
+    checkpoint_seconds=float(os.getenv("BROADCAST_CHECKPOINT_SECONDS", "5"))
+)
@@ -0,0 +1,339 @@
+"""
+Broadcast service - Concurrent fan-out of one message to many chats
+
+Broadcasts and tips used to send one message at a time with a fixed
+30 ms sleep, so 5,000 students took minutes while the admin waited. The
+engine sends up to `concurrency` messages at once and paces them with a
+token bucket shared by every broadcast in the process, set a little under
+Telegram's bulk limit (about 30 messages per second). A RetryAfter pauses
+all sends for the time Telegram asks and lowers the rate, which then
+creeps back up while sends succeed. The same chat is never sent to twice
+within a second. Each recipient gets a DeliveryResult, so callers can
+count, log or retry exactly who was missed. Chats marked unreachable in
+the recipient health store are skipped without an API call.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, NetworkError, RetryAfter
+
+from avap_bot.services.recipient_health import RecipientHealth, recipient_health
+
+logger = logging.getLogger(__name__)
+
+# Errors that will not go away by retrying (blocked bot, deleted account, bad chat id)
+PERMANENT_ERRORS = (Forbidden, BadRequest, ChatMigrated, InvalidToken)
+
+
+def _seconds(value: Union[int, float, timedelta]) -> float:
+    """RetryAfter.retry_after as seconds (an int, or a timedelta in newer PTB versions)"""
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+@dataclass
+class DeliveryResult:
+    """Outcome of sending to one chat"""
+    chat_id: int
+    ok: bool
+    attempts: int = 1
+    error: Optional[str] = None
+    permanent: bool = False
+    skipped: bool = False
+
+
+@dataclass
+class BroadcastReport:
+    """Outcome of a whole broadcast"""
+    results: List[DeliveryResult] = field(default_factory=list)
+    throttled: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def sent(self) -> int:
+        return sum(1 for r in self.results if r.ok)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for r in self.results if not r.ok and not r.skipped)
+
+    @property
+    def skipped(self) -> int:
+        """Sends saved by skipping unreachable recipients"""
+        return sum(1 for r in self.results if r.skipped)
+
+    @property
+    def failures(self) -> List[DeliveryResult]:
+        return [r for r in self.results if not r.ok and not r.skipped]
+
+
+class AsyncTokenBucket:
+    """Token bucket for coroutines, with a global pause for server throttling."""
+
+    def __init__(self, rate: float, burst: float):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate: Tokens per second
+            burst: Most tokens that can be saved up
+        """
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait for and take a token (waiters are served in arrival order)."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for `seconds`, then restart from an empty bucket."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self._updated = self._paused_until
+
+
+class BroadcastEngine:
+    """
+    Sends one message to many chats, as fast as Telegram allows.
+
+    The rate limit is shared by all broadcasts; concurrency is per broadcast.
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float = 25.0,
+        concurrency: int = 20,
+        max_attempts: int = 4,
+        min_rate: float = 5.0,
+        recovery_seconds: float = 10.0,
+        per_chat_interval: float = 1.0,
+        health: Optional[RecipientHealth] = None
+    ):
+        """
+        Initialize the engine.
+
+        Args:
+            rate_per_second: Target send rate across all broadcasts
+            concurrency: Sends in flight at once per broadcast
+            max_attempts: Tries per recipient for throttling and network errors
+            min_rate: Lowest rate adaptive slowdown goes to
+            recovery_seconds: Throttle-free time before the rate is raised again
+            per_chat_interval: Minimum seconds between two sends to the same chat
+            health: Store of unreachable chats to skip and to report failures to
+        """
+        self.target_rate = rate_per_second
+        self.min_rate = min(min_rate, rate_per_second)
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.recovery_seconds = recovery_seconds
+        self.per_chat_interval = per_chat_interval
+        self.health = health
+        self._bucket: Optional[AsyncTokenBucket] = None
+        self._last_throttle = 0.0
+        self._last_raise = 0.0
+        self._chat_last_send: Dict[int, float] = {}
+
+        self.broadcasts = 0
+        self.active = 0
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.retries = 0
+        self.skipped = 0
+
+    @property
+    def bucket(self) -> AsyncTokenBucket:
+        # Created on first use so it belongs to the running event loop. A small
+        # burst keeps the first second of a broadcast under the limit too
+        if self._bucket is None:
+            self._bucket = AsyncTokenBucket(self.target_rate, burst=self.target_rate / 5)
+        return self._bucket
+
+    def _throttled(self, seconds: float) -> None:
+        """Pause every sender and slow down after Telegram returned RetryAfter."""
+        self.throttled += 1
+        bucket = self.bucket
+        bucket.pause(seconds)
+        bucket.rate = max(self.min_rate, bucket.rate * 0.7)
+        self._last_throttle = time.monotonic()
+        logger.warning(f"Telegram asked to retry after {seconds:.1f}s; broadcast rate lowered to {bucket.rate:.1f}/s")
+
+    def _recover(self) -> None:
+        """Raise the rate step by step while no throttling is seen."""
+        bucket = self.bucket
+        now = time.monotonic()
+        if (bucket.rate < self.target_rate and now - self._last_throttle >= self.recovery_seconds
+                and now - self._last_raise >= 1.0):
+            bucket.rate = min(self.target_rate, bucket.rate * 1.1)
+            self._last_raise = now
+
+    async def _wait_for_chat(self, chat_id: int) -> None:
+        """Keep at least per_chat_interval between sends to one chat."""
+        last = self._chat_last_send.get(chat_id)
+        if last is not None:
+            wait = last + self.per_chat_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        self._chat_last_send[chat_id] = time.monotonic()
+
+    def _forget_idle_chats(self) -> None:
+        cutoff = time.monotonic() - self.per_chat_interval
+        for chat_id in [c for c, t in self._chat_last_send.items() if t < cutoff]:
+            del self._chat_last_send[chat_id]
+
+    async def deliver(self, chat_id: int, send: Callable[[int], Awaitable[Any]]) -> DeliveryResult:
+        """
+        Send to one chat under the shared rate limit, retrying throttling and network errors.
+
+        Args:
+            chat_id: Recipient chat
+            send: Coroutine function sending the message to a chat id
+
+        Returns:
+            The delivery result
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.bucket.acquire()
+            await self._wait_for_chat(chat_id)
+            try:
+                await send(chat_id)
+                self.sent += 1
+                self._recover()
+                if self.health:
+                    self.health.record_success(chat_id)
+                return DeliveryResult(chat_id, True, attempt)
+            except RetryAfter as e:
+                self._throttled(_seconds(e.retry_after))
+                error = e
+            except PERMANENT_ERRORS as e:
+                self.failed += 1
+                if self.health:
+                    self.health.record_failure(chat_id, e)
+                return DeliveryResult(chat_id, False, attempt, str(e), permanent=True)
+            except NetworkError as e:
+                error = e
+                await asyncio.sleep(min(2 ** attempt * 0.5, 8))
+            except Exception as e:
+                self.failed += 1
+                return DeliveryResult(chat_id, False, attempt, str(e))
+            if attempt >= self.max_attempts:
+                self.failed += 1
+                return DeliveryResult(chat_id, False, attempt, str(error))
+            self.retries += 1
+
+    async def broadcast(
+        self,
+        recipients: Union[Iterable[int], AsyncIterable[int]],
+        send: Callable[[int], Awaitable[Any]],
+        on_result: Optional[Callable[[DeliveryResult], Any]] = None,
+        concurrency: Optional[int] = None
+    ) -> BroadcastReport:
+        """
+        Send to every recipient, several at a time.
+
+        Args:
+            recipients: Chat ids (a list, or an async stream read as sending progresses)
+            send: Coroutine function sending the message to a chat id
+            on_result: Called with each DeliveryResult as it completes (may be a coroutine function)
+            concurrency: Sends in flight at once (default: the engine's)
+
+        Returns:
+            Report with one result per recipient
+        """
+        report = BroadcastReport()
+        throttled_before = self.throttled
+        start = time.monotonic()
+        slots = asyncio.Semaphore(concurrency or self.concurrency)
+        tasks = set()
+        self.broadcasts += 1
+        self.active += 1
+
+        async def report_result(result: DeliveryResult) -> None:
+            report.results.append(result)
+            if on_result:
+                outcome = on_result(result)
+                if asyncio.iscoroutine(outcome):
+                    await outcome
+
+        async def deliver_one(chat_id: int) -> None:
+            try:
+                result = await self.deliver(chat_id, send)
+                if not result.ok:
+                    logger.warning(f"Failed to send to user {chat_id}: {result.error}")
+                await report_result(result)
+            except Exception as e:
+                logger.exception("Broadcast delivery to %s failed: %s", chat_id, e)
+            finally:
+                slots.release()
+
+        async def launch(chat_id: int) -> None:
+            if self.health and not self.health.allow(chat_id):
+                self.skipped += 1
+                await report_result(DeliveryResult(chat_id, False, attempts=0, error="unreachable", skipped=True))
+                return
+            # Wait for a free slot before reading further, so a stream is consumed at send speed
+            await slots.acquire()
+            task = asyncio.create_task(deliver_one(chat_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        try:
+            if hasattr(recipients, "__aiter__"):
+                async for chat_id in recipients:
+                    await launch(chat_id)
+            else:
+                for chat_id in recipients:
+                    await launch(chat_id)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            self.active -= 1
+            self._forget_idle_chats()
+
+        report.throttled = self.throttled - throttled_before
+        report.elapsed = time.monotonic() - start
+        logger.info(f"Broadcast finished: {report.sent} sent, {report.failed} failed, "
+                    f"{report.skipped} unreachable skipped, {report.throttled} throttled, {report.elapsed:.1f}s")
+        return report
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get send counters and the current (adaptive) rate."""
+        return {
+            "broadcasts": self.broadcasts,
+            "active": self.active,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "skipped": self.skipped,
+            "target_rate": self.target_rate,
+            "current_rate": round(self._bucket.rate, 2) if self._bucket else self.target_rate
+        }
+
+
+broadcast_engine = BroadcastEngine(
+    rate_per_second=float(os.getenv("BROADCAST_RATE_PER_SECOND", "25")),
+    concurrency=int(os.getenv("BROADCAST_CONCURRENCY", "20")),
+    health=recipient_health
+)
@@ -0,0 +1,32 @@
+"""
+Counter service - Batched, atomic counters for tips
+
+Tip sends add to an in-memory aggregator; a scheduler job flushes it
+with one SQL function call that increments every pending row at once.
+Broadcast counts are saved by the broadcast job's own checkpoints.
+"""
+import logging
+import os
+from typing import Any, Dict
+
+from avap_bot.services.supabase_service import increment_tip_sent_counts_async
+from avap_bot.utils.counter_aggregator import CounterAggregator
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FLUSH_SECONDS = int(os.getenv("COUNTER_FLUSH_SECONDS", "10"))
+
+# tip_id -> sends
+tip_sent_counter = CounterAggregator(increment_tip_sent_counts_async, name="tip_sent_count")
+
+
+async def flush_counters() -> None:
+    """Flush every counter aggregator."""
+    await tip_sent_counter.flush()
+
+
+def get_counter_stats() -> Dict[str, Any]:
+    """Get stats for every counter aggregator."""
+    return {
+        "tip_sent_count": tip_sent_counter.get_stats()
+    }
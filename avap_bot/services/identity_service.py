@@ -0,0 +1,313 @@
+"""
+Identity service - Email/phone/name lookups across pending and verified students
+
+Resolves "does this email or phone already belong to a student?" with a
+single round trip: the find_identity_conflicts SQL function when installed,
+otherwise one PostgREST or= query per table sent concurrently. Matches are
+remembered in a small normalized email/phone index so repeated checks (and
+duplicates within a bulk add) are answered locally.
+
+Admin lookups by a free-form identifier (email, phone or name) are
+classified once and resolved with one or= query per table, ranked so the
+best match comes first.
+"""
+import asyncio
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from avap_bot.services.postgrest_client import PostgrestError, get_async_postgrest
+from avap_bot.utils.ttl_cache import TTLCache
+from avap_bot.utils.validators import validate_email, validate_phone
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_TABLES = ("pending_verifications", "verified_users")
+IDENTITY_COLUMNS = "id,name,email,phone,status"
+
+# Normalized email/phone -> matching rows; only positive matches are cached
+identity_index = TTLCache(
+    maxsize=int(os.getenv("IDENTITY_INDEX_SIZE", "5000")),
+    ttl=float(os.getenv("IDENTITY_INDEX_TTL", "120")),
+    negative_ttl=0,
+    name="identity_index"
+)
+
+_rpc_available: Optional[bool] = None
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """Lower-case and strip an email address"""
+    return email.strip().lower() if email and email.strip() else None
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Reduce a phone number to its digits"""
+    digits = re.sub(r"\D", "", phone or "")
+    return digits or None
+
+
+def phone_variants(phone: Optional[str]) -> List[str]:
+    """Spellings a phone number may be stored under (as typed, digits, +digits)"""
+    digits = normalize_phone(phone)
+    if not digits:
+        return []
+    variants = [phone.strip(), digits, f"+{digits}"]
+    return list(dict.fromkeys(v for v in variants if v))
+
+
+def _quote(value: str) -> str:
+    """Quote a value for use inside a PostgREST or=/in. expression"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _identity_filter(email: Optional[str], phones: List[str]) -> str:
+    """Build the or=(...) expression matching an email or any phone spelling"""
+    conditions = []
+    if email:
+        conditions.append(f"email.eq.{_quote(email)}")
+    if phones:
+        conditions.append(f"phone.in.({','.join(_quote(p) for p in phones)})")
+    return f"({','.join(conditions)})"
+
+
+def remember_identity(row: Dict[str, Any], source: str) -> None:
+    """
+    Add a student row to the local identity index.
+
+    Args:
+        row: Row with email and/or phone
+        source: Table the row lives in
+    """
+    record = dict(row, source=source)
+    for key in (("email", normalize_email(row.get("email"))), ("phone", normalize_phone(row.get("phone")))):
+        if key[1]:
+            _, rows = identity_index.get(key)
+            rows = [r for r in (rows or []) if r.get("id") != record.get("id")]
+            identity_index.set(key, rows + [record])
+
+
+def forget_identity(email: Optional[str] = None, phone: Optional[str] = None) -> None:
+    """Drop an email/phone from the local identity index (call after deletes)"""
+    if email is None and phone is None:
+        identity_index.clear()
+        return
+    if normalize_email(email):
+        identity_index.invalidate(("email", normalize_email(email)))
+    if normalize_phone(phone):
+        identity_index.invalidate(("phone", normalize_phone(phone)))
+
+
+def _order_conflicts(rows: Iterable[Dict[str, Any]], email: Optional[str], phone: Optional[str]) -> List[Dict[str, Any]]:
+    """De-duplicate rows and order them pending-before-verified, email-before-phone"""
+    unique = {}
+    for row in rows:
+        unique.setdefault((row.get("source"), row.get("id")), row)
+
+    def rank(row):
+        table_rank = IDENTITY_TABLES.index(row.get("source")) if row.get("source") in IDENTITY_TABLES else 2
+        email_match = email is not None and normalize_email(row.get("email")) == email
+        return (table_rank, 0 if email_match else 1)
+
+    return sorted(unique.values(), key=rank)
+
+
+async def find_identity_conflicts(email: Optional[str] = None, phone: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Find pending or verified students using an email or phone.
+
+    Args:
+        email: Email address to check
+        phone: Phone number to check (any formatting)
+
+    Returns:
+        Conflicting rows, each with a "source" table name, pending rows
+        first and email matches before phone matches
+    """
+    global _rpc_available
+    email = normalize_email(email)
+    phones = phone_variants(phone)
+    digits = normalize_phone(phone)
+    if not email and not phones:
+        return []
+
+    # Served locally when this email/phone is already known to be taken
+    local = []
+    for key in (("email", email), ("phone", digits)):
+        if key[1]:
+            found, rows = identity_index.get(key)
+            if found:
+                local.extend(rows)
+    if local:
+        return _order_conflicts(local, email, phone)
+
+    client = get_async_postgrest()
+    try:
+        rows = None
+        if _rpc_available is not False:
+            try:
+                rows = await client.rpc("find_identity_conflicts", {"p_email": email, "p_phones": phones})
+                _rpc_available = True
+            except PostgrestError as e:
+                if e.status_code == 404:
+                    _rpc_available = False
+                logger.info(f"find_identity_conflicts RPC unavailable, querying tables: {e}")
+
+        if rows is None:
+            expression = _identity_filter(email, phones)
+            pending, verified = await asyncio.gather(
+                client.select("pending_verifications", columns=IDENTITY_COLUMNS, filters=[("or", expression)]),
+                client.select("verified_users", columns=IDENTITY_COLUMNS,
+                              filters=[("or", expression), ("status", "eq.verified")])
+            )
+            rows = [dict(r, source="pending_verifications") for r in pending]
+            rows += [dict(r, source="verified_users") for r in verified]
+
+        for row in rows:
+            remember_identity(row, row.get("source", "verified_users"))
+        return _order_conflicts(rows, email, phone)
+    except Exception as e:
+        logger.exception("Identity conflict lookup failed: %s", e)
+        raise
+
+
+@dataclass
+class IdentifierMatch:
+    """A student row matched by an admin-supplied identifier"""
+    source: str
+    matched_on: str
+    exact: bool
+    row: Dict[str, Any]
+
+    def as_record(self) -> Dict[str, Any]:
+        """Row with the table it came from under the "source" key"""
+        return dict(self.row, source=self.source)
+
+
+def classify_identifier(identifier: str) -> str:
+    """Classify an identifier as email, phone or name"""
+    identifier = (identifier or "").strip()
+    if validate_email(identifier):
+        return "email"
+    if validate_phone(identifier):
+        return "phone"
+    return "name"
+
+
+def identifier_filter(kind: str, identifier: str, partial_names: bool = False) -> str:
+    """
+    Build the or=(...) expression for a classified identifier.
+
+    Args:
+        kind: Result of classify_identifier
+        identifier: Identifier as typed by the admin
+        partial_names: Also match names containing the identifier
+
+    Returns:
+        PostgREST or= expression
+    """
+    identifier = identifier.strip()
+    if kind == "email":
+        emails = list(dict.fromkeys([identifier, identifier.lower()]))
+        return f"(email.in.({','.join(_quote(e) for e in emails)}))"
+    if kind == "phone":
+        return f"(phone.in.({','.join(_quote(p) for p in phone_variants(identifier))}))"
+    conditions = [f"name.eq.{_quote(identifier)}"]
+    if partial_names:
+        pattern = identifier.replace("*", "")
+        conditions.append(f"name.ilike.{_quote(f'*{pattern}*')}")
+    return f"({','.join(conditions)})"
+
+
+def rank_identifier_matches(
+    rows: Iterable[Dict[str, Any]],
+    kind: str,
+    identifier: str,
+    tables: Sequence[str] = IDENTITY_TABLES
+) -> List[IdentifierMatch]:
+    """
+    Rank rows returned for an identifier: exact matches first, then by table preference.
+
+    Args:
+        rows: Rows carrying a "source" table name
+        kind: Result of classify_identifier
+        identifier: Identifier as typed by the admin
+        tables: Tables in order of preference
+
+    Returns:
+        Matches, best first
+    """
+    wanted = identifier.strip().lower()
+    matches = []
+    seen = set()
+    for row in rows:
+        source = row.get("source")
+        if (source, row.get("id")) in seen:
+            continue
+        seen.add((source, row.get("id")))
+        record = {k: v for k, v in row.items() if k != "source"}
+        exact = kind != "name" or (record.get("name") or "").strip().lower() == wanted
+        matches.append(IdentifierMatch(source=source, matched_on=kind, exact=exact, row=record))
+
+    def rank(match):
+        table_rank = tables.index(match.source) if match.source in tables else len(tables)
+        return (0 if match.exact else 1, table_rank)
+
+    return sorted(matches, key=rank)
+
+
+async def resolve_identifier(
+    identifier: str,
+    tables: Sequence[str] = IDENTITY_TABLES,
+    partial_names: bool = False
+) -> List[IdentifierMatch]:
+    """
+    Find students by email, phone or name with one query per table, run concurrently.
+
+    Args:
+        identifier: Email, phone or full name
+        tables: Tables to search, in order of preference
+        partial_names: Also match names containing the identifier
+
+    Returns:
+        Ranked matches (empty if nothing matched)
+    """
+    identifier = (identifier or "").strip()
+    if not identifier:
+        return []
+    kind = classify_identifier(identifier)
+    expression = identifier_filter(kind, identifier, partial_names)
+    client = get_async_postgrest()
+
+    async def query(table):
+        filters = [("or", expression)]
+        if table == "verified_users":
+            filters.append(("status", "eq.verified"))
+        rows = await client.select(table, filters=filters)
+        return [dict(r, source=table) for r in rows]
+
+    try:
+        results = await asyncio.gather(*(query(table) for table in tables))
+    except Exception as e:
+        logger.exception("Identifier lookup failed: %s", e)
+        raise
+    return rank_identifier_matches([row for rows in results for row in rows], kind, identifier, tables)
+
+
+async def resolve_student(
+    identifier: str,
+    tables: Sequence[str] = IDENTITY_TABLES,
+    partial_names: bool = False
+) -> Optional[IdentifierMatch]:
+    """Best match for an identifier, or None"""
+    matches = await resolve_identifier(identifier, tables, partial_names)
+    return matches[0] if matches else None
+
+
+def get_identity_stats() -> Dict[str, Any]:
+    """Get local index counters and whether the RPC is in use"""
+    stats = identity_index.get_stats()
+    stats["rpc_available"] = _rpc_available
+    return stats
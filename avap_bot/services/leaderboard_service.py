@@ -0,0 +1,218 @@
+"""
+Leaderboard service - Per-student submission and win counts without N+1 queries
+
+The leaderboard is computed with a single grouped query (the get_leaderboard
+SQL function in database_schema.sql). When that function is not installed,
+the engine scans the telegram_id and username columns of assignments and
+wins page by page, counts them in memory and picks the top N with a heap, so the number
+of round trips depends on table size / page size instead of one or two
+queries per student.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from avap_bot.services.postgrest_client import AsyncPostgrestClient, PostgrestError, get_async_postgrest
+
+logger = logging.getLogger(__name__)
+
+USER_COLUMNS = "telegram_id,name,email,created_at"
+# Assignment and win columns scanned for counts and usernames
+ACTIVITY_COLUMNS = "telegram_id,username"
+
+
+def leaderboard_row(row: Dict[str, Any], submissions: int, wins: int, username: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build a leaderboard entry.
+
+    Args:
+        row: Verified user row or get_leaderboard RPC row
+        submissions: Submission count
+        wins: Win count
+        username: Telegram username, if not in the row
+
+    Returns:
+        Leaderboard row
+    """
+    return {
+        "name": row.get("name") or "Unknown",
+        "username": username or row.get("username") or "unknown",
+        "telegram_id": row.get("telegram_id"),
+        "submissions": int(submissions or 0),
+        "wins": int(wins or 0),
+        "email": row.get("email") or "N/A",
+        "joined_at": row.get("created_at") or "Unknown"
+    }
+
+
+def rank_students(
+    users: Iterable[Dict[str, Any]],
+    submissions: Counter,
+    wins: Counter,
+    limit: int = 5,
+    min_submissions: int = 1,
+    min_wins: int = 0,
+    usernames: Optional[Dict[int, str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Pick the top students by submission count (wins break ties).
+
+    Args:
+        users: Verified user rows with telegram_id, name, email, created_at
+        submissions: Submission count per telegram_id
+        wins: Win count per telegram_id
+        limit: Number of students to return
+        min_submissions: Minimum submissions to be ranked
+        min_wins: Minimum wins to be ranked
+        usernames: Telegram username per telegram_id (verified_users has none)
+
+    Returns:
+        Leaderboard rows, best first
+    """
+    usernames = usernames or {}
+    candidates = []
+    for user in users:
+        telegram_id = user.get("telegram_id")
+        if not telegram_id:
+            continue
+        submission_count = submissions.get(telegram_id, 0)
+        win_count = wins.get(telegram_id, 0)
+        if submission_count < min_submissions or win_count < min_wins:
+            continue
+        candidates.append(leaderboard_row(user, submission_count, win_count, usernames.get(telegram_id)))
+    return heapq.nlargest(limit, candidates, key=lambda row: (row["submissions"], row["wins"]))
+
+
+def usernames_from(*row_lists: Iterable[Dict[str, Any]]) -> Dict[int, str]:
+    """Telegram username per telegram_id from assignment or win rows (earlier lists win)"""
+    usernames: Dict[int, str] = {}
+    for rows in reversed(row_lists):
+        for row in rows:
+            if row.get("username"):
+                usernames[row["telegram_id"]] = row["username"]
+    return usernames
+
+
+class LeaderboardEngine:
+    """
+    Computes the leaderboard through RPC or a paged column scan.
+
+    Scan results are cached for cache_ttl seconds so repeated /stats calls
+    with different limits reuse the same counts.
+    """
+
+    def __init__(self, client: Optional[AsyncPostgrestClient] = None, page_size: int = 1000, cache_ttl: float = 60.0):
+        """
+        Initialize the engine.
+
+        Args:
+            client: PostgREST client (defaults to the shared pooled client)
+            page_size: Rows fetched per page when scanning
+            cache_ttl: Seconds scanned counts are reused
+        """
+        self._client = client
+        self.page_size = page_size
+        self.cache_ttl = cache_ttl
+        self._rpc_available: Optional[bool] = None
+        self._cached: Optional[Tuple[float, List[Dict[str, Any]], Counter, Counter, Dict[int, str]]] = None
+        self._lock = asyncio.Lock()
+
+        self.rpc_calls = 0
+        self.scans = 0
+        self.scan_requests = 0
+        self.last_duration = 0.0
+
+    @property
+    def client(self) -> AsyncPostgrestClient:
+        return self._client or get_async_postgrest()
+
+    async def _scan(self, table: str, columns: str, filters: Optional[List[Tuple[str, str]]] = None) -> List[Dict[str, Any]]:
+        """Fetch only the given columns of a table, one keyset page at a time."""
+        rows = [row async for row in self.client.iter_rows(table, columns=columns, filters=filters,
+                                                             page_size=self.page_size)]
+        self.scan_requests += len(rows) // self.page_size + 1
+        return rows
+
+    async def _scan_counts(self) -> Tuple[List[Dict[str, Any]], Counter, Counter, Dict[int, str]]:
+        """Scan users, submissions and wins concurrently and count per student."""
+        cached = self._cached
+        if cached and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1:]
+
+        async with self._lock:
+            cached = self._cached
+            if cached and time.monotonic() - cached[0] < self.cache_ttl:
+                return cached[1:]
+
+            users, assignment_rows, win_rows = await asyncio.gather(
+                self._scan("verified_users", USER_COLUMNS, [("status", "eq.verified")]),
+                self._scan("assignments", ACTIVITY_COLUMNS),
+                self._scan("wins", ACTIVITY_COLUMNS)
+            )
+            submissions = Counter(row["telegram_id"] for row in assignment_rows)
+            wins = Counter(row["telegram_id"] for row in win_rows)
+            usernames = usernames_from(assignment_rows, win_rows)
+            self._cached = (time.monotonic(), users, submissions, wins, usernames)
+            self.scans += 1
+            return users, submissions, wins, usernames
+
+    async def top(self, limit: int = 5, min_submissions: int = 1, min_wins: int = 0) -> List[Dict[str, Any]]:
+        """
+        Get the top students.
+
+        Args:
+            limit: Number of students to return
+            min_submissions: Minimum submissions to be ranked
+            min_wins: Minimum wins to be ranked
+
+        Returns:
+            Leaderboard rows, best first
+        """
+        start = time.perf_counter()
+        try:
+            if self._rpc_available is not False:
+                try:
+                    rows = await self.client.rpc("get_leaderboard", {
+                        "limit_count": limit,
+                        "min_submissions": min_submissions,
+                        "min_wins": min_wins
+                    })
+                    self._rpc_available = True
+                    self.rpc_calls += 1
+                    return [leaderboard_row(row, row.get("submissions"), row.get("wins")) for row in rows or []]
+                except PostgrestError as e:
+                    if e.status_code == 404:
+                        self._rpc_available = False
+                    logger.info(f"get_leaderboard RPC unavailable, scanning tables instead: {e}")
+
+            users, submissions, wins, usernames = await self._scan_counts()
+            return rank_students(users, submissions, wins, limit, min_submissions, min_wins, usernames)
+        except Exception as e:
+            logger.exception("Leaderboard computation failed: %s", e)
+            return []
+        finally:
+            self.last_duration = time.perf_counter() - start
+
+    def invalidate(self) -> None:
+        """Drop cached scan counts."""
+        self._cached = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get RPC/scan counters and the last computation time."""
+        return {
+            "rpc_available": self._rpc_available,
+            "rpc_calls": self.rpc_calls,
+            "scans": self.scans,
+            "scan_requests": self.scan_requests,
+            "last_duration_ms": round(self.last_duration * 1000, 2)
+        }
+
+
+leaderboard_engine = LeaderboardEngine(
+    page_size=int(os.getenv("LEADERBOARD_PAGE_SIZE", "1000")),
+    cache_ttl=float(os.getenv("LEADERBOARD_CACHE_TTL", "60"))
+)
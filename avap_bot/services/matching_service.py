@@ -0,0 +1,226 @@
+"""
+Matching service - In-memory FIFO match queue backed by match_requests
+
+Waiting students are kept in insertion order in memory, so finding a
+partner is an O(1) pop from the front instead of a table query. Every
+state change is written through to match_requests, and each claim is a
+conditional update (status must still be pending) so two concurrent /match
+calls - in this process or another instance - can never take the same
+partner. Requests older than the TTL expire and their owners are told.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from avap_bot.services.supabase_service import (
+    add_match_request_async,
+    claim_match_request_async,
+    expire_match_requests_async,
+    get_pending_match_requests_async,
+    pop_match_request_async
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MatchTicket:
+    """A student waiting for a partner"""
+    match_id: str
+    telegram_id: int
+    username: str
+    enqueued_at: float
+
+
+@dataclass
+class MatchResult:
+    """Outcome of a match request: a partner, or the caller's own waiting ticket"""
+    partner: Optional[MatchTicket] = None
+    ticket: Optional[MatchTicket] = None
+    already_waiting: bool = False
+
+
+def _ticket_from_row(row: Dict[str, Any]) -> MatchTicket:
+    """Build a ticket from a match_requests row, ageing it by its created_at"""
+    enqueued_at = time.monotonic()
+    created_at = row.get("created_at")
+    if created_at:
+        try:
+            created = datetime.fromisoformat(str(created_at).replace("Z", "+00:00"))
+            enqueued_at -= max(0.0, (datetime.now(timezone.utc) - created).total_seconds())
+        except ValueError:
+            pass
+    return MatchTicket(
+        match_id=row["match_id"],
+        telegram_id=row["telegram_id"],
+        username=row.get("username") or "unknown",
+        enqueued_at=enqueued_at
+    )
+
+
+class MatchingEngine:
+    """
+    Pairs students first-come first-served.
+
+    A lock guards the in-memory queue within the process; the conditional
+    claim in the database arbitrates between concurrent claims.
+    """
+
+    def __init__(self, ttl: float = 86400.0):
+        """
+        Initialize the engine.
+
+        Args:
+            ttl: Seconds a request waits for a partner before expiring
+        """
+        self.ttl = ttl
+        self._waiting: "OrderedDict[int, MatchTicket]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._load_lock = asyncio.Lock()
+        self._loaded = False
+        # Tickets request() found past the TTL, waiting for expire() to notify
+        self._expiring: List[MatchTicket] = []
+        self._in_flight: Set[int] = set()
+
+        self.requests = 0
+        self.matched = 0
+        self.queued = 0
+        self.expired = 0
+        self.stale_claims = 0
+
+    async def _load(self) -> None:
+        """Warm the queue from pending rows younger than the TTL (load lock held)."""
+        since = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        for row in await get_pending_match_requests_async(since=since):
+            ticket = _ticket_from_row(row)
+            self._waiting.setdefault(ticket.telegram_id, ticket)
+        self._loaded = True
+        logger.info(f"Match queue loaded with {len(self._waiting)} waiting students")
+
+    def _pop_expired(self) -> List[MatchTicket]:
+        """Remove expired tickets from the front of the queue (lock held)."""
+        expired = []
+        deadline = time.monotonic() - self.ttl
+        while self._waiting:
+            ticket = next(iter(self._waiting.values()))
+            if ticket.enqueued_at > deadline:
+                break
+            self._waiting.popitem(last=False)
+            expired.append(ticket)
+        return expired
+
+    async def request(self, telegram_id: int, username: str) -> MatchResult:
+        """
+        Match a student with the longest-waiting partner, or queue them.
+
+        The lock only guards the in-memory queue; claims and inserts run
+        outside it, since the conditional claim is already atomic in the
+        database. Tickets found past the TTL are left for expire().
+
+        Args:
+            telegram_id: Requesting student's Telegram ID
+            username: Requesting student's username
+
+        Returns:
+            MatchResult with the claimed partner, or the student's waiting ticket
+        """
+        self.requests += 1
+        if not self._loaded:
+            async with self._load_lock:
+                if not self._loaded:
+                    await self._load()
+
+        async with self._lock:
+            self._expiring.extend(self._pop_expired())
+            if telegram_id in self._waiting or telegram_id in self._in_flight:
+                return MatchResult(ticket=self._waiting.get(telegram_id), already_waiting=True)
+            self._in_flight.add(telegram_id)
+
+        try:
+            while True:
+                async with self._lock:
+                    if not self._waiting:
+                        break
+                    _, partner = self._waiting.popitem(last=False)
+                try:
+                    claimed = await claim_match_request_async(partner.match_id)
+                except Exception:
+                    # Put the partner back at the front; the caller reports the error
+                    async with self._lock:
+                        self._waiting[partner.telegram_id] = partner
+                        self._waiting.move_to_end(partner.telegram_id, last=False)
+                    raise
+                if claimed:
+                    self.matched += 1
+                    return MatchResult(partner=partner)
+                # Claimed elsewhere or expired in the database
+                self.stale_claims += 1
+
+            # Nothing waiting here: a request made through another instance may be
+            row = await pop_match_request_async(exclude_id=telegram_id)
+            if row:
+                self.matched += 1
+                return MatchResult(partner=_ticket_from_row(row))
+
+            match_id = await add_match_request_async(telegram_id, username)
+            ticket = MatchTicket(match_id=match_id, telegram_id=telegram_id,
+                                 username=username, enqueued_at=time.monotonic())
+            async with self._lock:
+                self._waiting[telegram_id] = ticket
+            self.queued += 1
+            return MatchResult(ticket=ticket)
+        finally:
+            self._in_flight.discard(telegram_id)
+
+    async def expire(self, bot=None) -> int:
+        """
+        Expire requests older than the TTL and tell their owners.
+
+        Args:
+            bot: Telegram bot used to notify students (optional)
+
+        Returns:
+            Number of requests expired
+        """
+        async with self._lock:
+            expired = self._expiring + self._pop_expired()
+            self._expiring = []
+        if not expired:
+            return 0
+
+        rows = await expire_match_requests_async([t.match_id for t in expired])
+        self.expired += len(rows)
+        if bot:
+            for row in rows:
+                try:
+                    await bot.send_message(
+                        row["telegram_id"],
+                        "⌛ No partner was found for your match request. Send /match to try again."
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to notify {row['telegram_id']} of expired match request: {e}")
+        logger.info(f"Expired {len(rows)} match requests")
+        return len(rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue length and match counters."""
+        return {
+            "waiting": len(self._waiting),
+            "expiring": len(self._expiring),
+            "requests": self.requests,
+            "matched": self.matched,
+            "queued": self.queued,
+            "expired": self.expired,
+            "stale_claims": self.stale_claims,
+            "ttl": self.ttl
+        }
+
+
+MATCH_EXPIRE_INTERVAL = int(os.getenv("MATCH_EXPIRE_INTERVAL", "300"))
+
+matching_engine = MatchingEngine(ttl=float(os.getenv("MATCH_REQUEST_TTL", "86400")))
@@ -1,19 +1,86 @@
 """
 Admin notification service - Send notifications to admin via Telegram
+
+Async notifications go through the application's bot when one is attached,
+so they share the outbound rate limiter (as "notify" priority) with every
+other send. The direct HTTP path remains for sync callers and for use
+before the bot exists. It reuses one pooled keep-alive client (async) and
+one pooled session (sync) instead of paying a new TCP and TLS handshake for
+every notification.
 """
 import os
 import logging
+import threading
 import time
 import asyncio
 from typing import Optional
 import httpx
 
+from avap_bot.services.outbound_limiter import NOTIFY
+
 logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_USER_ID = os.getenv("ADMIN_USER_ID")
 TELEGRAM_API_URL = "https://api.telegram.org/bot"
 
+_bot = None
+
+# Pooled HTTP clients for the direct path, created on first use
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_session = None
+_sync_session_lock = threading.Lock()
+
+
+def attach_bot(bot) -> None:
+    """Send async notifications through this bot (and its rate limiter) from now on"""
+    global _bot
+    _bot = bot
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Get or create the pooled async client for the running event loop"""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+        # A client is bound to the loop it was first used on
+        _async_client = httpx.AsyncClient(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60.0)
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+def _get_sync_session():
+    """Get or create the pooled requests session (shared by threads)"""
+    global _sync_session
+    if _sync_session is None:
+        with _sync_session_lock:
+            if _sync_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=10))
+                _sync_session = session
+    return _sync_session
+
+
+async def close_notifier_clients() -> None:
+    """Close the pooled notifier clients if they were created"""
+    global _async_client, _async_client_loop, _sync_session
+    if _async_client is not None:
+        if not _async_client.is_closed and _async_client_loop is asyncio.get_running_loop():
+            await _async_client.aclose()
+        _async_client = None
+        _async_client_loop = None
+    with _sync_session_lock:
+        if _sync_session is not None:
+            _sync_session.close()
+            _sync_session = None
+
 
 def _get_retry_delay(attempt: int, status_code: int = None) -> float:
     """Calculate retry delay with exponential backoff"""
@@ -31,31 +98,29 @@ async def _send_with_retry(url: str, payload: dict, max_retries: int = 3) -> boo
     """Send request with retry logic for 429 and temporary errors"""
     for attempt in range(max_retries + 1):
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, timeout=10.0)
-
-                if response.status_code == 200:
-                    return True
-                elif response.status_code == 401:
-                    logger.warning("Telegram API returned 401 - check bot token")
-                    return False  # Don't retry 401 errors
-                elif response.status_code == 429:
-                    retry_after = response.headers.get("Retry-After")
-                    delay = int(retry_after) if retry_after else _get_retry_delay(attempt, 429)
-                    logger.warning(f"Rate limited by Telegram API, retrying in {delay}s (attempt {attempt + 1}/{max_retries + 1})")
-                    if attempt < max_retries:
-                        await asyncio.sleep(delay)
-                        continue
-                elif response.status_code >= 500:
-                    # Server errors - retry with exponential backoff
-                    delay = _get_retry_delay(attempt)
-                    logger.warning(f"Telegram API server error {response.status_code}, retrying in {delay}s (attempt {attempt + 1}/{max_retries + 1})")
-                    if attempt < max_retries:
-                        await asyncio.sleep(delay)
-                        continue
-                else:
-                    logger.warning(f"Telegram API returned {response.status_code}: {response.text}")
-                    return False
+            response = await _get_async_client().post(url, json=payload)
+            if response.status_code == 200:
+                return True
+            elif response.status_code == 401:
+                logger.warning("Telegram API returned 401 - check bot token")
+                return False  # Don't retry 401 errors
+            elif response.status_code == 429:
+                retry_after = response.headers.get("Retry-After")
+                delay = int(retry_after) if retry_after else _get_retry_delay(attempt, 429)
+                logger.warning(f"Rate limited by Telegram API, retrying in {delay}s (attempt {attempt + 1}/{max_retries + 1})")
+                if attempt < max_retries:
+                    await asyncio.sleep(delay)
+                    continue
+            elif response.status_code >= 500:
+                # Server errors - retry with exponential backoff
+                delay = _get_retry_delay(attempt)
+                logger.warning(f"Telegram API server error {response.status_code}, retrying in {delay}s (attempt {attempt + 1}/{max_retries + 1})")
+                if attempt < max_retries:
+                    await asyncio.sleep(delay)
+                    continue
+            else:
+                logger.warning(f"Telegram API returned {response.status_code}: {response.text}")
+                return False
 
         except httpx.TimeoutException:
             delay = _get_retry_delay(attempt)
@@ -91,7 +156,7 @@ def _send_with_retry_sync(url: str, payload: dict, max_retries: int = 3) -> bool
 
     for attempt in range(max_retries + 1):
         try:
-            response = requests.post(url, json=payload, timeout=10)
+            response = _get_sync_session().post(url, json=payload, timeout=10)
 
             if response.status_code == 200:
                 return True
@@ -164,13 +229,21 @@ def notify_admin_sync(message: str) -> bool:
         return False
 
 
-async def notify_admin(message: str) -> bool:
+async def notify_admin(message: str, bot=None) -> bool:
     """Send notification to admin asynchronously with retry logic"""
     try:
         if not BOT_TOKEN or not ADMIN_USER_ID:
             logger.warning("BOT_TOKEN or ADMIN_USER_ID not set, cannot send notification")
             return False
 
+        bot = bot or _bot
+        if bot is not None:
+            # The rate limiter paces this behind interactive replies and retries RetryAfter
+            await bot.send_message(ADMIN_USER_ID, f"🚨 AVAP Bot Alert:\n\n{message}", parse_mode="HTML",
+                                   rate_limit_args=NOTIFY)
+            logger.info("Admin notification sent successfully")
+            return True
+
         url = f"{TELEGRAM_API_URL}{BOT_TOKEN}/sendMessage"
         payload = {
             "chat_id": ADMIN_USER_ID,
@@ -207,7 +280,7 @@ async def notify_admin_success(success_message: str, context: str = "") -> bool:
 
 async def notify_admin_telegram(bot, message: str) -> bool:
     """Send notification to admin via Telegram bot (legacy function name)"""
-    return await notify_admin(message)
+    return await notify_admin(message, bot=bot)
 
 
 def send_admin_notification(message: str) -> bool:
@@ -0,0 +1,298 @@
+"""
+Outbound limiter - One priority-aware rate limit for every Bot API send
+
+Handlers, admin notifications, broadcasts and daily tips all send through
+the same bot, but each used to pace itself (or not at all). A broadcast
+running next to student traffic could push the bot over Telegram's
+global limit of about 30 messages per second, and then interactive
+replies failed too. PriorityRateLimiter plugs into python-telegram-bot
+as the application's rate limiter, so every send through bot_app.bot
+passes through it.
+
+Each request belongs to a class, chosen with the rate_limit_args argument
+of the bot methods: interactive replies (the default), admin
+notifications ("notify") and bulk fan-out ("bulk"). Each class has its
+own rate budget and per-chat pacing. When there is a free slot in the
+shared global budget, the waiting request with the highest priority
+gets it. A RetryAfter pauses every class. Interactive and notify
+requests are then retried; bulk requests re-raise so the broadcast
+engine can slow down.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from avap_bot.services.broadcast_service import AsyncTokenBucket, _seconds
+from avap_bot.utils.bulkhead import WAIT_BUCKETS_MS
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, NOTIFY, BULK = "interactive", "notify", "bulk"
+
+# Endpoints that post to a chat and count against Telegram's message limits
+LIMITED_PREFIXES = ("send", "copyMessage", "forwardMessage", "editMessage")
+
+
+@dataclass
+class PriorityClass:
+    """Budget and pacing for one kind of outbound traffic"""
+    name: str
+    priority: int
+    rate: float
+    burst: float
+    per_chat_interval: float = 0.0
+    group_interval: float = 0.0
+
+
+def _class_from_env(name: str, priority: int, rate: float, burst: float,
+                    per_chat_interval: float, group_interval: float) -> PriorityClass:
+    """Defaults, overridable with OUTBOUND_<NAME>_RATE / _BURST / _CHAT_INTERVAL"""
+    prefix = f"OUTBOUND_{name.upper()}"
+    return PriorityClass(
+        name=name,
+        priority=priority,
+        rate=float(os.getenv(f"{prefix}_RATE", rate)),
+        burst=float(os.getenv(f"{prefix}_BURST", burst)),
+        per_chat_interval=float(os.getenv(f"{prefix}_CHAT_INTERVAL", per_chat_interval)),
+        group_interval=group_interval
+    )
+
+
+class _ClassStats:
+    """Queue wait and outcome counters for one class."""
+
+    def __init__(self):
+        self.requests = 0
+        self.waiting = 0
+        self.retry_after = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record_wait(self, waited_ms: float) -> None:
+        bucket = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if waited_ms <= bound), len(WAIT_BUCKETS_MS))
+        self.wait_histogram[bucket] += 1
+        self.requests += 1
+        self.wait_total_ms += waited_ms
+        self.wait_max_ms = max(self.wait_max_ms, waited_ms)
+
+    def as_dict(self) -> Dict[str, Any]:
+        labels = [f"<={bound}ms" for bound in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+        return {
+            "requests": self.requests,
+            "waiting": self.waiting,
+            "retry_after": self.retry_after,
+            "avg_wait_ms": round(self.wait_total_ms / self.requests, 2) if self.requests else 0.0,
+            "max_wait_ms": round(self.wait_max_ms, 2),
+            "wait_histogram": dict(zip(labels, self.wait_histogram))
+        }
+
+
+class PriorityRateLimiter(BaseRateLimiter[str]):
+    """
+    Rate limiter for python-telegram-bot with priority classes.
+
+    Use as Application.builder().rate_limiter(limiter) and pick the class per
+    call, e.g. bot.send_message(chat_id, text, rate_limit_args="bulk").
+    """
+
+    def __init__(
+        self,
+        overall_rate: float = 30.0,
+        classes: Optional[List[PriorityClass]] = None,
+        max_retries: int = 2
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            overall_rate: Sends per second across all classes
+            classes: Priority classes (default: interactive, notify, bulk)
+            max_retries: RetryAfter retries for non-bulk requests
+        """
+        self.overall_rate = overall_rate
+        self.capacity = max(1.0, overall_rate)
+        self.max_retries = max_retries
+        self.classes: Dict[str, PriorityClass] = {c.name: c for c in classes or default_classes()}
+        self.default_class = INTERACTIVE if INTERACTIVE in self.classes else min(
+            self.classes.values(), key=lambda c: c.priority).name
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pump_task: Optional[asyncio.Task] = None
+        self._class_buckets: Dict[str, AsyncTokenBucket] = {}
+        self._chat_next: Dict[Tuple[str, Union[int, str]], float] = {}
+        self._stats: Dict[str, _ClassStats] = {name: _ClassStats() for name in self.classes}
+        self.unlimited = 0
+
+    async def initialize(self) -> None:
+        """Start the dispatcher (called by Bot.initialize)."""
+        self._ensure_pump()
+
+    async def shutdown(self) -> None:
+        """Stop the dispatcher and release anyone still waiting."""
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+            self._pump_task = None
+        for _, _, future in self._waiters:
+            if not future.done():
+                future.cancel()
+        self._waiters.clear()
+
+    def _ensure_pump(self) -> None:
+        if self._pump_task is None or self._pump_task.done():
+            self._wakeup = asyncio.Event()
+            self._pump_task = asyncio.get_running_loop().create_task(self._pump())
+
+    async def _pump(self) -> None:
+        """Hand out global tokens, highest priority (then oldest) waiter first."""
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.overall_rate)
+            self._updated = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.overall_rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # Waiter was cancelled
+            self._tokens -= 1
+            future.set_result(None)
+
+    def _bucket(self, cls: PriorityClass) -> AsyncTokenBucket:
+        bucket = self._class_buckets.get(cls.name)
+        if bucket is None:
+            bucket = self._class_buckets[cls.name] = AsyncTokenBucket(cls.rate, cls.burst)
+        return bucket
+
+    async def _wait_for_chat(self, cls: PriorityClass, chat_id: Union[int, str, None]) -> None:
+        """Reserve this class's next send slot for the chat and wait for it."""
+        chat_id = self._normalize_chat_id(chat_id)
+        is_group = isinstance(chat_id, str) or (isinstance(chat_id, int) and chat_id < 0)
+        interval = max(cls.per_chat_interval, cls.group_interval if is_group else 0.0)
+        if chat_id is None or interval <= 0:
+            return
+        key = (cls.name, chat_id)
+        now = time.monotonic()
+        slot = max(now, self._chat_next.get(key, 0.0))
+        self._chat_next[key] = slot + interval
+        if len(self._chat_next) > 10000:
+            self._chat_next = {k: t for k, t in self._chat_next.items() if t > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    @staticmethod
+    def _normalize_chat_id(chat_id: Union[int, str, None]) -> Union[int, str, None]:
+        """Turn numeric string ids (e.g. ADMIN_USER_ID from env) into ints; keep @usernames."""
+        if isinstance(chat_id, str):
+            try:
+                return int(chat_id.strip())
+            except ValueError:
+                return chat_id
+        return chat_id
+
+    async def _acquire(self, cls: PriorityClass, chat_id: Union[int, str, None]) -> None:
+        """Wait for per-chat pacing, the class budget and then a global slot."""
+        await self._wait_for_chat(cls, chat_id)
+        await self._bucket(cls).acquire()
+        self._ensure_pump()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (cls.priority, next(self._order), future))
+        self._wakeup.set()
+        await future
+
+    def _pause(self, seconds: float) -> None:
+        """Stop handing out global slots after Telegram returned RetryAfter."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+    @staticmethod
+    def _limited(endpoint: str, data: Dict[str, Any]) -> bool:
+        return "chat_id" in data and endpoint.startswith(LIMITED_PREFIXES)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[str],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        """Wait for the request's class and priority, then send it."""
+        if not self._limited(endpoint, data):
+            self.unlimited += 1
+            return await callback(*args, **kwargs)
+
+        cls = self.classes.get(rate_limit_args) or self.classes[self.default_class]
+        stats = self._stats[cls.name]
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            stats.waiting += 1
+            try:
+                await self._acquire(cls, data.get("chat_id"))
+            finally:
+                stats.waiting -= 1
+            stats.record_wait((time.monotonic() - start) * 1000)
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                seconds = _seconds(e.retry_after)
+                stats.retry_after += 1
+                self._pause(seconds)
+                logger.warning(f"Telegram asked to retry after {seconds:.1f}s ({cls.name} {endpoint}); all sends paused")
+                # Bulk senders handle RetryAfter themselves and slow down
+                if cls.name == BULK or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue wait metrics per class."""
+        return {
+            "overall_rate": self.overall_rate,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "queued": len(self._waiters),
+            "unlimited_requests": self.unlimited,
+            "classes": {name: stats.as_dict() for name, stats in self._stats.items()}
+        }
+
+
+def default_classes() -> List[PriorityClass]:
+    """Interactive replies, then admin notifications, then bulk fan-out."""
+    return [
+        _class_from_env(INTERACTIVE, 0, rate=30, burst=30, per_chat_interval=0.0, group_interval=0.0),
+        # Group chats allow about 20 messages a minute
+        _class_from_env(NOTIFY, 1, rate=10, burst=5, per_chat_interval=1.0, group_interval=3.0),
+        _class_from_env(BULK, 2, rate=25, burst=5, per_chat_interval=1.0, group_interval=3.0),
+    ]
+
+
+outbound_limiter = PriorityRateLimiter(
+    overall_rate=float(os.getenv("OUTBOUND_RATE_PER_SECOND", "30"))
+)
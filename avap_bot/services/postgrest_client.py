@@ -0,0 +1,361 @@
+"""
+Async PostgREST client for Supabase on a shared, pooled HTTP connection
+
+The supabase-py client is synchronous, so every call made from a handler
+blocks the event loop for a full round trip. This client talks to the same
+REST endpoint through a single httpx.AsyncClient with keep-alive (and HTTP/2
+when the h2 package is installed), so queries from many handlers are
+multiplexed over a few warm connections instead of blocking.
+"""
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Filters are passed as PostgREST query parameters, e.g. [("status", "eq.verified")]
+Filters = Union[Dict[str, str], Sequence[Tuple[str, str]]]
+
+
+class PostgrestError(Exception):
+    """Raised when PostgREST answers with an error status."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"PostgREST error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+class AsyncPostgrestClient:
+    """
+    Minimal async PostgREST client with a pooled HTTP connection.
+
+    The underlying httpx.AsyncClient is created lazily on first use so it
+    binds to the running event loop.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        timeout: float = 10.0,
+        http2: Optional[bool] = None
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            url: Supabase project URL (https://<project>.supabase.co)
+            key: Supabase API key
+            max_connections: Maximum concurrent connections in the pool
+            max_keepalive: Idle connections kept open for reuse
+            timeout: Request timeout in seconds
+            http2: Force HTTP/2 on or off (defaults to on when h2 is installed)
+        """
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self._headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=30.0
+        )
+        self._timeout = timeout
+        self._http2 = HTTP2_AVAILABLE if http2 is None else (http2 and HTTP2_AVAILABLE)
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.requests = 0
+        self.errors = 0
+        self.pages_streamed = 0
+        self._total_latency = 0.0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get or create the pooled HTTP client."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self._headers,
+                limits=self._limits,
+                timeout=self._timeout,
+                http2=self._http2
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """Close the pooled HTTP client."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Filters] = None,
+        json: Any = None,
+        prefer: Optional[str] = None
+    ) -> httpx.Response:
+        """Send a request and raise PostgrestError for error responses."""
+        headers = {"Prefer": prefer} if prefer else None
+        start = time.perf_counter()
+        try:
+            response = await self._get_client().request(method, path, params=params, json=json, headers=headers)
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+        finally:
+            self.requests += 1
+            self._total_latency += time.perf_counter() - start
+
+        if response.status_code >= 400:
+            self.errors += 1
+            try:
+                message = response.json().get("message", response.text)
+            except Exception:
+                message = response.text
+            raise PostgrestError(response.status_code, message)
+        return response
+
+    @staticmethod
+    def _params(filters: Optional[Filters], **extra: Any) -> List[Tuple[str, str]]:
+        """Merge filters with select/order/limit parameters."""
+        params: List[Tuple[str, str]] = []
+        if filters:
+            items = filters.items() if isinstance(filters, dict) else filters
+            params.extend((key, str(value)) for key, value in items)
+        for key, value in extra.items():
+            if value is not None:
+                params.append((key, str(value)))
+        return params
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Filters] = None,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Select rows from a table.
+
+        Args:
+            table: Table name
+            columns: PostgREST select expression
+            filters: Query filters such as {"telegram_id": "eq.123"}
+            order: Order expression such as "created_at.desc"
+            limit: Maximum number of rows
+            offset: Number of rows to skip
+
+        Returns:
+            List of rows
+        """
+        params = self._params(filters, select=columns, order=order, limit=limit, offset=offset)
+        response = await self._request("GET", f"/{table}", params=params)
+        return response.json()
+
+    async def iter_rows(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Filters] = None,
+        page_size: int = 1000,
+        key_column: str = "id",
+        start_after: Optional[Any] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream rows page by page using keyset pagination (key_column > last key).
+
+        Unlike offset paging, each page is an index range scan and rows
+        inserted mid-stream do not shift later pages.
+
+        Args:
+            table: Table name
+            columns: Columns to fetch (key_column is added if missing)
+            filters: Query filters applied to every page
+            page_size: Rows per request
+            key_column: Unique, ordered column to page on
+            start_after: Only rows whose key_column is greater than this (resume point)
+
+        Yields:
+            Rows in key_column order
+        """
+        if columns != "*" and key_column not in columns.split(","):
+            columns = f"{key_column},{columns}"
+        base_filters = list(filters.items()) if isinstance(filters, dict) else list(filters or [])
+        last_key = start_after
+        while True:
+            page_filters = list(base_filters)
+            if last_key is not None:
+                page_filters.append((key_column, f"gt.{last_key}"))
+            page = await self.select(table, columns=columns, filters=page_filters,
+                                     order=f"{key_column}.asc", limit=page_size)
+            self.pages_streamed += 1
+            for row in page:
+                yield row
+            if len(page) < page_size:
+                return
+            last_key = page[-1][key_column]
+
+    async def count(self, table: str, filters: Optional[Filters] = None) -> int:
+        """
+        Count rows matching the filters without transferring them.
+
+        Args:
+            table: Table name
+            filters: Query filters
+
+        Returns:
+            Exact row count
+        """
+        params = self._params(filters, select="id", limit=0)
+        response = await self._request("GET", f"/{table}", params=params, prefer="count=exact")
+        content_range = response.headers.get("content-range", "")
+        total = content_range.rsplit("/", 1)[-1]
+        return int(total) if total.isdigit() else 0
+
+    async def insert(self, table: str, rows: Union[Dict[str, Any], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Insert one or more rows.
+
+        Args:
+            table: Table name
+            rows: Row dict or list of row dicts
+
+        Returns:
+            Inserted rows
+        """
+        response = await self._request("POST", f"/{table}", json=rows, prefer="return=representation")
+        return response.json()
+
+    async def upsert(self, table: str, rows: Union[Dict[str, Any], List[Dict[str, Any]]],
+                     on_conflict: str) -> List[Dict[str, Any]]:
+        """
+        Insert rows, updating those whose on_conflict columns already exist.
+
+        Args:
+            table: Table name
+            rows: Row dict or list of row dicts
+            on_conflict: Comma-separated unique columns
+
+        Returns:
+            Inserted or updated rows
+        """
+        response = await self._request(
+            "POST", f"/{table}", params=[("on_conflict", on_conflict)], json=rows,
+            prefer="resolution=merge-duplicates,return=representation"
+        )
+        return response.json()
+
+    async def update(self, table: str, values: Dict[str, Any], filters: Filters) -> List[Dict[str, Any]]:
+        """
+        Update rows matching the filters.
+
+        Args:
+            table: Table name
+            values: Column values to set
+            filters: Query filters selecting the rows
+
+        Returns:
+            Updated rows
+        """
+        response = await self._request(
+            "PATCH", f"/{table}", params=self._params(filters), json=values, prefer="return=representation"
+        )
+        return response.json()
+
+    async def delete(self, table: str, filters: Filters) -> List[Dict[str, Any]]:
+        """
+        Delete rows matching the filters.
+
+        Args:
+            table: Table name
+            filters: Query filters selecting the rows
+
+        Returns:
+            Deleted rows
+        """
+        response = await self._request(
+            "DELETE", f"/{table}", params=self._params(filters), prefer="return=representation"
+        )
+        return response.json()
+
+    async def rpc(self, function: str, args: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Call a Postgres function exposed through PostgREST.
+
+        Args:
+            function: Function name
+            args: Named function arguments
+
+        Returns:
+            Decoded JSON result
+        """
+        response = await self._request("POST", f"/rpc/{function}", json=args or {})
+        return response.json() if response.content else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get request counters and average latency."""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_latency_ms": round(self._total_latency / self.requests * 1000, 2) if self.requests else 0.0,
+            "pages_streamed": self.pages_streamed,
+            "http2": self._http2,
+            "connected": self._client is not None and not self._client.is_closed
+        }
+
+
+# Global client instance
+_async_client: Optional[AsyncPostgrestClient] = None
+
+
+def get_async_postgrest() -> AsyncPostgrestClient:
+    """Get or create the shared async PostgREST client."""
+    global _async_client
+    if _async_client is None:
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_KEY")
+        if not url or not key:
+            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
+        if not url.startswith(("http://", "https://")):
+            url = f"https://{url}"
+        _async_client = AsyncPostgrestClient(
+            url,
+            key,
+            max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20")),
+            max_keepalive=int(os.getenv("SUPABASE_MAX_KEEPALIVE", "10"))
+        )
+        logger.info(f"Async PostgREST client created (http2={_async_client._http2})")
+    return _async_client
+
+
+async def close_async_postgrest() -> None:
+    """Close the shared async PostgREST client if it was created."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def get_async_postgrest_stats() -> Dict[str, Any]:
+    """Get stats of the shared client without creating it."""
+    if _async_client is None:
+        return {"requests": 0, "errors": 0, "avg_latency_ms": 0.0, "http2": HTTP2_AVAILABLE, "connected": False}
+    return _async_client.get_stats()
@@ -0,0 +1,225 @@
+"""
+Recipient health - Remember chats the bot can no longer reach
+
+Students who block the bot or delete their account stay verified, so
+every broadcast and daily tip used to send to them again, and each send
+came back as a failure. Every send path now reports Forbidden and "chat
+not found" errors here. Fan-out through the broadcast engine skips those
+recipients. After a probe interval (7 days by default, doubling after
+each failed probe) one send is let through to see if the chat works
+again. Any successful send to a chat, including a grade notification or
+an answer, clears its mark.
+
+Marks are kept in memory and written to the recipient_health table by a
+periodic flush, so they survive restarts.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Set
+
+from telegram.error import BadRequest, Forbidden
+
+from avap_bot.services.supabase_service import (
+    delete_recipient_health_async,
+    get_recipient_health_async,
+    save_recipient_health_async
+)
+
+logger = logging.getLogger(__name__)
+
+RECIPIENT_HEALTH_FLUSH_SECONDS = int(os.getenv("RECIPIENT_HEALTH_FLUSH_SECONDS", "60"))
+
+# BadRequest messages meaning the chat is gone (other BadRequests are about the message itself)
+UNREACHABLE_MESSAGES = ("chat not found", "user not found", "user is deactivated", "peer_id_invalid")
+
+
+def is_unreachable_error(error: BaseException) -> bool:
+    """True if a send error means the recipient cannot receive messages at all."""
+    if isinstance(error, Forbidden):
+        return True
+    if isinstance(error, BadRequest):
+        message = str(getattr(error, "message", error)).lower()
+        return any(text in message for text in UNREACHABLE_MESSAGES)
+    return False
+
+
+def _timestamp(value: float) -> str:
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+def _epoch(value: Any) -> float:
+    if not value:
+        return 0.0
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+class RecipientHealth:
+    """Tracks unreachable chats and decides which ones fan-out should skip."""
+
+    def __init__(
+        self,
+        probe_interval: float = 7 * 86400,
+        max_probe_interval: float = 60 * 86400,
+        probe_lease: float = 3600
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            probe_interval: Seconds before the first probe of an unreachable chat
+            max_probe_interval: Longest gap between probes
+            probe_lease: How long a probe is given before another one may go out
+        """
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.probe_lease = probe_lease
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._dirty: Set[int] = set()
+        self._cleared: Set[int] = set()
+        self._lock = asyncio.Lock()
+
+        self.marked = 0
+        self.recovered = 0
+        self.skipped = 0
+        self.probes = 0
+        self.flushes = 0
+        self.flush_failures = 0
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self._entries
+
+    async def load(self) -> int:
+        """
+        Load marks saved by earlier runs (those recorded since are kept).
+
+        Returns:
+            Number of unreachable recipients known
+        """
+        try:
+            rows = await get_recipient_health_async()
+        except Exception as e:
+            logger.warning(f"Could not load recipient health: {e}")
+            return len(self._entries)
+        for row in rows:
+            chat_id = int(row["telegram_id"])
+            if chat_id in self._entries or chat_id in self._cleared:
+                continue
+            self._entries[chat_id] = {
+                "reason": row.get("reason", ""),
+                "failures": row.get("failures") or 1,
+                "marked_at": _epoch(row.get("marked_at")),
+                "next_probe_at": _epoch(row.get("next_probe_at"))
+            }
+        logger.info(f"Loaded {len(self._entries)} unreachable recipients")
+        return len(self._entries)
+
+    def allow(self, chat_id: int) -> bool:
+        """
+        Whether a fan-out should send to this chat now.
+
+        Unmarked chats are always allowed. A marked chat whose probe is due
+        is allowed once; the probe is then leased so concurrent broadcasts
+        do not all probe it.
+        """
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return True
+        now = time.time()
+        if now >= entry["next_probe_at"]:
+            entry["next_probe_at"] = now + self.probe_lease
+            self.probes += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def record_failure(self, chat_id: int, error: BaseException) -> bool:
+        """
+        Report a failed send.
+
+        Args:
+            chat_id: Recipient chat
+            error: The exception raised by the send
+
+        Returns:
+            True if the error marked the chat unreachable
+        """
+        if not chat_id or not is_unreachable_error(error):
+            return False
+        now = time.time()
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            entry = {"failures": 0, "marked_at": now}
+            self._entries[chat_id] = entry
+            self.marked += 1
+            logger.info(f"Recipient {chat_id} marked unreachable: {error}")
+        entry["failures"] += 1
+        entry["reason"] = str(error)[:200]
+        entry["next_probe_at"] = now + min(self.probe_interval * 2 ** (entry["failures"] - 1), self.max_probe_interval)
+        self._dirty.add(chat_id)
+        self._cleared.discard(chat_id)
+        return True
+
+    def record_success(self, chat_id: int) -> None:
+        """Report a successful send; clears the chat's mark if it had one."""
+        if self._entries.pop(chat_id, None) is None:
+            return
+        self._dirty.discard(chat_id)
+        self._cleared.add(chat_id)
+        self.recovered += 1
+        logger.info(f"Recipient {chat_id} is reachable again")
+
+    async def flush(self) -> int:
+        """
+        Write changed marks to the database.
+
+        Returns:
+            Number of rows written or deleted (0 if nothing changed or the write failed)
+        """
+        async with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            cleared, self._cleared = self._cleared, set()
+            rows = [
+                {
+                    "telegram_id": chat_id,
+                    "reason": entry["reason"],
+                    "failures": entry["failures"],
+                    "marked_at": _timestamp(entry["marked_at"]),
+                    "next_probe_at": _timestamp(entry["next_probe_at"])
+                }
+                for chat_id in dirty if (entry := self._entries.get(chat_id)) is not None
+            ]
+            if not rows and not cleared:
+                return 0
+            try:
+                written = await save_recipient_health_async(rows)
+                written += await delete_recipient_health_async(sorted(cleared))
+            except Exception as e:
+                # Keep the changes (unless superseded meanwhile) for the next flush
+                self._dirty |= {chat_id for chat_id in dirty if chat_id in self._entries}
+                self._cleared |= {chat_id for chat_id in cleared if chat_id not in self._entries}
+                self.flush_failures += 1
+                logger.exception("Recipient health flush failed: %s", e)
+                return 0
+            self.flushes += 1
+            return written
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get mark counts and how many sends were skipped."""
+        return {
+            "unreachable": len(self._entries),
+            "marked": self.marked,
+            "recovered": self.recovered,
+            "sends_skipped": self.skipped,
+            "probes": self.probes,
+            "pending_writes": len(self._dirty) + len(self._cleared),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures
+        }
+
+
+recipient_health = RecipientHealth(
+    probe_interval=float(os.getenv("RECIPIENT_PROBE_DAYS", "7")) * 86400
+)
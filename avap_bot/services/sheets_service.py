@@ -3,12 +3,18 @@ Google Sheets service for data storage - Single spreadsheet with CSV fallback
 """
 import os
 import json
-import csv
 import logging
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
 import base64
 
+from avap_bot.utils.fallback_reconciler import FallbackReconciler, ReplayTarget
+from avap_bot.utils.fallback_store import FallbackStore
+from avap_bot.utils.sheet_append_queue import SheetAppendQueue
+from avap_bot.utils.sheet_snapshot import WorksheetSnapshot
+from avap_bot.utils.sheet_update_queue import SheetUpdateQueue
+from avap_bot.utils.sheets_gateway import BACKGROUND, GatedSpreadsheet, SheetsGateway
+
 try:
     import gspread
     from google.oauth2.service_account import Credentials
@@ -26,6 +32,14 @@ GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS_JSON")
 _sheets_client = None
 _spreadsheet = None
 
+# Every Sheets API request goes through this gateway: read/write quota
+# buckets, interactive-before-background ordering, and retries on 429/5xx
+sheets_gateway = SheetsGateway(
+    reads_per_minute=float(os.getenv("SHEETS_READS_PER_MINUTE", "60")),
+    writes_per_minute=float(os.getenv("SHEETS_WRITES_PER_MINUTE", "60")),
+    max_retries=int(os.getenv("SHEETS_MAX_RETRIES", "4"))
+)
+
 # CSV fallback directory
 # IMPORTANT: /tmp/ is ephemeral on many hosting platforms like Render.
 # For persistent backups, set the STABLE_BACKUP_DIR environment variable.
@@ -60,6 +74,43 @@ def _ensure_csv_directory():
 # Initialize CSV directory on module load
 _ensure_csv_directory()
 
+# Fallback rows live in an indexed SQLite store next to the CSV backups;
+# the CSV files already there are imported the first time it is used
+FALLBACK_DB_PATH = os.getenv("FALLBACK_DB_PATH") or os.path.join(CSV_DIR, "fallback.sqlite3")
+fallback_store = FallbackStore(FALLBACK_DB_PATH)
+_fallback_imported = False
+
+
+def _get_fallback_store() -> FallbackStore:
+    """Get the fallback store, importing existing CSV backups on first use"""
+    global _fallback_imported
+    if not _fallback_imported:
+        _fallback_imported = True
+        imported = fallback_store.import_csv_dir(CSV_DIR)
+        if imported:
+            logger.info(f"Imported {imported} rows from CSV backups into {FALLBACK_DB_PATH}")
+    return fallback_store
+
+
+def _dataset(filename: str) -> str:
+    """Fallback dataset name for a legacy CSV file name"""
+    return filename[:-4] if filename.endswith(".csv") else filename
+
+
+def export_fallback_csv(directory: Optional[str] = None) -> Dict[str, int]:
+    """Export every fallback dataset to <name>.csv files (default: CSV_DIR)"""
+    store = _get_fallback_store()
+    directory = directory or CSV_DIR
+    return {
+        name: store.export_csv(name, os.path.join(directory, f"{name}.csv"))
+        for name in store.datasets()
+    }
+
+
+def get_fallback_stats() -> Dict[str, Any]:
+    """Get fallback store row counts and lookup timings"""
+    return fallback_store.get_stats()
+
 
 def _get_sheets_client():
     """Get Google Sheets client (lazy initialization)"""
@@ -152,7 +203,7 @@ def _get_sheets_client():
             # Test the connection by trying to access the spreadsheet
             if GOOGLE_SHEET_ID:
                 try:
-                    test_spreadsheet = _sheets_client.open_by_key(GOOGLE_SHEET_ID)
+                    test_spreadsheet = sheets_gateway.call("read", _sheets_client.open_by_key, GOOGLE_SHEET_ID)
                     logger.info(f"Successfully connected to spreadsheet: {test_spreadsheet.title}")
                 except Exception as test_error:
                     logger.warning(f"Could not access spreadsheet {GOOGLE_SHEET_ID}: {test_error}")
@@ -194,10 +245,14 @@ def _get_spreadsheet():
         try:
             if GOOGLE_SHEET_ID:
                 logger.info("Opening spreadsheet by ID: %s", GOOGLE_SHEET_ID[:10] + "...")
-                _spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
+                _spreadsheet = GatedSpreadsheet(
+                    sheets_gateway.call("read", client.open_by_key, GOOGLE_SHEET_ID), sheets_gateway
+                )
             elif GOOGLE_SHEET_URL:
                 logger.info("Opening spreadsheet by URL")
-                _spreadsheet = client.open_by_url(GOOGLE_SHEET_URL)
+                _spreadsheet = GatedSpreadsheet(
+                    sheets_gateway.call("read", client.open_by_url, GOOGLE_SHEET_URL), sheets_gateway
+                )
 
             logger.info("Google Sheets connected successfully")
 
@@ -284,189 +339,370 @@ def ensure_Questions_worksheet():
 
 
 def _csv_fallback(filename: str, data: List[List[str]], headers: List[str] = None):
-    """Fallback to CSV when Sheets is not available"""
+    """Fallback to the local store when Sheets is not available"""
     # IMPORTANT: /tmp/ is ephemeral on many hosting platforms like Render.
     # For persistent backups, set the STABLE_BACKUP_DIR environment variable.
-    if not os.getenv("STABLE_BACKUP_DIR"):
+    if not os.getenv("STABLE_BACKUP_DIR") and not os.getenv("FALLBACK_DB_PATH"):
         logger.warning("Using ephemeral /tmp/ directory for CSV fallback. Set STABLE_BACKUP_DIR for persistent storage.")
 
-    filepath = os.path.join(CSV_DIR, filename)
+    dataset = _dataset(filename)
     try:
-        file_exists = os.path.exists(filepath)
-
-        with open(filepath, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-
-            # Write headers if file doesn't exist and headers provided
-            if not file_exists and headers:
-                writer.writerow(headers)
-
-            writer.writerow(data)
-        logger.info("CSV fallback: wrote to %s", filepath)
+        store = _get_fallback_store()
+        store.append(dataset, headers or store.headers(dataset) or [str(i) for i in range(len(data))], data)
+        logger.info("Fallback store: wrote to %s", dataset)
         return True
     except Exception as e:
         logger.exception("CSV fallback failed: %s", e)
         return False
 
 
-def _read_csv_fallback(filename: str) -> List[Dict[str, Any]]:
-    """Read data from CSV file (fallback mode)"""
-    filepath = os.path.join(CSV_DIR, filename)
+def _read_csv_fallback(filename: str, **equals: Any) -> List[Dict[str, Any]]:
+    """Read rows from the fallback store, optionally by indexed column (username, telegram_id, submission_id)"""
+    dataset = _dataset(filename)
     try:
-        if not os.path.exists(filepath):
-            return []
-
-        with open(filepath, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            return list(reader)
+        store = _get_fallback_store()
+        return store.find(dataset, **equals) if equals else store.all(dataset)
     except Exception as e:
         logger.exception("CSV read fallback failed for %s: %s", filename, e)
         return []
 
 
-def append_pending_verification(record: Dict[str, Any]) -> bool:
-    """Append pending verification to Google Sheets"""
-    try:
-        spreadsheet = _get_spreadsheet()
+# Worksheet snapshots: per-student reads are served from indexed in-memory
+# copies of these worksheets instead of downloading the whole sheet each time
+SHEET_SNAPSHOT_TTL = float(os.getenv("SHEET_SNAPSHOT_TTL", "30"))
+SHEET_SNAPSHOT_FULL_REFRESH = float(os.getenv("SHEET_SNAPSHOT_FULL_REFRESH", "600"))
+
 
-        # If spreadsheet is None, use CSV fallback
+def _worksheet_opener(title: str):
+    """Build a callable opening a worksheet, raising if Sheets is unavailable"""
+    def open_worksheet():
+        spreadsheet = _get_spreadsheet()
         if spreadsheet is None:
-            logger.info("Using CSV fallback for pending verification")
-            return _csv_fallback("verification_pending.csv", [
-                record.get("name", ""),
-                record.get("email", ""),
-                record.get("phone", ""),
-                record.get("status", "Pending"),
-                datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-            ], ["name", "email", "phone", "status", "created_at"])
+            raise RuntimeError("Google Sheets not available")
+        return spreadsheet.worksheet(title)
+    return open_worksheet
+
+
+def _snapshot(title: str, indexes: Dict[str, tuple], numericise: bool = True) -> WorksheetSnapshot:
+    """Create a snapshot for a worksheet of the main spreadsheet"""
+    return WorksheetSnapshot(
+        title,
+        _worksheet_opener(title),
+        indexes,
+        ttl=SHEET_SNAPSHOT_TTL,
+        full_refresh_interval=SHEET_SNAPSHOT_FULL_REFRESH,
+        numericise=numericise
+    )
+
+
+submissions_snapshot = _snapshot("submissions", {
+    "submission_id": ("submission_id",),
+    "username": ("username",),
+    "telegram_id": ("telegram_id",),
+    "username_module": ("username", "module"),
+    "telegram_id_module": ("telegram_id", "module")
+})
+win_snapshots = {
+    title: _snapshot(title, {"win_id": ("win_id",), "username": ("username",), "telegram_id": ("telegram_id",)})
+    for title in ("wins_new", "wins")
+}
+# Questions are read as plain text (get_all_values) because the sheet may have duplicate headers
+questions_snapshot = _snapshot(
+    "Questions",
+    {"question_id": ("question_id",), "username": ("username",), "telegram_id": ("telegram_id",)},
+    numericise=False
+)
+
+
+def get_snapshot_stats() -> Dict[str, Any]:
+    """Get stats for every worksheet snapshot"""
+    snapshots = [submissions_snapshot, *win_snapshots.values(), questions_snapshot]
+    return {snapshot.title: snapshot.get_stats() for snapshot in snapshots}
+
+
+# Append queues: rows are batched per worksheet and written with append_rows
+SHEET_APPEND_FLUSH_SECONDS = float(os.getenv("SHEET_APPEND_FLUSH_SECONDS", "1"))
+SHEET_APPEND_MAX_BATCH = int(os.getenv("SHEET_APPEND_MAX_BATCH", "200"))
+
+SUBMISSION_HEADERS = ["submission_id", "username", "telegram_id", "module", "type", "file_id", "file_name",
+                      "text_content", "submitted_at", "status", "grade", "comments"]
+WIN_HEADERS = ["win_id", "username", "telegram_id", "type", "file_id", "file_name", "text_content", "shared_at"]
+QUESTION_HEADERS = ["question_id", "username", "telegram_id", "question_text", "file_id", "file_name",
+                    "asked_at", "status", "answer"]
+VERIFICATION_HEADERS = ["name", "email", "phone", "status", "created_at"]
+
+# Queue title -> (CSV fallback file, CSV headers)
+_csv_targets: Dict[str, tuple] = {}
+
+
+def _append_target(titles: tuple, header: List[str], create_title: Optional[str] = None, cols: int = 20):
+    """Build a callable returning the first existing worksheet of titles, creating create_title if none exist"""
+    def open_worksheet():
+        spreadsheet = _get_spreadsheet()
+        if spreadsheet is None:
+            raise RuntimeError("Google Sheets not available")
+        # Batched appends can wait; reads and grading writes go first
+        spreadsheet = spreadsheet.with_priority(BACKGROUND)
+        error = None
+        for title in titles:
+            try:
+                return spreadsheet.worksheet(title)
+            except Exception as e:
+                error = e
+        if not create_title:
+            raise error
+        logger.warning(f"No {' / '.join(titles)} worksheet found, creating {create_title}")
+        return spreadsheet.add_worksheet(title=create_title, rows=1000, cols=max(cols, len(header)))
+    return open_worksheet
+
+
+def _patch_snapshot(worksheet, rows: List[List[Any]]) -> None:
+    """Add appended rows to the snapshot of the worksheet they went to"""
+    snapshot = {"submissions": submissions_snapshot, "Questions": questions_snapshot, **win_snapshots}.get(worksheet.title)
+    if snapshot:
+        for row in rows:
+            snapshot.patch_append(row)
+
+
+def _append_queue(title: str, target, header: List[str], csv_file: str, csv_headers: List[str]) -> SheetAppendQueue:
+    """Create an append queue whose failed rows go to a CSV fallback file"""
+    def write_csv(rows: List[List[Any]], error: Exception) -> None:
+        logger.warning("Failed to append %d rows to %s worksheet (using CSV fallback): %s", len(rows), title, error)
+        for row in rows:
+            _csv_fallback(csv_file, row, csv_headers)
+
+    _csv_targets[title] = (csv_file, csv_headers)
+    return SheetAppendQueue(
+        title,
+        target,
+        header,
+        flush_interval=SHEET_APPEND_FLUSH_SECONDS,
+        max_batch=SHEET_APPEND_MAX_BATCH,
+        on_flushed=_patch_snapshot,
+        on_failed=write_csv
+    )
+
+
+submission_queue = _append_queue(
+    "submissions", _append_target(("submissions", "submissions_new"), SUBMISSION_HEADERS, "submissions_new", cols=15),
+    SUBMISSION_HEADERS, "submissions.csv",
+    ["submission_id", "username", "telegram_id", "module", "type", "file_id", "file_name", "text_content",
+     "submitted_at", "status", "graded_at", "grade"]
+)
+win_queue = _append_queue(
+    "wins", _append_target(("wins_new", "wins"), WIN_HEADERS, "wins_new", cols=10),
+    WIN_HEADERS, "wins.csv", WIN_HEADERS
+)
+question_queue = _append_queue(
+    "Questions", _append_target(("Questions",), QUESTION_HEADERS, "Questions"),
+    QUESTION_HEADERS, "questions.csv", QUESTION_HEADERS
+)
+verification_queue = _append_queue(
+    "verification", _append_target(("verification",), VERIFICATION_HEADERS),
+    VERIFICATION_HEADERS, "verification_pending.csv", VERIFICATION_HEADERS
+)
+_append_queues = [submission_queue, win_queue, question_queue, verification_queue]
+
+# Update queues: grading and answer writes are located through the snapshots'
+# row indexes and coalesced into one batch_update per flush window
+SHEET_UPDATE_FLUSH_SECONDS = float(os.getenv("SHEET_UPDATE_FLUSH_SECONDS", "0.5"))
+
+submission_updates = SheetUpdateQueue(
+    submissions_snapshot,
+    _worksheet_opener("submissions"),
+    flush_interval=SHEET_UPDATE_FLUSH_SECONDS,
+    default_columns={"status": 10, "grade": 11, "comments": 12}
+)
+question_updates = SheetUpdateQueue(
+    questions_snapshot,
+    _worksheet_opener("Questions"),
+    flush_interval=SHEET_UPDATE_FLUSH_SECONDS
+)
+_update_queues = [submission_updates, question_updates]
+
+
+# Replay: rows and updates that went to the fallback store while Sheets was
+# down are written back in bulk once it is reachable again
+FALLBACK_REPLAY_SECONDS = float(os.getenv("FALLBACK_REPLAY_SECONDS", "60"))
+FALLBACK_REPLAY_BATCH = int(os.getenv("FALLBACK_REPLAY_BATCH", "500"))
+
+SHEET_UPDATE_HEADERS = ["worksheet", "index", "key", "fields", "pending_only", "recorded_at"]
+_update_queues_by_title = {queue.title: queue for queue in _update_queues}
+
+
+def _defer_update(queue: SheetUpdateQueue, index: str, key: tuple, fields: Dict[str, Any], pending_only: bool = False) -> bool:
+    """Keep an update made while Sheets is unavailable so the reconciler can apply it later"""
+    return _csv_fallback("sheet_updates.csv", [
+        queue.title, index, json.dumps(list(key)), json.dumps(fields), "1" if pending_only else "",
+        datetime.now(timezone.utc).isoformat()
+    ], SHEET_UPDATE_HEADERS)
+
+
+def _replay_updates(records: List[Dict[str, Any]]) -> None:
+    """Apply deferred updates, one coalesced batch_update per worksheet"""
+    futures = []
+    for record in records:
+        queue = _update_queues_by_title[record["worksheet"]]
+        pending_only = bool(record.get("pending_only"))
+        futures.append((queue, record, queue.submit(
+            record["index"], json.loads(record["key"]), json.loads(record["fields"]),
+            where=(lambda r: r.get("status") == "Pending") if pending_only else None,
+            pick=-1 if pending_only else 0
+        )))
+    for queue in {queue for queue, _, _ in futures}:
+        queue.flush()
+    for queue, record, future in futures:
+        if not future.result(timeout=60):
+            logger.warning(f"Deferred {queue.title} update matched no row: {record['key']}")
+
+
+def _replay_target(queue: SheetAppendQueue, key_column: str, snapshots: tuple = ()) -> ReplayTarget:
+    """Replay target appending a fallback dataset to the queue's worksheet, skipping keys already there"""
+    csv_file, csv_headers = _csv_targets[queue.title]
+
+    def write(records: List[Dict[str, Any]]) -> None:
+        # Fallback rows were written positionally from the worksheet row
+        queue.write_now([[record.get(header, "") for header in csv_headers] for record in records])
+
+    def exists(key: str) -> bool:
+        for snapshot in snapshots:
+            try:
+                if snapshot.lookup(key_column, key):
+                    return True
+            except Exception as e:
+                logger.debug(f"Could not check {snapshot.title} for {key}: {e}")
+        return False
 
-        sheet = spreadsheet.worksheet("verification")
+    return ReplayTarget(_dataset(csv_file), write, key=lambda record: record.get(key_column, ""), exists=exists)
 
-        row = [
-            record.get("name", ""),
-            record.get("email", ""),
-            record.get("phone", ""),
-            record.get("status", "Pending"),
-            datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-        ]
 
-        sheet.append_row(row)
-        logger.info("Added pending verification to sheets: %s", record.get('email'))
-        return True
+fallback_reconciler = FallbackReconciler(
+    fallback_store,
+    [
+        _replay_target(submission_queue, "submission_id", (submissions_snapshot,)),
+        _replay_target(win_queue, "win_id", tuple(win_snapshots.values())),
+        _replay_target(question_queue, "question_id", (questions_snapshot,)),
+        _replay_target(verification_queue, "email"),
+        # After the appends, so grades and answers find their rows
+        ReplayTarget("sheet_updates", _replay_updates)
+    ],
+    is_available=lambda: _get_spreadsheet() is not None,
+    batch_size=FALLBACK_REPLAY_BATCH
+)
 
-    except Exception as e:
-        logger.warning("Failed to append pending verification to sheets (using CSV fallback): %s", e)
-        # CSV fallback
-        return _csv_fallback("verification_pending.csv", [
-            record.get("name", ""),
-            record.get("email", ""),
-            record.get("phone", ""),
-            record.get("status", "Pending"),
-            datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-        ], ["name", "email", "phone", "status", "created_at"])
 
+def replay_fallback() -> int:
+    """Write rows kept in the fallback store back to Sheets (blocking; call through run_blocking)"""
+    _get_fallback_store()
+    return fallback_reconciler.run_once()
 
-def append_submission(payload: Dict[str, Any]) -> bool:
-    """Append assignment submission to Google Sheets"""
-    try:
-        spreadsheet = _get_spreadsheet()
 
-        # If spreadsheet is None, use CSV fallback
-        if spreadsheet is None:
-            logger.info("Using CSV fallback for submission")
-            return _csv_fallback("submissions.csv", [
-                payload.get("submission_id", ""),
-                payload.get("username", ""),
-                payload.get("telegram_id", ""),
-                payload.get("module", ""),
-                payload.get("type", ""),
-                payload.get("file_id", ""),
-                payload.get("file_name", ""),
-                payload.get("text_content", ""),
-                payload.get("submitted_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"),
-                payload.get("status", "Pending"),
-                "",
-                ""
-            ], ["submission_id", "username", "telegram_id", "module", "type", "file_id", "file_name", "text_content", "submitted_at", "status", "graded_at", "grade"])
+def get_replay_stats() -> Dict[str, Any]:
+    """Get replay counters and rows still waiting to be written back"""
+    _get_fallback_store()
+    return fallback_reconciler.get_stats()
+
 
+def stop_append_queues(timeout: float = 10.0) -> None:
+    """Flush and stop every append and update queue (blocking; call through run_blocking)"""
+    for queue in [*_append_queues, *_update_queues]:
         try:
-            sheet = spreadsheet.worksheet("submissions")
-            
-            # Check if sheet has headers, if not add them
-            try:
-                headers = sheet.row_values(1)
-                if not headers or headers[0] == "":
-                    # Add headers if sheet is empty
-                    sheet.update('A1:L1', [['submission_id', 'username', 'telegram_id', 'module', 'type', 'file_id', 'file_name', 'text_content', 'submitted_at', 'status', 'grade', 'comments']])
-                    logger.info("Added headers to submissions worksheet")
-            except Exception as header_error:
-                logger.warning(f"Could not check/update headers for submissions worksheet: {header_error}")
-
-            row = [
-                payload.get("submission_id", ""),
-                payload.get("username", ""),
-                payload.get("telegram_id", ""),
-                payload.get("module", ""),
-                payload.get("type", ""),
-                payload.get("file_id", ""),
-                payload.get("file_name", ""),
-                payload.get("text_content", ""),
-                payload.get("submitted_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"),
-                payload.get("status", "Pending"),
-                "",  # Grade column
-                ""   # Comments column
-            ]
-
-            sheet.append_row(row)
-            logger.info("Added submission to sheets: %s - Module %s", payload.get('username'), payload.get('module'))
-            return True
-            
-        except Exception as sheet_error:
-            logger.warning(f"Failed to access submissions worksheet: {sheet_error}")
-            # Try to create a new submissions worksheet with proper headers
-            try:
-                new_sheet = spreadsheet.add_worksheet(title="submissions_new", rows=1000, cols=15)
-                new_sheet.update('A1:L1', [['submission_id', 'username', 'telegram_id', 'module', 'type', 'file_id', 'file_name', 'text_content', 'submitted_at', 'status', 'grade', 'comments']])
-                
-                row = [
-                    payload.get("submission_id", ""),
-                    payload.get("username", ""),
-                    payload.get("telegram_id", ""),
-                    payload.get("module", ""),
-                    payload.get("type", ""),
-                    payload.get("file_id", ""),
-                    payload.get("file_name", ""),
-                    payload.get("text_content", ""),
-                    payload.get("submitted_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"),
-                    payload.get("status", "Pending"),
-                    "",  # Grade column
-                    ""   # Comments column
-                ]
-                
-                new_sheet.append_row(row)
-                logger.info("Added submission to new submissions worksheet: %s - Module %s", payload.get('username'), payload.get('module'))
-                return True
-            except Exception as create_error:
-                logger.error(f"Failed to create new submissions worksheet: {create_error}")
-                raise sheet_error
+            queue.stop(timeout)
+        except Exception as e:
+            logger.exception("Failed to stop %s append queue: %s", queue.title, e)
+
+
+def get_append_queue_stats() -> Dict[str, Any]:
+    """Get stats for every append and update queue"""
+    stats = {queue.title: queue.get_stats() for queue in _append_queues}
+    stats["updates"] = {queue.title: queue.get_stats() for queue in _update_queues}
+    return stats
+
+
+def _submission_row(payload: Dict[str, Any]) -> List[Any]:
+    """Build a submissions worksheet row from a submission payload"""
+    return [
+        payload.get("submission_id", ""),
+        payload.get("username", ""),
+        payload.get("telegram_id", ""),
+        payload.get("module", ""),
+        payload.get("type", ""),
+        payload.get("file_id", ""),
+        payload.get("file_name", ""),
+        payload.get("text_content", ""),
+        payload.get("submitted_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"),
+        payload.get("status", "Pending"),
+        "",  # Grade column
+        ""   # Comments column
+    ]
+
+
+def _win_row(payload: Dict[str, Any]) -> List[Any]:
+    """Build a wins worksheet row from a win payload"""
+    return [
+        payload.get("win_id", ""),
+        payload.get("username", ""),
+        payload.get("telegram_id", ""),
+        payload.get("type", ""),
+        payload.get("file_id", ""),
+        payload.get("file_name", ""),
+        payload.get("text_content", ""),
+        payload.get("shared_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S")
+    ]
+
+
+def _question_row(payload: Dict[str, Any]) -> List[Any]:
+    """Build a Questions worksheet row from a question payload"""
+    return [
+        payload.get("question_id", ""),
+        payload.get("username", ""),
+        payload.get("telegram_id", ""),
+        payload.get("question_text", ""),
+        payload.get("file_id", ""),
+        payload.get("file_name", ""),
+        payload.get("asked_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"),
+        payload.get("status", "Pending"),
+        payload.get("answer", "")
+    ]
+
+
+def _verification_row(record: Dict[str, Any]) -> List[Any]:
+    """Build a verification worksheet row from a pending verification record"""
+    return [
+        record.get("name", ""),
+        record.get("email", ""),
+        record.get("phone", ""),
+        record.get("status", "Pending"),
+        datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    ]
+
 
+def _queue_append(queue: SheetAppendQueue, row: List[Any], kind: str) -> bool:
+    """Queue a row for its worksheet, writing it to the CSV fallback if Sheets is unavailable"""
+    csv_file, csv_headers = _csv_targets[queue.title]
+    try:
+        if _get_spreadsheet() is None:
+            logger.info("Using CSV fallback for %s", kind)
+            return _csv_fallback(csv_file, row, csv_headers)
+        queue.enqueue(row)
+        return True
     except Exception as e:
-        logger.warning("Failed to append submission to sheets (using CSV fallback): %s", e)
-        # CSV fallback
-        return _csv_fallback("submissions.csv", [
-            payload.get("submission_id", ""),
-            payload.get("username", ""),
-            payload.get("telegram_id", ""),
-            payload.get("module", ""),
-            payload.get("type", ""),
-            payload.get("file_id", ""),
-            payload.get("file_name", ""),
-            payload.get("text_content", ""),
-            payload.get("submitted_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"),
-            payload.get("status", "Pending"),
-            "",
-            ""
-        ], ["submission_id", "username", "telegram_id", "module", "type", "file_id", "file_name", "text_content", "submitted_at", "status", "graded_at", "grade"])
+        logger.warning("Failed to queue %s for sheets (using CSV fallback): %s", kind, e)
+        return _csv_fallback(csv_file, row, csv_headers)
+
+
+def append_pending_verification(record: Dict[str, Any]) -> bool:
+    """Append pending verification to Google Sheets"""
+    queued = _queue_append(verification_queue, _verification_row(record), "pending verification")
+    logger.info("Queued pending verification for sheets: %s", record.get('email'))
+    return queued
+
+
+def append_submission(payload: Dict[str, Any]) -> bool:
+    """Append assignment submission to Google Sheets"""
+    queued = _queue_append(submission_queue, _submission_row(payload), "submission")
+    logger.info("Queued submission for sheets: %s - Module %s", payload.get('username'), payload.get('module'))
+    return queued
 
 
 def update_submission_status(submission_id: str, status: str, score: Optional[int] = None) -> bool:
@@ -494,194 +730,16 @@ def update_submission_status(submission_id: str, status: str, score: Optional[in
 
 def append_win(payload: Dict[str, Any]) -> bool:
     """Append win to Google Sheets"""
-    try:
-        spreadsheet = _get_spreadsheet()
-
-        # If spreadsheet is None, use CSV fallback
-        if spreadsheet is None:
-            logger.info("Using CSV fallback for win")
-            return _csv_fallback("wins.csv", [
-                payload.get("win_id", ""),
-                payload.get("username", ""),
-                payload.get("telegram_id", ""),
-                payload.get("type", ""),
-                payload.get("file_id", ""),
-                payload.get("file_name", ""),
-                payload.get("text_content", ""),
-                payload.get("shared_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S")
-            ], ["win_id", "username", "telegram_id", "type", "file_id", "file_name", "text_content", "shared_at"])
-
-        try:
-            # Try wins_new worksheet first (preferred)
-            try:
-                sheet = spreadsheet.worksheet("wins_new")
-                logger.info("Using wins_new worksheet")
-            except:
-                # Fallback to wins worksheet
-                try:
-                    sheet = spreadsheet.worksheet("wins")
-                    logger.info("Using wins worksheet")
-                except:
-                    # Create wins_new worksheet if neither exists
-                    sheet = spreadsheet.add_worksheet(title="wins_new", rows=1000, cols=10)
-                    sheet.update('A1:H1', [['win_id', 'username', 'telegram_id', 'type', 'file_id', 'file_name', 'text_content', 'shared_at']])
-                    logger.info("Created new wins_new worksheet")
-            
-            # Check if sheet has headers, if not add them
-            try:
-                headers = sheet.row_values(1)
-                if not headers or headers[0] == "":
-                    # Add headers if sheet is empty
-                    sheet.update('A1:H1', [['win_id', 'username', 'telegram_id', 'type', 'file_id', 'file_name', 'text_content', 'shared_at']])
-                    logger.info("Added headers to wins worksheet")
-            except Exception as header_error:
-                logger.warning(f"Could not check/update headers for wins worksheet: {header_error}")
-
-            row = [
-                payload.get("win_id", ""),
-                payload.get("username", ""),
-                payload.get("telegram_id", ""),
-                payload.get("type", ""),
-                payload.get("file_id", ""),
-                payload.get("file_name", ""),
-                payload.get("text_content", ""),
-                payload.get("shared_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S")
-            ]
-
-            sheet.append_row(row)
-            logger.info("Added win to new wins worksheet: %s - %s", payload.get('username'), payload.get('type'))
-            return True
-            
-        except Exception as sheet_error:
-            logger.error(f"Failed to access any wins worksheet: {sheet_error}")
-            raise sheet_error
-
-    except Exception as e:
-        logger.warning("Failed to append win to sheets (using CSV fallback): %s", e)
-        # CSV fallback
-        return _csv_fallback("wins.csv", [
-            payload.get("win_id", ""),
-            payload.get("username", ""),
-            payload.get("telegram_id", ""),
-            payload.get("type", ""),
-            payload.get("file_id", ""),
-            payload.get("file_name", ""),
-            payload.get("text_content", ""),
-            payload.get("shared_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S")
-        ], ["win_id", "username", "telegram_id", "type", "file_id", "file_name", "text_content", "shared_at"])
+    queued = _queue_append(win_queue, _win_row(payload), "win")
+    logger.info("Queued win for sheets: %s - %s", payload.get('username'), payload.get('type'))
+    return queued
 
 
 def append_question(payload: Dict[str, Any]) -> bool:
     """Append question to Google Sheets"""
-    try:
-        spreadsheet = _get_spreadsheet()
-
-        # If spreadsheet is None, use CSV fallback
-        if spreadsheet is None:
-            logger.info("Using CSV fallback for question")
-            return _csv_fallback("questions.csv", [
-                payload.get("question_id", ""),
-                payload.get("username", ""),
-                payload.get("telegram_id", ""),
-                payload.get("question_text", ""),
-                payload.get("file_id", ""),
-                payload.get("file_name", ""),
-                payload.get("asked_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"),
-                payload.get("status", "Pending"),
-                payload.get("answer", "")
-            ], ["question_id", "username", "telegram_id", "question_text", "file_id", "file_name", "asked_at", "status", "answer"])
-
-        # Ensure the questions worksheet exists
-        try:
-            sheet = spreadsheet.worksheet("Questions")
-        except Exception as e:
-            if "WorksheetNotFound" in str(e):
-                logger.warning("Questions worksheet not found, creating it...")
-                try:
-                    spreadsheet.add_worksheet(title="Questions", rows=1000, cols=20)
-                    # Add headers
-                    sheet = spreadsheet.worksheet("Questions")
-                    sheet.append_row(["question_id", "username", "telegram_id", "question_text", "file_id", "file_name", "asked_at", "status", "answer"])
-                    logger.info("Created questions worksheet with headers")
-                except Exception as create_error:
-                    logger.error(f"Failed to create questions worksheet: {create_error}")
-                    return False
-            else:
-                raise e
-
-        # Get the current headers to ensure correct column mapping
-        try:
-            headers = sheet.row_values(1)
-            logger.info(f"Current worksheet headers: {headers}")
-            
-            # Create a dictionary to map data to correct columns
-            data_row = {}
-            
-            # Map data to headers based on expected column positions
-            if len(headers) >= 9:
-                # Standard headers: question_id, username, telegram_id, question_text, file_id, file_name, asked_at, status, answer
-                data_row = {
-                    headers[0]: payload.get("question_id", ""),  # question_id
-                    headers[1]: payload.get("username", ""),     # username
-                    headers[2]: payload.get("telegram_id", ""),   # telegram_id
-                    headers[3]: payload.get("question_text", ""), # question_text
-                    headers[4]: payload.get("file_id", ""),      # file_id
-                    headers[5]: payload.get("file_name", ""),     # file_name
-                    headers[6]: payload.get("asked_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"), # asked_at
-                    headers[7]: payload.get("status", "Pending"), # status
-                    headers[8]: payload.get("answer", "")         # answer
-                }
-            else:
-                # Fallback to direct mapping if headers are unexpected
-                logger.warning(f"Unexpected header count: {len(headers)}, using fallback mapping")
-                data_row = {
-                    "question_id": payload.get("question_id", ""),
-                    "username": payload.get("username", ""),
-                    "telegram_id": payload.get("telegram_id", ""),
-                    "question_text": payload.get("question_text", ""),
-                    "file_id": payload.get("file_id", ""),
-                    "file_name": payload.get("file_name", ""),
-                    "asked_at": payload.get("asked_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"),
-                    "status": payload.get("status", "Pending"),
-                    "answer": payload.get("answer", "")
-                }
-            
-            # Convert to list in the correct order
-            row = [data_row.get(header, "") for header in headers]
-            
-        except Exception as e:
-            logger.error(f"Error mapping data to headers: {e}")
-            # Fallback to direct row creation
-        row = [
-            payload.get("question_id", ""),
-            payload.get("username", ""),
-            payload.get("telegram_id", ""),
-            payload.get("question_text", ""),
-            payload.get("file_id", ""),
-            payload.get("file_name", ""),
-            payload.get("asked_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"),
-            payload.get("status", "Pending"),
-                payload.get("answer", "")
-        ]
-
-        sheet.append_row(row)
-        logger.info(f"Added question to sheets: {payload.get('question_id', 'N/A')} for user {payload.get('username', 'N/A')}")
-        return True
-
-    except Exception as e:
-        logger.warning("Failed to append question to sheets (using CSV fallback): %s", e)
-        # CSV fallback
-        return _csv_fallback("questions.csv", [
-            payload.get("question_id", ""),
-            payload.get("username", ""),
-            payload.get("telegram_id", ""),
-            payload.get("question_text", ""),
-            payload.get("file_id", ""),
-            payload.get("file_name", ""),
-            payload.get("asked_at", datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M:%S"),
-            payload.get("status", "Pending"),
-            ""
-        ], ["question_id", "username", "telegram_id", "question_text", "file_id", "file_name", "asked_at", "status", "answer"])
+    queued = _queue_append(question_queue, _question_row(payload), "question")
+    logger.info(f"Queued question for sheets: {payload.get('question_id', 'N/A')} for user {payload.get('username', 'N/A')}")
+    return queued
 
 
 def get_student_submissions(username: str, module: Optional[str] = None, telegram_id: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -692,23 +750,12 @@ def get_student_submissions(username: str, module: Optional[str] = None, telegra
         # If Google Sheets is available, use it
         if spreadsheet:
             try:
-                sheet = spreadsheet.worksheet("submissions")
-                # Get all data
-                records = sheet.get_all_records()
-
-                # Filter by username and/or telegram_id and optionally module
-                student_submissions = []
-                for record in records:
-                    # Check if record matches either username or telegram_id
-                    username_match = username and record.get("username") == username
-                    telegram_id_match = telegram_id and record.get("telegram_id") == telegram_id
-
-                    if username_match or telegram_id_match:
-                        student_submissions.append(record)
-
+                # Match either username or telegram_id, and optionally module
                 if module:
-                    student_submissions = [s for s in student_submissions if s.get("module") == module]
-                return student_submissions
+                    keys = [("username_module", (username, module)), ("telegram_id_module", (telegram_id, module))]
+                else:
+                    keys = [("username", (username,)), ("telegram_id", (telegram_id,))]
+                return submissions_snapshot.lookup_any(keys)
             except Exception as e:
                 logger.warning("Failed to get submissions from Google Sheets, falling back to CSV: %s", e)
 
@@ -728,17 +775,8 @@ def get_student_submissions(username: str, module: Optional[str] = None, telegra
 def _get_student_submissions_csv(username: str, module: Optional[str] = None, telegram_id: Optional[int] = None) -> List[Dict[str, Any]]:
     """Get student submissions from CSV file (fallback mode)"""
     try:
-        records = _read_csv_fallback("submissions.csv")
-
-        # Filter by username and/or telegram_id and optionally module
-        student_submissions = []
-        for record in records:
-            # Check if record matches either username or telegram_id
-            username_match = username and record.get("username") == username
-            telegram_id_match = telegram_id and record.get("telegram_id") == telegram_id
-
-            if username_match or telegram_id_match:
-                student_submissions.append(record)
+        # Rows matching either username or telegram_id
+        student_submissions = _read_csv_fallback("submissions.csv", username=username, telegram_id=telegram_id)
 
         if module:
             student_submissions = [s for s in student_submissions if s.get("module") == module]
@@ -767,10 +805,7 @@ def get_all_submissions() -> List[Dict[str, Any]]:
         # If Google Sheets is available, use it
         if spreadsheet:
             try:
-                sheet = spreadsheet.worksheet("submissions")
-                # Get all data
-                records = sheet.get_all_records()
-                return records
+                return submissions_snapshot.records()
             except Exception as e:
                 logger.warning("Failed to get all submissions from Google Sheets, falling back to CSV: %s", e)
 
@@ -855,6 +890,21 @@ def _get_manual_tips_csv() -> List[Dict[str, Any]]:
         return []
 
 
+def _graded_fields(grade: Any, comment: str) -> Dict[str, Any]:
+    """Submission columns written when grading"""
+    fields = {"status": "Graded", "grade": grade}
+    if comment:
+        fields["comments"] = comment
+    return fields
+
+
+def _submission_key(username_or_id: str, module: Optional[Any]) -> tuple:
+    """Index and key for a submission addressed by submission_id or (username, module)"""
+    if module is None:
+        return "submission_id", (username_or_id,)
+    return "username_module", (username_or_id, str(module))
+
+
 def update_submission_grade(username_or_id: str, module_or_grade: Any, grade: Optional[int] = None, comment: str = "") -> bool:
     """Update submission grade and comment in Google Sheets
     
@@ -863,47 +913,28 @@ def update_submission_grade(username_or_id: str, module_or_grade: Any, grade: Op
     - update_submission_grade(submission_id, grade, comment) - new way
     """
     try:
-        spreadsheet = _get_spreadsheet()
-        sheet = spreadsheet.worksheet("submissions")
-        
         # Detect which calling pattern is being used
         if grade is not None:
             # Legacy pattern: update_submission_grade(username, module, grade, comment)
-            username = username_or_id
-            module = str(module_or_grade)
+            index, key = _submission_key(username_or_id, module_or_grade)
             actual_grade = grade
-            
-            # Find row by username and module
-            all_records = sheet.get_all_records()
-            for i, record in enumerate(all_records, start=2):  # start at 2 for header
-                if record.get("username") == username and str(record.get("module")) == module:
-                    sheet.update_cell(i, 10, "Graded")  # Status column (column 10)
-                    sheet.update_cell(i, 11, actual_grade)  # Grade column (column 11)
-                    if comment:
-                        sheet.update_cell(i, 12, comment)  # Comments column (column 12)
-                    logger.info(f"Updated submission grade for {username} module {module}: {actual_grade}")
-                    return True
-            
-            logger.warning(f"Submission not found for {username} module {module}")
-            return False
         else:
             # New pattern: update_submission_grade(submission_id, grade, comment)
-            submission_id = username_or_id
+            index, key = _submission_key(username_or_id, None)
             actual_grade = module_or_grade
-            
-            # Find row by submission_id
-            try:
-                cell = sheet.find(submission_id)
-                sheet.update_cell(cell.row, 10, "Graded")  # Status column (column 10)
-                sheet.update_cell(cell.row, 11, actual_grade)  # Grade column (column 11)
-                if comment:
-                    sheet.update_cell(cell.row, 12, comment)  # Comments column (column 12)
-                logger.info("Updated submission grade: %s -> %s (comment: %s)", submission_id, actual_grade, comment)
-                return True
-            except Exception as e:
-                logger.warning("Submission not found: %s", submission_id)
-                return False
-        
+
+        if _get_spreadsheet() is None:
+            logger.warning("Sheets unavailable, keeping submission grade for replay")
+            return _defer_update(submission_updates, index, key, _graded_fields(actual_grade, comment))
+
+        # Status, grade and comment go out in one batch_update, coalesced with other graders
+        updated = submission_updates.update(index, key, _graded_fields(actual_grade, comment), pick=0)
+        if not updated:
+            logger.warning(f"Submission not found: {' module '.join(key)}")
+            return False
+        logger.info(f"Updated submission grade for {' module '.join(key)}: {actual_grade} (comment: {comment})")
+        return True
+
     except Exception as e:
         logger.exception("Failed to update submission grade: %s", e)
         return False
@@ -917,42 +948,26 @@ def add_grade_comment(username_or_id: str, module_or_comment: Any, comment: Opti
     - add_grade_comment(submission_id, comment) - new way
     """
     try:
-        spreadsheet = _get_spreadsheet()
-        sheet = spreadsheet.worksheet("submissions")
-        
         # Detect which calling pattern is being used
         if comment is not None:
             # Legacy pattern: add_grade_comment(username, module, comment)
-            username = username_or_id
-            module = str(module_or_comment)
+            index, key = _submission_key(username_or_id, module_or_comment)
             actual_comment = comment
-            
-            # Find row by username and module
-            all_records = sheet.get_all_records()
-            for i, record in enumerate(all_records, start=2):  # start at 2 for header
-                if record.get("username") == username and str(record.get("module")) == module:
-                    # Update the comments column (column 12)
-                    sheet.update_cell(i, 12, actual_comment)
-                    logger.info(f"Added grade comment for {username} module {module}: {actual_comment}")
-                    return True
-
-            logger.warning(f"Submission not found for {username} module {module}")
-            return False
         else:
             # New pattern: add_grade_comment(submission_id, comment)
-            submission_id = username_or_id
+            index, key = _submission_key(username_or_id, None)
             actual_comment = module_or_comment
-            
-            # Find row by submission_id
-            try:
-                cell = sheet.find(submission_id)
-                # Update the comments column (column 12)
-                sheet.update_cell(cell.row, 12, actual_comment)
-                logger.info("Added grade comment: %s -> %s", submission_id, actual_comment)
-                return True
-            except Exception as e:
-                logger.warning("Submission not found: %s", submission_id)
-                return False
+
+        if _get_spreadsheet() is None:
+            logger.warning("Sheets unavailable, keeping grade comment for replay")
+            return _defer_update(submission_updates, index, key, {"comments": actual_comment})
+
+        updated = submission_updates.update(index, key, {"comments": actual_comment}, pick=0)
+        if not updated:
+            logger.warning(f"Submission not found: {' module '.join(key)}")
+            return False
+        logger.info(f"Added grade comment for {' module '.join(key)}: {actual_comment}")
+        return True
 
     except Exception as e:
         logger.exception("Failed to add grade comment: %s", e)
@@ -1031,15 +1046,13 @@ def get_all_wins() -> List[Dict[str, Any]]:
             try:
                 # Try wins_new worksheet first (new format)
                 try:
-                    sheet = spreadsheet.worksheet("wins_new")
+                    records = win_snapshots["wins_new"].records()
                     logger.info("Using wins_new worksheet")
-                    records = sheet.get_all_records()
                     return records
                 except Exception:
                     # Fallback to wins worksheet
-                    sheet = spreadsheet.worksheet("wins")
+                    records = win_snapshots["wins"].records()
                     logger.info("Using wins worksheet")
-                    records = sheet.get_all_records()
                     return records
             except Exception as e:
                 logger.warning("Failed to get wins from Google Sheets, falling back to CSV: %s", e)
@@ -1055,13 +1068,7 @@ def get_all_wins() -> List[Dict[str, Any]]:
 def _get_all_wins_csv() -> List[Dict[str, Any]]:
     """Get all wins from CSV file (fallback mode)"""
     try:
-        csv_file = "data/csv_backup/wins.csv"
-        wins = []
-        if os.path.exists(csv_file):
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                wins = list(reader)
-        return wins
+        return _read_csv_fallback("wins.csv")
     except Exception as e:
         logger.exception("Error reading wins CSV: %s", e)
         return []
@@ -1077,9 +1084,7 @@ def get_student_wins(username: str) -> List[Dict[str, Any]]:
             try:
                 # Try wins_new worksheet first (new format)
                 try:
-                    sheet = spreadsheet.worksheet("wins_new")
-                    records = sheet.get_all_records()
-                    student_wins = [record for record in records if record.get("username") == username]
+                    student_wins = win_snapshots["wins_new"].lookup("username", username)
                     if student_wins:
                         logger.info(f"Found {len(student_wins)} wins in wins_new worksheet for {username}")
                         return student_wins
@@ -1087,10 +1092,7 @@ def get_student_wins(username: str) -> List[Dict[str, Any]]:
                     logger.debug(f"wins_new worksheet not found or empty: {e}")
                 
                 # Fallback to wins worksheet (old format)
-                sheet = spreadsheet.worksheet("wins")
-                records = sheet.get_all_records()
-                student_wins = [record for record in records if record.get("username") == username]
-                return student_wins
+                return win_snapshots["wins"].lookup("username", username)
             except Exception as e:
                 logger.warning("Failed to get wins from Google Sheets, falling back to CSV: %s", e)
 
@@ -1110,10 +1112,7 @@ def get_student_wins(username: str) -> List[Dict[str, Any]]:
 def _get_student_wins_csv(username: str) -> List[Dict[str, Any]]:
     """Get student wins from CSV file (fallback mode)"""
     try:
-        records = _read_csv_fallback("wins.csv")
-
-        # Filter by username
-        student_wins = [record for record in records if record.get("username") == username]
+        student_wins = _read_csv_fallback("wins.csv", username=username)
 
         # Convert string values to appropriate types if needed
         for win in student_wins:
@@ -1139,37 +1138,7 @@ def get_student_questions(username: str) -> List[Dict[str, Any]]:
         # If Google Sheets is available, use it
         if spreadsheet:
             try:
-                sheet = spreadsheet.worksheet("Questions")
-                # Get all data with robust header handling to avoid duplicate header issues
-                try:
-                    # Get raw data to avoid header issues
-                    all_data = sheet.get_all_values()
-                    if len(all_data) < 2:  # Need at least header + 1 data row
-                        logger.warning("No data found in questions worksheet")
-                        return []
-                    
-                    # Get headers from first row
-                    headers = all_data[0]
-                    logger.info(f"Raw headers from questions worksheet: {headers}")
-                    
-                    # Create records manually to avoid duplicate header issues
-                    records = []
-                    for row_data in all_data[1:]:  # Skip header row
-                        if len(row_data) >= len(headers):
-                            record = {}
-                            for i, header in enumerate(headers):
-                                if i < len(row_data):
-                                    record[header] = row_data[i]
-                            records.append(record)
-                    
-                    logger.info(f"Successfully parsed {len(records)} records from questions worksheet")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to get records from questions worksheet: {e}")
-                    return []
-                # Filter by username
-                student_questions = [record for record in records if record.get("username") == username]
-                return student_questions
+                return questions_snapshot.lookup("username", username)
             except Exception as e:
                 if "WorksheetNotFound" in str(e):
                     logger.warning("Questions worksheet not found, creating it...")
@@ -1203,10 +1172,7 @@ def get_student_questions(username: str) -> List[Dict[str, Any]]:
 def _get_student_questions_csv(username: str) -> List[Dict[str, Any]]:
     """Get student questions from CSV file (fallback mode)"""
     try:
-        records = _read_csv_fallback("questions.csv")
-
-        # Filter by username
-        student_questions = [record for record in records if record.get("username") == username]
+        student_questions = _read_csv_fallback("questions.csv", username=username)
 
         # Convert string values to appropriate types if needed
         for question in student_questions:
@@ -1229,94 +1195,22 @@ def update_question_status(username: str, answer: str) -> bool:
     try:
         spreadsheet = _get_spreadsheet()
 
-        # If spreadsheet is None, we can't update (CSV fallback doesn't support updates)
+        # Without Sheets, keep the answer and apply it when the reconciler replays the fallback store
         if spreadsheet is None:
-            logger.warning("Cannot update question status in CSV fallback mode")
-            return False
-
-        # Ensure the questions worksheet exists
-        try:
-            sheet = spreadsheet.worksheet("Questions")
-        except Exception as e:
-            if "WorksheetNotFound" in str(e):
-                logger.warning("Questions worksheet not found, creating it...")
-                try:
-                    spreadsheet.add_worksheet(title="Questions", rows=1000, cols=20)
-                    # Add headers
-                    sheet = spreadsheet.worksheet("Questions")
-                    sheet.append_row(["question_id", "username", "telegram_id", "question_text", "file_id", "file_name", "asked_at", "status", "answer"])
-                    logger.info("Created questions worksheet with headers")
-                except Exception as create_error:
-                    logger.error(f"Failed to create questions worksheet: {create_error}")
-                    return False
-            else:
-                raise e
-
-        # Find row by username (get the most recent question)
-        # Handle duplicate headers by using a more robust approach
-        try:
-            # First, try to get all data as raw values to avoid header issues
-            all_data = sheet.get_all_values()
-            if len(all_data) < 2:  # Need at least header + 1 data row
-                logger.warning("No data found in questions worksheet")
-                return False
-            
-            # Get headers from first row
-            headers = all_data[0]
-            logger.info(f"Raw headers from worksheet: {headers}")
-            
-            # Create records manually to avoid duplicate header issues
-            all_records = []
-            for row_data in all_data[1:]:  # Skip header row
-                if len(row_data) >= len(headers):
-                    record = {}
-                    for i, header in enumerate(headers):
-                        if i < len(row_data):
-                            record[header] = row_data[i]
-                    all_records.append(record)
-            
-            logger.info(f"Successfully parsed {len(all_records)} records from questions worksheet")
-            
-        except Exception as e:
-            logger.error(f"Failed to get records from questions worksheet: {e}")
+            logger.warning("Sheets unavailable, keeping question answer for replay")
+            return _defer_update(question_updates, "username", (username,),
+                                 {"status": "Answered", "answer": answer}, pending_only=True)
+
+        # Answer the student's most recent pending question
+        updated = question_updates.update(
+            "username", (username,), {"status": "Answered", "answer": answer},
+            where=lambda r: r.get("status") == "Pending", pick=-1
+        )
+        if not updated:
+            logger.warning(f"No pending question found for {username}")
             return False
-        
-        # Get headers to find correct column positions
-        try:
-            headers = sheet.row_values(1)
-            logger.info(f"Headers for update: {headers}")
-            
-            # Find column positions dynamically
-            status_col = None
-            answer_col = None
-            
-            for i, header in enumerate(headers, 1):
-                if header.lower() in ["status"]:
-                    status_col = i
-                elif header.lower() in ["answer"]:
-                    answer_col = i
-            
-            if not status_col or not answer_col:
-                logger.error(f"Could not find status or answer columns. Headers: {headers}")
-                return False
-                
-            logger.info(f"Status column: {status_col}, Answer column: {answer_col}")
-            
-        except Exception as e:
-            logger.error(f"Error getting headers: {e}")
-            return False
-        
-        for i, record in enumerate(reversed(all_records), start=1):
-            if record.get("username") == username and record.get("status") == "Pending":
-                # Update the row (i is from bottom, so actual row is len - i + 2 for header)
-                actual_row = len(all_records) - i + 2
-                sheet.update_cell(actual_row, status_col, "Answered")  # Status column
-                sheet.update_cell(actual_row, answer_col, answer)  # Answer column
-                logger.info(f"Updated question status for {username} to Answered in row {actual_row}")
-                return True
-
-        logger.warning(f"No pending question found for {username}")
-        return False
+        logger.info(f"Updated question status for {username} to Answered")
+        return True
 
     except Exception as e:
         logger.exception("Failed to update question status: %s", e)
@@ -1331,24 +1225,22 @@ def get_submission_by_id(submission_id: str) -> Optional[Dict[str, Any]]:
         # If Google Sheets is available, use it
         if spreadsheet:
             try:
-                sheet = spreadsheet.worksheet("submissions")
-                # Get all data
-                records = sheet.get_all_records()
                 # Find submission by ID
-                for record in records:
-                    if record.get("submission_id") == submission_id:
-                        return {
-                            'submission_id': record.get("submission_id", ""),
-                            'username': record.get("username", ""),
-                            'telegram_id': record.get("telegram_id", ""),
-                            'module': record.get("module", ""),
-                            'type': record.get("type", ""),
-                            'file_id': record.get("file_id", ""),
-                            'file_name': record.get("file_name", ""),
-                            'text_content': record.get("text_content", ""),
-                            'submitted_at': record.get("submitted_at", ""),
-                            'status': record.get("status", ""),
-                        }
+                matches = submissions_snapshot.lookup("submission_id", submission_id)
+                if matches:
+                    record = matches[0]
+                    return {
+                        'submission_id': record.get("submission_id", ""),
+                        'username': record.get("username", ""),
+                        'telegram_id': record.get("telegram_id", ""),
+                        'module': record.get("module", ""),
+                        'type': record.get("type", ""),
+                        'file_id': record.get("file_id", ""),
+                        'file_name': record.get("file_name", ""),
+                        'text_content': record.get("text_content", ""),
+                        'submitted_at': record.get("submitted_at", ""),
+                        'status': record.get("status", ""),
+                    }
                 logger.warning(f"Submission not found in Google Sheets: {submission_id}")
                 return None
             except Exception as e:
@@ -1370,12 +1262,9 @@ def get_submission_by_id(submission_id: str) -> Optional[Dict[str, Any]]:
 def _get_submission_by_id_csv(submission_id: str) -> Optional[Dict[str, Any]]:
     """Get submission from CSV file (fallback mode)"""
     try:
-        records = _read_csv_fallback("submissions.csv")
-
-        # Find submission by ID
-        for record in records:
-            if record.get("submission_id") == submission_id:
-                return record
+        records = _read_csv_fallback("submissions.csv", submission_id=submission_id)
+        if records:
+            return records[0]
 
         logger.warning(f"Submission not found in CSV: {submission_id}")
         return None
@@ -1451,6 +1340,7 @@ def fix_questions_worksheet_headers() -> bool:
                 new_sheet.append_row(row_data[:len(proper_headers)])
             
             logger.info(f"Restored {len(existing_data)} rows of data to new worksheet")
+            questions_snapshot.invalidate()
             return True
             
         except Exception as e:
@@ -0,0 +1,132 @@
+"""
+Stats service - In-memory snapshot of bot statistics
+
+The snapshot is refreshed by a background job and served from memory with
+its age, so /stats and the admin API can be polled freely without running
+the aggregate queries on every request.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from avap_bot.services.supabase_service import get_bot_statistics_async
+
+logger = logging.getLogger(__name__)
+
+
+class StatsSnapshot:
+    """
+    Cached result of an aggregate statistics loader.
+
+    Concurrent refreshes are coalesced into one loader call; a failed
+    refresh keeps serving the previous snapshot.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[Dict[str, Any]]], max_age: float = 300.0):
+        """
+        Initialize the snapshot.
+
+        Args:
+            loader: Coroutine function returning the statistics dict ({} on failure)
+            max_age: Seconds after which get() refreshes the snapshot on demand
+        """
+        self._loader = loader
+        self.max_age = max_age
+        self._stats: Dict[str, Any] = {}
+        self._refreshed_at: Optional[float] = None
+        self._refreshed_wall: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+
+        self.refreshes = 0
+        self.failures = 0
+        self.served = 0
+        self.last_duration = 0.0
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last successful refresh, None if never refreshed."""
+        if self._refreshed_at is None:
+            return None
+        return time.monotonic() - self._refreshed_at
+
+    async def refresh(self) -> bool:
+        """
+        Reload the statistics, joining a refresh that is already running.
+
+        Returns:
+            True if the snapshot holds fresh data after the call
+        """
+        started_waiting = time.monotonic()
+        async with self._lock:
+            # Another caller refreshed while we were waiting for the lock
+            if self._refreshed_at is not None and self._refreshed_at >= started_waiting:
+                return True
+
+            start = time.monotonic()
+            try:
+                stats = await self._loader()
+            except Exception as e:
+                logger.exception("Stats snapshot refresh failed: %s", e)
+                stats = {}
+            self.last_duration = time.monotonic() - start
+
+            if not stats:
+                self.failures += 1
+                logger.warning(f"Stats snapshot refresh returned no data (keeping snapshot aged {self.age})")
+                return False
+
+            self._stats = stats
+            self._refreshed_at = time.monotonic()
+            self._refreshed_wall = datetime.now(timezone.utc)
+            self.refreshes += 1
+            logger.debug(f"Stats snapshot refreshed in {self.last_duration * 1000:.0f}ms")
+            return True
+
+    async def get(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Get the snapshot, refreshing it first if it is missing or too old.
+
+        Args:
+            max_age: Override the maximum acceptable age in seconds
+
+        Returns:
+            Dict with "stats", "refreshed_at" (ISO timestamp or None),
+            "age_seconds" and "stale"
+        """
+        limit = self.max_age if max_age is None else max_age
+        age = self.age
+        if age is None or age > limit:
+            await self.refresh()
+
+        self.served += 1
+        age = self.age
+        return {
+            "stats": dict(self._stats),
+            "refreshed_at": self._refreshed_wall.isoformat() if self._refreshed_wall else None,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "stale": age is None or age > limit
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get refresh counters and snapshot age."""
+        age = self.age
+        return {
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "served": self.served,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "last_refresh_ms": round(self.last_duration * 1000, 2)
+        }
+
+
+STATS_REFRESH_SECONDS = int(os.getenv("STATS_REFRESH_SECONDS", "60"))
+
+# Refreshed by the scheduler every STATS_REFRESH_SECONDS; get() refreshes on
+# demand only if the background job has fallen well behind
+bot_stats_snapshot = StatsSnapshot(
+    get_bot_statistics_async,
+    max_age=float(os.getenv("STATS_SNAPSHOT_MAX_AGE", str(STATS_REFRESH_SECONDS * 5)))
+)
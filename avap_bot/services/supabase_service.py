@@ -2,13 +2,25 @@
 Supabase service for database operations
 """
 import os
+import asyncio
 import logging
+import random
 import uuid
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterator, AsyncIterator
+from collections import Counter
 from datetime import datetime, timezone
 
 from supabase import create_client, Client
 
+from avap_bot.services.postgrest_client import get_async_postgrest, PostgrestError
+from avap_bot.services.leaderboard_service import (
+    ACTIVITY_COLUMNS, USER_COLUMNS, leaderboard_row, rank_students, usernames_from
+)
+from avap_bot.services.identity_service import forget_identity
+from avap_bot.utils.counter_aggregator import PartialFlushError
+from avap_bot.utils.ttl_cache import TTLCache
+from avap_bot.utils.write_behind import WriteBehindBuffer
+
 logger = logging.getLogger(__name__)
 
 def _get_response_data(response):
@@ -39,6 +51,36 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 # Global client instance
 supabase_client: Optional[Client] = None
 
+# Verified users keyed by telegram_id; a cached None means "not verified".
+# Must be invalidated wherever a verified_users row is added or removed.
+verified_user_cache = TTLCache(
+    maxsize=int(os.getenv("VERIFIED_CACHE_SIZE", "5000")),
+    ttl=float(os.getenv("VERIFIED_CACHE_TTL", "300")),
+    negative_ttl=float(os.getenv("VERIFIED_CACHE_NEGATIVE_TTL", "30")),
+    name="verified_user_cache"
+)
+
+
+def invalidate_verified_user(telegram_id: Optional[int] = None) -> None:
+    """Drop a user's cached verification status, or all of them if telegram_id is None"""
+    if telegram_id is None:
+        verified_user_cache.clear()
+    else:
+        verified_user_cache.invalidate(int(telegram_id))
+
+
+def _invalidate_verified_rows(rows: Optional[List[Dict[str, Any]]]) -> None:
+    """Invalidate the cache for every row that carries a telegram_id"""
+    for row in rows or []:
+        if row.get("telegram_id"):
+            invalidate_verified_user(row["telegram_id"])
+
+
+def _cached_verified_user(telegram_id: int):
+    """Return (found, copy of cached user) from the verified-user cache"""
+    found, user = verified_user_cache.get(telegram_id)
+    return found, (dict(user) if user else None)
+
 
 def _clean_supabase_url(url: str) -> str:
     """Validate and clean Supabase URL format"""
@@ -196,13 +238,17 @@ def add_pending_verification(data: Dict[str, Any]) -> Dict[str, Any]:
 
 def find_verified_by_telegram(telegram_id: int) -> Optional[Dict[str, Any]]:
     """Find verified user by telegram ID"""
+    found, user = _cached_verified_user(telegram_id)
+    if found:
+        return user
+    epoch = verified_user_cache.epoch
     try:
         client = get_supabase()
         res = client.table("verified_users").select("*").eq("telegram_id", telegram_id).eq("status", "verified").execute()
         data = _get_response_data(res)
-        if data and len(data) > 0:
-            return data[0]
-        return None
+        user = data[0] if data else None
+        verified_user_cache.set(telegram_id, user, epoch=epoch)
+        return dict(user) if user else None
     except Exception as e:
         logger.exception("Supabase find_verified_by_telegram error: %s", e)
         return None
@@ -308,6 +354,9 @@ async def promote_pending_to_verified(pending_id: int, telegram_id: int) -> Dict
 
         verified_user = ins.data[0]
         logger.info(f"Successfully inserted verified user: {verified_user['name']} ({verified_user['email']})")
+        if telegram_id:
+            # Drop the negative entry cached while the user was unverified
+            invalidate_verified_user(telegram_id)
 
         # Note: Systeme.io contact already created with verified status when student was added
 
@@ -319,120 +368,140 @@ async def promote_pending_to_verified(pending_id: int, telegram_id: int) -> Dict
         raise
 
 
-def remove_verified_user(identifier: str) -> bool:
-    """Identifier may be email, phone, or full name. Return True if deleted."""
+async def remove_student_record_async(source: str, row_id: Any) -> bool:
+    """
+    Delete exactly one student row, as confirmed by an admin.
+
+    Args:
+        source: Table the row was found in (verified_users or pending_verifications)
+        row_id: id of that row
+
+    Returns:
+        True if the row was deleted
+    """
+    if source not in ("verified_users", "pending_verifications"):
+        raise ValueError(f"Not a student table: {source}")
+    data = await get_async_postgrest().delete(source, [("id", f"eq.{row_id}")])
+    for row in data:
+        forget_identity(row.get('email'), row.get('phone'))
+    if source == "verified_users":
+        _invalidate_verified_rows(data)
+    if data:
+        logger.info(f"Removed student row {row_id} from {source}")
+        return True
+    logger.warning(f"Student row {row_id} was not found in {source}; it may already be removed")
+    return False
+
+
+# Streaming reads: keyset pages (id > last id) with only the needed columns,
+# so whole-table consumers keep memory flat as tables grow
+STREAM_PAGE_SIZE = int(os.getenv("SUPABASE_STREAM_PAGE_SIZE", "1000"))
+BROADCAST_COLUMNS = "telegram_id"
+STUDENT_COLUMNS = "id,telegram_id,name,email,phone,status,badge,created_at"
+FAQ_COLUMNS = "id,question,answer"
+ANSWERED_QUESTION_COLUMNS = "id,question_text,answer"
+TIP_COLUMNS = "id,text,sent_count,created_at"
+
+
+def iter_table(table: str, columns: str = "*", filters: Optional[List[tuple]] = None,
+               page_size: int = STREAM_PAGE_SIZE, key_column: str = "id") -> Iterator[Dict[str, Any]]:
+    """
+    Stream rows of a table in keyset pages.
+
+    Args:
+        table: Table name
+        columns: Columns to fetch (key_column is added if missing)
+        filters: (column, "op.value") pairs such as ("status", "eq.verified")
+        page_size: Rows per request
+        key_column: Unique, ordered column to page on
+
+    Yields:
+        Rows in key_column order
+    """
     client = get_supabase()
-    try:
-        # First, check if user exists in verified_users
-        user_exists = False
-        user_info = None
-        table_name = "verified_users"
-        
-        # Check by email
-        res = client.table("verified_users").select("*").eq("email", identifier).execute()
-        data = _get_response_data(res)
-        if data:
-            user_exists = True
-            user_info = data[0]
-            table_name = "verified_users"
-            logger.info(f"Found user by email in verified_users: {identifier}")
-        else:
-            # Check by phone
-            res = client.table("verified_users").select("*").eq("phone", identifier).execute()
-            data = _get_response_data(res)
-            if data:
-                user_exists = True
-                user_info = data[0]
-                table_name = "verified_users"
-                logger.info(f"Found user by phone in verified_users: {identifier}")
-            else:
-                # Check by name
-                res = client.table("verified_users").select("*").eq("name", identifier).execute()
-                data = _get_response_data(res)
-                if data:
-                    user_exists = True
-                    user_info = data[0]
-                    table_name = "verified_users"
-                    logger.info(f"Found user by name in verified_users: {identifier}")
-        
-        # If not found in verified_users, check pending_verifications
-        if not user_exists:
-            # Check by email in pending_verifications
-            res = client.table("pending_verifications").select("*").eq("email", identifier).execute()
-            data = _get_response_data(res)
-            if data:
-                user_exists = True
-                user_info = data[0]
-                table_name = "pending_verifications"
-                logger.info(f"Found user by email in pending_verifications: {identifier}")
-            else:
-                # Check by phone in pending_verifications
-                res = client.table("pending_verifications").select("*").eq("phone", identifier).execute()
-                data = _get_response_data(res)
-                if data:
-                    user_exists = True
-                    user_info = data[0]
-                    table_name = "pending_verifications"
-                    logger.info(f"Found user by phone in pending_verifications: {identifier}")
-                else:
-                    # Check by name in pending_verifications
-                    res = client.table("pending_verifications").select("*").eq("name", identifier).execute()
-                    data = _get_response_data(res)
-                    if data:
-                        user_exists = True
-                        user_info = data[0]
-                        table_name = "pending_verifications"
-                        logger.info(f"Found user by name in pending_verifications: {identifier}")
-        
-        if not user_exists:
-            logger.warning(f"User not found for identifier: {identifier}")
-            logger.warning(f"Searched by email, phone, and name in both verified_users and pending_verifications - no matches found")
-            logger.info(f"This is normal if the user was never added or already removed")
-            return False
-        
-        # Now delete the user from the appropriate table
-        if user_info:
-            # Delete by the primary key or unique identifier
-            if user_info.get('email'):
-                res = client.table(table_name).delete().eq("email", user_info['email']).execute()
-            elif user_info.get('phone'):
-                res = client.table(table_name).delete().eq("phone", user_info['phone']).execute()
-            else:
-                res = client.table(table_name).delete().eq("name", user_info['name']).execute()
-            
-            data = _get_response_data(res)
-            if data:
-                logger.info(f"Successfully removed user from {table_name}: {identifier}")
-                return True
-            else:
-                logger.error(f"Failed to delete user record from {table_name}: {identifier}")
-                return False
-        else:
-            logger.error(f"No user info found for deletion: {identifier}")
-            return False
-            
-    except Exception as e:
-        logger.exception("Supabase remove_verified_user error: %s", e)
-        return False
+    if columns != "*" and key_column not in columns.split(","):
+        columns = f"{key_column},{columns}"
+    last_key = None
+    while True:
+        query = client.table(table).select(columns)
+        for column, expression in filters or []:
+            operator, value = expression.split(".", 1)
+            query = query.filter(column, operator, value)
+        if last_key is not None:
+            query = query.gt(key_column, last_key)
+        page = _get_response_data(query.order(key_column).limit(page_size).execute()) or []
+        yield from page
+        if len(page) < page_size:
+            return
+        last_key = page[-1][key_column]
+
+
+def iter_verified_users(columns: str = STUDENT_COLUMNS) -> Iterator[Dict[str, Any]]:
+    """Stream verified users"""
+    return iter_table("verified_users", columns, [("status", "eq.verified")])
+
+
+def iter_verified_telegram_ids() -> Iterator[int]:
+    """Stream telegram IDs of verified users"""
+    for user in iter_table("verified_users", BROADCAST_COLUMNS, [("status", "eq.verified")]):
+        if user.get("telegram_id"):
+            yield user["telegram_id"]
+
+
+def iter_answered_questions(columns: str = ANSWERED_QUESTION_COLUMNS) -> Iterator[Dict[str, Any]]:
+    """Stream answered questions"""
+    return iter_table("questions", columns, [("answer", "not.is.null")])
 
 
-def remove_verified_by_identifier(identifier: str) -> bool:
-    """Alias for remove_verified_user for backward compatibility"""
-    return remove_verified_user(identifier)
+async def iter_verified_users_async(columns: str = STUDENT_COLUMNS, after: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Stream verified users in id order (optionally those after an id) without blocking the event loop"""
+    async for user in get_async_postgrest().iter_rows(
+        "verified_users", columns=columns, filters=[("status", "eq.verified")], page_size=STREAM_PAGE_SIZE,
+        start_after=after
+    ):
+        yield user
+
+
+async def iter_verified_telegram_ids_async() -> AsyncIterator[int]:
+    """Stream telegram IDs of verified users without blocking the event loop"""
+    async for user in iter_verified_users_async(BROADCAST_COLUMNS):
+        if user.get("telegram_id"):
+            yield user["telegram_id"]
+
+
+async def iter_faqs_async(columns: str = FAQ_COLUMNS) -> AsyncIterator[Dict[str, Any]]:
+    """Stream FAQs without blocking the event loop"""
+    async for faq in get_async_postgrest().iter_rows("faqs", columns=columns, page_size=STREAM_PAGE_SIZE):
+        yield faq
+
+
+async def count_verified_users_async() -> int:
+    """Count verified users without fetching them"""
+    try:
+        return await get_async_postgrest().count("verified_users", filters=[("status", "eq.verified")])
+    except Exception as e:
+        logger.exception("Supabase count_verified_users_async error: %s", e)
+        return 0
 
 
 def get_all_verified_users() -> List[Dict[str, Any]]:
-    """Get all verified users"""
-    client = get_supabase()
+    """Get all verified users (prefer iter_verified_users for large rosters)"""
     try:
-        res = client.table("verified_users").select("*").eq("status", "verified").execute()
-        data = _get_response_data(res)
-        return data or []
+        return list(iter_table("verified_users", "*", [("status", "eq.verified")]))
     except Exception as e:
         logger.exception("Supabase get_all_verified_users error: %s", e)
         return []
 
 
+def get_all_verified_telegram_ids() -> List[int]:
+    """Get telegram IDs of all verified users"""
+    try:
+        return list(iter_verified_telegram_ids())
+    except Exception as e:
+        logger.exception("Supabase get_all_verified_telegram_ids error: %s", e)
+        return []
+
+
 def add_match_request(telegram_id: int, username: str) -> str:
     """Add match request and return match_id"""
     logger.info(f"Adding match request for telegram_id: {telegram_id}, username: {username}")
@@ -507,17 +576,8 @@ def clear_all_match_requests() -> bool:
 
 
 def check_verified_user(telegram_id: int) -> Optional[Dict[str, Any]]:
-    """Check if user is verified by telegram_id"""
-    try:
-        client = get_supabase()
-        res = client.table("verified_users").select("*").eq("telegram_id", telegram_id).eq("status", "verified").execute()
-        data = _get_response_data(res)
-        if data and len(data) > 0:
-            return data[0] if data else None
-        return None
-    except Exception as e:
-        logger.exception("Supabase check_verified_user error: %s", e)
-        return None
+    """Check if user is verified by telegram_id (cached)"""
+    return find_verified_by_telegram(telegram_id)
 
 
 def get_student_questions(telegram_id: int) -> List[Dict[str, Any]]:
@@ -604,12 +664,9 @@ def get_faqs() -> List[Dict[str, Any]]:
 
 
 def get_answered_questions() -> List[Dict[str, Any]]:
-    """Get all answered questions"""
+    """Get all answered questions (prefer iter_answered_questions for large tables)"""
     try:
-        client = get_supabase()
-        res = client.table("questions").select("*").neq("answer", None).execute()
-        data = _get_response_data(res)
-        return data or []
+        return list(iter_answered_questions("*"))
     except Exception as e:
         logger.exception("Supabase get_answered_questions error: %s", e)
         return []
@@ -656,43 +713,6 @@ def get_answered_questions() -> List[Dict[str, Any]]:
         raise
 
 
-    client = get_supabase()
-    
-    # Get all verified users
-    users_res = client.table("verified_users").select("*").eq("status", "verified")
-    try:
-        users = _get_response_data(users_res) or []
-    except Exception as e:
-        logger.exception("Supabase get_top_students error: %s", e)
-        return []
-    
-    top_students = []
-    for user in users:
-        telegram_id = user.get("telegram_id")
-        if not telegram_id:
-            continue
-        
-        # Count assignments
-        assignments_res = client.table("assignments").select("id", count="exact").eq("telegram_id", telegram_id).execute()
-        assignment_count = assignments_res.count or 0
-        
-        # Count wins
-        wins_res = client.table("wins").select("id", count="exact").eq("telegram_id", telegram_id).execute()
-        wins_count = wins_res.count or 0
-        
-        if assignment_count >= 3 and wins_count >= 3:
-            top_students.append({
-                "telegram_id": telegram_id,
-                "username": user.get("username", "unknown"),
-                "name": user.get("name", "Unknown"),
-                "assignments": assignment_count,
-                "wins": wins_count,
-                "joined_at": user.get("created_at", "Unknown")
-            })
-    
-    return top_students
-
-
     client = get_supabase()
     try:
         res = client.table("verified_users").select("telegram_id").eq("status", "verified").execute()
@@ -792,18 +812,6 @@ def add_tip(text: str, created_by: int = None) -> Dict[str, Any]:
         raise
 
 
-def get_all_tips() -> List[Dict[str, Any]]:
-    """Get all tips"""
-    client = get_supabase()
-    try:
-        res = client.table("tips").select("*").order("created_at", desc=True).execute()
-        data = _get_response_data(res)
-        return data or []
-    except Exception as e:
-        logger.exception("Supabase get_all_tips error: %s", e)
-        return []
-
-
 def get_random_tip() -> Optional[Dict[str, Any]]:
     """Get a random tip"""
     client = get_supabase()
@@ -811,7 +819,6 @@ def get_random_tip() -> Optional[Dict[str, Any]]:
         res = client.table("tips").select("*").execute()
         data = _get_response_data(res)
         if data:
-            import random
             return random.choice(data)
         return None
     except Exception as e:
@@ -820,18 +827,11 @@ def get_random_tip() -> Optional[Dict[str, Any]]:
 
 
 def update_tip_sent_count(tip_id: int) -> bool:
-    """Update tip sent count"""
+    """Atomically increment a tip's sent count"""
     client = get_supabase()
     try:
-        # First get current count
-        res = client.table("tips").select("sent_count").eq("id", tip_id).execute()
-        data = _get_response_data(res)
-        if data:
-            current_count = data[0].get("sent_count", 0)
-            new_count = current_count + 1
-            update_res = client.table("tips").update({"sent_count": new_count}).eq("id", tip_id).execute()
-            return bool(_get_response_data(update_res))
-        return False
+        res = client.rpc("increment_tip_sent_counts", {"p_deltas": {str(tip_id): 1}}).execute()
+        return bool(_get_response_data(res))
     except Exception as e:
         logger.exception("Supabase update_tip_sent_count error: %s", e)
         return False
@@ -875,9 +875,55 @@ def get_student_submissions_by_module(username: str, module: str) -> List[Dict[s
 
 
 # Statistics Functions
+# Count queries used when the get_bot_statistics SQL function is not installed
+_BOT_STATISTICS_COUNTS = {
+    "total_users": ("verified_users", None),
+    "verified_users": ("verified_users", [("status", "eq.verified")]),
+    "removed_users": ("verified_users", [("status", "eq.removed")]),
+    "pending_verifications": ("pending_verifications", None),
+    "total_submissions": ("assignments", None),
+    "graded_submissions": ("assignments", [("status", "eq.graded")]),
+    "pending_submissions": ("assignments", [("status", "eq.submitted")]),
+    "total_wins": ("wins", None),
+    "total_questions": ("questions", None),
+    "answered_questions": ("questions", [("status", "eq.answered")]),
+}
+
+
+async def get_bot_statistics_async() -> Dict[str, Any]:
+    """Get bot statistics in one RPC round trip, or concurrent counts if the SQL function is missing"""
+    client = get_async_postgrest()
+    try:
+        stats = await client.rpc("get_bot_statistics")
+        if isinstance(stats, dict):
+            return {key: int(value or 0) for key, value in stats.items()}
+    except PostgrestError as e:
+        logger.debug("get_bot_statistics RPC unavailable, using concurrent counts: %s", e)
+    except Exception as e:
+        logger.warning("get_bot_statistics RPC failed, using concurrent counts: %s", e)
+
+    try:
+        keys = list(_BOT_STATISTICS_COUNTS)
+        counts = await asyncio.gather(*(
+            client.count(table, filters) for table, filters in _BOT_STATISTICS_COUNTS.values()
+        ))
+        return dict(zip(keys, counts))
+    except Exception as e:
+        logger.exception("Supabase get_bot_statistics_async error: %s", e)
+        return {}
+
+
 def get_bot_statistics() -> Dict[str, Any]:
     """Get comprehensive bot statistics"""
     client = get_supabase()
+    try:
+        res = client.rpc("get_bot_statistics").execute()
+        data = _get_response_data(res)
+        if isinstance(data, dict):
+            return {key: int(value or 0) for key, value in data.items()}
+    except Exception as e:
+        logger.debug("get_bot_statistics RPC unavailable, using count queries: %s", e)
+
     try:
         stats = {}
         
@@ -916,35 +962,23 @@ def get_bot_statistics() -> Dict[str, Any]:
 
 
 def get_top_students_by_submissions(limit: int = 5) -> List[Dict[str, Any]]:
-    """Get top students by submission count"""
+    """Get top students by submission count (one grouped query, no per-user counts)"""
     client = get_supabase()
     try:
-        # Get all verified users with their submission counts
-        users_res = client.table("verified_users").select("*").eq("status", "verified").execute()
-        users = _get_response_data(users_res) or []
-        
-        top_students = []
-        for user in users:
-            telegram_id = user.get("telegram_id")
-            if not telegram_id:
-                continue
-            
-            # Count submissions
-            submissions_res = client.table("assignments").select("id", count="exact").eq("telegram_id", telegram_id).execute()
-            submission_count = submissions_res.count or 0
-            
-            if submission_count > 0:
-                top_students.append({
-                    "name": user.get("name", "Unknown"),
-                    "username": user.get("username", "unknown"),
-                    "telegram_id": telegram_id,
-                    "submissions": submission_count,
-                    "email": user.get("email", "N/A")
-                })
-        
-        # Sort by submission count and return top N
-        top_students.sort(key=lambda x: x["submissions"], reverse=True)
-        return top_students[:limit]
+        res = client.rpc("get_leaderboard", {"limit_count": limit, "min_submissions": 1, "min_wins": 0}).execute()
+        rows = _get_response_data(res)
+        if isinstance(rows, list):
+            return [leaderboard_row(row, row.get("submissions"), row.get("wins")) for row in rows]
+    except Exception as e:
+        logger.debug("get_leaderboard RPC unavailable, scanning tables: %s", e)
+
+    try:
+        users = list(iter_verified_users(USER_COLUMNS))
+        assignment_rows = list(iter_table("assignments", ACTIVITY_COLUMNS))
+        win_rows = list(iter_table("wins", ACTIVITY_COLUMNS))
+        submissions = Counter(row["telegram_id"] for row in assignment_rows)
+        wins = Counter(row["telegram_id"] for row in win_rows)
+        return rank_students(users, submissions, wins, limit, usernames=usernames_from(assignment_rows, win_rows))
     except Exception as e:
         logger.exception("Supabase get_top_students_by_submissions error: %s", e)
         return []
@@ -958,6 +992,377 @@ def get_top_students_by_submissions(limit: int = 5) -> List[Dict[str, Any]]:
 
 
 
+# Async API - same queries as above over the shared pooled PostgREST client,
+# for use from handlers without blocking the event loop
+async def _bulk_insert(table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return await get_async_postgrest().insert(table, rows)
+
+
+# Fire-and-forget inserts (questions) are buffered and written as bulk
+# inserts every WRITE_BEHIND_FLUSH_MS or WRITE_BEHIND_BATCH_SIZE rows,
+# whichever comes first
+insert_buffer = WriteBehindBuffer(
+    _bulk_insert,
+    flush_interval=int(os.getenv("WRITE_BEHIND_FLUSH_MS", "250")) / 1000.0,
+    batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100")),
+    max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", "5000")),
+    dead_letter_path=os.getenv(
+        "WRITE_BEHIND_DEAD_LETTER",
+        os.path.join(os.getenv("STABLE_BACKUP_DIR", "./data/csv_backup"), "write_behind_dead_letter.jsonl")
+    ),
+    name="insert_buffer"
+)
+
+
+async def add_question_async(telegram_id: int, username: str, question_text: str, file_id: Optional[str] = None,
+                             file_name: Optional[str] = None, answer: Optional[str] = None,
+                             status: str = "pending") -> asyncio.Future:
+    """
+    Queue a new question for a bulk insert.
+
+    Returns:
+        Future resolving to the inserted row; await it only if the id is needed
+    """
+    payload = {
+        "telegram_id": telegram_id,
+        "username": username,
+        "question_text": question_text,
+        "file_id": file_id,
+        "file_name": file_name,
+        "status": status,
+        "asked_at": datetime.now(timezone.utc).isoformat()
+    }
+
+    # Only add answer if provided (for auto-answered questions)
+    if answer:
+        payload["answer"] = answer
+        payload["answered_at"] = datetime.now(timezone.utc).isoformat()
+
+    return await insert_buffer.submit("questions", payload)
+
+
+async def find_verified_by_telegram_async(telegram_id: int) -> Optional[Dict[str, Any]]:
+    """Find verified user by telegram ID"""
+    found, user = _cached_verified_user(telegram_id)
+    if found:
+        return user
+    epoch = verified_user_cache.epoch
+    try:
+        data = await get_async_postgrest().select(
+            "verified_users",
+            filters=[("telegram_id", f"eq.{telegram_id}"), ("status", "eq.verified")],
+            limit=1
+        )
+        user = data[0] if data else None
+        verified_user_cache.set(telegram_id, user, epoch=epoch)
+        return dict(user) if user else None
+    except Exception as e:
+        logger.exception("Supabase find_verified_by_telegram_async error: %s", e)
+        return None
+
+
+async def check_verified_user_async(telegram_id: int) -> Optional[Dict[str, Any]]:
+    """Check if user is verified by telegram_id (cached)"""
+    return await find_verified_by_telegram_async(telegram_id)
+
+
+async def find_pending_by_email_or_phone_async(email: Optional[str] = None, phone: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Search pending_verifications by email or phone"""
+    try:
+        client = get_async_postgrest()
+        results = []
+        if email:
+            results.extend(await client.select("pending_verifications", filters=[("email", f"eq.{email}")]))
+        if phone:
+            results.extend(await client.select("pending_verifications", filters=[("phone", f"eq.{phone}")]))
+        return results
+    except Exception as e:
+        logger.exception("Supabase find_pending_by_email_or_phone_async error: %s", e)
+        return []
+
+
+async def get_all_verified_telegram_ids_async() -> List[int]:
+    """Get telegram IDs of all verified users"""
+    try:
+        return [telegram_id async for telegram_id in iter_verified_telegram_ids_async()]
+    except Exception as e:
+        logger.exception("Supabase get_all_verified_telegram_ids_async error: %s", e)
+        return []
+
+
+async def add_match_request_async(telegram_id: int, username: str) -> str:
+    """Add match request and return match_id"""
+    match_id = str(uuid.uuid4())
+    payload = {
+        "match_id": match_id,
+        "telegram_id": telegram_id,
+        "username": username,
+        "status": "pending",
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    try:
+        # Inserted directly, not through insert_buffer: the request must exist
+        # before anyone can claim it and the matcher is waiting on it
+        await get_async_postgrest().insert("match_requests", payload)
+        logger.info(f"Successfully added match request with ID: {match_id}")
+        return match_id
+    except Exception as e:
+        # If username column doesn't exist, try without it
+        if "username" in str(e) and "column" in str(e).lower():
+            logger.warning("Username column not found in match_requests, inserting without username field")
+            payload.pop("username")
+            await get_async_postgrest().insert("match_requests", payload)
+            return match_id
+        logger.exception("Supabase add_match_request_async error: %s", e)
+        raise
+
+
+async def claim_match_request_async(match_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Atomically mark one pending match request as matched.
+
+    The update only applies while the row is still pending, so of two
+    concurrent claims exactly one gets the row back.
+
+    Returns:
+        The claimed row, or None if it was already claimed or expired
+    """
+    data = await get_async_postgrest().update(
+        "match_requests", {"status": "matched"},
+        [("match_id", f"eq.{match_id}"), ("status", "eq.pending")]
+    )
+    return data[0] if data else None
+
+
+async def pop_match_request_async(exclude_id: int) -> Optional[Dict[str, Any]]:
+    """Atomically claim the oldest pending match request not made by exclude_id"""
+    client = get_async_postgrest()
+    try:
+        try:
+            data = await client.rpc("claim_match_request", {"p_telegram_id": exclude_id})
+            if data:
+                logger.info(f"Claimed match request {data[0].get('match_id')}")
+                return data[0]
+            return None
+        except PostgrestError as e:
+            if e.status_code != 404:
+                raise
+            logger.info("claim_match_request RPC unavailable, claiming with conditional updates")
+
+        candidates = await client.select(
+            "match_requests",
+            filters=[("telegram_id", f"neq.{exclude_id}"), ("status", "eq.pending")],
+            order="created_at.asc",
+            limit=5
+        )
+        for candidate in candidates:
+            claimed = await claim_match_request_async(candidate["match_id"])
+            if claimed:
+                logger.info(f"Marked match request {candidate['match_id']} as matched")
+                return claimed
+        logger.info(f"No pending match requests found excluding user {exclude_id}")
+        return None
+    except Exception as e:
+        logger.exception("Supabase pop_match_request_async error: %s", e)
+        return None
+
+
+async def get_pending_match_requests_async(since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Get pending match requests (created after since, if given), oldest first"""
+    filters = [("status", "eq.pending")]
+    if since is not None:
+        filters.append(("created_at", f"gte.{since.isoformat()}"))
+    try:
+        return await get_async_postgrest().select(
+            "match_requests", columns="match_id,telegram_id,username,created_at",
+            filters=filters, order="created_at.asc"
+        )
+    except Exception as e:
+        logger.exception("Supabase get_pending_match_requests_async error: %s", e)
+        return []
+
+
+async def expire_match_requests_async(match_ids: List[str]) -> List[Dict[str, Any]]:
+    """Mark still-pending match requests as expired and return the rows that were"""
+    if not match_ids:
+        return []
+    try:
+        return await get_async_postgrest().update(
+            "match_requests", {"status": "expired"},
+            [("match_id", f"in.({','.join(match_ids)})"), ("status", "eq.pending")]
+        )
+    except Exception as e:
+        logger.exception("Supabase expire_match_requests_async error: %s", e)
+        return []
+
+
+async def create_broadcast_job_async(admin_id: int, admin_chat_id: int, message_type: str, content: str,
+                                     file_id: Optional[str], total_count: int) -> Dict[str, Any]:
+    """Insert a running broadcast job (not buffered: the job needs its id to checkpoint)"""
+    try:
+        now = datetime.now(timezone.utc).isoformat()
+        payload = {
+            "admin_id": admin_id,
+            "admin_chat_id": admin_chat_id,
+            "message_type": message_type,
+            "content": content,
+            "file_id": file_id,
+            "recipients_count": 0,
+            "failures_count": 0,
+            "total_count": total_count,
+            "status": "running",
+            "sent_at": now,
+            "updated_at": now
+        }
+        data = await get_async_postgrest().insert("broadcast_history", payload)
+        return data[0] if data else None
+    except Exception as e:
+        logger.exception("Supabase create_broadcast_job_async error: %s", e)
+        raise
+
+
+async def update_broadcast_history_async(broadcast_id: str, values: Dict[str, Any]) -> bool:
+    """Update a broadcast's checkpoint, counts or status"""
+    try:
+        values = dict(values, updated_at=datetime.now(timezone.utc).isoformat())
+        data = await get_async_postgrest().update("broadcast_history", values, [("id", f"eq.{broadcast_id}")])
+        return bool(data)
+    except Exception as e:
+        logger.exception("Supabase update_broadcast_history_async error: %s", e)
+        return False
+
+
+async def get_running_broadcasts_async() -> List[Dict[str, Any]]:
+    """Get broadcasts that were still sending when the bot last stopped"""
+    try:
+        return await get_async_postgrest().select(
+            "broadcast_history", filters=[("status", "eq.running")], order="sent_at.asc"
+        )
+    except Exception as e:
+        logger.exception("Supabase get_running_broadcasts_async error: %s", e)
+        return []
+
+
+async def get_recipient_health_async() -> List[Dict[str, Any]]:
+    """Get every recipient marked unreachable"""
+    return [row async for row in get_async_postgrest().iter_rows(
+        "recipient_health", page_size=STREAM_PAGE_SIZE, key_column="telegram_id"
+    )]
+
+
+async def save_recipient_health_async(rows: List[Dict[str, Any]]) -> int:
+    """Insert or update unreachable-recipient rows"""
+    if not rows:
+        return 0
+    return len(await get_async_postgrest().upsert("recipient_health", rows, on_conflict="telegram_id"))
+
+
+async def delete_recipient_health_async(telegram_ids: List[int]) -> int:
+    """Forget recipients that are reachable again"""
+    if not telegram_ids:
+        return 0
+    ids = ",".join(str(telegram_id) for telegram_id in telegram_ids)
+    return len(await get_async_postgrest().delete("recipient_health", [("telegram_id", f"in.({ids})")]))
+
+
+async def get_random_tip_async() -> Optional[Dict[str, Any]]:
+    """Get a random tip by counting tips and fetching the one at a random offset"""
+    try:
+        total = await count_tips_async()
+        if not total:
+            return None
+        data = await get_async_postgrest().select(
+            "tips", columns=TIP_COLUMNS, order="id.asc", limit=1, offset=random.randrange(total)
+        )
+        return data[0] if data else None
+    except Exception as e:
+        logger.exception("Supabase get_random_tip_async error: %s", e)
+        return None
+
+
+async def get_recent_tips_async(limit: int = 10, columns: str = TIP_COLUMNS) -> List[Dict[str, Any]]:
+    """Get the newest tips"""
+    try:
+        return await get_async_postgrest().select("tips", columns=columns, order="created_at.desc", limit=limit)
+    except Exception as e:
+        logger.exception("Supabase get_recent_tips_async error: %s", e)
+        return []
+
+
+async def count_tips_async() -> int:
+    """Count tips without fetching them"""
+    try:
+        return await get_async_postgrest().count("tips")
+    except Exception as e:
+        logger.exception("Supabase count_tips_async error: %s", e)
+        return 0
+
+
+async def increment_tip_sent_counts_async(deltas: Dict[Any, int]) -> int:
+    """
+    Add batched deltas to tips.sent_count in one atomic request.
+
+    Args:
+        deltas: {tip_id: delta}
+
+    Returns:
+        Number of tips updated
+    """
+    client = get_async_postgrest()
+    payload = {str(tip_id): delta for tip_id, delta in deltas.items()}
+    try:
+        return await client.rpc("increment_tip_sent_counts", {"p_deltas": payload}) or 0
+    except PostgrestError as e:
+        if e.status_code != 404:
+            raise
+    # SQL function not installed: read-modify-write per tip (not atomic)
+    logger.warning("increment_tip_sent_counts RPC unavailable, updating tips one by one")
+    updated = 0
+    unwritten: Dict[Any, int] = {}
+    for tip_id, delta in deltas.items():
+        try:
+            data = await client.select("tips", columns="sent_count", filters=[("id", f"eq.{tip_id}")])
+            if data:
+                new_count = (data[0].get("sent_count") or 0) + delta
+                updated += len(await client.update("tips", {"sent_count": new_count}, [("id", f"eq.{tip_id}")]))
+        except Exception as e:
+            logger.warning(f"Failed to update sent_count for tip {tip_id}: {e}")
+            unwritten[tip_id] = delta
+    if unwritten:
+        raise PartialFlushError(unwritten)
+    return updated
+
+
+async def update_tip_sent_count_async(tip_id: int) -> bool:
+    """Atomically increment a tip's sent count"""
+    try:
+        return bool(await increment_tip_sent_counts_async({tip_id: 1}))
+    except Exception as e:
+        logger.exception("Supabase update_tip_sent_count_async error: %s", e)
+        return False
+
+
+async def get_faqs_async() -> List[Dict[str, Any]]:
+    """Get all FAQs"""
+    try:
+        return await get_async_postgrest().select("faqs")
+    except Exception as e:
+        logger.exception("Supabase get_faqs_async error: %s", e)
+        return []
+
+
+async def get_all_students_async(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Get verified students, newest first (all of them unless limit is given)"""
+    try:
+        return await get_async_postgrest().select(
+            "verified_users", columns=STUDENT_COLUMNS, filters=[("status", "eq.verified")],
+            order="created_at.desc", limit=limit
+        )
+    except Exception as e:
+        logger.exception("Supabase get_all_students_async error: %s", e)
+        return []
+
+
 def update_assignment_grade(submission_id: int, grade: int, comment: Optional[str] = None) -> bool:
     client = get_supabase()
     try:
@@ -0,0 +1,149 @@
+"""
+Bulkhead - Per-backend thread pools with bounded queues and timeouts
+
+All blocking calls used to share one 4-thread executor, so a few slow
+Sheets reads could starve Supabase and Systeme calls. Each backend now gets
+its own pool: its own number of threads, a limit on calls waiting for a
+thread (beyond which callers get BulkheadFull immediately instead of
+queueing forever), a per-call timeout, and a histogram of how long calls
+waited for a thread. A slow backend then only degrades the features that
+use it.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Queue wait histogram bucket upper bounds, in milliseconds
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class BulkheadFull(Exception):
+    """Raised when a backend's pool already has max_queue calls waiting."""
+
+    def __init__(self, name: str, waiting: int):
+        super().__init__(f"{name} bulkhead full ({waiting} calls waiting)")
+        self.name = name
+        self.waiting = waiting
+
+
+class Bulkhead:
+    """
+    Thread pool for one backend's blocking calls.
+
+    run() awaits the call's result; a call still waiting for a thread counts
+    against max_queue, and one that does not finish within timeout raises
+    asyncio.TimeoutError (the thread itself keeps running to completion).
+    """
+
+    def __init__(self, name: str, max_workers: int = 4, max_queue: int = 50, timeout: Optional[float] = 30.0):
+        """
+        Initialize the bulkhead.
+
+        Args:
+            name: Backend name (used for thread names, errors and stats)
+            max_workers: Threads in the pool
+            max_queue: Most calls allowed to wait for a thread
+            timeout: Default seconds a caller waits for a result (None for no limit)
+        """
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-io")
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+
+        self.calls = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.max_waiting = 0
+        self.wait_total_ms = 0.0
+        self.wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def _record_wait(self, waited_ms: float) -> None:
+        bucket = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if waited_ms <= bound), len(WAIT_BUCKETS_MS))
+        self.wait_histogram[bucket] += 1
+        self.wait_total_ms += waited_ms
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking call in this pool with the default timeout."""
+        return await self.run_with_timeout(self.timeout, func, *args, **kwargs)
+
+    async def run_with_timeout(self, timeout: Optional[float], func: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking call in this pool.
+
+        Args:
+            timeout: Seconds to wait for the result (None for no limit)
+            func: Blocking function
+            *args, **kwargs: Passed to func
+
+        Returns:
+            func's result
+
+        Raises:
+            BulkheadFull: max_queue calls are already waiting for a thread
+            asyncio.TimeoutError: The call did not finish within timeout
+        """
+        with self._lock:
+            if self._waiting >= self.max_queue and self._running >= self.max_workers:
+                self.rejected += 1
+                raise BulkheadFull(self.name, self._waiting)
+            self._waiting += 1
+            self.max_waiting = max(self.max_waiting, self._waiting)
+            self.calls += 1
+        submitted = time.monotonic()
+
+        def call():
+            with self._lock:
+                self._waiting -= 1
+                self._running += 1
+                self._record_wait((time.monotonic() - submitted) * 1000)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, call)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            # Nobody awaits the abandoned call any more; retrieve its outcome so errors are not reported as unhandled
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            logger.warning(f"{self.name} call {getattr(func, '__name__', 'call')} timed out after {timeout}s")
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pool's threads."""
+        self._executor.shutdown(wait=wait)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool usage, rejections, timeouts and the queue wait histogram."""
+        labels = [f"<={bound}ms" for bound in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+        started = sum(self.wait_histogram)
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "timeout": self.timeout,
+            "running": self._running,
+            "waiting": self._waiting,
+            "max_waiting": self.max_waiting,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_wait_ms": round(self.wait_total_ms / started, 2) if started else 0.0,
+            "wait_histogram": dict(zip(labels, self.wait_histogram))
+        }
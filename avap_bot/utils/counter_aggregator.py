@@ -0,0 +1,120 @@
+"""
+CounterAggregator - Batch counter increments in memory and flush them together
+
+Hot paths call add() instead of writing to the database; deltas for the
+same key are summed and written by flush() in a single batched request,
+typically from a periodic job. A failed flush keeps its deltas for the
+next attempt, so increments are delayed rather than lost.
+"""
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PartialFlushError(Exception):
+    """Raised by a flush callable that wrote only some deltas; carries the rest."""
+
+    def __init__(self, unwritten: Dict[Hashable, int], message: str = ""):
+        super().__init__(message or f"{len(unwritten)} counters not written")
+        self.unwritten = unwritten
+
+
+class CounterAggregator:
+    """
+    Sums counter deltas per key until the next flush.
+
+    The flush callable receives {key: delta} and must apply all deltas
+    atomically (or raise so they are retried). A callable that can only
+    write some of them raises PartialFlushError with the unwritten deltas,
+    so keys already written are not counted twice.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[Dict[Hashable, int]], Awaitable[Any]],
+        name: str = "counters",
+        max_pending_keys: int = 1000
+    ):
+        """
+        Initialize the aggregator.
+
+        Args:
+            flush: Coroutine function writing a batch of deltas
+            name: Name used in log messages
+            max_pending_keys: Flush early once this many keys are pending
+        """
+        self._flush = flush
+        self.name = name
+        self.max_pending_keys = max_pending_keys
+        self._pending: Counter = Counter()
+        self._lock = asyncio.Lock()
+        self._early_flush: Optional[asyncio.Task] = None
+
+        self.added = 0
+        self.flushes = 0
+        self.failures = 0
+        self.flushed_keys = 0
+
+    def add(self, key: Hashable, delta: int = 1) -> None:
+        """
+        Add a delta to a counter.
+
+        Args:
+            key: Counter key (e.g. a row id)
+            delta: Amount to add
+        """
+        if key is None or not delta:
+            return
+        self._pending[key] += delta
+        self.added += delta
+        if len(self._pending) >= self.max_pending_keys and (self._early_flush is None or self._early_flush.done()):
+            try:
+                self._early_flush = asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                pass  # No running loop; the periodic flush will pick it up
+
+    async def flush(self) -> int:
+        """
+        Write all pending deltas in one batch.
+
+        Returns:
+            Number of keys written (0 if nothing was pending or the write failed)
+        """
+        async with self._lock:
+            if not self._pending:
+                return 0
+            deltas, self._pending = self._pending, Counter()
+            try:
+                await self._flush(dict(deltas))
+            except PartialFlushError as e:
+                # Only re-queue what was not written
+                self._pending.update(e.unwritten)
+                self.failures += 1
+                written = len(deltas) - len(e.unwritten)
+                self.flushed_keys += written
+                logger.error("%s flush partly failed, %d keys kept: %s", self.name, len(e.unwritten), e)
+                return written
+            except Exception as e:
+                # Keep the deltas (plus anything added meanwhile) for the next flush
+                self._pending.update(deltas)
+                self.failures += 1
+                logger.exception("%s flush failed, %d keys kept: %s", self.name, len(deltas), e)
+                return 0
+            self.flushes += 1
+            self.flushed_keys += len(deltas)
+            logger.debug(f"{self.name}: flushed {len(deltas)} counters")
+            return len(deltas)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pending and flush counters."""
+        return {
+            "pending_keys": len(self._pending),
+            "pending_total": sum(self._pending.values()),
+            "added": self.added,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "flushed_keys": self.flushed_keys
+        }
@@ -0,0 +1,148 @@
+"""
+FallbackReconciler - Replays rows written to the fallback store back into Sheets
+
+While Google Sheets is unavailable, writes land in the FallbackStore and
+used to stay there. The reconciler pages through each fallback dataset in
+insertion order and hands the rows to a bulk writer (append_rows, or a
+coalesced batch_update), skipping rows whose key is already in the sheet
+or was already replayed. After each batch it saves a per-dataset cursor in
+the store itself, so a restart resumes where replay stopped instead of
+starting over or writing rows twice.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from avap_bot.utils.fallback_store import FallbackStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReplayTarget:
+    """How one fallback dataset is written back."""
+    dataset: str
+    write: Callable[[List[Dict[str, Any]]], None]
+    key: Optional[Callable[[Dict[str, Any]], str]] = None
+    exists: Optional[Callable[[str], bool]] = None
+
+
+class FallbackReconciler:
+    """
+    Streams unsynced fallback rows to their destination in large batches.
+
+    run_once() is blocking (call it through run_blocking) and does nothing
+    while is_available() is false. Targets are replayed in order, and a
+    failing target stops the run so later ones (e.g. answers to questions
+    that were not replayed yet) wait for the next run.
+    """
+
+    def __init__(
+        self,
+        store: FallbackStore,
+        targets: List[ReplayTarget],
+        is_available: Callable[[], bool],
+        batch_size: int = 500,
+        cursor_prefix: str = "replay"
+    ):
+        """
+        Initialize the reconciler.
+
+        Args:
+            store: Fallback store holding the rows and the cursors
+            targets: Datasets to replay, in order
+            is_available: Returns True when the destination can be written
+            batch_size: Rows read and written per batch
+            cursor_prefix: Prefix of the cursor names saved in the store
+        """
+        self.store = store
+        self.targets = list(targets)
+        self.is_available = is_available
+        self.batch_size = max(1, batch_size)
+        self.cursor_prefix = cursor_prefix
+        self._run_lock = threading.Lock()
+
+        self.runs = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_run: Optional[float] = None
+        self.replayed: Dict[str, int] = {target.dataset: 0 for target in self.targets}
+        self.duplicates: Dict[str, int] = {target.dataset: 0 for target in self.targets}
+
+    def _cursor(self, target: ReplayTarget) -> str:
+        return f"{self.cursor_prefix}:{target.dataset}"
+
+    def _replay(self, target: ReplayTarget) -> int:
+        """Replay one dataset from its cursor to the end."""
+        position = self.store.get_cursor(self._cursor(target))
+        seen = set()
+        replayed = 0
+        while True:
+            page = self.store.rows_after(target.dataset, position, self.batch_size)
+            if not page:
+                return replayed
+            records = []
+            for _, record in page:
+                key = target.key(record) if target.key else None
+                if key:
+                    if key in seen or (target.exists and target.exists(key)):
+                        self.duplicates[target.dataset] += 1
+                        continue
+                    seen.add(key)
+                records.append(record)
+            if records:
+                target.write(records)
+            position = page[-1][0]
+            self.store.set_cursor(self._cursor(target), position)
+            replayed += len(records)
+            self.replayed[target.dataset] += len(records)
+            logger.info(f"Replayed {len(records)} {target.dataset} rows from fallback store "
+                        f"({len(page) - len(records)} duplicates skipped)")
+
+    def run_once(self) -> int:
+        """
+        Replay every target's unsynced rows.
+
+        Returns:
+            Number of rows written
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return 0  # A run is already in progress
+        try:
+            if not any(self.store.count(t.dataset, self.store.get_cursor(self._cursor(t))) for t in self.targets):
+                return 0
+            if not self.is_available():
+                return 0
+            self.runs += 1
+            self.last_run = time.time()
+            total = 0
+            for target in self.targets:
+                try:
+                    total += self._replay(target)
+                except Exception as e:
+                    self.failures += 1
+                    self.last_error = f"{target.dataset}: {e}"
+                    logger.warning(f"Fallback replay of {target.dataset} stopped, will resume from its cursor: {e}")
+                    break
+            return total
+        finally:
+            self._run_lock.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get replay counters and rows still waiting per dataset."""
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_run": self.last_run,
+            "datasets": {
+                target.dataset: {
+                    "replayed": self.replayed[target.dataset],
+                    "duplicates_skipped": self.duplicates[target.dataset],
+                    "pending": self.store.count(target.dataset, self.store.get_cursor(self._cursor(target)))
+                }
+                for target in self.targets
+            }
+        }
@@ -0,0 +1,335 @@
+"""
+FallbackStore - Indexed SQLite store for data kept locally when Sheets is down
+
+Replaces the CSV fallback files: every lookup used to re-read and re-parse
+a whole CSV, and every write reopened the file. Rows are now kept in one
+SQLite database (WAL mode), grouped by dataset (the old CSV name without
+.csv), with indexes on username, telegram_id and submission_id. Existing
+CSV backups are imported once; any dataset can be exported back to CSV.
+"""
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEXED_COLUMNS = ("username", "telegram_id", "submission_id")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    name TEXT PRIMARY KEY,
+    headers TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rows (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dataset TEXT NOT NULL,
+    username TEXT,
+    telegram_id TEXT,
+    submission_id TEXT,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rows_dataset ON rows (dataset, id);
+CREATE INDEX IF NOT EXISTS idx_rows_username ON rows (dataset, username);
+CREATE INDEX IF NOT EXISTS idx_rows_telegram_id ON rows (dataset, telegram_id);
+CREATE INDEX IF NOT EXISTS idx_rows_submission_id ON rows (dataset, submission_id);
+CREATE TABLE IF NOT EXISTS cursors (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS csv_imports (
+    path TEXT PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    imported_at REAL NOT NULL
+);
+"""
+
+
+def _index_value(value: Any) -> Optional[str]:
+    """Normalize an indexed value so 123, 123.0 and "123" match."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return text or None
+
+
+class FallbackStore:
+    """
+    Append-mostly row store keyed by dataset, safe to use from several threads.
+
+    Rows are dicts; the first append (or import) of a dataset records its
+    column order, which is used for CSV export.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the store (the database is opened on first use).
+
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._headers: Dict[str, List[str]] = {}
+
+        self.appends = 0
+        self.lookups = 0
+        self.lookup_seconds = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the database and create the schema on first use (lock held)."""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._headers = {name: json.loads(headers) for name, headers in conn.execute("SELECT name, headers FROM datasets")}
+            self._conn = conn
+            logger.info(f"Fallback store opened: {self.path}")
+        return self._conn
+
+    def _ensure_dataset(self, conn: sqlite3.Connection, dataset: str, headers: Iterable[str]) -> None:
+        if dataset not in self._headers:
+            self._headers[dataset] = list(headers)
+            conn.execute("INSERT OR IGNORE INTO datasets (name, headers) VALUES (?, ?)",
+                         (dataset, json.dumps(self._headers[dataset])))
+
+    def _insert(self, conn: sqlite3.Connection, dataset: str, records: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        conn.executemany(
+            "INSERT INTO rows (dataset, username, telegram_id, submission_id, data, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (dataset, *(_index_value(record.get(column)) for column in INDEXED_COLUMNS),
+                 json.dumps(record), now)
+                for record in records
+            ]
+        )
+
+    def append(self, dataset: str, headers: List[str], row: List[Any]) -> None:
+        """
+        Add one row.
+
+        Args:
+            dataset: Dataset name (e.g. "submissions")
+            headers: Column names for the row's values
+            row: Values in header order (stored as text, as in the CSV files)
+        """
+        record = {header: "" if value is None else str(value) for header, value in zip(headers, row)}
+        with self._lock:
+            conn = self._connection()
+            self._ensure_dataset(conn, dataset, headers)
+            self._insert(conn, dataset, [record])
+            self.appends += 1
+
+    def _select(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        start = time.perf_counter()
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+            self.lookups += 1
+            self.lookup_seconds += time.perf_counter() - start
+        return [json.loads(data) for (data,) in rows]
+
+    def find(self, dataset: str, **equals: Any) -> List[Dict[str, Any]]:
+        """
+        Get rows whose indexed column matches any of the given values.
+
+        Args:
+            dataset: Dataset name
+            **equals: Indexed column -> value; empty values are ignored
+
+        Returns:
+            Matching rows in insertion order
+        """
+        queries, params = [], []
+        for column, value in equals.items():
+            if column not in INDEXED_COLUMNS:
+                raise ValueError(f"{column} is not an indexed column")
+            value = _index_value(value)
+            if value is not None:
+                queries.append(f"SELECT id, data FROM rows WHERE dataset = ? AND {column} = ?")
+                params.extend([dataset, value])
+        if not queries:
+            return []
+        # One indexed query per column, unioned; OR across columns would scan the dataset
+        return self._select(f"SELECT data FROM ({' UNION '.join(queries)}) ORDER BY id", tuple(params))
+
+    def all(self, dataset: str) -> List[Dict[str, Any]]:
+        """Get every row of a dataset in insertion order."""
+        return self._select("SELECT data FROM rows WHERE dataset = ? ORDER BY id", (dataset,))
+
+    def count(self, dataset: str, after: int = 0) -> int:
+        """Number of rows in a dataset (with an id above `after`)."""
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM rows WHERE dataset = ? AND id > ?", (dataset, after)
+            ).fetchone()[0]
+
+    def rows_after(self, dataset: str, after: int, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Page through a dataset in insertion order.
+
+        Args:
+            dataset: Dataset name
+            after: Row id to start after (0 for the beginning)
+            limit: Most rows to return
+
+        Returns:
+            (row id, row) pairs
+        """
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT id, data FROM rows WHERE dataset = ? AND id > ? ORDER BY id LIMIT ?", (dataset, after, limit)
+            ).fetchall()
+        return [(row_id, json.loads(data)) for row_id, data in rows]
+
+    def get_cursor(self, name: str) -> int:
+        """Saved position of a named cursor (0 if never set)."""
+        with self._lock:
+            row = self._connection().execute("SELECT position FROM cursors WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def set_cursor(self, name: str, position: int) -> None:
+        """Durably save a named cursor's position."""
+        with self._lock:
+            self._connection().execute(
+                "INSERT INTO cursors (name, position) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET position = excluded.position",
+                (name, position)
+            )
+
+    def import_csv(self, path: str, dataset: Optional[str] = None, force: bool = False) -> int:
+        """
+        Import a CSV backup file (once per file unless forced).
+
+        Args:
+            path: CSV file with a header row
+            dataset: Dataset name (default: file name without .csv)
+            force: Import again even if this file was imported before
+
+        Returns:
+            Number of rows imported
+        """
+        dataset = dataset or os.path.splitext(os.path.basename(path))[0]
+        key = os.path.abspath(path)
+        with self._lock:
+            conn = self._connection()
+            if not force and conn.execute("SELECT 1 FROM csv_imports WHERE path = ?", (key,)).fetchone():
+                return 0
+            with open(path, "r", newline="", encoding="utf-8") as f:
+                reader = csv.DictReader(f)
+                records = list(reader)
+                headers = reader.fieldnames or []
+            conn.execute("BEGIN")
+            try:
+                self._ensure_dataset(conn, dataset, headers)
+                self._insert(conn, dataset, records)
+                conn.execute("INSERT OR REPLACE INTO csv_imports (path, dataset, rows, imported_at) VALUES (?, ?, ?, ?)",
+                             (key, dataset, len(records), time.time()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                self._headers.pop(dataset, None)
+                raise
+        logger.info(f"Imported {len(records)} rows from {path} into fallback dataset {dataset}")
+        return len(records)
+
+    def import_csv_dir(self, directory: str) -> int:
+        """
+        Import every *.csv in a directory that has not been imported yet.
+
+        Returns:
+            Number of rows imported
+        """
+        if not os.path.isdir(directory):
+            return 0
+        imported = 0
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".csv"):
+                try:
+                    imported += self.import_csv(os.path.join(directory, name))
+                except Exception as e:
+                    logger.warning(f"Could not import {name} into fallback store: {e}")
+        return imported
+
+    def export_csv(self, dataset: str, path: str) -> int:
+        """
+        Write a dataset to a CSV file (for tools that expect the old backups).
+
+        Returns:
+            Number of rows written
+        """
+        rows = self.all(dataset)
+        headers = list(self._headers.get(dataset, []))
+        for row in rows:
+            headers.extend(column for column in row if column not in headers)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=headers, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def headers(self, dataset: str) -> List[str]:
+        """Column order recorded for a dataset (empty if unknown)."""
+        with self._lock:
+            self._connection()
+            return list(self._headers.get(dataset, []))
+
+    def datasets(self) -> List[str]:
+        """Names of every dataset in the store."""
+        with self._lock:
+            self._connection()
+            return sorted(self._headers)
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get row counts and lookup timings."""
+        stats: Dict[str, Any] = {
+            "path": self.path,
+            "open": self._conn is not None,
+            "appends": self.appends,
+            "lookups": self.lookups,
+            "avg_lookup_ms": round(self.lookup_seconds / self.lookups * 1000, 3) if self.lookups else 0.0
+        }
+        if self._conn is not None:
+            with self._lock:
+                stats["rows"] = dict(self._conn.execute("SELECT dataset, COUNT(*) FROM rows GROUP BY dataset").fetchall())
+        return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import CSV backups into, or export them from, the fallback store")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("database", help="SQLite database file")
+    parser.add_argument("directory", help="CSV directory to import from or export to")
+    args = parser.parse_args()
+
+    store = FallbackStore(args.database)
+    if args.command == "import":
+        print(f"Imported {store.import_csv_dir(args.directory)} rows")
+    else:
+        for name in store.datasets():
+            count = store.export_csv(name, os.path.join(args.directory, f"{name}.csv"))
+            print(f"{name}.csv: {count} rows")
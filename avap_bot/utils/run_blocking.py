@@ -1,31 +1,76 @@
 """
 Helper for running blocking operations in thread pool
+
+Each backend (Sheets, Supabase, Systeme) has its own bulkhead pool so a
+slow backend cannot take the threads the others need. run_blocking picks
+the pool from the module the function lives in; run_on names it directly.
 """
 import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Callable, Awaitable
+import os
+from typing import Any, Callable, Awaitable, Dict
+
+from avap_bot.utils.bulkhead import Bulkhead, BulkheadFull
 
 logger = logging.getLogger(__name__)
 
-# Thread pool executor for blocking operations
-_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="blocking")
 
+def _bulkhead(name: str, workers: int, queue: int, timeout: float) -> Bulkhead:
+    """Create a backend pool, sized from BULKHEAD_<NAME>_WORKERS / _QUEUE / _TIMEOUT"""
+    prefix = f"BULKHEAD_{name.upper()}"
+    return Bulkhead(
+        name,
+        max_workers=int(os.getenv(f"{prefix}_WORKERS", str(workers))),
+        max_queue=int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+        timeout=float(os.getenv(f"{prefix}_TIMEOUT", str(timeout)))
+    )
 
-async def run_blocking(func: Callable, *args, **kwargs) -> Any:
-    """Run blocking function in thread pool executor"""
+
+bulkheads: Dict[str, Bulkhead] = {
+    "sheets": _bulkhead("sheets", workers=4, queue=40, timeout=60),
+    "supabase": _bulkhead("supabase", workers=8, queue=100, timeout=20),
+    "systeme": _bulkhead("systeme", workers=2, queue=20, timeout=30),
+    "default": _bulkhead("default", workers=4, queue=50, timeout=60),
+    # Fallback replay can run for minutes after a Sheets outage; its own
+    # thread keeps it from holding one of the Sheets pool's workers
+    "replay": Bulkhead("replay", max_workers=1, max_queue=1, timeout=None)
+}
+
+# Module -> backend pool for run_blocking
+BACKEND_MODULES = {
+    "avap_bot.services.sheets_service": "sheets",
+    "avap_bot.services.supabase_service": "supabase",
+    "avap_bot.services.systeme_service": "systeme"
+}
+
+
+def backend_for(func: Callable) -> str:
+    """Name of the pool a function's calls run in"""
+    return BACKEND_MODULES.get(getattr(func, "__module__", None), "default")
+
+
+async def run_on(backend: str, func: Callable, *args, **kwargs) -> Any:
+    """Run blocking function in the named backend's pool"""
     try:
-        loop = asyncio.get_event_loop()
-        # Create a wrapper function that handles both args and kwargs properly
-        def wrapper():
-            return func(*args, **kwargs)
-        result = await loop.run_in_executor(_executor, wrapper)
-        return result
+        return await bulkheads[backend].run(func, *args, **kwargs)
+    except BulkheadFull as e:
+        logger.warning("Blocking operation %s rejected: %s", getattr(func, "__name__", "call"), e)
+        raise
     except Exception as e:
         logger.exception("Blocking operation failed: %s", e)
         raise
 
 
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run blocking function in its backend's thread pool"""
+    return await run_on(backend_for(func), func, *args, **kwargs)
+
+
+def get_bulkhead_stats() -> Dict[str, Any]:
+    """Get stats for every backend pool"""
+    return {name: bulkhead.get_stats() for name, bulkhead in bulkheads.items()}
+
+
 def run_async_in_thread(coro: Awaitable) -> Any:
     """Run async coroutine in a separate thread (for sync contexts)"""
     try:
@@ -41,8 +86,7 @@ def run_async_in_thread(coro: Awaitable) -> Any:
 
 
 def shutdown_executor():
-    """Shutdown thread pool executor"""
-    global _executor
-    if _executor:
-        _executor.shutdown(wait=True)
-        logger.info("Thread pool executor shutdown complete")
+    """Shutdown every backend thread pool"""
+    for bulkhead in bulkheads.values():
+        bulkhead.shutdown(wait=True)
+    logger.info("Thread pool executor shutdown complete")
@@ -0,0 +1,244 @@
+"""
+SheetAppendQueue - Coalesce worksheet appends into batched append_rows calls
+
+Appending one event used to cost a worksheet lookup, a header read and an
+append_row request. Bursts ran into Google's per-minute quota, returned
+429s and fell back to CSV. Rows are now queued per worksheet and written
+by a background thread with one append_rows request per flush_interval.
+The worksheet handle and its header check are cached. A batch that keeps
+failing is handed to an on_failed callback (the CSV fallback) so rows are
+not lost.
+
+Callers run in the run_blocking thread pool, so this uses threads rather
+than asyncio.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from avap_bot.utils.sheet_snapshot import _column_letter
+
+logger = logging.getLogger(__name__)
+
+
+class SheetAppendQueue:
+    """
+    Queue of rows for one worksheet, flushed with append_rows.
+
+    open_worksheet is called once (and again after a failure) and may
+    create the worksheet; the header row is checked the first time the
+    worksheet is used and written if the sheet is empty.
+    """
+
+    def __init__(
+        self,
+        title: str,
+        open_worksheet: Callable[[], Any],
+        header: List[str],
+        flush_interval: float = 1.0,
+        max_batch: int = 200,
+        max_retries: int = 3,
+        on_flushed: Optional[Callable[[Any, List[List[Any]]], None]] = None,
+        on_failed: Optional[Callable[[List[List[Any]], Exception], None]] = None
+    ):
+        """
+        Initialize the queue.
+
+        Args:
+            title: Worksheet title (used in logs and stats)
+            open_worksheet: Returns the gspread worksheet to append to
+            header: Expected header row
+            flush_interval: Seconds between flushes
+            max_batch: Rows per append_rows request
+            max_retries: Consecutive failed flushes before a batch is handed to on_failed
+            on_flushed: Called with (worksheet, rows) after rows are written
+            on_failed: Called with (rows, error) for rows that could not be written
+        """
+        self.title = title
+        self._open_worksheet = open_worksheet
+        self.header = list(header)
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, max_batch)
+        self.max_retries = max(1, max_retries)
+        self._on_flushed = on_flushed
+        self._on_failed = on_failed
+
+        self._pending: Deque[List[Any]] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._worksheet = None
+        self.sheet_header: Optional[List[str]] = None
+        self._consecutive_failures = 0
+
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.failed_rows = 0
+        self.max_batch_seen = 0
+        self.recent_batches: Deque[Dict[str, Any]] = deque(maxlen=20)
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=f"sheet-append-{self.title}", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, row: List[Any]) -> None:
+        """
+        Queue a row for the next flush.
+
+        Args:
+            row: Cell values in column order
+        """
+        with self._lock:
+            self._pending.append(row)
+            self.enqueued += 1
+            full = len(self._pending) >= self.max_batch
+        self._ensure_started()
+        if full:
+            self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception("Sheet append queue %s flush error: %s", self.title, e)
+
+    def _ensure_header(self, worksheet) -> None:
+        """Read (and if missing, write) the header row once per worksheet handle."""
+        if self.sheet_header is not None:
+            return
+        header = worksheet.row_values(1)
+        if not header or header[0] == "":
+            worksheet.update(range_name=f"A1:{_column_letter(len(self.header))}1", values=[self.header])
+            logger.info(f"Added headers to {worksheet.title} worksheet")
+            header = list(self.header)
+        self.sheet_header = header
+
+    def flush(self) -> int:
+        """
+        Write every queued row now.
+
+        Returns:
+            Number of rows written
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+                if not batch:
+                    return written
+                start = time.monotonic()
+                try:
+                    if self._worksheet is None:
+                        self._worksheet = self._open_worksheet()
+                        self.sheet_header = None
+                    self._ensure_header(self._worksheet)
+                    self._worksheet.append_rows(batch)
+                except Exception as e:
+                    self._handle_failure(batch, e)
+                    return written
+
+                self._consecutive_failures = 0
+                written += len(batch)
+                self.written += len(batch)
+                self.flushes += 1
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+                self.recent_batches.append({"rows": len(batch), "ms": round((time.monotonic() - start) * 1000, 1)})
+                logger.info(f"Appended {len(batch)} rows to {self._worksheet.title} worksheet")
+                if self._on_flushed:
+                    try:
+                        self._on_flushed(self._worksheet, batch)
+                    except Exception as e:
+                        logger.warning(f"Sheet append queue {self.title}: on_flushed failed: {e}")
+
+    def write_now(self, rows: List[List[Any]]) -> None:
+        """
+        Append rows in one request, bypassing the queue (used to replay fallback rows).
+
+        Args:
+            rows: Rows in column order
+
+        Raises:
+            Exception: The append error; nothing is requeued or handed to on_failed
+        """
+        with self._flush_lock:
+            try:
+                if self._worksheet is None:
+                    self._worksheet = self._open_worksheet()
+                    self.sheet_header = None
+                self._ensure_header(self._worksheet)
+                self._worksheet.append_rows(rows)
+            except Exception:
+                self._worksheet = None
+                raise
+            self.written += len(rows)
+            self.flushes += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(rows))
+            logger.info(f"Appended {len(rows)} replayed rows to {self._worksheet.title} worksheet")
+            if self._on_flushed:
+                try:
+                    self._on_flushed(self._worksheet, rows)
+                except Exception as e:
+                    logger.warning(f"Sheet append queue {self.title}: on_flushed failed: {e}")
+
+    def _handle_failure(self, batch: List[List[Any]], error: Exception) -> None:
+        """Requeue a failed batch, or give up on it after max_retries consecutive failures."""
+        self.failures += 1
+        self._consecutive_failures += 1
+        # The worksheet may have been deleted or renamed; look it up again next time
+        self._worksheet = None
+        if self._consecutive_failures < self.max_retries and not self._stopping:
+            logger.warning(f"Sheet append queue {self.title}: flush of {len(batch)} rows failed "
+                           f"(attempt {self._consecutive_failures}), will retry: {error}")
+            with self._lock:
+                self._pending.extendleft(reversed(batch))
+            return
+        logger.warning(f"Sheet append queue {self.title}: giving up on {len(batch)} rows: {error}")
+        self._consecutive_failures = 0
+        self.failed_rows += len(batch)
+        if self._on_failed:
+            try:
+                self._on_failed(batch, error)
+            except Exception as e:
+                logger.exception("Sheet append queue %s on_failed error: %s", self.title, e)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop the flush thread and write everything still queued.
+
+        Args:
+            timeout: Seconds to wait for the flush thread
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, batch sizes and failure counters."""
+        return {
+            "worksheet": self.title,
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "flushes": self.flushes,
+            "avg_batch_size": round(self.written / self.flushes, 2) if self.flushes else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "recent_batches": list(self.recent_batches),
+            "failures": self.failures,
+            "failed_rows": self.failed_rows,
+            "header_cached": self.sheet_header is not None
+        }
@@ -0,0 +1,372 @@
+"""
+WorksheetSnapshot - Cached, indexed copy of a worksheet for per-student reads
+
+Readers look rows up through hash indexes (e.g. by username or
+submission_id) instead of downloading and scanning the whole sheet. The
+snapshot refreshes on a TTL by fetching only the rows appended since the
+last read, with a periodic full reload to pick up edits made directly in
+the sheet. Writes made by this process are patched in locally so readers
+see them before the next refresh.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _numericise(value: str) -> Any:
+    """Convert numeric cell text to int/float, as gspread's get_all_records does."""
+    if value == "":
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return value if number != number or number in (float("inf"), float("-inf")) else number
+
+
+def _column_letter(column: int) -> str:
+    """Convert a 1-based column number to its A1 letter (1 -> A, 27 -> AA)."""
+    letters = ""
+    while column > 0:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _key_part(value: Any) -> str:
+    """Normalize a key value so 3, 3.0 and "3" index the same way."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+class WorksheetSnapshot:
+    """
+    In-memory copy of one worksheet with hash indexes over chosen columns.
+
+    Indexes are declared as {name: (column, ...)}; a record is indexed
+    under the tuple of its (normalized) values, or the single value for
+    one-column indexes, and skipped if any of them is empty. Safe to use
+    from the run_blocking thread pool.
+    """
+
+    def __init__(
+        self,
+        title: str,
+        open_worksheet: Callable[[], Any],
+        indexes: Dict[str, Sequence[str]],
+        ttl: float = 30.0,
+        full_refresh_interval: float = 600.0,
+        numericise: bool = True
+    ):
+        """
+        Initialize the snapshot.
+
+        Args:
+            title: Worksheet title (used in logs and stats)
+            open_worksheet: Returns the gspread worksheet; raises if unavailable
+            indexes: Index name -> columns making up its key
+            ttl: Seconds before new rows are fetched again
+            full_refresh_interval: Seconds between full reloads
+            numericise: Convert numeric cells like get_all_records (False keeps text, like get_all_values)
+        """
+        self.title = title
+        self._open_worksheet = open_worksheet
+        self._index_columns = {name: tuple(columns) for name, columns in indexes.items()}
+        self.ttl = ttl
+        self.full_refresh_interval = full_refresh_interval
+        self.numericise = numericise
+
+        self._header: List[str] = []
+        self._records: List[Dict[str, Any]] = []
+        self._indexes: Dict[str, Dict[Hashable, List[int]]] = {name: {} for name in self._index_columns}
+        # Patch times of rows we appended ourselves; they sit at the end of _records
+        self._local: List[float] = []
+        self._generation = 0
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+        self.hits = 0
+        self.full_loads = 0
+        self.incremental_loads = 0
+        self.rows_fetched = 0
+        self.patches = 0
+
+    def _key(self, index: str, values: Iterable[Any]) -> Optional[Hashable]:
+        parts = tuple(_key_part(v) for v in values)
+        if not parts or any(part == "" for part in parts):
+            return None
+        return parts[0] if len(self._index_columns[index]) == 1 else parts
+
+    def _cell(self, value: Any) -> Any:
+        text = "" if value is None else str(value)
+        return _numericise(text) if self.numericise else text
+
+    def _parse(self, row: List[Any]) -> Dict[str, Any]:
+        values = [self._cell(v) for v in row]
+        values += [""] * (len(self._header) - len(values))
+        return dict(zip(self._header, values))
+
+    def _rebuild(self) -> None:
+        """Rebuild every index from _records (lock held)."""
+        self._indexes = {name: {} for name in self._index_columns}
+        for position, record in enumerate(self._records):
+            self._index(record, position)
+
+    def _index(self, record: Dict[str, Any], position: int) -> None:
+        for name, columns in self._index_columns.items():
+            key = self._key(name, (record.get(column, "") for column in columns))
+            if key is not None:
+                self._indexes[name].setdefault(key, []).append(position)
+
+    def _recent_local(self, started: float) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Locally appended rows a fetch that began at `started` may not include (lock held).
+
+        Anything patched earlier was already in the sheet when the fetch began.
+        """
+        records = self._records[len(self._records) - len(self._local):]
+        return [(patched_at, record) for patched_at, record in zip(self._local, records) if patched_at > started]
+
+    def _refresh(self) -> None:
+        """Fetch new rows, or everything if due for a full reload."""
+        now = time.monotonic()
+        full = not self._header or now - self._loaded_at >= self.full_refresh_interval
+        worksheet = self._open_worksheet()
+        started = time.time()
+
+        if full:
+            values = worksheet.get_all_values()
+            with self._lock:
+                local = self._recent_local(started)
+                self._header = list(values[0]) if values else []
+                self._records = [self._parse(row) for row in values[1:]]
+                self._records.extend(record for _, record in local)
+                self._local = [patched_at for patched_at, _ in local]
+                self._rebuild()
+                self._loaded_at = self._checked_at = now
+                self.full_loads += 1
+                self.rows_fetched += len(self._records)
+            logger.debug(f"Snapshot {self.title}: loaded {len(self._records)} rows")
+            return
+
+        with self._lock:
+            sheet_rows = len(self._records) - len(self._local)
+            generation = self._generation
+        # Rows appended since the last read, whoever appended them (+2: header row, one-based)
+        rows = worksheet.get_values(f"A{sheet_rows + 2}:{_column_letter(len(self._header))}")
+        with self._lock:
+            if generation != self._generation:
+                return  # Invalidated meanwhile; the next read reloads everything
+            local = self._recent_local(started)
+            self._records = self._records[:sheet_rows] + [self._parse(row) for row in rows]
+            self._records.extend(record for _, record in local)
+            self._local = [patched_at for patched_at, _ in local]
+            self._rebuild()
+            self._checked_at = now
+            self.incremental_loads += 1
+            self.rows_fetched += len(rows)
+        if rows:
+            logger.debug(f"Snapshot {self.title}: fetched {len(rows)} new rows")
+
+    def ensure_fresh(self) -> None:
+        """
+        Refresh the snapshot if it is older than the TTL.
+
+        Raises:
+            Exception: Whatever opening or reading the worksheet raised
+        """
+        if self._header and time.monotonic() - self._checked_at < self.ttl:
+            return
+        with self._refresh_lock:
+            # Another thread may have refreshed while we waited
+            if self._header and time.monotonic() - self._checked_at < self.ttl:
+                return
+            self._refresh()
+
+    def lookup(self, index: str, *values: Any) -> List[Dict[str, Any]]:
+        """
+        Get the records whose index key matches, in sheet order.
+
+        Args:
+            index: Index name
+            *values: Key values, one per indexed column
+
+        Returns:
+            Copies of the matching records
+        """
+        return self.lookup_any([(index, values)])
+
+    def lookup_any(self, keys: List[Tuple[str, Sequence[Any]]]) -> List[Dict[str, Any]]:
+        """
+        Get records matching any of several index keys, without duplicates.
+
+        Args:
+            keys: (index name, key values) pairs; pairs with an empty value are ignored
+
+        Returns:
+            Copies of the matching records, in sheet order
+        """
+        self.ensure_fresh()
+        with self._lock:
+            positions = set()
+            for index, values in keys:
+                key = self._key(index, values)
+                if key is not None:
+                    positions.update(self._indexes[index].get(key, ()))
+            self.hits += 1
+            return [dict(self._records[i]) for i in sorted(positions)]
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Get copies of every record, in sheet order."""
+        self.ensure_fresh()
+        with self._lock:
+            self.hits += 1
+            return [dict(record) for record in self._records]
+
+    def patch_append(self, row: List[Any]) -> None:
+        """
+        Add a row this process just appended to the sheet.
+
+        Ignored until the snapshot has been loaded (the first load will
+        include the row anyway).
+
+        Args:
+            row: Cell values in column order, as passed to append_row
+        """
+        with self._lock:
+            if not self._header:
+                return
+            record = self._parse(row)
+            self._records.append(record)
+            self._index(record, len(self._records) - 1)
+            self._local.append(time.time())
+            self.patches += 1
+
+    def patch_update(
+        self,
+        index: str,
+        key: Sequence[Any],
+        fields: Dict[str, Any],
+        where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        pick: Optional[int] = None
+    ) -> int:
+        """
+        Apply an update this process just made to the sheet.
+
+        Args:
+            index: Index used to find the rows
+            key: Key values for that index
+            fields: Column -> new value
+            where: Extra condition the rows must meet
+            pick: Only update this one of the matching rows (0 first, -1 last)
+
+        Returns:
+            Number of records updated
+        """
+        with self._lock:
+            positions = self._positions(index, key, where, pick)
+            for position in positions:
+                self._update(position, fields)
+            return len(positions)
+
+    def patch_row(self, row_number: int, fields: Dict[str, Any]) -> None:
+        """
+        Apply an update this process just made to one sheet row.
+
+        Args:
+            row_number: Sheet row number, as returned by locate()
+            fields: Column -> new value
+        """
+        with self._lock:
+            if 0 <= row_number - 2 < len(self._records):
+                self._update(row_number - 2, fields)
+
+    def _positions(self, index: str, key: Sequence[Any], where, pick) -> List[int]:
+        """Positions of records matching an index key (lock held)."""
+        lookup_key = self._key(index, key)
+        if lookup_key is None:
+            return []
+        positions = [i for i in self._indexes[index].get(lookup_key, ())
+                     if where is None or where(self._records[i])]
+        if pick is not None and positions:
+            positions = [positions[pick]]
+        return positions
+
+    def _update(self, position: int, fields: Dict[str, Any]) -> None:
+        """Update one record, reindexing if a key column changed (lock held)."""
+        self._records[position].update({column: self._cell(value) for column, value in fields.items()})
+        if any(column in columns for columns in self._index_columns.values() for column in fields):
+            self._rebuild()
+        self.patches += 1
+
+    def locate(
+        self,
+        index: str,
+        key: Sequence[Any],
+        where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        pick: Optional[int] = None
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Find the sheet rows of matching records.
+
+        Row numbers assume no other writer has inserted or deleted rows
+        since the last refresh; callers that write by row number should
+        verify the row's key cells first.
+
+        Args:
+            index: Index name
+            key: Key values for that index
+            where: Extra condition the rows must meet
+            pick: Only return this one of the matching rows (0 first, -1 last)
+
+        Returns:
+            (sheet row number, record copy) pairs in sheet order
+        """
+        self.ensure_fresh()
+        with self._lock:
+            return [(position + 2, dict(self._records[position]))
+                    for position in self._positions(index, key, where, pick)]
+
+    @property
+    def header(self) -> List[str]:
+        """Header row of the last load (empty before the first load)."""
+        return list(self._header)
+
+    def index_columns(self, index: str) -> Tuple[str, ...]:
+        """Columns making up an index key."""
+        return self._index_columns[index]
+
+    def invalidate(self) -> None:
+        """Force a full reload on the next read."""
+        with self._lock:
+            self._header = []
+            self._records = []
+            self._local = []
+            self._indexes = {name: {} for name in self._index_columns}
+            self._generation += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get snapshot size and load counters."""
+        return {
+            "worksheet": self.title,
+            "rows": len(self._records),
+            "pending_local_rows": len(self._local),
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._header else None,
+            "hits": self.hits,
+            "full_loads": self.full_loads,
+            "incremental_loads": self.incremental_loads,
+            "rows_fetched": self.rows_fetched,
+            "patches": self.patches
+        }
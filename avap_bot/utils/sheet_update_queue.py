@@ -0,0 +1,279 @@
+"""
+SheetUpdateQueue - Coalesce cell updates into one batch_update per flush window
+
+Grading a submission used to download the whole worksheet to find the row
+and then write status, grade and comment with three update_cell requests.
+Updates are now addressed by an index key of a WorksheetSnapshot (e.g.
+submission_id or (username, module)) and resolved to row numbers from the
+snapshot. Everything submitted within one flush window, by any number of
+graders, is written with a single batch_update request.
+
+Because row numbers come from a cached copy, the key cells of the target
+rows are read back in one batch_get before writing. If they no longer
+match (rows inserted or deleted in the sheet), the snapshot is reloaded
+and the rows are located again.
+"""
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from avap_bot.utils.sheet_snapshot import WorksheetSnapshot, _column_letter, _key_part
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CellUpdate:
+    """Fields to write to the row(s) matching an index key"""
+    index: str
+    key: Sequence[Any]
+    fields: Dict[str, Any]
+    where: Optional[Callable[[Dict[str, Any]], bool]] = None
+    pick: Optional[int] = None
+    future: Future = field(default_factory=Future)
+
+
+class SheetUpdateQueue:
+    """
+    Queue of keyed row updates for one worksheet, flushed with batch_update.
+
+    The worksheet's columns are found by header name (case-insensitive),
+    so updates name fields rather than column numbers.
+    """
+
+    def __init__(
+        self,
+        snapshot: WorksheetSnapshot,
+        open_worksheet: Callable[[], Any],
+        flush_interval: float = 0.5,
+        verify: bool = True,
+        default_columns: Optional[Dict[str, int]] = None
+    ):
+        """
+        Initialize the queue.
+
+        Args:
+            snapshot: Snapshot of the worksheet, used to find rows
+            open_worksheet: Returns the gspread worksheet to write to
+            flush_interval: Seconds updates wait to be coalesced
+            verify: Read back target rows' key cells before writing
+            default_columns: Column numbers for fields missing from the header
+        """
+        self.snapshot = snapshot
+        self.title = snapshot.title
+        self._open_worksheet = open_worksheet
+        self.flush_interval = flush_interval
+        self.verify = verify
+        self.default_columns = {name.lower(): number for name, number in (default_columns or {}).items()}
+
+        self._pending: Deque[CellUpdate] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._worksheet = None
+
+        self.submitted = 0
+        self.flushes = 0
+        self.updates_flushed = 0
+        self.cells_written = 0
+        self.not_found = 0
+        self.relocations = 0
+        self.failures = 0
+        self.max_batch_seen = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=f"sheet-update-{self.title}", daemon=True)
+            self._thread.start()
+
+    def submit(
+        self,
+        index: str,
+        key: Sequence[Any],
+        fields: Dict[str, Any],
+        where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        pick: Optional[int] = None
+    ) -> Future:
+        """
+        Queue an update for the next flush.
+
+        Args:
+            index: Snapshot index used to find the rows
+            key: Key values for that index
+            fields: Column name -> new value
+            where: Extra condition the rows must meet
+            pick: Only update this one of the matching rows (0 first, -1 last)
+
+        Returns:
+            Future resolving to the number of rows updated (0 if none matched)
+        """
+        update = CellUpdate(index, tuple(key), dict(fields), where, pick)
+        with self._lock:
+            self._pending.append(update)
+            self.submitted += 1
+        self._ensure_started()
+        return update.future
+
+    def update(self, index: str, key: Sequence[Any], fields: Dict[str, Any],
+               where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+               pick: Optional[int] = None, timeout: float = 30.0) -> int:
+        """
+        Queue an update and wait for its flush (call from a worker thread).
+
+        Returns:
+            Number of rows updated
+
+        Raises:
+            Exception: Whatever the flush raised
+        """
+        return self.submit(index, key, fields, where, pick).result(timeout=self.flush_interval + timeout)
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception("Sheet update queue %s flush error: %s", self.title, e)
+
+    def _columns(self) -> Dict[str, int]:
+        """Lower-cased header name -> 1-based column number (first occurrence wins over defaults)."""
+        columns: Dict[str, int] = dict(self.default_columns)
+        seen = set()
+        for number, name in enumerate(self.snapshot.header, start=1):
+            if name.strip().lower() not in seen:
+                seen.add(name.strip().lower())
+                columns[name.strip().lower()] = number
+        return columns
+
+    def _resolve(self, batch: List[CellUpdate]) -> List[Tuple[CellUpdate, List[Tuple[int, Dict[str, Any]]]]]:
+        """
+        Locate each update's rows, applying earlier updates to the snapshot first.
+
+        Patching as we go means two updates in one window (e.g. two answers
+        for the same student) see each other and pick different rows.
+        """
+        resolved = []
+        for update in batch:
+            rows = self.snapshot.locate(update.index, update.key, update.where, update.pick)
+            for row_number, _ in rows:
+                self.snapshot.patch_row(row_number, update.fields)
+            resolved.append((update, rows))
+        return resolved
+
+    def _verify(self, worksheet, resolved) -> bool:
+        """Check that every target row still holds the key it was located by."""
+        columns = self._columns()
+        checks = []
+        for update, rows in resolved:
+            key_columns = self.snapshot.index_columns(update.index)
+            if any(column in update.fields for column in key_columns):
+                continue  # The update rewrites its own key; nothing stable to compare
+            for row_number, record in rows:
+                for column in key_columns:
+                    number = columns.get(column.lower())
+                    if number:
+                        checks.append((f"{_column_letter(number)}{row_number}", _key_part(record.get(column))))
+        if not checks:
+            return True
+        values = worksheet.batch_get([cell for cell, _ in checks])
+        for (cell, expected), value in zip(checks, values):
+            actual = value[0][0] if value and value[0] else ""
+            if _key_part(actual) != expected:
+                logger.warning(f"Sheet update queue {self.title}: row moved ({cell} is {actual!r}, "
+                               f"expected {expected!r}); reloading snapshot")
+                return False
+        return True
+
+    def flush(self) -> int:
+        """
+        Write every queued update with one batch_update request.
+
+        Returns:
+            Number of cells written
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+                self._pending.clear()
+            if not batch:
+                return 0
+            try:
+                if self._worksheet is None:
+                    self._worksheet = self._open_worksheet()
+                resolved = self._resolve(batch)
+                if self.verify and not self._verify(self._worksheet, resolved):
+                    self.relocations += 1
+                    self.snapshot.invalidate()
+                    resolved = self._resolve(batch)
+                    if not self._verify(self._worksheet, resolved):
+                        raise RuntimeError(f"rows in {self.title} keep moving; not writing")
+
+                columns = self._columns()
+                data = []
+                for update, rows in resolved:
+                    for row_number, _ in rows:
+                        for name, value in update.fields.items():
+                            number = columns.get(name.lower())
+                            if not number:
+                                raise KeyError(f"column {name!r} not found in {self.title} header")
+                            data.append({"range": f"{_column_letter(number)}{row_number}", "values": [[value]]})
+                if data:
+                    self._worksheet.batch_update(data, raw=False)  # USER_ENTERED, like update_cell
+            except Exception as e:
+                self.failures += 1
+                self._worksheet = None
+                # The snapshot was patched optimistically; reload it from the sheet
+                self.snapshot.invalidate()
+                logger.warning(f"Sheet update queue {self.title}: batch of {len(batch)} updates failed: {e}")
+                for update in batch:
+                    if not update.future.done():
+                        update.future.set_exception(e)
+                return 0
+
+            self.flushes += 1
+            self.updates_flushed += len(batch)
+            self.cells_written += len(data)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            for update, rows in resolved:
+                if not rows:
+                    self.not_found += 1
+                update.future.set_result(len(rows))
+            logger.info(f"Wrote {len(data)} cells for {len(batch)} updates to {self.title} worksheet")
+            return len(data)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop the flush thread and write everything still queued.
+
+        Args:
+            timeout: Seconds to wait for the flush thread
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and write counters."""
+        return {
+            "worksheet": self.title,
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "flushes": self.flushes,
+            "avg_updates_per_flush": round(self.updates_flushed / self.flushes, 2) if self.flushes else 0.0,
+            "max_updates_per_flush": self.max_batch_seen,
+            "cells_written": self.cells_written,
+            "not_found": self.not_found,
+            "relocations": self.relocations,
+            "failures": self.failures
+        }
@@ -0,0 +1,340 @@
+"""
+SheetsGateway - Quota-aware rate limiting and retries for Google Sheets calls
+
+Every Sheets API request takes a token from a read or write bucket sized
+to the project's per-minute quota. When callers have to wait, interactive
+work (a student's /status, a grader's write) is served before background
+work (batched appends). Requests that fail with 429 or 5xx are retried
+with exponential backoff, honouring Retry-After. A 429 also drains the
+bucket so other callers back off instead of piling onto the limit.
+Appends are only retried on 429: Google may have applied an append that
+answered 5xx or timed out, so those errors go to the caller's fallback
+path instead of writing the rows twice.
+
+GatedSpreadsheet and GatedWorksheet wrap gspread objects so existing code
+keeps calling spreadsheet.worksheet(...) and sheet.append_rows(...) while
+each request goes through the gateway.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP status of a gspread APIError (or anything carrying a response)."""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) or getattr(error, "code", None)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header, if the server sent one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("Retry-After")
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None  # HTTP-date form; fall back to our own backoff
+
+
+class RequestMeter:
+    """Counts requests over a sliding one-minute window (quota usage)."""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self._times: Deque[float] = deque()
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def record(self, count: int = 1) -> None:
+        """Record requests made just now."""
+        now = time.monotonic()
+        with self._lock:
+            self._times.extend([now] * count)
+            self.total += count
+            self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        while self._times and self._times[0] <= now - self.window:
+            self._times.popleft()
+
+    def last_minute(self) -> int:
+        """Requests made within the window."""
+        with self._lock:
+            self._trim(time.monotonic())
+            return len(self._times)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket where higher-priority waiters go first.
+
+    Lower priority numbers win: a caller only takes a token when nobody
+    of a higher priority is waiting for one.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        """
+        Initialize the bucket.
+
+        Args:
+            per_minute: Tokens added per minute (the quota)
+            burst: Most tokens that can be saved up (default: a quarter of the quota)
+        """
+        self.rate = max(per_minute, 1.0) / 60.0
+        self.capacity = max(1.0, burst if burst is not None else per_minute / 4)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiting: Dict[int, int] = {}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority: int = INTERACTIVE) -> float:
+        """
+        Take a token, waiting if necessary.
+
+        Returns:
+            Seconds spent waiting
+        """
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    self._refill()
+                    ahead = any(count for p, count in self._waiting.items() if p < priority)
+                    if self.tokens >= 1 and not ahead:
+                        self.tokens -= 1
+                        return time.monotonic() - start
+                    wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.05
+                    self._cond.wait(timeout=min(max(wait, 0.01), 1.0))
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def drain(self, seconds: float) -> None:
+        """Hold back new tokens for about `seconds` (after the server throttled us)."""
+        with self._cond:
+            self._refill()
+            self.tokens = min(self.tokens, -self.rate * seconds)
+
+    def waiting(self) -> int:
+        """Callers currently waiting for a token."""
+        with self._cond:
+            return sum(self._waiting.values())
+
+
+class SheetsGateway:
+    """
+    Runs Sheets API calls under read/write quotas with retries.
+
+    call() blocks the calling thread (the run_blocking pool or a queue's
+    flush thread) while waiting for a token or backing off.
+    """
+
+    def __init__(
+        self,
+        reads_per_minute: float = 60,
+        writes_per_minute: float = 60,
+        max_retries: int = 4,
+        base_backoff: float = 1.0,
+        max_backoff: float = 32.0
+    ):
+        """
+        Initialize the gateway.
+
+        Args:
+            reads_per_minute: Read request quota
+            writes_per_minute: Write request quota
+            max_retries: Retries after a 429/5xx before giving up
+            base_backoff: First retry delay in seconds (doubled each time, plus jitter)
+            max_backoff: Longest delay between retries
+        """
+        self.buckets = {"read": TokenBucket(reads_per_minute), "write": TokenBucket(writes_per_minute)}
+        self.meters = {"read": RequestMeter(), "write": RequestMeter()}
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.server_errors = 0
+        self.failures = 0
+        self.queued = {p: {"count": 0, "total_ms": 0.0, "max_ms": 0.0} for p in PRIORITY_NAMES}
+
+    def _record_wait(self, priority: int, waited: float) -> None:
+        ms = waited * 1000
+        with self._lock:
+            stats = self.queued[priority]
+            stats["count"] += 1
+            stats["total_ms"] += ms
+            stats["max_ms"] = max(stats["max_ms"], ms)
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return delay + random.uniform(0, delay / 2)
+
+    def call(self, kind: str, fn: Callable[..., Any], *args, priority: int = INTERACTIVE,
+             idempotent: bool = True, **kwargs) -> Any:
+        """
+        Run one Sheets API request under the quota, retrying 429s and 5xx.
+
+        Args:
+            kind: "read" or "write"
+            fn: gspread method making the request
+            priority: INTERACTIVE or BACKGROUND
+            idempotent: False for requests that add rows; only 429s are retried
+            *args, **kwargs: Passed to fn
+
+        Returns:
+            fn's result
+
+        Raises:
+            Exception: fn's error if it is not retryable or retries ran out
+        """
+        bucket = self.buckets[kind]
+        self._record_wait(priority, bucket.acquire(priority))
+        attempt = 0
+        while True:
+            self.meters[kind].record()
+            try:
+                result = fn(*args, **kwargs)
+                with self._lock:
+                    self.calls += 1
+                return result
+            except Exception as e:
+                status = _status_code(e)
+                if idempotent:
+                    retryable = status in RETRYABLE_STATUS or (status is None and isinstance(e, OSError))
+                else:
+                    # Rejected before anything was written; other errors may hide an applied append
+                    retryable = status == 429
+                if not retryable or attempt >= self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                with self._lock:
+                    self.retries += 1
+                    if status == 429:
+                        self.throttled += 1
+                    elif status:
+                        self.server_errors += 1
+                if status == 429:
+                    bucket.drain(delay)
+                logger.warning(f"Sheets {kind} {getattr(fn, '__name__', 'call')} failed "
+                               f"({status or type(e).__name__}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                attempt += 1
+                # The retry is another request against the quota
+                self._record_wait(priority, bucket.acquire(priority))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get call counters, throttling events, queued times and quota usage."""
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "server_errors": self.server_errors,
+            "failures": self.failures,
+            "queued": {
+                PRIORITY_NAMES[p]: {
+                    "count": s["count"],
+                    "avg_ms": round(s["total_ms"] / s["count"], 1) if s["count"] else 0.0,
+                    "max_ms": round(s["max_ms"], 1)
+                }
+                for p, s in self.queued.items()
+            },
+            **{
+                kind: {
+                    "requests_last_minute": self.meters[kind].last_minute(),
+                    "requests_total": self.meters[kind].total,
+                    "quota_per_minute": round(bucket.rate * 60),
+                    "tokens": round(bucket.tokens, 2),
+                    "waiting": bucket.waiting()
+                }
+                for kind, bucket in self.buckets.items()
+            }
+        }
+
+
+# gspread methods by the quota they count against
+READ_METHODS = {
+    "get_all_values", "get_all_records", "get_values", "get", "batch_get", "row_values", "col_values",
+    "find", "findall", "acell", "cell", "worksheets", "worksheet", "fetch_sheet_metadata"
+}
+WRITE_METHODS = {
+    "append_row", "append_rows", "update", "batch_update", "update_cell", "update_acell", "update_cells",
+    "insert_row", "insert_rows", "delete_rows", "clear", "resize", "add_worksheet", "del_worksheet"
+}
+# Writes that add rows, so repeating one after an ambiguous failure duplicates them
+APPEND_METHODS = {"append_row", "append_rows", "insert_row", "insert_rows"}
+
+
+class _Gated:
+    """Proxy routing a gspread object's API methods through a gateway."""
+
+    def __init__(self, target: Any, gateway: SheetsGateway, priority: int = INTERACTIVE):
+        self._target = target
+        self._gateway = gateway
+        self._priority = priority
+
+    @property
+    def unwrapped(self) -> Any:
+        """The underlying gspread object."""
+        return self._target
+
+    def with_priority(self, priority: int) -> "_Gated":
+        """The same object, with calls made at another priority."""
+        return type(self)(self._target, self._gateway, priority)
+
+    def _wrap_result(self, result: Any) -> Any:
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._target, name)
+        kind = "read" if name in READ_METHODS else "write" if name in WRITE_METHODS else None
+        if kind is None or not callable(attribute):
+            return attribute
+
+        def gated(*args, **kwargs):
+            args = tuple(a.unwrapped if isinstance(a, _Gated) else a for a in args)
+            result = self._gateway.call(kind, attribute, *args, priority=self._priority,
+                                        idempotent=name not in APPEND_METHODS, **kwargs)
+            return self._wrap_result(result)
+        gated.__name__ = name
+        return gated
+
+
+class GatedWorksheet(_Gated):
+    """gspread Worksheet whose requests go through a SheetsGateway."""
+
+
+class GatedSpreadsheet(_Gated):
+    """gspread Spreadsheet whose requests (and worksheets') go through a SheetsGateway."""
+
+    def _wrap_result(self, result: Any) -> Any:
+        # worksheet(), add_worksheet() and worksheets() hand back gated worksheets
+        if isinstance(result, list):
+            return [self._wrap_result(item) for item in result]
+        if hasattr(result, "append_rows") and not isinstance(result, _Gated):
+            return GatedWorksheet(result, self._gateway, self._priority)
+        return result
@@ -0,0 +1,163 @@
+"""
+TTLCache - Size-bounded LRU cache with per-entry expiry
+
+Entries expire after a TTL and the least recently used entry is evicted
+once the cache is full. "Negative" entries (a cached None, meaning the
+lookup found nothing) use a separate, usually much shorter, TTL so a
+not-yet-verified user is not locked out for long.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with TTL and negative caching.
+
+    get() returns a (found, value) pair so a cached None can be told apart
+    from a cache miss. Every invalidation bumps an epoch; a loader that read
+    the epoch before querying can pass it to set() so a result fetched
+    before a concurrent invalidation is not cached.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, negative_ttl: float = 30.0, name: str = "cache"):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries before LRU eviction
+            ttl: Seconds a positive entry stays valid
+            negative_ttl: Seconds a cached None stays valid (0 disables negative caching)
+            name: Name used in log messages
+        """
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def epoch(self) -> int:
+        """Invalidation counter, read before loading a value to cache."""
+        return self._epoch
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Look up a key.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            (True, value) on a hit (value may be None for a negative entry),
+            (False, None) on a miss or expired entry
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return False, None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            if value is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, epoch: Optional[int] = None) -> bool:
+        """
+        Store a value (None stores a negative entry).
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            ttl: Override the default TTL for this entry
+            epoch: Epoch read before loading the value; the value is discarded
+                if an invalidation happened since
+
+        Returns:
+            True if the value was stored
+        """
+        if ttl is None:
+            ttl = self.ttl if value is not None else self.negative_ttl
+        if ttl <= 0:
+            return False
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return False
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, key: Hashable) -> bool:
+        """
+        Remove a key from the cache.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            True if an entry was removed
+        """
+        with self._lock:
+            removed = self._data.pop(key, _MISSING) is not _MISSING
+            self._epoch += 1
+        self.invalidations += 1
+        if removed:
+            logger.debug(f"{self.name}: invalidated {key}")
+        return removed
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+            self._epoch += 1
+        self.invalidations += 1
+        logger.debug(f"{self.name}: cleared")
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get size and hit/miss counters."""
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "negative_ttl": self.negative_ttl,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "miss_ratio": round(self.misses / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
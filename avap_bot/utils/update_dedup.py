@@ -0,0 +1,150 @@
+"""
+UpdateDeduplicator - Replay protection for Telegram updates by update_id
+
+Telegram re-delivers an update when the previous delivery was not
+acknowledged in time. The deduplicator remembers the most recent update ids
+in a bounded ring buffer backed by a hash set, so a redelivered update is
+dropped before it is decoded or dispatched. The window can optionally be
+persisted to a JSON file so it survives restarts.
+"""
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDeduplicator:
+    """
+    Bounded window of recently seen update ids.
+
+    Lookups and inserts are O(1); the oldest id is evicted once the window
+    is full.
+    """
+
+    def __init__(self, window: int = 5000, persist_path: Optional[str] = None):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            window: Number of most recent update ids remembered
+            persist_path: Optional JSON file used to keep the window across restarts
+        """
+        self.window = max(1, window)
+        self.persist_path = persist_path
+        self._order: Deque[int] = deque()
+        self._seen: Set[int] = set()
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        self.hits = 0
+        self.misses = 0
+
+        if persist_path:
+            self.load()
+        logger.info(f"UpdateDeduplicator initialized: window={self.window}, persist_path={persist_path}")
+
+    def _remember(self, update_id: int) -> None:
+        """Add an id to the window, evicting the oldest one if needed."""
+        self._order.append(update_id)
+        self._seen.add(update_id)
+        while len(self._order) > self.window:
+            self._seen.discard(self._order.popleft())
+
+    def check_and_add(self, update_id: Optional[int]) -> bool:
+        """
+        Check whether an update is new and remember it.
+
+        Args:
+            update_id: Telegram update_id (None is always treated as new)
+
+        Returns:
+            True if the update has not been seen before, False for a duplicate
+        """
+        if update_id is None:
+            return True
+        with self._lock:
+            if update_id in self._seen:
+                self.hits += 1
+                return False
+            self._remember(update_id)
+            self.misses += 1
+            self._dirty = True
+            return True
+
+    def discard(self, update_id: int) -> None:
+        """
+        Forget an update id so its redelivery is accepted again.
+
+        Used when an update was seen but could not be queued.
+
+        Args:
+            update_id: Telegram update_id
+        """
+        with self._lock:
+            if update_id in self._seen:
+                self._seen.discard(update_id)
+                try:
+                    self._order.remove(update_id)
+                except ValueError:
+                    pass
+                self._dirty = True
+
+    def __contains__(self, update_id: int) -> bool:
+        return update_id in self._seen
+
+    def load(self) -> None:
+        """Load the persisted window, ignoring a missing or corrupt file."""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                ids = json.load(f).get("update_ids", [])
+            with self._lock:
+                for update_id in ids[-self.window:]:
+                    if update_id not in self._seen:
+                        self._remember(int(update_id))
+            logger.info(f"Loaded {len(self._order)} update id(s) from {self.persist_path}")
+        except Exception as e:
+            logger.warning(f"Failed to load update dedup window from {self.persist_path}: {e}")
+
+    def save(self) -> bool:
+        """
+        Persist the window atomically if it changed since the last save.
+
+        Returns:
+            True if the file was written
+        """
+        if not self.persist_path or not self._dirty:
+            return False
+        try:
+            with self._lock:
+                ids = list(self._order)
+                self._dirty = False
+            directory = os.path.dirname(self.persist_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.persist_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"update_ids": ids}, f)
+            os.replace(tmp_path, self.persist_path)
+            return True
+        except Exception as e:
+            self._dirty = True
+            logger.warning(f"Failed to save update dedup window to {self.persist_path}: {e}")
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get window size and duplicate hit counters."""
+        total = self.hits + self.misses
+        return {
+            "window": self.window,
+            "size": len(self._order),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "persistent": bool(self.persist_path)
+        }
@@ -0,0 +1,174 @@
+"""
+UpdateDispatcher - Per-user ordered, cross-user concurrent update processing
+
+Updates are sharded into lanes by user id (falling back to chat id). Each lane
+is drained by a single task so one user's updates are processed strictly in
+arrival order, keeping ConversationHandler state safe, while lanes belonging
+to different users run concurrently up to a global concurrency limit.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDispatcher:
+    """
+    Dispatch updates to a processor with per-key ordering and bounded concurrency.
+
+    dispatch() only appends the update to its lane and returns, so callers are
+    never blocked by slow handlers unless the number of pending updates exceeds
+    max_pending (backpressure).
+    """
+
+    def __init__(
+        self,
+        process: Callable[[Any], Awaitable[Any]],
+        max_concurrency: int = 8,
+        max_pending: int = 500
+    ):
+        """
+        Initialize the dispatcher.
+
+        Args:
+            process: Coroutine function called for every update
+            max_concurrency: Maximum number of updates processed at the same time
+            max_pending: Pending updates (queued + in flight) before dispatch() waits
+        """
+        self._process = process
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_pending = max(1, max_pending)
+        self._lanes: Dict[Hashable, Deque[Any]] = {}
+        self._drain_tasks: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._has_capacity: Optional[asyncio.Event] = None
+
+        self.pending = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.dispatched = 0
+        self.processed = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+        logger.info(f"UpdateDispatcher initialized: max_concurrency={self.max_concurrency}, max_pending={self.max_pending}")
+
+    @staticmethod
+    def shard_key(update: Any) -> Hashable:
+        """
+        Get the ordering key for an update.
+
+        Args:
+            update: telegram.Update (or any object with the same attributes)
+
+        Returns:
+            ("user", id), ("chat", id) or ("update", update_id) for unkeyed updates
+        """
+        user = getattr(update, "effective_user", None)
+        if user is not None:
+            return ("user", user.id)
+        chat = getattr(update, "effective_chat", None)
+        if chat is not None:
+            return ("chat", chat.id)
+        return ("update", getattr(update, "update_id", id(update)))
+
+    def _get_primitives(self):
+        """Create asyncio primitives lazily so they bind to the running loop."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._has_capacity = asyncio.Event()
+            self._has_capacity.set()
+        return self._semaphore, self._has_capacity
+
+    async def dispatch(self, update: Any) -> None:
+        """
+        Schedule an update for processing in its lane.
+
+        The update is appended to its lane before the first await, so the
+        arrival order per key is preserved even with several callers.
+
+        Args:
+            update: Decoded telegram.Update
+        """
+        _, has_capacity = self._get_primitives()
+        key = self.shard_key(update)
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = deque()
+            self._lanes[key] = lane
+            task = asyncio.create_task(self._drain(key, lane), name=f"update-lane-{key[0]}-{key[1]}")
+            self._drain_tasks.add(task)
+            task.add_done_callback(self._drain_tasks.discard)
+        lane.append(update)
+
+        self.dispatched += 1
+        self.pending += 1
+        if self.pending >= self.max_pending:
+            has_capacity.clear()
+            self.backpressure_waits += 1
+            await has_capacity.wait()
+
+    async def _drain(self, key: Hashable, lane: Deque[Any]) -> None:
+        """Process a lane's updates one at a time until it is empty."""
+        semaphore, has_capacity = self._get_primitives()
+        try:
+            while lane:
+                update = lane.popleft()
+                try:
+                    async with semaphore:
+                        self.in_flight += 1
+                        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                        try:
+                            await self._process(update)
+                            self.processed += 1
+                        finally:
+                            self.in_flight -= 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Failed to process update {getattr(update, 'update_id', '?')} for {key}: {e}", exc_info=True)
+                finally:
+                    self.pending -= 1
+                    if self.pending < self.max_pending:
+                        has_capacity.set()
+        finally:
+            # No await between the empty-lane check and removal, so a new
+            # update for this key always either lands in this lane or a new one
+            if self._lanes.get(key) is lane:
+                del self._lanes[key]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Wait for in-progress lanes to finish, cancelling them after a timeout.
+
+        Args:
+            timeout: Maximum seconds to wait for lanes to drain
+        """
+        tasks = list(self._drain_tasks)
+        if not tasks:
+            return
+        done, not_done = await asyncio.wait(tasks, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            logger.warning(f"UpdateDispatcher cancelled {len(not_done)} lane(s) on stop")
+            await asyncio.gather(*not_done, return_exceptions=True)
+        logger.info("UpdateDispatcher stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get lane, concurrency and throughput counters."""
+        return {
+            "active_lanes": len(self._lanes),
+            "pending": self.pending,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending,
+            "dispatched": self.dispatched,
+            "processed": self.processed,
+            "failed": self.failed,
+            "backpressure_waits": self.backpressure_waits
+        }
@@ -0,0 +1,179 @@
+"""
+UpdateQueue - Bounded ingestion queue for incoming Telegram updates
+
+The webhook route only validates and decodes an update, pushes it onto this
+queue and returns 200 immediately. A pool of consumer tasks drains the queue
+and runs the (possibly slow) handler pipeline, so Sheets/Supabase latency no
+longer holds the HTTP request open.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateQueue:
+    """
+    Bounded asyncio queue with a configurable pool of consumer tasks.
+
+    Tracks queue depth, time spent waiting in the queue and the number of
+    updates dropped because the queue was full.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[Any], Awaitable[Any]],
+        maxsize: int = 1000,
+        workers: int = 1,
+        wait_samples: int = 500
+    ):
+        """
+        Initialize the update queue.
+
+        Args:
+            process: Coroutine function called for every dequeued update
+            maxsize: Maximum number of updates waiting in the queue
+            workers: Number of consumer tasks draining the queue
+            wait_samples: Number of recent queue-wait samples kept for percentiles
+        """
+        self._process = process
+        self.maxsize = maxsize
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._wait_samples: Deque[float] = deque(maxlen=wait_samples)
+
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        logger.info(f"UpdateQueue initialized: maxsize={maxsize}, workers={self.workers}")
+
+    @property
+    def running(self) -> bool:
+        """True while consumer tasks are alive."""
+        return any(not task.done() for task in self._worker_tasks)
+
+    def _get_queue(self) -> asyncio.Queue:
+        """Create the underlying queue lazily so it binds to the running loop."""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        return self._queue
+
+    async def start(self) -> None:
+        """Start the consumer tasks."""
+        if self.running:
+            return
+        queue = self._get_queue()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(queue), name=f"update-consumer-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"UpdateQueue started {self.workers} consumer task(s)")
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """
+        Stop the consumer tasks, draining queued updates first.
+
+        Args:
+            drain_timeout: Maximum seconds to wait for the queue to empty
+        """
+        if self._queue is not None and self.running:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"UpdateQueue drain timed out with {self._queue.qsize()} update(s) left")
+
+        for task in self._worker_tasks:
+            task.cancel()
+        if self._worker_tasks:
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        logger.info("UpdateQueue stopped")
+
+    def enqueue(self, update: Any) -> bool:
+        """
+        Push an update onto the queue without waiting.
+
+        Args:
+            update: Decoded telegram.Update
+
+        Returns:
+            True if queued, False if the queue was full and the update was dropped
+        """
+        queue = self._get_queue()
+        try:
+            queue.put_nowait((update, time.monotonic()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"UpdateQueue full ({self.maxsize}) - dropped update {getattr(update, 'update_id', '?')}")
+            return False
+        self.enqueued += 1
+        return True
+
+    async def wait_for_room(self, initial_delay: float = 0.05, max_delay: float = 1.0) -> None:
+        """
+        Wait until the queue can take another update, backing off while it is full.
+
+        Args:
+            initial_delay: First sleep in seconds
+            max_delay: Longest sleep between checks
+        """
+        queue = self._get_queue()
+        delay = initial_delay
+        while queue.full():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        """Consumer loop: dequeue updates and hand them to the processor."""
+        while True:
+            update, enqueued_at = await queue.get()
+            try:
+                self._record_wait(time.monotonic() - enqueued_at)
+                await self._process(update)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to process update {getattr(update, 'update_id', '?')}: {e}", exc_info=True)
+            finally:
+                queue.task_done()
+
+    def _record_wait(self, wait: float) -> None:
+        """Record the time an update spent waiting in the queue."""
+        self._wait_samples.append(wait)
+        self._total_wait += wait
+        if wait > self._max_wait:
+            self._max_wait = wait
+
+    def _wait_percentile(self, pct: float) -> float:
+        """Return a percentile of the recent queue-wait samples in seconds."""
+        if not self._wait_samples:
+            return 0.0
+        ordered = sorted(self._wait_samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, throughput, wait time and drop counters."""
+        waited = self.processed + self.failed
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "running": self.running,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "avg_wait_ms": round(self._total_wait / waited * 1000, 2) if waited else 0.0,
+            "p95_wait_ms": round(self._wait_percentile(95) * 1000, 2),
+            "max_wait_ms": round(self._max_wait * 1000, 2)
+        }
@@ -0,0 +1,281 @@
+"""
+WriteBehindBuffer - Queue append-only rows and write them as bulk inserts
+
+Callers submit a row and get back a future for the inserted row; rows for
+the same table (and the same set of columns) are written together once
+batch_size rows are waiting or flush_interval has passed. Memory is
+bounded by max_pending: submit() waits for room when the buffer is full.
+Failed batches are retried with backoff; rows that still cannot be
+written are appended to a JSONL dead-letter file instead of being lost.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BatchKey = Tuple[str, FrozenSet[str]]
+
+
+class WriteBehindError(Exception):
+    """Raised on a row's future when it could not be written and was dead-lettered."""
+
+
+def _is_rejected(error: Optional[Exception]) -> bool:
+    """True for client errors (bad data) that a retry cannot fix."""
+    status = getattr(error, "status_code", None)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+class WriteBehindBuffer:
+    """
+    Per-table write-behind buffer with size/time-triggered bulk flushes.
+
+    The writer is called as writer(table, rows) and must return the
+    inserted rows in the same order (PostgREST return=representation).
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[str, List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]],
+        flush_interval: float = 0.25,
+        batch_size: int = 100,
+        max_pending: int = 5000,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        dead_letter_path: Optional[str] = None,
+        name: str = "write_behind"
+    ):
+        """
+        Initialize the buffer.
+
+        Args:
+            writer: Coroutine function inserting a list of rows into a table
+            flush_interval: Seconds a row may wait before being flushed
+            batch_size: Rows per insert; reaching it triggers an immediate flush
+            max_pending: Rows held in memory before submit() waits
+            max_retries: Attempts per batch before dead-lettering
+            retry_backoff: Initial delay between attempts (doubled each time)
+            dead_letter_path: JSONL file for rows that could not be written
+            name: Name used in log messages
+        """
+        self._writer = writer
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max(1, max_pending)
+        self.max_retries = max(1, max_retries)
+        self.retry_backoff = retry_backoff
+        self.dead_letter_path = dead_letter_path
+        self.name = name
+
+        self._queues: "OrderedDict[BatchKey, Deque[Tuple[Dict[str, Any], asyncio.Future]]]" = OrderedDict()
+        self._pending = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.dead_lettered = 0
+        self.last_flush_ms = 0.0
+
+    def _ensure_started(self) -> None:
+        """Create loop-bound primitives and the flush task on first use."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def start(self) -> None:
+        """Start the background flush task."""
+        self._ensure_started()
+        logger.info(f"{self.name}: started (batch_size={self.batch_size}, flush_interval={self.flush_interval}s)")
+
+    async def submit(self, table: str, row: Dict[str, Any]) -> asyncio.Future:
+        """
+        Queue a row for insertion.
+
+        Waits only if max_pending rows are already buffered.
+
+        Args:
+            table: Table name
+            row: Row to insert
+
+        Returns:
+            Future resolving to the inserted row (or raising WriteBehindError);
+            await it only when the inserted id is needed
+        """
+        self._ensure_started()
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        key = (table, frozenset(row))
+        self._queues.setdefault(key, deque()).append((row, future))
+        self._pending += 1
+        self.submitted += 1
+        if len(self._queues[key]) >= self.batch_size:
+            self._wakeup.set()
+        return future
+
+    async def _run(self) -> None:
+        """Flush whenever a batch fills up or flush_interval elapses."""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("%s: flush loop error: %s", self.name, e)
+
+    async def flush(self) -> int:
+        """
+        Write every buffered row now.
+
+        Returns:
+            Number of rows written
+        """
+        if self._flush_lock is None:
+            return 0
+        async with self._flush_lock:
+            start = time.monotonic()
+            batches = []
+            for key in list(self._queues):
+                queue = self._queues[key]
+                while queue:
+                    batch = [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+                    batches.append((key[0], batch))
+                del self._queues[key]
+            if not batches:
+                return 0
+            written = sum(await asyncio.gather(*(self._write_batch(table, batch) for table, batch in batches)))
+            self.last_flush_ms = (time.monotonic() - start) * 1000
+            return written
+
+    async def _insert(self, table: str, rows: List[Dict[str, Any]]) -> Tuple[Optional[List[Dict[str, Any]]], Optional[Exception]]:
+        """Insert rows with retries; returns (inserted rows, None) or (None, last error)."""
+        delay = self.retry_backoff
+        error: Optional[Exception] = None
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                inserted = await self._writer(table, rows)
+                self.batches += 1
+                self.written += len(rows)
+                return inserted or [], None
+            except Exception as e:
+                error = e
+                if _is_rejected(e):
+                    break  # The data is rejected; retrying the same rows will not help
+                if attempt < self.max_retries:
+                    self.retries += 1
+                    logger.warning(f"{self.name}: insert into {table} failed (attempt {attempt}), retrying: {e}")
+                    await asyncio.sleep(delay)
+                    delay *= 2
+        return None, error
+
+    async def _write_batch(self, table: str, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> int:
+        """Insert one batch, resolving each row's future."""
+        try:
+            rows = [row for row, _ in batch]
+            inserted, error = await self._insert(table, rows)
+            if inserted is not None:
+                for i, (row, future) in enumerate(batch):
+                    if not future.done():
+                        future.set_result(inserted[i] if i < len(inserted) else row)
+                return len(rows)
+
+            # One rejected row should not sink the rest of its batch
+            outcomes = [(batch, error)]
+            if len(batch) > 1 and _is_rejected(error):
+                outcomes = []
+                for item in batch:
+                    single, single_error = await self._insert(table, [item[0]])
+                    if single is not None:
+                        if not item[1].done():
+                            item[1].set_result(single[0] if single else item[0])
+                    else:
+                        outcomes.append(([item], single_error))
+
+            for failed, failed_error in outcomes:
+                self._dead_letter(table, [row for row, _ in failed], failed_error)
+                for _, future in failed:
+                    if not future.done():
+                        future.set_exception(WriteBehindError(f"Insert into {table} failed: {failed_error}"))
+                        # Nobody may await it; avoid "exception was never retrieved" noise
+                        future.exception()
+            return len(batch) - sum(len(failed) for failed, _ in outcomes)
+        finally:
+            self._pending -= len(batch)
+            for _ in batch:
+                self._slots.release()
+
+    def _dead_letter(self, table: str, rows: List[Dict[str, Any]], error: Optional[Exception]) -> None:
+        """Append rows that could not be written to the dead-letter file."""
+        self.dead_lettered += len(rows)
+        logger.error(f"{self.name}: dead-lettering {len(rows)} rows for {table}: {error}")
+        if not self.dead_letter_path:
+            return
+        try:
+            directory = os.path.dirname(self.dead_letter_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            failed_at = datetime.now(timezone.utc).isoformat()
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps({"table": table, "row": row, "error": str(error), "failed_at": failed_at},
+                                       default=str) + "\n")
+        except OSError as e:
+            logger.error(f"{self.name}: could not write dead-letter file {self.dead_letter_path}: {e}")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop the flush task and write everything still buffered.
+
+        Args:
+            timeout: Seconds to wait for the final flush
+        """
+        self._stopping = True
+        if self._task and not self._task.done():
+            # Let the loop finish its current flush instead of cancelling it mid-write
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name}: final flush timed out with {self._pending} rows pending")
+        logger.info(f"{self.name}: stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get buffer depth and write counters."""
+        return {
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "submitted": self.submitted,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+            "last_flush_ms": round(self.last_flush_ms, 2)
+        }
@@ -8,7 +8,8 @@ from typing import Dict, Any
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
 
-from avap_bot.services.supabase_service import get_supabase
+from avap_bot.services.supabase_service import get_supabase, invalidate_verified_user
+from avap_bot.services.identity_service import forget_identity
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +66,8 @@ async def purge_single_email(request: Request) -> Dict[str, Any]:
         result = client.table("pending_verifications").delete().eq("email", email).execute()
         
         deleted_count = len(result.data) if result.data else 0
+        for row in result.data or []:
+            forget_identity(row.get("email"), row.get("phone"))
         
         logger.info("Purged email from pending verifications: %s (deleted: %d)", email, deleted_count)
         
@@ -92,6 +95,7 @@ async def purge_all_pending(request: Request) -> Dict[str, Any]:
         # Delete all from Supabase
         client = get_supabase()
         result = client.table("pending_verifications").delete().neq("id", 0).execute()
+        forget_identity()
         
         deleted_count = len(result.data) if result.data else 0
         
@@ -132,6 +136,10 @@ async def remove_verified_by_email(request: Request) -> Dict[str, Any]:
         }).eq("email", email).execute()
         
         updated_count = len(result.data) if result.data else 0
+        for row in result.data or []:
+            forget_identity(row.get("email"), row.get("phone"))
+            if row.get("telegram_id"):
+                invalidate_verified_user(row["telegram_id"])
         
         logger.info("Removed verified user by email: %s (updated: %d)", email, updated_count)
         
@@ -171,6 +179,9 @@ async def remove_verified_by_telegram(request: Request) -> Dict[str, Any]:
             "removed_at": "now()",
             "removal_reason": reason
         }).eq("telegram_id", telegram_id).execute()
+        invalidate_verified_user(telegram_id)
+        for row in result.data or []:
+            forget_identity(row.get("email"), row.get("phone"))
         
         updated_count = len(result.data) if result.data else 0
         
@@ -198,22 +209,22 @@ async def get_admin_stats(request: Request) -> Dict[str, Any]:
         raise HTTPException(status_code=403, detail="Forbidden")
     
     try:
-        client = get_supabase()
-        
-        # Get counts
-        pending_result = client.table("pending_verifications").select("id", count="exact").execute()
-        verified_result = client.table("verified_users").select("id", count="exact").eq("status", "verified").execute()
-        removed_result = client.table("verified_users").select("id", count="exact").eq("status", "removed").execute()
-        
+        # Served from the in-memory snapshot refreshed in the background
+        from avap_bot.services.stats_service import bot_stats_snapshot
+        snapshot = await bot_stats_snapshot.get()
+        if snapshot["refreshed_at"] is None:
+            raise HTTPException(status_code=503, detail="Statistics not available yet")
+
         return {
             "status": "ok",
-            "stats": {
-                "pending_verifications": pending_result.count or 0,
-                "verified_users": verified_result.count or 0,
-                "removed_users": removed_result.count or 0
-            }
+            "stats": snapshot["stats"],
+            "refreshed_at": snapshot["refreshed_at"],
+            "age_seconds": snapshot["age_seconds"],
+            "stale": snapshot["stale"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Admin stats failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
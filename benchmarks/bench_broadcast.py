@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the broadcast engine
+
+Simulates the Bot API with a per-request latency and a global limit of
+--limit messages per second (requests above it get RetryAfter), then
+compares:
+  * the old loop: one send at a time with a 30 ms sleep
+  * BroadcastEngine fan-out at the configured rate and concurrency
+
+Run: python benchmarks/bench_broadcast.py [--users 5000] [--latency-ms 80] [--limit 30]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.error import RetryAfter
+
+from avap_bot.services.broadcast_service import BroadcastEngine
+
+
+class TelegramStandin:
+    """Accepts at most `limit` sends in any one-second window."""
+
+    def __init__(self, latency: float, limit: int):
+        self.latency = latency
+        self.limit = limit
+        self.window = deque()
+        self.accepted = 0
+        self.throttled = 0
+
+    async def send(self, chat_id: int) -> None:
+        await asyncio.sleep(self.latency / 2)
+        now = time.monotonic()
+        while self.window and self.window[0] <= now - 1:
+            self.window.popleft()
+        if len(self.window) >= self.limit:
+            self.throttled += 1
+            raise RetryAfter(1)
+        self.window.append(now)
+        self.accepted += 1
+        await asyncio.sleep(self.latency / 2)
+
+
+async def sequential(standin: TelegramStandin, users: int) -> None:
+    """The old loop in broadcast_content and send_daily_tip."""
+    for user_id in range(users):
+        try:
+            await standin.send(user_id)
+            await asyncio.sleep(0.03)
+        except Exception:
+            pass
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Broadcast benchmark")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--limit", type=int, default=30, help="simulated messages per second limit")
+    parser.add_argument("--rate", type=float, default=25.0)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--sample", type=int, default=200, help="users timed for the sequential extrapolation")
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000.0
+    print(f"{args.users} users, {args.latency_ms:.0f} ms per send, limit {args.limit}/s")
+    print(f"{'approach':<30} {'seconds':>9} {'msg/s':>7} {'sent':>6} {'429s':>5}")
+
+    standin = TelegramStandin(latency, args.limit)
+    start = time.perf_counter()
+    await sequential(standin, args.sample)
+    elapsed = (time.perf_counter() - start) * args.users / args.sample
+    print(f"{'sequential (extrapolated)':<30} {elapsed:>9.1f} {args.users / elapsed:>7.1f} {args.users:>6} {standin.throttled:>5}")
+
+    standin = TelegramStandin(latency, args.limit)
+    engine = BroadcastEngine(rate_per_second=args.rate, concurrency=args.concurrency)
+    start = time.perf_counter()
+    report = await engine.broadcast(range(args.users), standin.send)
+    elapsed = time.perf_counter() - start
+    print(f"{'BroadcastEngine':<30} {elapsed:>9.1f} {report.sent / elapsed:>7.1f} {report.sent:>6} {standin.throttled:>5}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
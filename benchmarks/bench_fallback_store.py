@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the fallback store
+
+Writes synthetic submissions to a CSV backup, imports it into the SQLite
+fallback store, then compares per-student lookups:
+  * the old CSV path (read and parse the whole file, filter in Python)
+  * indexed lookups by username, telegram_id and submission_id
+
+Run: python benchmarks/bench_fallback_store.py [--rows 100000] [--lookups 1000]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from avap_bot.utils.fallback_store import FallbackStore
+
+HEADERS = ["submission_id", "username", "telegram_id", "module", "submission_type", "file_id",
+           "file_name", "submitted_at", "status", "grade", "comments"]
+
+
+def write_csv(path: str, rows: int, students: int) -> None:
+    """Write a submissions CSV in the fallback format."""
+    rng = random.Random(7)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        for i in range(rows):
+            student = rng.randrange(students)
+            writer.writerow([f"sub_{i}", f"student{student}", 100000 + student, rng.randint(1, 12), "document",
+                             f"file_{i}", f"work_{i}.pdf", "2025-01-01T00:00:00+00:00", "Pending", "", ""])
+
+
+def csv_lookup(path: str, username: str):
+    """The old fallback read: parse the whole file, then filter."""
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        return [r for r in csv.DictReader(f) if r.get("username") == username]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fallback store benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--csv-lookups", type=int, default=5, help="CSV scans timed (each parses the whole file)")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "submissions.csv")
+        write_csv(csv_path, args.rows, args.students)
+
+        store = FallbackStore(os.path.join(directory, "fallback.sqlite3"))
+        start = time.perf_counter()
+        store.import_csv(csv_path)
+        print(f"{args.rows} rows, {args.students} students; import took {time.perf_counter() - start:.2f}s")
+        print(f"{'lookup':<26} {'avg ms':>10} {'rows':>6}")
+
+        start = time.perf_counter()
+        for _ in range(args.csv_lookups):
+            found = csv_lookup(csv_path, f"student{rng.randrange(args.students)}")
+        print(f"{'CSV scan by username':<26} {(time.perf_counter() - start) / args.csv_lookups * 1000:>10.3f} {len(found):>6}")
+
+        cases = [
+            ("username", lambda: f"student{rng.randrange(args.students)}"),
+            ("telegram_id", lambda: 100000 + rng.randrange(args.students)),
+            ("submission_id", lambda: f"sub_{rng.randrange(args.rows)}")
+        ]
+        for column, value in cases:
+            start = time.perf_counter()
+            for _ in range(args.lookups):
+                found = store.find("submissions", **{column: value()})
+            print(f"{'indexed ' + column:<26} {(time.perf_counter() - start) / args.lookups * 1000:>10.3f} {len(found):>6}")
+
+        out = os.path.join(directory, "export", "submissions.csv")
+        start = time.perf_counter()
+        exported = store.export_csv("submissions", out)
+        print(f"export of {exported} rows took {time.perf_counter() - start:.2f}s")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
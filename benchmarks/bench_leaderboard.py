@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the leaderboard engine
+
+Populates a local PostgREST stand-in with synthetic students, assignments
+and wins, then compares:
+  * the old N+1 approach (one or two count queries per student), timed on a
+    sample of students and extrapolated to the whole population
+  * the paged column scan used when the get_leaderboard SQL function is missing
+  * the single get_leaderboard RPC round trip
+
+Run: python benchmarks/bench_leaderboard.py [--users 10000] [--latency-ms 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.postgrest_standin import FAKE_KEY, PostgrestStandin
+
+
+def populate(standin: PostgrestStandin, users: int, seed: int = 7):
+    """Create verified users with a skewed number of submissions and wins."""
+    rng = random.Random(seed)
+    standin.tables["verified_users"] = [
+        {"id": i, "telegram_id": 100000 + i, "name": f"Student {i}", "email": f"s{i}@example.com",
+         "status": "verified", "created_at": "2025-01-01T00:00:00+00:00"}
+        for i in range(1, users + 1)
+    ]
+    assignments, wins = [], []
+    for user in standin.tables["verified_users"]:
+        for _ in range(int(rng.expovariate(1 / 4))):
+            assignments.append({"id": len(assignments) + 1, "telegram_id": user["telegram_id"], "status": "submitted"})
+        for _ in range(int(rng.expovariate(1 / 1.5))):
+            wins.append({"id": len(wins) + 1, "telegram_id": user["telegram_id"]})
+    standin.tables["assignments"] = assignments
+    standin.tables["wins"] = wins
+    return len(assignments), len(wins)
+
+
+def register_leaderboard_rpc(standin: PostgrestStandin):
+    """Emulate the get_leaderboard SQL function inside the stand-in."""
+    def get_leaderboard(args):
+        submissions = Counter(row["telegram_id"] for row in standin.tables["assignments"])
+        wins = Counter(row["telegram_id"] for row in standin.tables["wins"])
+        rows = [
+            {"telegram_id": u["telegram_id"], "name": u["name"], "email": u["email"], "created_at": u["created_at"],
+             "submissions": submissions[u["telegram_id"]], "wins": wins[u["telegram_id"]]}
+            for u in standin.tables["verified_users"]
+            if submissions[u["telegram_id"]] >= args.get("min_submissions", 1)
+            and wins[u["telegram_id"]] >= args.get("min_wins", 0)
+        ]
+        rows.sort(key=lambda r: (r["submissions"], r["wins"]), reverse=True)
+        return rows[:args.get("limit_count", 5)]
+    standin.rpcs["get_leaderboard"] = get_leaderboard
+
+
+def n_plus_one(client, users):
+    """The previous algorithm: count queries per verified user."""
+    top = []
+    for user in users:
+        telegram_id = user["telegram_id"]
+        submissions = client.table("assignments").select("id", count="exact").eq("telegram_id", telegram_id).execute().count or 0
+        wins = client.table("wins").select("id", count="exact").eq("telegram_id", telegram_id).execute().count or 0
+        if submissions > 0:
+            top.append({"telegram_id": telegram_id, "submissions": submissions, "wins": wins})
+    top.sort(key=lambda x: x["submissions"], reverse=True)
+    return top[:5]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Leaderboard benchmark")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--sample", type=int, default=200, help="students timed for the N+1 extrapolation")
+    args = parser.parse_args()
+
+    standin = PostgrestStandin(latency=args.latency_ms / 1000.0).start()
+    assignment_count, win_count = populate(standin, args.users)
+    os.environ["SUPABASE_URL"] = standin.url
+    os.environ["SUPABASE_KEY"] = FAKE_KEY
+
+    from supabase import create_client
+    from avap_bot.services.leaderboard_service import LeaderboardEngine
+    from avap_bot.services.postgrest_client import AsyncPostgrestClient
+
+    print(f"{args.users} users, {assignment_count} assignments, {win_count} wins, "
+          f"{args.latency_ms:.0f} ms per request")
+    print(f"{'approach':<34} {'seconds':>9} {'requests':>9}")
+
+    sync_client = create_client(standin.url, FAKE_KEY)
+    sample = standin.tables["verified_users"][:args.sample]
+    before = standin.requests
+    start = time.perf_counter()
+    n_plus_one(sync_client, sample)
+    elapsed = (time.perf_counter() - start) * args.users / len(sample)
+    requests = (standin.requests - before) * args.users // len(sample)
+    print(f"{'N+1 counts (extrapolated)':<34} {elapsed:>9.2f} {requests:>9}")
+
+    client = AsyncPostgrestClient(standin.url, FAKE_KEY)
+    engine = LeaderboardEngine(client=client, page_size=1000, cache_ttl=0)
+    engine._rpc_available = False
+    before = standin.requests
+    start = time.perf_counter()
+    scanned = await engine.top(limit=5)
+    print(f"{'paged column scan + heap':<34} {time.perf_counter() - start:>9.2f} {standin.requests - before:>9}")
+
+    register_leaderboard_rpc(standin)
+    engine._rpc_available = None
+    before = standin.requests
+    start = time.perf_counter()
+    ranked = await engine.top(limit=5)
+    print(f"{'get_leaderboard RPC':<34} {time.perf_counter() - start:>9.2f} {standin.requests - before:>9}")
+
+    same = [r["telegram_id"] for r in scanned] == [r["telegram_id"] for r in ranked]
+    print(f"scan and RPC agree on top 5: {same}")
+
+    await client.close()
+    standin.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
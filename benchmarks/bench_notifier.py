@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the admin notifier's HTTP clients
+
+Starts a local HTTPS stand-in for the Bot API's sendMessage (self-signed
+certificate made with openssl; falls back to plain HTTP without it) and
+sends notifications one after another, comparing:
+  * async, before: a new httpx.AsyncClient per attempt (new TCP + TLS handshake)
+  * async, after:  notifier._send_with_retry on the pooled keep-alive client
+  * sync, before:  requests.post per attempt
+  * sync, after:   notifier._send_with_retry_sync on the pooled session
+
+Run: python benchmarks/bench_notifier.py [--notifications 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SendMessageHandler(BaseHTTPRequestHandler):
+    """Answers every POST like a successful sendMessage."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ok": True, "result": {"message_id": 1}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_certificate(directory: str):
+    """Create a self-signed localhost certificate, or None if openssl is missing."""
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    try:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-keyout", key, "-out", cert, "-subj", "/CN=localhost",
+             "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"],
+            check=True, capture_output=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return cert, key
+
+
+def start_server(certificate):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SendMessageHandler)
+    scheme = "http"
+    if certificate:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*certificate)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://localhost:{server.server_address[1]}/botTOKEN/sendMessage"
+
+
+async def async_before(url: str, payload: dict, count: int) -> float:
+    import httpx
+    start = time.perf_counter()
+    for _ in range(count):
+        async with httpx.AsyncClient() as client:
+            response = await client.post(url, json=payload, timeout=10.0)
+            assert response.status_code == 200
+    return time.perf_counter() - start
+
+
+async def async_after(url: str, payload: dict, count: int) -> float:
+    from avap_bot.services import notifier
+    start = time.perf_counter()
+    for _ in range(count):
+        assert await notifier._send_with_retry(url, payload, max_retries=0)
+    elapsed = time.perf_counter() - start
+    await notifier.close_notifier_clients()
+    return elapsed
+
+
+def sync_before(url: str, payload: dict, count: int) -> float:
+    import requests
+    start = time.perf_counter()
+    for _ in range(count):
+        assert requests.post(url, json=payload, timeout=10).status_code == 200
+    return time.perf_counter() - start
+
+
+def sync_after(url: str, payload: dict, count: int) -> float:
+    from avap_bot.services import notifier
+    start = time.perf_counter()
+    for _ in range(count):
+        assert notifier._send_with_retry_sync(url, payload, max_retries=0)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notifier HTTP client benchmark")
+    parser.add_argument("--notifications", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        certificate = make_certificate(directory)
+        if certificate:
+            # Trust the stand-in's certificate in both httpx and requests
+            os.environ["SSL_CERT_FILE"] = os.environ["REQUESTS_CA_BUNDLE"] = certificate[0]
+        server, url = start_server(certificate)
+        payload = {"chat_id": 1, "text": "🚨 AVAP Bot Alert:\n\nbenchmark", "parse_mode": "HTML"}
+        count = args.notifications
+
+        print(f"{count} notifications over {'HTTPS' if certificate else 'HTTP (openssl not found)'} to {url.split('/bot')[0]}")
+        print(f"{'client':<32} {'seconds':>9} {'notif/s':>9} {'ms each':>9}")
+        results = [
+            ("async, new client per attempt", asyncio.run(async_before(url, payload, count))),
+            ("async, pooled client", asyncio.run(async_after(url, payload, count))),
+            ("sync, requests.post", sync_before(url, payload, count)),
+            ("sync, pooled session", sync_after(url, payload, count)),
+        ]
+        for label, elapsed in results:
+            print(f"{label:<32} {elapsed:>9.2f} {count / elapsed:>9.1f} {elapsed / count * 1000:>9.2f}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
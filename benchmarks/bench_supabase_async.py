@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the async Supabase data-access layer
+
+Runs the same burst of check_verified_user lookups from concurrent handler
+coroutines twice against a local PostgREST stand-in with simulated network
+latency: first with the synchronous supabase-py call made straight from the
+coroutine (as the handlers used to), then with check_verified_user_async on
+the pooled client. A ticker task measures how long the event loop is stalled
+in each case.
+
+Run: python benchmarks/bench_supabase_async.py [--lookups 50] [--latency-ms 40]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.postgrest_standin import FAKE_KEY, PostgrestStandin
+
+TICK = 0.005
+
+
+async def measure_stalls(stop: asyncio.Event, samples: list):
+    """Record how late a 5 ms ticker wakes up."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        samples.append(max(0.0, time.perf_counter() - start - TICK))
+
+
+async def run(label: str, lookup, user_ids):
+    """Run all lookups concurrently while measuring event-loop stalls."""
+    samples = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_stalls(stop, samples))
+    await asyncio.sleep(TICK * 2)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(lookup(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    samples.sort()
+    found = sum(1 for r in results if r)
+    print(f"{label:<28} {elapsed:>8.2f} {max(samples) * 1000:>13.1f} "
+          f"{samples[int(len(samples) * 0.99) - 1] * 1000:>13.1f} {sum(samples) * 1000:>14.1f} {found:>6}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Sync vs async Supabase lookup benchmark")
+    parser.add_argument("--lookups", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    args = parser.parse_args()
+
+    standin = PostgrestStandin(latency=args.latency_ms / 1000.0).start()
+    standin.tables["verified_users"] = [
+        {"id": i, "telegram_id": 1000 + i, "name": f"Student {i}", "status": "verified"}
+        for i in range(args.lookups)
+    ]
+    os.environ["SUPABASE_URL"] = standin.url
+    os.environ["SUPABASE_KEY"] = FAKE_KEY
+
+    from supabase import create_client
+    from avap_bot.services import supabase_service
+    from avap_bot.services.postgrest_client import close_async_postgrest
+
+    supabase_service.supabase_client = create_client(standin.url, FAKE_KEY)
+    user_ids = [1000 + i for i in range(args.lookups)]
+
+    async def sync_lookup(user_id):
+        return supabase_service.check_verified_user(user_id)
+
+    print(f"{args.lookups} concurrent lookups, {args.latency_ms:.0f} ms simulated round trip")
+    print(f"{'mode':<28} {'elapsed_s':>8} {'max_stall_ms':>13} {'p99_stall_ms':>13} {'total_stall_ms':>14} {'found':>6}")
+    await run("sync (blocking)", sync_lookup, user_ids)
+    await run("async (pooled client)", supabase_service.check_verified_user_async, user_ids)
+
+    await close_async_postgrest()
+    standin.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark for UpdateDispatcher
+
+Feeds a synthetic stream of updates from many users through the dispatcher
+with a simulated I/O-bound handler and reports throughput for increasing
+concurrency limits. Also verifies that every user's updates were processed
+in order.
+
+Run: python benchmarks/bench_update_dispatcher.py [--users 50] [--per-user 10] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from avap_bot.utils.update_dispatcher import UpdateDispatcher
+
+
+def build_stream(users: int, per_user: int):
+    """Build an interleaved update stream: round-robin over users."""
+    stream = []
+    update_id = 0
+    for seq in range(per_user):
+        for user_id in range(users):
+            update_id += 1
+            stream.append(SimpleNamespace(
+                update_id=update_id,
+                effective_user=SimpleNamespace(id=user_id),
+                effective_chat=SimpleNamespace(id=user_id),
+                seq=seq
+            ))
+    return stream
+
+
+async def run_once(stream, concurrency: int, latency: float):
+    """Dispatch the whole stream and return (elapsed seconds, ordered, stats)."""
+    seen = {}
+
+    async def process(update):
+        await asyncio.sleep(latency)
+        seen.setdefault(update.effective_user.id, []).append(update.seq)
+
+    dispatcher = UpdateDispatcher(process, max_concurrency=concurrency, max_pending=len(stream))
+    start = time.perf_counter()
+    for update in stream:
+        await dispatcher.dispatch(update)
+    await dispatcher.stop(timeout=600)
+    elapsed = time.perf_counter() - start
+
+    ordered = all(seqs == sorted(seqs) for seqs in seen.values())
+    return elapsed, ordered, dispatcher.get_stats()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="UpdateDispatcher throughput benchmark")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--per-user", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    stream = build_stream(args.users, args.per_user)
+    latency = args.latency_ms / 1000.0
+    print(f"{len(stream)} updates, {args.users} users, {args.latency_ms:.0f} ms handler latency")
+    print(f"{'concurrency':>11} {'elapsed_s':>10} {'updates/s':>10} {'peak':>5} {'ordered':>8}")
+
+    for concurrency in args.concurrency:
+        elapsed, ordered, stats = await run_once(stream, concurrency, latency)
+        print(f"{concurrency:>11} {elapsed:>10.2f} {len(stream) / elapsed:>10.1f} "
+              f"{stats['peak_in_flight']:>5} {str(ordered):>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the write-behind insert buffer
+
+Simulates a live class where many students run /ask at once: each
+question is inserted into a local PostgREST stand-in with simulated network
+latency, first with one insert per question (as add_question did), then
+through WriteBehindBuffer which groups them into bulk inserts.
+
+Run: python benchmarks/bench_write_behind.py [--questions 200] [--latency-ms 40]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.postgrest_standin import FAKE_KEY, PostgrestStandin
+
+
+def question(i: int) -> dict:
+    return {"telegram_id": 100000 + i, "username": f"student{i}", "question_text": f"Question {i}",
+            "status": "pending"}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-row vs write-behind insert benchmark")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--flush-ms", type=float, default=250.0)
+    args = parser.parse_args()
+
+    standin = PostgrestStandin(latency=args.latency_ms / 1000.0).start()
+    standin.tables["questions"] = []
+
+    from supabase import create_client
+    from avap_bot.services.postgrest_client import AsyncPostgrestClient
+    from avap_bot.utils.write_behind import WriteBehindBuffer
+
+    print(f"{args.questions} questions, {args.latency_ms:.0f} ms per request")
+    print(f"{'approach':<30} {'seconds':>9} {'requests':>9} {'handler wait ms':>16}")
+
+    # One synchronous insert per question, as the handlers did through run_blocking
+    sync_client = create_client(standin.url, FAKE_KEY)
+    before = standin.requests
+    start = time.perf_counter()
+    for i in range(args.questions):
+        sync_client.table("questions").insert(question(i)).execute()
+    elapsed = time.perf_counter() - start
+    print(f"{'insert per question':<30} {elapsed:>9.2f} {standin.requests - before:>9} "
+          f"{elapsed / args.questions * 1000:>16.1f}")
+
+    client = AsyncPostgrestClient(standin.url, FAKE_KEY)
+    buffer = WriteBehindBuffer(client.insert, flush_interval=args.flush_ms / 1000.0, batch_size=args.batch_size)
+    await buffer.start()
+    before = standin.requests
+    start = time.perf_counter()
+    waits = []
+
+    async def ask(i):
+        submitted = time.perf_counter()
+        future = await buffer.submit("questions", question(i))
+        waits.append(time.perf_counter() - submitted)
+        return future
+
+    futures = await asyncio.gather(*(ask(i) for i in range(args.questions)))
+    await asyncio.gather(*futures)
+    elapsed = time.perf_counter() - start
+    print(f"{'write-behind bulk inserts':<30} {elapsed:>9.2f} {standin.requests - before:>9} "
+          f"{max(waits) * 1000:>16.1f}")
+
+    await buffer.stop()
+    await client.close()
+    print(f"rows stored: {len(standin.tables['questions'])}")
+    standin.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -105,6 +105,27 @@ CREATE TABLE IF NOT EXISTS broadcast_history (
     sent_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Broadcast jobs: delivery state so a broadcast resumes after a restart
+-- (cursor = last verified_users.id every recipient up to which was handled)
+ALTER TABLE broadcast_history ADD COLUMN IF NOT EXISTS status TEXT DEFAULT 'completed';
+ALTER TABLE broadcast_history ADD COLUMN IF NOT EXISTS cursor UUID;
+ALTER TABLE broadcast_history ADD COLUMN IF NOT EXISTS file_id TEXT;
+ALTER TABLE broadcast_history ADD COLUMN IF NOT EXISTS admin_chat_id BIGINT;
+ALTER TABLE broadcast_history ADD COLUMN IF NOT EXISTS progress_message_id BIGINT;
+ALTER TABLE broadcast_history ADD COLUMN IF NOT EXISTS total_count INTEGER;
+ALTER TABLE broadcast_history ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE broadcast_history ADD COLUMN IF NOT EXISTS skipped_count INTEGER DEFAULT 0;
+
+-- Recipients the bot cannot reach (blocked the bot, deleted account, chat not found).
+-- Fan-out skips them until next_probe_at, when one send checks if they are back
+CREATE TABLE IF NOT EXISTS recipient_health (
+    telegram_id BIGINT PRIMARY KEY,
+    reason TEXT NOT NULL,
+    failures INTEGER DEFAULT 1,
+    marked_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    next_probe_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
 
 -- Insert some sample FAQs
 INSERT INTO faqs (question, answer, category) VALUES
@@ -129,10 +150,14 @@ CREATE INDEX IF NOT EXISTS idx_verified_users_telegram_id ON verified_users(tele
 CREATE INDEX IF NOT EXISTS idx_verified_users_email ON verified_users(email);
 CREATE INDEX IF NOT EXISTS idx_assignments_username ON assignments(username);
 CREATE INDEX IF NOT EXISTS idx_assignments_status ON assignments(status);
+CREATE INDEX IF NOT EXISTS idx_assignments_telegram_id ON assignments(telegram_id);
+CREATE INDEX IF NOT EXISTS idx_wins_telegram_id ON wins(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_match_requests_status ON match_requests(status);
+CREATE INDEX IF NOT EXISTS idx_match_requests_pending ON match_requests(created_at) WHERE status = 'pending';
 CREATE INDEX IF NOT EXISTS idx_tips_day_of_week ON tips(day_of_week);
 CREATE INDEX IF NOT EXISTS idx_broadcast_history_sent_at ON broadcast_history(sent_at);
 CREATE INDEX IF NOT EXISTS idx_broadcast_history_admin_id ON broadcast_history(admin_id);
+CREATE INDEX IF NOT EXISTS idx_broadcast_history_running ON broadcast_history(status) WHERE status = 'running';
 
 -- Enable Row Level Security (RLS)
 ALTER TABLE pending_verifications ENABLE ROW LEVEL SECURITY;
@@ -144,6 +169,7 @@ ALTER TABLE questions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE faqs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE tips ENABLE ROW LEVEL SECURITY;
 ALTER TABLE broadcast_history ENABLE ROW LEVEL SECURITY;
+ALTER TABLE recipient_health ENABLE ROW LEVEL SECURITY;
 
 -- Create policies (allow all for now - adjust based on your security needs)
 CREATE POLICY "Allow all operations" ON pending_verifications FOR ALL USING (true);
@@ -155,3 +181,104 @@ CREATE POLICY "Allow all operations" ON questions FOR ALL USING (true);
 CREATE POLICY "Allow all operations" ON faqs FOR ALL USING (true);
 CREATE POLICY "Allow all operations" ON tips FOR ALL USING (true);
 CREATE POLICY "Allow all operations" ON broadcast_history FOR ALL USING (true);
+CREATE POLICY "Allow all operations" ON recipient_health FOR ALL USING (true);
+
+-- Functions called through PostgREST RPC (/rest/v1/rpc/<name>)
+
+-- Aggregated bot statistics in a single round trip
+CREATE OR REPLACE FUNCTION get_bot_statistics()
+RETURNS json AS $$
+    SELECT json_build_object(
+        'total_users', (SELECT COUNT(*) FROM verified_users),
+        'verified_users', (SELECT COUNT(*) FROM verified_users WHERE status = 'verified'),
+        'removed_users', (SELECT COUNT(*) FROM verified_users WHERE status = 'removed'),
+        'pending_verifications', (SELECT COUNT(*) FROM pending_verifications),
+        'total_submissions', (SELECT COUNT(*) FROM assignments),
+        'graded_submissions', (SELECT COUNT(*) FROM assignments WHERE status = 'graded'),
+        'pending_submissions', (SELECT COUNT(*) FROM assignments WHERE status = 'submitted'),
+        'total_wins', (SELECT COUNT(*) FROM wins),
+        'total_questions', (SELECT COUNT(*) FROM questions),
+        'answered_questions', (SELECT COUNT(*) FROM questions WHERE status = 'answered')
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Identity lookup: pending or verified students using an email or any phone spelling
+CREATE OR REPLACE FUNCTION find_identity_conflicts(p_email TEXT, p_phones TEXT[])
+RETURNS TABLE (source TEXT, id UUID, name TEXT, email TEXT, phone TEXT, status TEXT) AS $$
+    SELECT 'pending_verifications', p.id, p.name, p.email, p.phone, p.status
+    FROM pending_verifications p
+    WHERE lower(p.email) = lower(p_email) OR p.phone = ANY(p_phones)
+    UNION ALL
+    SELECT 'verified_users', v.id, v.name, v.email, v.phone, v.status
+    FROM verified_users v
+    WHERE v.status = 'verified' AND (lower(v.email) = lower(p_email) OR v.phone = ANY(p_phones));
+$$ LANGUAGE sql STABLE;
+
+-- Match queue: atomically claim the oldest pending request from someone else
+-- (SKIP LOCKED lets concurrent claims take different rows instead of blocking)
+CREATE OR REPLACE FUNCTION claim_match_request(p_telegram_id BIGINT)
+RETURNS SETOF match_requests AS $$
+    UPDATE match_requests SET status = 'matched'
+    WHERE id = (
+        SELECT id FROM match_requests
+        WHERE status = 'pending' AND telegram_id <> p_telegram_id
+        ORDER BY created_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$ LANGUAGE sql VOLATILE;
+
+-- Counters: apply batched deltas atomically, keyed by row id
+-- p_deltas: {"<tip id>": 3, ...}
+CREATE OR REPLACE FUNCTION increment_tip_sent_counts(p_deltas JSONB)
+RETURNS INTEGER AS $$
+    WITH updated AS (
+        UPDATE tips t
+        SET sent_count = COALESCE(t.sent_count, 0) + d.value::INTEGER
+        FROM jsonb_each_text(p_deltas) AS d(key, value)
+        WHERE t.id = d.key::UUID
+        RETURNING 1
+    )
+    SELECT count(*)::INTEGER FROM updated;
+$$ LANGUAGE sql VOLATILE;
+
+-- Leaderboard: per-student submission and win counts in one grouped query
+-- (username is the student's latest Telegram username from their submissions or wins;
+-- the return type changed, so drop any older definition first)
+DROP FUNCTION IF EXISTS get_leaderboard(INTEGER, INTEGER, INTEGER);
+CREATE OR REPLACE FUNCTION get_leaderboard(
+    limit_count INTEGER DEFAULT 5,
+    min_submissions INTEGER DEFAULT 1,
+    min_wins INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    telegram_id BIGINT,
+    name TEXT,
+    username TEXT,
+    email TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    submissions BIGINT,
+    wins BIGINT
+) AS $$
+    SELECT v.telegram_id, v.name, COALESCE(a.username, w.username) AS username, v.email, v.created_at,
+           COALESCE(a.submissions, 0) AS submissions,
+           COALESCE(w.wins, 0) AS wins
+    FROM verified_users v
+    LEFT JOIN (
+        SELECT assignments.telegram_id, COUNT(*) AS submissions,
+               (array_agg(assignments.username ORDER BY assignments.submitted_at DESC))[1] AS username
+        FROM assignments GROUP BY assignments.telegram_id
+    ) a ON a.telegram_id = v.telegram_id
+    LEFT JOIN (
+        SELECT wins.telegram_id, COUNT(*) AS wins,
+               (array_agg(wins.username ORDER BY wins.shared_at DESC))[1] AS username
+        FROM wins GROUP BY wins.telegram_id
+    ) w ON w.telegram_id = v.telegram_id
+    WHERE v.status = 'verified'
+      AND v.telegram_id IS NOT NULL
+      AND COALESCE(a.submissions, 0) >= min_submissions
+      AND COALESCE(w.wins, 0) >= min_wins
+    ORDER BY submissions DESC, wins DESC
+    LIMIT limit_count;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,146 @@
+"""
+Unit tests for BroadcastJobManager.
+
+Tests checkpointing of the low-water cursor, resuming after a restart,
+cancellation through the CancelRegistry and progress message edits.
+"""
+import asyncio
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from avap_bot.services import broadcast_jobs as jobs_module
+from avap_bot.services.broadcast_jobs import BroadcastJobManager
+from avap_bot.services.broadcast_service import BroadcastEngine
+from avap_bot.utils.cancel_registry import CancelRegistry
+
+
+class FakeHistory:
+    """In-memory broadcast_history and verified_users tables."""
+
+    def __init__(self, users):
+        self.users = [{"id": f"u{i:04d}", "telegram_id": 1000 + i} for i in range(users)]
+        self.rows = {}
+
+    async def create(self, admin_id, admin_chat_id, message_type, content, file_id, total_count):
+        row = {"id": f"b{len(self.rows) + 1}", "admin_id": admin_id, "admin_chat_id": admin_chat_id,
+               "message_type": message_type, "content": content, "file_id": file_id,
+               "total_count": total_count, "recipients_count": 0, "failures_count": 0,
+               "status": "running", "cursor": None}
+        self.rows[row["id"]] = row
+        return dict(row)
+
+    async def update(self, broadcast_id, values):
+        self.rows[broadcast_id].update(values)
+        return True
+
+    async def running(self):
+        return [dict(row) for row in self.rows.values() if row["status"] == "running"]
+
+    async def count(self):
+        return len(self.users)
+
+    async def iter_users(self, columns="*", after=None):
+        for user in self.users:
+            if after is None or user["id"] > after:
+                await asyncio.sleep(0)
+                yield user
+
+    @contextmanager
+    def installed(self):
+        with patch.multiple(
+            jobs_module,
+            create_broadcast_job_async=self.create,
+            update_broadcast_history_async=self.update,
+            get_running_broadcasts_async=self.running,
+            count_verified_users_async=self.count,
+            iter_verified_users_async=self.iter_users
+        ):
+            yield
+
+
+class FakeBot:
+    """Records messages and progress edits."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.edits = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.sent.append(chat_id)
+        return SimpleNamespace(message_id=42)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.edits.append((chat_id, message_id, text))
+
+
+def make_manager(**kwargs):
+    engine = BroadcastEngine(rate_per_second=10000, concurrency=5, per_chat_interval=0)
+    return BroadcastJobManager(engine, **kwargs)
+
+
+class TestBroadcastJobManager:
+    """Test BroadcastJobManager functionality."""
+
+    async def test_job_completes_and_records_final_checkpoint(self):
+        """Test a job sends to everyone and leaves a completed row with its counts."""
+        history = FakeHistory(users=30)
+        bot = FakeBot()
+        manager = make_manager(progress_seconds=0)
+        with history.installed():
+            job = await manager.submit(bot, admin_id=1, admin_chat_id=99, message_type="text", content="hi")
+            await job.task
+
+        row = history.rows[job.id]
+        assert row["status"] == "completed"
+        assert row["recipients_count"] == 30 and row["cursor"] == "u0029"
+        assert sorted(bot.sent[1:]) == [u["telegram_id"] for u in history.users]
+        assert "Complete" in bot.edits[-1][2] and bot.edits[-1][:2] == (99, 42)
+
+    async def test_shutdown_checkpoints_and_resume_skips_sent_users(self):
+        """Test a stopped job stays running at its cursor and resumes without resending."""
+        history = FakeHistory(users=60)
+        bot = FakeBot(delay=0.005)
+        manager = make_manager()
+        with history.installed():
+            job = await manager.submit(bot, admin_id=1, admin_chat_id=99, message_type="text", content="hi")
+            await asyncio.sleep(0.03)
+            await manager.shutdown()
+
+        row = history.rows[job.id]
+        first_run = bot.sent[1:]
+        assert row["status"] == "running"
+        assert 0 < row["recipients_count"] < 60
+
+        # A fresh process picks the job up from the saved cursor
+        restarted = make_manager()
+        with history.installed():
+            assert await restarted.resume_all(bot) == 1
+            await restarted.jobs[job.id].task
+
+        second_run = bot.sent[1 + len(first_run):]
+        assert history.rows[job.id]["status"] == "completed"
+        assert history.rows[job.id]["recipients_count"] == 60
+        # Only sends made after the last checkpoint (the in-flight window) can repeat
+        assert len(first_run) + len(second_run) - 60 <= 5
+
+    async def test_cancel_via_registry(self):
+        """Test /cancel for the admin stops the job and marks it cancelled."""
+        history = FakeHistory(users=200)
+        bot = FakeBot(delay=0.005)
+        manager = make_manager()
+        registry = CancelRegistry()
+        manager.cancel_registry = registry
+        with history.installed():
+            job = await manager.submit(bot, admin_id=7, admin_chat_id=99, message_type="text", content="hi")
+            await asyncio.sleep(0.03)
+            await registry.request_cancel(7)
+            await job.task
+
+        row = history.rows[job.id]
+        assert row["status"] == "cancelled"
+        assert row["recipients_count"] < 200
+        assert "Cancelled" in bot.edits[-1][2]
+        assert (await registry.get_user_stats(7))["total_jobs"] == 0
@@ -0,0 +1,93 @@
+"""
+Unit tests for BroadcastEngine.
+
+Tests concurrent delivery, per-recipient results, RetryAfter handling
+with adaptive slowdown, permanent failures and rate pacing.
+"""
+import asyncio
+import time
+
+from telegram.error import Forbidden, RetryAfter, TimedOut
+
+from avap_bot.services.broadcast_service import BroadcastEngine
+
+
+class FakeBot:
+    """Records sends; can throttle or fail chosen chats."""
+
+    def __init__(self, delay=0.0, errors=None):
+        self.delay = delay
+        self.errors = errors or {}
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send(self, chat_id):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            queued = self.errors.get(chat_id)
+            if queued:
+                raise queued.pop(0)
+            self.sent.append(chat_id)
+        finally:
+            self.in_flight -= 1
+
+
+async def stream(ids):
+    for chat_id in ids:
+        yield chat_id
+
+
+class TestBroadcastEngine:
+    """Test BroadcastEngine functionality."""
+
+    async def test_sends_concurrently_and_reports_each_recipient(self):
+        """Test sends overlap up to the concurrency limit and every chat gets a result."""
+        bot = FakeBot(delay=0.02)
+        engine = BroadcastEngine(rate_per_second=1000, concurrency=5)
+        seen = []
+
+        report = await engine.broadcast(stream(range(30)), bot.send, on_result=seen.append)
+
+        assert report.sent == 30 and report.failed == 0
+        assert sorted(r.chat_id for r in report.results) == list(range(30))
+        assert len(seen) == 30
+        assert bot.max_in_flight == 5
+
+    async def test_retry_after_pauses_and_slows_down(self):
+        """Test a RetryAfter is retried after the pause and lowers the rate."""
+        bot = FakeBot(errors={3: [RetryAfter(1)]})
+        engine = BroadcastEngine(rate_per_second=100, concurrency=4, min_rate=10)
+
+        start = time.monotonic()
+        report = await engine.broadcast(range(6), bot.send)
+
+        assert report.sent == 6 and report.throttled == 1
+        assert time.monotonic() - start >= 0.9
+        assert next(r for r in report.results if r.chat_id == 3).attempts == 2
+        assert engine.get_stats()["current_rate"] < 100
+
+    async def test_permanent_and_transient_failures(self):
+        """Test blocked chats fail at once while network errors are retried."""
+        bot = FakeBot(errors={1: [Forbidden("bot was blocked by the user")], 2: [TimedOut()]})
+        engine = BroadcastEngine(rate_per_second=1000, concurrency=3)
+
+        report = await engine.broadcast([1, 2, 3], bot.send)
+
+        failures = report.failures
+        assert [r.chat_id for r in failures] == [1]
+        assert failures[0].permanent and failures[0].attempts == 1
+        assert sorted(bot.sent) == [2, 3]
+
+    async def test_rate_limit_paces_sends(self):
+        """Test the shared bucket keeps the send rate near its target."""
+        bot = FakeBot()
+        engine = BroadcastEngine(rate_per_second=50, concurrency=20)
+
+        start = time.monotonic()
+        await engine.broadcast(range(100), bot.send)
+
+        # 10 tokens of burst, then 90 more at 50/s
+        assert 1.6 <= time.monotonic() - start < 2.5
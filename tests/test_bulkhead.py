@@ -0,0 +1,91 @@
+"""
+Unit tests for Bulkhead and backend routing in run_blocking.
+
+Tests isolation between pools, queue-length rejection, timeouts and
+the queue wait histogram.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from avap_bot.utils.bulkhead import Bulkhead, BulkheadFull
+from avap_bot.utils.run_blocking import backend_for
+
+
+class TestBulkhead:
+    """Test Bulkhead functionality."""
+
+    async def test_runs_call_and_records_wait(self):
+        """Test a call returns its result and lands in the wait histogram."""
+        bulkhead = Bulkhead("sheets", max_workers=2)
+
+        assert await bulkhead.run(lambda a, b=0: a + b, 2, b=3) == 5
+
+        stats = bulkhead.get_stats()
+        assert stats["calls"] == 1 and sum(stats["wait_histogram"].values()) == 1
+        bulkhead.shutdown()
+
+    async def test_full_queue_rejects_immediately(self):
+        """Test calls beyond max_queue raise BulkheadFull instead of waiting."""
+        bulkhead = Bulkhead("sheets", max_workers=1, max_queue=1)
+        release = threading.Event()
+        blocked = asyncio.ensure_future(bulkhead.run(release.wait))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(bulkhead.run(lambda: "queued"))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(BulkheadFull):
+            await bulkhead.run(lambda: "rejected")
+
+        release.set()
+        assert await queued == "queued"
+        await blocked
+        assert bulkhead.get_stats()["rejected"] == 1
+        bulkhead.shutdown()
+
+    async def test_slow_backend_does_not_starve_another(self):
+        """Test a saturated pool leaves other pools' calls unaffected."""
+        sheets = Bulkhead("sheets", max_workers=1, max_queue=10)
+        supabase = Bulkhead("supabase", max_workers=1)
+        release = threading.Event()
+        slow = [asyncio.ensure_future(sheets.run(release.wait)) for _ in range(3)]
+        await asyncio.sleep(0.02)
+
+        start = time.monotonic()
+        assert await supabase.run(lambda: "fast") == "fast"
+        assert time.monotonic() - start < 0.5
+
+        release.set()
+        await asyncio.gather(*slow)
+        sheets.shutdown()
+        supabase.shutdown()
+
+    async def test_timeout(self):
+        """Test a call exceeding the timeout raises and is counted."""
+        bulkhead = Bulkhead("systeme", max_workers=1, timeout=0.05)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await bulkhead.run(time.sleep, 0.3)
+
+        assert bulkhead.get_stats()["timeouts"] == 1
+        bulkhead.shutdown()
+
+    def test_backend_routing_by_module(self):
+        """Test service functions are sent to their backend's pool."""
+        from avap_bot.services.sheets_service import append_submission
+        from avap_bot.services.systeme_service import create_contact_and_tag
+
+        assert backend_for(append_submission) == "sheets"
+        assert backend_for(create_contact_and_tag) == "systeme"
+        assert backend_for(len) == "default"
+
+    def test_replay_has_its_own_pool(self):
+        """Test fallback replay runs on one dedicated thread without a timeout."""
+        from avap_bot.utils.run_blocking import bulkheads
+
+        replay = bulkheads["replay"]
+        assert replay is not bulkheads["sheets"]
+        assert replay.max_workers == 1
+        assert replay.timeout is None
@@ -0,0 +1,61 @@
+"""
+Unit tests for CounterAggregator.
+
+Tests delta summing, batched flushes and retention of deltas when a
+flush fails.
+"""
+import asyncio
+from unittest.mock import AsyncMock
+
+from avap_bot.utils.counter_aggregator import CounterAggregator, PartialFlushError
+
+
+class TestCounterAggregator:
+    """Test CounterAggregator functionality."""
+
+    async def test_deltas_are_summed_into_one_flush(self):
+        """Test many increments become one batched write."""
+        writer = AsyncMock()
+        counters = CounterAggregator(writer)
+        for _ in range(5):
+            counters.add("tip-1")
+        counters.add("tip-2", 3)
+
+        assert await counters.flush() == 2
+        writer.assert_awaited_once_with({"tip-1": 5, "tip-2": 3})
+        assert await counters.flush() == 0
+        assert writer.await_count == 1
+
+    async def test_failed_flush_keeps_deltas(self):
+        """Test deltas survive a failed write and are merged with new ones."""
+        writer = AsyncMock(side_effect=[RuntimeError("db down"), None])
+        counters = CounterAggregator(writer)
+        counters.add("tip-1", 2)
+
+        assert await counters.flush() == 0
+        counters.add("tip-1")
+        assert await counters.flush() == 1
+        assert writer.await_args.args[0] == {"tip-1": 3}
+        assert counters.get_stats()["failures"] == 1
+
+    async def test_partial_flush_keeps_only_unwritten_deltas(self):
+        """Test keys written before a partial failure are not re-queued."""
+        writer = AsyncMock(side_effect=[PartialFlushError({"tip-2": 3}), None])
+        counters = CounterAggregator(writer)
+        counters.add("tip-1", 2)
+        counters.add("tip-2", 3)
+
+        assert await counters.flush() == 1
+        assert await counters.flush() == 1
+        assert writer.await_args.args[0] == {"tip-2": 3}
+
+    async def test_flushes_early_when_many_keys_pending(self):
+        """Test reaching max_pending_keys triggers a flush without waiting for the job."""
+        writer = AsyncMock()
+        counters = CounterAggregator(writer, max_pending_keys=3)
+        for key in range(3):
+            counters.add(key)
+        await asyncio.sleep(0)
+
+        writer.assert_awaited_once()
+        assert counters.get_stats()["pending_keys"] == 0
@@ -0,0 +1,88 @@
+"""
+Unit tests for FallbackReconciler.
+
+Tests batched replay, de-duplication by key, the durable cursor across
+restarts and stopping on a failed write.
+"""
+from avap_bot.utils.fallback_reconciler import FallbackReconciler, ReplayTarget
+from avap_bot.utils.fallback_store import FallbackStore
+
+HEADERS = ["submission_id", "username", "status"]
+
+
+def make_store(tmp_path, rows):
+    store = FallbackStore(str(tmp_path / "fallback.sqlite3"))
+    for row in rows:
+        store.append("submissions", HEADERS, row)
+    return store
+
+
+class Sink:
+    """Destination recording each bulk write, optionally failing."""
+
+    def __init__(self, existing=(), fail=False):
+        self.batches = []
+        self.existing = set(existing)
+        self.fail = fail
+
+    def write(self, records):
+        if self.fail:
+            raise RuntimeError("503 backend error")
+        self.batches.append([r["submission_id"] for r in records])
+        self.existing.update(r["submission_id"] for r in records)
+
+
+def make_reconciler(store, sink, available=True, batch_size=500):
+    target = ReplayTarget("submissions", sink.write, key=lambda r: r["submission_id"], exists=sink.existing.__contains__)
+    return FallbackReconciler(store, [target], lambda: available, batch_size=batch_size)
+
+
+class TestFallbackReconciler:
+    """Test FallbackReconciler functionality."""
+
+    def test_replays_in_batches_and_skips_duplicates(self, tmp_path):
+        """Test rows go out in batch_size writes, skipping keys already present or repeated."""
+        store = make_store(tmp_path, [[f"s{i}", "ada", "Pending"] for i in range(5)] + [["s1", "ada", "Pending"]])
+        sink = Sink(existing={"s0"})
+        reconciler = make_reconciler(store, sink, batch_size=3)
+
+        assert reconciler.run_once() == 4
+        assert sink.batches == [["s1", "s2"], ["s3", "s4"]]
+        stats = reconciler.get_stats()["datasets"]["submissions"]
+        assert stats == {"replayed": 4, "duplicates_skipped": 2, "pending": 0}
+
+    def test_cursor_survives_restart(self, tmp_path):
+        """Test a new reconciler on the same database only replays rows added since."""
+        store = make_store(tmp_path, [["s1", "ada", "Pending"]])
+        make_reconciler(store, Sink()).run_once()
+        store.append("submissions", HEADERS, ["s2", "bob", "Pending"])
+        store.close()
+
+        sink = Sink()
+        reconciler = make_reconciler(FallbackStore(str(tmp_path / "fallback.sqlite3")), sink)
+
+        assert reconciler.run_once() == 1
+        assert sink.batches == [["s2"]]
+
+    def test_failed_write_keeps_cursor(self, tmp_path):
+        """Test rows from a failed batch are replayed by the next run."""
+        store = make_store(tmp_path, [["s1", "ada", "Pending"]])
+        sink = Sink(fail=True)
+        reconciler = make_reconciler(store, sink)
+
+        assert reconciler.run_once() == 0
+        assert reconciler.get_stats()["failures"] == 1
+
+        sink.fail = False
+        assert reconciler.run_once() == 1
+        assert sink.batches == [["s1"]]
+
+    def test_waits_while_destination_unavailable(self, tmp_path):
+        """Test nothing is written or consumed while Sheets is down."""
+        store = make_store(tmp_path, [["s1", "ada", "Pending"]])
+        sink = Sink()
+        reconciler = make_reconciler(store, sink, available=False)
+
+        assert reconciler.run_once() == 0
+        assert sink.batches == []
+        assert reconciler.get_stats()["datasets"]["submissions"]["pending"] == 1
@@ -0,0 +1,72 @@
+"""
+Unit tests for FallbackStore.
+
+Tests indexed lookups, CSV import (once per file) and export back to CSV.
+"""
+import csv
+
+from avap_bot.utils.fallback_store import FallbackStore
+
+HEADERS = ["submission_id", "username", "telegram_id", "module", "status"]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        writer.writerows(rows)
+
+
+class TestFallbackStore:
+    """Test FallbackStore functionality."""
+
+    def test_lookup_by_indexed_columns(self, tmp_path):
+        """Test rows are found by username, telegram_id or submission_id."""
+        store = FallbackStore(str(tmp_path / "fallback.sqlite3"))
+        store.append("submissions", HEADERS, ["s1", "ada", 123, 1, "Pending"])
+        store.append("submissions", HEADERS, ["s2", "bob", 456, 1, "Pending"])
+        store.append("submissions", HEADERS, ["s3", "ada", 123, 2, None])
+
+        assert [r["submission_id"] for r in store.find("submissions", username="ada")] == ["s1", "s3"]
+        assert store.find("submissions", telegram_id="456")[0]["username"] == "bob"
+        assert store.find("submissions", submission_id="s3")[0]["status"] == ""
+        assert store.find("submissions", username="zed") == []
+        assert store.find("wins", username="ada") == []
+
+    def test_lookup_any_column_returns_each_row_once(self, tmp_path):
+        """Test matching several columns unions the rows without duplicates."""
+        store = FallbackStore(str(tmp_path / "fallback.sqlite3"))
+        store.append("submissions", HEADERS, ["s1", "ada", 123, 1, "Pending"])
+        store.append("submissions", HEADERS, ["s2", "", 123, 1, "Pending"])
+
+        rows = store.find("submissions", username="ada", telegram_id=123.0)
+
+        assert [r["submission_id"] for r in rows] == ["s1", "s2"]
+
+    def test_csv_imported_once(self, tmp_path):
+        """Test a CSV backup is imported on the first pass only."""
+        write_csv(tmp_path / "submissions.csv", [["s1", "ada", "123", "1", "Pending"]])
+        store = FallbackStore(str(tmp_path / "fallback.sqlite3"))
+
+        assert store.import_csv_dir(str(tmp_path)) == 1
+        assert store.import_csv_dir(str(tmp_path)) == 0
+        store.close()
+
+        reopened = FallbackStore(str(tmp_path / "fallback.sqlite3"))
+        assert reopened.import_csv_dir(str(tmp_path)) == 0
+        assert reopened.count("submissions") == 1
+        assert reopened.headers("submissions") == HEADERS
+
+    def test_export_round_trip(self, tmp_path):
+        """Test exported CSV keeps the column order and every row."""
+        store = FallbackStore(str(tmp_path / "fallback.sqlite3"))
+        store.append("submissions", HEADERS, ["s1", "ada", 123, 1, "Pending"])
+        store.append("submissions", HEADERS, ["s2", "bob", 456, 2, "Graded"])
+
+        assert store.export_csv("submissions", str(tmp_path / "out" / "submissions.csv")) == 2
+
+        with open(tmp_path / "out" / "submissions.csv", newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        assert rows[0] == HEADERS
+        assert rows[2] == ["s2", "bob", "456", "2", "Graded"]
+        assert store.get_stats()["rows"] == {"submissions": 2}
@@ -0,0 +1,184 @@
+"""
+Unit tests for the identity service.
+
+Tests identifier classification, the or= filters sent to PostgREST, the
+ranking of matches across pending and verified students and the
+add-student duplicate check.
+"""
+from unittest.mock import AsyncMock, Mock, patch
+
+from avap_bot.services import identity_service
+from avap_bot.services.identity_service import (
+    classify_identifier,
+    find_identity_conflicts,
+    identifier_filter,
+    phone_variants,
+    rank_identifier_matches,
+    resolve_student
+)
+from avap_bot.services.postgrest_client import PostgrestError
+
+
+class TestIdentifierClassification:
+    """Test classification and filter building."""
+
+    def test_classify(self):
+        """Test identifiers are classified once as email, phone or name."""
+        assert classify_identifier("Ada@Example.com") == "email"
+        assert classify_identifier("+234 801 234 5678") == "phone"
+        assert classify_identifier("Ada Lovelace") == "name"
+
+    def test_phone_variants(self):
+        """Test phone spellings cover the typed, digit-only and +digit forms."""
+        assert phone_variants("+234 801") == ["+234 801", "234801", "+234801"]
+        assert phone_variants("") == []
+
+    def test_filters(self):
+        """Test each kind produces a single or= expression."""
+        assert identifier_filter("email", "Ada@Example.com") == '(email.in.("Ada@Example.com","ada@example.com"))'
+        assert identifier_filter("phone", "08012345678") == '(phone.in.("08012345678","+08012345678"))'
+        assert identifier_filter("name", "Ada") == '(name.eq."Ada")'
+        assert identifier_filter("name", "Ada", partial_names=True) == '(name.eq."Ada",name.ilike."*Ada*")'
+
+
+class TestIdentifierRanking:
+    """Test ranking and resolution of matches."""
+
+    def test_exact_name_before_partial(self):
+        """Test an exact name beats a partial match from a preferred table."""
+        rows = [
+            {"id": 1, "name": "Ada Lovelace", "source": "pending_verifications"},
+            {"id": 2, "name": "Ada", "source": "verified_users"},
+            {"id": 2, "name": "Ada", "source": "verified_users"},
+        ]
+        matches = rank_identifier_matches(rows, "name", "ada")
+        assert [(m.source, m.row["id"], m.exact) for m in matches] == [
+            ("verified_users", 2, True),
+            ("pending_verifications", 1, False),
+        ]
+
+    def test_table_preference(self):
+        """Test the first table wins between equally good matches."""
+        rows = [
+            {"id": 1, "email": "a@b.co", "source": "pending_verifications"},
+            {"id": 2, "email": "a@b.co", "source": "verified_users"},
+        ]
+        matches = rank_identifier_matches(rows, "email", "a@b.co", tables=("verified_users", "pending_verifications"))
+        assert matches[0].source == "verified_users"
+        assert "source" not in matches[0].row
+        assert matches[0].as_record()["source"] == "verified_users"
+
+    async def test_resolve_queries_each_table_once(self):
+        """Test resolution sends one query per table and returns the best match."""
+        client = Mock()
+        client.select = AsyncMock(side_effect=lambda table, filters: (
+            [{"id": 7, "email": "a@b.co"}] if table == "verified_users" else []
+        ))
+        with patch.object(identity_service, "get_async_postgrest", return_value=client):
+            match = await resolve_student("a@b.co")
+
+        assert client.select.await_count == 2
+        assert match.source == "verified_users"
+        assert match.matched_on == "email"
+        verified_filters = [c.kwargs["filters"] for c in client.select.await_args_list if c.args[0] == "verified_users"][0]
+        assert ("status", "eq.verified") in verified_filters
+
+
+def conflict_client(pending=(), verified=(), rpc_error=404):
+    """Stand-in PostgREST client without the RPC, serving fixed rows per table"""
+    client = Mock()
+    client.rpc = AsyncMock(side_effect=PostgrestError(rpc_error, "function find_identity_conflicts does not exist"))
+    rows = {"pending_verifications": list(pending), "verified_users": list(verified)}
+    client.select = AsyncMock(side_effect=lambda table, columns, filters: rows[table])
+    return client
+
+
+class TestFindIdentityConflicts:
+    """Test the add-student duplicate check."""
+
+    def setup_method(self):
+        identity_service.identity_index.clear()
+        identity_service._rpc_available = None
+
+    def teardown_method(self):
+        self.setup_method()
+
+    async def find(self, client, **kwargs):
+        with patch.object(identity_service, "get_async_postgrest", return_value=client):
+            return await find_identity_conflicts(**kwargs)
+
+    def or_filter(self, client, table):
+        call = [c for c in client.select.await_args_list if c.args[0] == table][0]
+        return dict(call.kwargs["filters"])["or"]
+
+    async def test_email_only(self):
+        """Test an email alone is matched case-insensitively with no phone condition."""
+        client = conflict_client(pending=[{"id": 1, "email": "ada@x.co", "phone": "0801"}])
+
+        conflicts = await self.find(client, email=" Ada@X.co ")
+
+        assert [(c["source"], c["id"]) for c in conflicts] == [("pending_verifications", 1)]
+        assert self.or_filter(client, "pending_verifications") == '(email.eq."ada@x.co")'
+
+    async def test_phone_only(self):
+        """Test a phone alone is matched under every stored spelling."""
+        client = conflict_client(verified=[{"id": 2, "email": "b@x.co", "phone": "+2348012345678"}])
+
+        conflicts = await self.find(client, phone="234 801 234 5678")
+
+        assert [(c["source"], c["id"]) for c in conflicts] == [("verified_users", 2)]
+        assert self.or_filter(client, "verified_users") == (
+            '(phone.in.("234 801 234 5678","2348012345678","+2348012345678"))'
+        )
+
+    async def test_email_and_phone_in_one_query_per_table(self):
+        """Test email and phone share one or= query per table and email matches come first."""
+        client = conflict_client(pending=[
+            {"id": 3, "email": "other@x.co", "phone": "0801"},
+            {"id": 4, "email": "ada@x.co", "phone": "0999"},
+        ])
+
+        conflicts = await self.find(client, email="ada@x.co", phone="0801")
+
+        assert [c["id"] for c in conflicts] == [4, 3]
+        assert client.select.await_count == 2
+        assert self.or_filter(client, "pending_verifications") == (
+            '(email.eq."ada@x.co",phone.in.("0801","+0801"))'
+        )
+
+    async def test_conflicts_split_across_tables(self):
+        """Test an email taken in pending and a phone taken in verified are both reported, pending first."""
+        client = conflict_client(
+            pending=[{"id": 5, "email": "ada@x.co", "phone": "0700"}],
+            verified=[{"id": 6, "email": "z@x.co", "phone": "0801"}]
+        )
+
+        conflicts = await self.find(client, email="ada@x.co", phone="0801")
+
+        assert [(c["source"], c["id"]) for c in conflicts] == [
+            ("pending_verifications", 5), ("verified_users", 6)
+        ]
+        verified_call = [c for c in client.select.await_args_list if c.args[0] == "verified_users"][0]
+        assert ("status", "eq.verified") in verified_call.kwargs["filters"]
+
+    async def test_rpc_and_local_index(self):
+        """Test the RPC answers in one call and a repeat check is served from the index."""
+        client = conflict_client()
+        client.rpc = AsyncMock(return_value=[
+            {"source": "verified_users", "id": 7, "email": "ada@x.co", "phone": "0801"}
+        ])
+
+        first = await self.find(client, email="ada@x.co")
+        second = await self.find(client, phone="0801")
+
+        assert [c["id"] for c in first] == [c["id"] for c in second] == [7]
+        client.rpc.assert_awaited_once()
+        client.select.assert_not_awaited()
+
+    async def test_no_identity_and_no_conflict(self):
+        """Test nothing to check returns at once and a free email/phone returns no rows."""
+        client = conflict_client()
+
+        assert await self.find(client) == []
+        assert await self.find(client, email="new@x.co", phone="0802") == []
+        assert client.select.await_count == 2
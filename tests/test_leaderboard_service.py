@@ -0,0 +1,120 @@
+"""
+Unit tests for the leaderboard service.
+
+Tests ranking and thresholds in rank_students, the get_leaderboard RPC
+path, the fallback to a paged column scan and expiry of cached scans.
+"""
+from collections import Counter
+from unittest.mock import AsyncMock, Mock
+
+from avap_bot.services.leaderboard_service import LeaderboardEngine, rank_students
+from avap_bot.services.postgrest_client import PostgrestError
+
+USERS = [
+    {"telegram_id": 1, "name": "Ada", "email": "ada@x.co", "created_at": "2025-01-01"},
+    {"telegram_id": 2, "name": "Bola", "email": "bola@x.co", "created_at": "2025-01-02"},
+    {"telegram_id": 3, "name": "Chi", "email": "chi@x.co", "created_at": "2025-01-03"},
+    {"telegram_id": None, "name": "No Telegram"},
+]
+
+TABLES = {
+    "verified_users": USERS,
+    "assignments": [
+        {"telegram_id": 1, "username": "ada_l"},
+        {"telegram_id": 2, "username": "bola"},
+        {"telegram_id": 2, "username": "bola"},
+        {"telegram_id": 3, "username": "chi"},
+    ],
+    "wins": [{"telegram_id": 3, "username": "chi_new"}],
+}
+
+
+def fake_client(rpc):
+    """A stand-in PostgREST client serving TABLES and the given rpc mock"""
+    client = Mock()
+    client.rpc = rpc
+
+    async def iter_rows(table, columns="*", filters=None, page_size=1000):
+        for row in TABLES[table]:
+            yield row
+
+    client.iter_rows = Mock(side_effect=iter_rows)
+    return client
+
+
+class TestRankStudents:
+    """Test rank_students functionality."""
+
+    def test_orders_by_submissions_then_wins(self):
+        """Test submissions rank first, wins break ties and limit is applied."""
+        rows = rank_students(USERS, Counter({1: 1, 2: 2, 3: 1}), Counter({3: 1}), limit=2)
+
+        assert [row["telegram_id"] for row in rows] == [2, 3]
+        assert rows[0]["submissions"] == 2 and rows[1]["wins"] == 1
+
+    def test_thresholds_and_usernames(self):
+        """Test minimum counts filter students and usernames come from the mapping."""
+        rows = rank_students(USERS, Counter({1: 1, 2: 2, 3: 1}), Counter({3: 1}),
+                             min_wins=1, usernames={3: "chi"})
+
+        assert [row["telegram_id"] for row in rows] == [3]
+        assert rows[0]["username"] == "chi"
+        assert rank_students(USERS, Counter({1: 1}), Counter())[0]["username"] == "unknown"
+
+
+class TestLeaderboardEngine:
+    """Test LeaderboardEngine functionality."""
+
+    async def test_rpc_rows_keep_name_and_username(self):
+        """Test the RPC path maps the joined name and username."""
+        rpc = AsyncMock(return_value=[
+            {"telegram_id": 2, "name": "Bola", "username": "bola", "email": "bola@x.co",
+             "created_at": "2025-01-02", "submissions": 2, "wins": 0},
+            {"telegram_id": 1, "name": "Ada", "username": None, "submissions": "1", "wins": None},
+        ])
+        engine = LeaderboardEngine(client=fake_client(rpc))
+
+        rows = await engine.top(limit=2)
+
+        assert [(row["name"], row["username"], row["submissions"]) for row in rows] == [
+            ("Bola", "bola", 2), ("Ada", "unknown", 1)
+        ]
+        assert engine.get_stats()["rpc_available"] is True
+        assert engine.scans == 0
+
+    async def test_missing_rpc_falls_back_to_scan(self):
+        """Test a 404 from the RPC switches to scanning and stops calling it."""
+        rpc = AsyncMock(side_effect=PostgrestError(404, "function get_leaderboard does not exist"))
+        engine = LeaderboardEngine(client=fake_client(rpc))
+
+        rows = await engine.top(limit=5)
+        await engine.top(limit=1)
+
+        assert [(row["telegram_id"], row["username"]) for row in rows] == [(2, "bola"), (3, "chi"), (1, "ada_l")]
+        assert rpc.await_count == 1
+        assert engine.get_stats()["rpc_available"] is False
+
+    async def test_other_rpc_errors_fall_back_without_disabling_rpc(self):
+        """Test a transient RPC error scans this time and tries the RPC again next time."""
+        rpc = AsyncMock(side_effect=[PostgrestError(500, "timeout"), []])
+        engine = LeaderboardEngine(client=fake_client(rpc))
+
+        assert len(await engine.top()) == 3
+        assert await engine.top() == []
+        assert rpc.await_count == 2
+
+    async def test_scan_cache_expiry(self):
+        """Test scanned counts are reused within cache_ttl and rescanned after it or on invalidate."""
+        rpc = AsyncMock(side_effect=PostgrestError(404, "missing"))
+        cached = LeaderboardEngine(client=fake_client(rpc), cache_ttl=60)
+        await cached.top(limit=5)
+        await cached.top(limit=2)
+        assert cached.scans == 1
+        cached.invalidate()
+        await cached.top()
+        assert cached.scans == 2
+
+        expired = LeaderboardEngine(client=fake_client(rpc), cache_ttl=0)
+        await expired.top()
+        await expired.top()
+        assert expired.scans == 2
@@ -0,0 +1,130 @@
+"""
+Unit tests for MatchingEngine.
+
+Tests FIFO pairing, duplicate requests, concurrent claims and TTL expiry
+against an in-memory stand-in for the match_requests table.
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from avap_bot.services import matching_service
+from avap_bot.services.matching_service import MatchingEngine
+
+
+class FakeMatchTable:
+    """match_requests rows keyed by match_id, with conditional claims."""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def add(self, telegram_id, username):
+        match_id = f"m{len(self.rows) + 1}"
+        self.rows[match_id] = {"match_id": match_id, "telegram_id": telegram_id,
+                               "username": username, "status": "pending"}
+        await asyncio.sleep(0)
+        return match_id
+
+    async def claim(self, match_id):
+        await asyncio.sleep(0)
+        row = self.rows.get(match_id)
+        if row and row["status"] == "pending":
+            row["status"] = "matched"
+            return row
+        return None
+
+    async def expire(self, match_ids):
+        expired = []
+        for match_id in match_ids:
+            if self.rows[match_id]["status"] == "pending":
+                self.rows[match_id]["status"] = "expired"
+                expired.append(self.rows[match_id])
+        return expired
+
+
+@pytest.fixture
+def table():
+    fake = FakeMatchTable()
+    with patch.object(matching_service, "add_match_request_async", side_effect=fake.add), \
+            patch.object(matching_service, "claim_match_request_async", side_effect=fake.claim), \
+            patch.object(matching_service, "expire_match_requests_async", side_effect=fake.expire), \
+            patch.object(matching_service, "get_pending_match_requests_async", AsyncMock(return_value=[])), \
+            patch.object(matching_service, "pop_match_request_async", AsyncMock(return_value=None)):
+        yield fake
+
+
+class TestMatchingEngine:
+    """Test MatchingEngine functionality."""
+
+    async def test_pairs_first_come_first_served(self, table):
+        """Test the longest-waiting student is matched first."""
+        engine = MatchingEngine()
+        engine._loaded = True
+        engine._waiting[1] = matching_service.MatchTicket("m-old", 1, "a", 0.0)
+        engine._waiting[2] = matching_service.MatchTicket("m-new", 2, "b", 1.0)
+        table.rows["m-old"] = {"match_id": "m-old", "telegram_id": 1, "status": "pending"}
+        table.rows["m-new"] = {"match_id": "m-new", "telegram_id": 2, "status": "pending"}
+        engine.ttl = float("inf")
+
+        result = await engine.request(3, "c")
+
+        assert result.partner.telegram_id == 1
+        assert list(engine._waiting) == [2]
+
+    async def test_second_request_claims_waiting_student(self, table):
+        """Test a later request pairs with the waiting one and marks it matched."""
+        engine = MatchingEngine()
+        first = await engine.request(1, "a")
+        second = await engine.request(2, "b")
+
+        assert first.ticket and not first.partner
+        assert second.partner.telegram_id == 1
+        assert table.rows[first.ticket.match_id]["status"] == "matched"
+        assert engine.get_stats()["waiting"] == 0
+
+    async def test_duplicate_request_keeps_one_ticket(self, table):
+        """Test a student already waiting is not queued twice or matched with themselves."""
+        engine = MatchingEngine()
+        await engine.request(1, "a")
+        again = await engine.request(1, "a")
+
+        assert again.already_waiting
+        assert len(table.rows) == 1
+
+    async def test_concurrent_requests_claim_partner_once(self, table):
+        """Test only one of many concurrent requests gets the waiting student."""
+        engine = MatchingEngine()
+        await engine.request(1, "a")
+
+        results = await asyncio.gather(*(engine.request(i, f"u{i}") for i in range(2, 7)))
+
+        partners = [r.partner.telegram_id for r in results if r.partner]
+        assert partners.count(1) == 1
+
+    async def test_expire_notifies_owner(self, table):
+        """Test requests past the TTL are expired and their owners told."""
+        engine = MatchingEngine(ttl=0.01)
+        first = await engine.request(1, "a")
+        await asyncio.sleep(0.02)
+        bot = AsyncMock()
+
+        assert await engine.expire(bot) == 1
+        assert table.rows[first.ticket.match_id]["status"] == "expired"
+        bot.send_message.assert_awaited_once()
+        assert bot.send_message.await_args.args[0] == 1
+
+    async def test_expired_ticket_seen_by_request_is_notified_by_expire(self, table):
+        """Test a ticket request() finds past the TTL is skipped, then expire() tells its owner."""
+        engine = MatchingEngine(ttl=0.01)
+        first = await engine.request(1, "a")
+        await asyncio.sleep(0.02)
+
+        second = await engine.request(2, "b")
+        assert second.ticket and not second.partner
+        assert table.rows[first.ticket.match_id]["status"] == "pending"
+
+        bot = AsyncMock()
+        engine.ttl = float("inf")
+        assert await engine.expire(bot) == 1
+        assert table.rows[first.ticket.match_id]["status"] == "expired"
+        assert bot.send_message.await_args.args[0] == 1
@@ -0,0 +1,29 @@
+"""
+Unit tests for the notifier's pooled HTTP clients.
+
+Tests that the async client and sync session are reused across
+notifications and released by close_notifier_clients.
+"""
+from avap_bot.services import notifier
+
+
+class TestNotifierClients:
+    """Test pooled notifier client functionality."""
+
+    async def test_async_client_is_reused_and_closed(self):
+        """Test one keep-alive client serves every call until it is closed."""
+        client = notifier._get_async_client()
+        assert notifier._get_async_client() is client
+
+        await notifier.close_notifier_clients()
+        assert client.is_closed
+        assert notifier._get_async_client() is not client
+        await notifier.close_notifier_clients()
+
+    async def test_sync_session_is_shared(self):
+        """Test the sync path reuses one session and closing drops it."""
+        session = notifier._get_sync_session()
+        assert notifier._get_sync_session() is session
+
+        await notifier.close_notifier_clients()
+        assert notifier._sync_session is None
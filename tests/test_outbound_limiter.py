@@ -0,0 +1,113 @@
+"""
+Unit tests for PriorityRateLimiter.
+
+Tests priority ordering between classes, per-chat pacing, RetryAfter
+handling per class, pass-through of non-send endpoints and the
+per-class queue wait metrics.
+"""
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from avap_bot.services.outbound_limiter import BULK, INTERACTIVE, NOTIFY, PriorityClass, PriorityRateLimiter
+
+
+def make_limiter(overall_rate=1000.0, chat_interval=0.0, **kwargs):
+    return PriorityRateLimiter(overall_rate=overall_rate, classes=[
+        PriorityClass(INTERACTIVE, 0, rate=1000, burst=1000),
+        PriorityClass(NOTIFY, 1, rate=1000, burst=1000, per_chat_interval=chat_interval),
+        PriorityClass(BULK, 2, rate=1000, burst=1000, per_chat_interval=chat_interval),
+    ], **kwargs)
+
+
+async def send(limiter, chat_id, priority=None, callback=None, endpoint="sendMessage"):
+    async def ok():
+        return True
+    return await limiter.process_request(callback or ok, (), {}, endpoint, {"chat_id": chat_id}, priority)
+
+
+class TestPriorityRateLimiter:
+    """Test PriorityRateLimiter functionality."""
+
+    async def test_interactive_overtakes_queued_bulk(self):
+        """Test an interactive reply is served before bulk sends queued earlier."""
+        limiter = make_limiter(overall_rate=20)
+        limiter._tokens = 0
+        order = []
+
+        def record(name):
+            async def callback():
+                order.append(name)
+            return callback
+
+        bulk = [asyncio.ensure_future(send(limiter, i, BULK, record(f"bulk{i}"))) for i in range(6)]
+        await asyncio.sleep(0.01)
+        reply = asyncio.ensure_future(send(limiter, 99, None, record("reply")))
+        await asyncio.gather(reply, *bulk)
+
+        assert order.index("reply") <= 1
+        await limiter.shutdown()
+
+    async def test_per_chat_pacing(self):
+        """Test two bulk sends to one chat are spaced by the class interval."""
+        limiter = make_limiter(chat_interval=0.2)
+
+        start = time.monotonic()
+        await asyncio.gather(send(limiter, 5, BULK), send(limiter, 5, BULK), send(limiter, 6, BULK))
+
+        assert 0.18 <= time.monotonic() - start < 0.4
+        await limiter.shutdown()
+
+    async def test_numeric_string_chat_id_paced_as_private_chat(self):
+        """Test a numeric string id shares the int id's slot and skips group pacing."""
+        limiter = PriorityRateLimiter(overall_rate=1000, classes=[
+            PriorityClass(INTERACTIVE, 0, rate=1000, burst=1000),
+            PriorityClass(NOTIFY, 1, rate=1000, burst=1000, per_chat_interval=0.2, group_interval=1.0),
+        ])
+
+        start = time.monotonic()
+        await asyncio.gather(send(limiter, "123456", NOTIFY), send(limiter, 123456, NOTIFY))
+
+        assert 0.18 <= time.monotonic() - start < 0.6
+        assert (NOTIFY, 123456) in limiter._chat_next
+        assert (NOTIFY, "123456") not in limiter._chat_next
+        await limiter.shutdown()
+
+    async def test_retry_after_retries_interactive_and_raises_bulk(self):
+        """Test RetryAfter pauses sends, retries interactive and leaves bulk to the engine."""
+        limiter = make_limiter()
+        calls = []
+
+        async def throttled_once():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise RetryAfter(1)
+            return True
+
+        assert await send(limiter, 1, None, throttled_once) is True
+        assert calls[1] - calls[0] >= 0.9
+
+        async def throttled():
+            raise RetryAfter(0)
+
+        with pytest.raises(RetryAfter):
+            await send(limiter, 2, BULK, throttled)
+        stats = limiter.get_stats()["classes"]
+        assert stats[INTERACTIVE]["retry_after"] == 1 and stats[BULK]["retry_after"] == 1
+        await limiter.shutdown()
+
+    async def test_non_send_endpoints_are_not_limited(self):
+        """Test calls like getMe pass straight through and do not appear in class metrics."""
+        limiter = make_limiter()
+
+        assert await send(limiter, None, endpoint="getMe") is True
+        await send(limiter, 3, NOTIFY)
+
+        stats = limiter.get_stats()
+        assert stats["unlimited_requests"] == 1
+        assert stats["classes"][NOTIFY]["requests"] == 1
+        assert sum(stats["classes"][NOTIFY]["wait_histogram"].values()) == 1
+        assert stats["classes"][BULK]["requests"] == 0
+        await limiter.shutdown()
@@ -0,0 +1,50 @@
+"""
+Unit tests for AsyncPostgrestClient.
+
+Tests keyset pagination in iter_rows against a stubbed select().
+"""
+from unittest.mock import AsyncMock
+
+from avap_bot.services.postgrest_client import AsyncPostgrestClient
+
+
+def _paged_select(rows):
+    """Emulate PostgREST for id > last_id, ordered by id, limited."""
+    async def select(table, columns="*", filters=None, order=None, limit=None, offset=None):
+        last_id = 0
+        for column, expression in filters or []:
+            if column == "id" and expression.startswith("gt."):
+                last_id = int(expression[3:])
+        page = [row for row in rows if row["id"] > last_id]
+        return page[:limit]
+    return select
+
+
+class TestIterRows:
+    """Test keyset streaming."""
+
+    async def test_streams_every_row_once(self):
+        """Test pages continue after the last key until a short page."""
+        rows = [{"id": i, "telegram_id": 100 + i} for i in range(1, 26)]
+        client = AsyncPostgrestClient("http://localhost", "key")
+        client.select = AsyncMock(side_effect=_paged_select(rows))
+
+        streamed = [row async for row in client.iter_rows("verified_users", columns="telegram_id", page_size=10)]
+
+        assert streamed == rows
+        assert client.select.await_count == 3
+        assert client.pages_streamed == 3
+        first_call = client.select.await_args_list[0]
+        assert first_call.kwargs["columns"] == "id,telegram_id"
+        assert first_call.kwargs["order"] == "id.asc"
+
+    async def test_keeps_base_filters(self):
+        """Test the caller's filters are sent with every page."""
+        client = AsyncPostgrestClient("http://localhost", "key")
+        client.select = AsyncMock(side_effect=_paged_select([{"id": i} for i in range(1, 5)]))
+
+        streamed = [row async for row in client.iter_rows("faqs", filters={"status": "eq.verified"}, page_size=2)]
+
+        assert len(streamed) == 4
+        for call in client.select.await_args_list:
+            assert ("status", "eq.verified") in call.kwargs["filters"]
@@ -0,0 +1,90 @@
+"""
+Unit tests for RecipientHealth.
+
+Tests which errors mark a chat unreachable, skipping and re-probing,
+recovery on success, broadcast engine integration and flushing.
+"""
+import time
+from unittest.mock import AsyncMock, patch
+
+from telegram.error import BadRequest, Forbidden, TimedOut
+
+from avap_bot.services import recipient_health as health_module
+from avap_bot.services.broadcast_service import BroadcastEngine
+from avap_bot.services.recipient_health import RecipientHealth, is_unreachable_error
+
+
+class TestRecipientHealth:
+    """Test RecipientHealth functionality."""
+
+    def test_unreachable_errors(self):
+        """Test blocked and missing chats count, message errors and timeouts do not."""
+        assert is_unreachable_error(Forbidden("Forbidden: bot was blocked by the user"))
+        assert is_unreachable_error(BadRequest("Chat not found"))
+        assert not is_unreachable_error(BadRequest("Can't parse entities"))
+        assert not is_unreachable_error(TimedOut())
+
+    def test_marked_chat_is_skipped_until_probe_is_due(self):
+        """Test a marked chat is skipped, then allowed once when its probe is due."""
+        health = RecipientHealth(probe_interval=60)
+        assert health.record_failure(5, Forbidden("blocked"))
+        assert not health.allow(5)
+        assert health.allow(6)
+
+        with patch.object(health_module.time, "time", return_value=time.time() + 61):
+            assert health.allow(5)
+            assert not health.allow(5)  # probe leased to one sender
+
+        stats = health.get_stats()
+        assert stats["sends_skipped"] == 2 and stats["probes"] == 1
+
+    def test_failed_probe_backs_off_and_success_clears(self):
+        """Test repeated failures double the probe interval and a success removes the mark."""
+        health = RecipientHealth(probe_interval=60, max_probe_interval=1000)
+        health.record_failure(5, Forbidden("blocked"))
+        first = health._entries[5]["next_probe_at"]
+        health.record_failure(5, Forbidden("blocked"))
+        assert health._entries[5]["next_probe_at"] - first >= 59
+
+        health.record_success(5)
+        assert 5 not in health and health.allow(5)
+        assert health.get_stats()["recovered"] == 1
+
+    async def test_engine_skips_unreachable_and_reports_saved_sends(self):
+        """Test a broadcast skips marked chats and marks new ones from Forbidden errors."""
+        health = RecipientHealth()
+        health.record_failure(1, Forbidden("blocked"))
+        engine = BroadcastEngine(rate_per_second=1000, per_chat_interval=0, health=health)
+        sent, seen = [], []
+
+        async def send(chat_id):
+            if chat_id == 2:
+                raise Forbidden("Forbidden: user is deactivated")
+            sent.append(chat_id)
+
+        report = await engine.broadcast([1, 2, 3], send, on_result=seen.append)
+        assert sorted(sent) == [3]
+        assert (report.sent, report.failed, report.skipped) == (1, 1, 1)
+        assert len(seen) == 3 and 2 in health
+
+        report = await engine.broadcast([1, 2, 3], send)
+        assert (report.sent, report.failed, report.skipped) == (1, 0, 2)
+
+    async def test_flush_writes_marks_and_deletes_recovered(self):
+        """Test flush upserts new marks, deletes cleared ones and keeps changes on failure."""
+        health = RecipientHealth()
+        health.record_failure(5, Forbidden("blocked"))
+        health.record_failure(6, Forbidden("blocked"))
+        health.record_success(6)
+        save = AsyncMock(side_effect=[RuntimeError("down"), 1])
+        delete = AsyncMock(return_value=1)
+
+        with patch.multiple(health_module, save_recipient_health_async=save, delete_recipient_health_async=delete):
+            assert await health.flush() == 0
+            assert health.get_stats()["pending_writes"] == 2
+            assert await health.flush() == 2
+
+        rows = save.call_args.args[0]
+        assert [row["telegram_id"] for row in rows] == [5]
+        delete.assert_called_with([6])
+        assert health.get_stats()["pending_writes"] == 0
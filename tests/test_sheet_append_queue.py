@@ -0,0 +1,103 @@
+"""
+Unit tests for SheetAppendQueue.
+
+Tests batching into append_rows, the cached header check, retries and
+the failure callback against an in-memory stand-in for a worksheet.
+"""
+from avap_bot.utils.sheet_append_queue import SheetAppendQueue
+
+HEADER = ["id", "username", "status"]
+
+
+class FakeWorksheet:
+    """Worksheet recording append_rows calls, optionally failing the first few."""
+
+    def __init__(self, header=None, fail_times=0):
+        self.title = "submissions"
+        self.values = [list(header)] if header else []
+        self.append_calls = []
+        self.header_reads = 0
+        self.fail_times = fail_times
+
+    def row_values(self, row):
+        self.header_reads += 1
+        return list(self.values[0]) if self.values else []
+
+    def update(self, range_name=None, values=None):
+        self.values[:1] = [list(values[0])]
+
+    def append_rows(self, rows):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("429 quota exceeded")
+        self.append_calls.append(len(rows))
+        self.values.extend(rows)
+
+
+def make_queue(sheet, **kwargs):
+    return SheetAppendQueue("submissions", lambda: sheet, HEADER, flush_interval=60, **kwargs)
+
+
+class TestSheetAppendQueue:
+    """Test SheetAppendQueue functionality."""
+
+    def test_rows_coalesced_into_one_request(self):
+        """Test queued rows are written with a single append_rows call."""
+        sheet = FakeWorksheet(HEADER)
+        flushed = []
+        queue = make_queue(sheet, on_flushed=lambda ws, rows: flushed.extend(rows))
+        for i in range(5):
+            queue.enqueue([f"s{i}", "ada", "Pending"])
+
+        assert queue.flush() == 5
+        assert sheet.append_calls == [5]
+        assert len(flushed) == 5
+        assert queue.get_stats()["max_batch_size"] == 5
+        queue.stop()
+
+    def test_max_batch_splits_requests(self):
+        """Test a backlog larger than max_batch is written in several requests."""
+        sheet = FakeWorksheet(HEADER)
+        queue = make_queue(sheet, max_batch=2)
+        for i in range(5):
+            queue._pending.append([f"s{i}", "ada", "Pending"])
+
+        queue.flush()
+
+        assert sheet.append_calls == [2, 2, 1]
+
+    def test_header_checked_once_and_written_if_missing(self):
+        """Test the header is read once per worksheet and added to an empty sheet."""
+        sheet = FakeWorksheet()
+        queue = make_queue(sheet)
+        for _ in range(3):
+            queue._pending.append(["s", "ada", "Pending"])
+            queue.flush()
+
+        assert sheet.header_reads == 1
+        assert sheet.values[0] == HEADER
+        assert sheet.append_calls == [1, 1, 1]
+
+    def test_failed_flush_retried_then_handed_to_callback(self):
+        """Test a failing batch is retried and then passed to on_failed."""
+        sheet = FakeWorksheet(HEADER, fail_times=5)
+        failed = []
+        queue = make_queue(sheet, max_retries=2, on_failed=lambda rows, error: failed.extend(rows))
+        queue._pending.append(["s1", "ada", "Pending"])
+
+        queue.flush()
+        assert failed == [] and queue.get_stats()["pending"] == 1
+
+        queue.flush()
+        assert failed == [["s1", "ada", "Pending"]]
+        assert queue.get_stats()["pending"] == 0
+
+    def test_recovers_after_transient_failure(self):
+        """Test rows requeued after a failure are written by the next flush."""
+        sheet = FakeWorksheet(HEADER, fail_times=1)
+        queue = make_queue(sheet)
+        queue._pending.append(["s1", "ada", "Pending"])
+
+        assert queue.flush() == 0
+        assert queue.flush() == 1
+        assert sheet.values[-1] == ["s1", "ada", "Pending"]
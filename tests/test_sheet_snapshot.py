@@ -0,0 +1,142 @@
+"""
+Unit tests for WorksheetSnapshot.
+
+Tests indexed lookups, incremental refresh, full reloads and local
+patches against an in-memory stand-in for a gspread worksheet.
+"""
+import time
+
+from avap_bot.utils.sheet_snapshot import WorksheetSnapshot, _column_letter
+
+HEADER = ["submission_id", "username", "telegram_id", "module", "status", "grade", "comments"]
+
+
+class FakeWorksheet:
+    """Rows of text cells with the two gspread reads the snapshot uses."""
+
+    def __init__(self, rows):
+        self.values = [HEADER] + [list(row) for row in rows]
+        self.full_reads = 0
+        self.ranges = []
+
+    def get_all_values(self):
+        self.full_reads += 1
+        return [list(row) for row in self.values]
+
+    def get_values(self, range_name):
+        self.ranges.append(range_name)
+        first_row = int(range_name.split(":")[0][1:])
+        return [list(row) for row in self.values[first_row - 1:]]
+
+    def append_row(self, row):
+        self.values.append([str(v) for v in row])
+
+
+def make_snapshot(sheet, **kwargs):
+    return WorksheetSnapshot(
+        "submissions",
+        lambda: sheet,
+        {
+            "submission_id": ("submission_id",),
+            "username": ("username",),
+            "telegram_id": ("telegram_id",),
+            "username_module": ("username", "module")
+        },
+        **kwargs
+    )
+
+
+class TestWorksheetSnapshot:
+    """Test WorksheetSnapshot functionality."""
+
+    def test_lookup_by_index(self):
+        """Test lookups return matching rows, numericised like get_all_records."""
+        sheet = FakeWorksheet([
+            ["s1", "ada", "101", "1", "Pending", "", ""],
+            ["s2", "bob", "102", "1", "Pending", "", ""],
+            ["s3", "ada", "101", "2", "Graded", "8", ""]
+        ])
+        snapshot = make_snapshot(sheet)
+
+        assert [r["submission_id"] for r in snapshot.lookup("username", "ada")] == ["s1", "s3"]
+        assert snapshot.lookup("telegram_id", 102)[0]["telegram_id"] == 102
+        assert snapshot.lookup("username_module", "ada", "2")[0]["grade"] == 8
+        assert snapshot.lookup("submission_id", "missing") == []
+        assert sheet.full_reads == 1
+
+    def test_lookup_any_deduplicates(self):
+        """Test rows matching several keys are returned once, in sheet order."""
+        sheet = FakeWorksheet([["s1", "ada", "101", "1", "", "", ""], ["s2", "x", "101", "2", "", "", ""]])
+        snapshot = make_snapshot(sheet)
+
+        rows = snapshot.lookup_any([("username", ("ada",)), ("telegram_id", (101,)), ("username", (None,))])
+
+        assert [r["submission_id"] for r in rows] == ["s1", "s2"]
+
+    def test_incremental_refresh_fetches_only_new_rows(self):
+        """Test an expired TTL fetches rows after the known ones, not the whole sheet."""
+        sheet = FakeWorksheet([["s1", "ada", "101", "1", "", "", ""]])
+        snapshot = make_snapshot(sheet, ttl=0)
+        snapshot.records()
+        sheet.append_row(["s2", "ada", "101", "2", "", "", ""])
+
+        rows = snapshot.lookup("username", "ada")
+
+        assert [r["submission_id"] for r in rows] == ["s1", "s2"]
+        assert sheet.full_reads == 1
+        assert sheet.ranges[-1] == "A3:G"
+
+    def test_full_reload_picks_up_edits(self):
+        """Test the periodic full reload sees cells edited directly in the sheet."""
+        sheet = FakeWorksheet([["s1", "ada", "101", "1", "Pending", "", ""]])
+        snapshot = make_snapshot(sheet, ttl=0, full_refresh_interval=0)
+        snapshot.records()
+        sheet.values[1][4] = "Graded"
+
+        assert snapshot.lookup("submission_id", "s1")[0]["status"] == "Graded"
+        assert sheet.full_reads == 2
+
+    def test_patch_append_visible_and_not_duplicated(self):
+        """Test our own append is visible at once and replaced by the sheet's copy on refresh."""
+        sheet = FakeWorksheet([["s1", "ada", "101", "1", "", "", ""]])
+        snapshot = make_snapshot(sheet, ttl=60)
+        snapshot.records()
+        row = ["s2", "ada", 101, "2", "Pending", "", ""]
+        sheet.append_row(row)
+        snapshot.patch_append(row)
+
+        assert snapshot.lookup("submission_id", "s2")[0]["telegram_id"] == 101
+        assert sheet.ranges == []
+
+        time.sleep(0.01)
+        snapshot.ttl = 0
+        assert len(snapshot.lookup("username", "ada")) == 2
+        assert snapshot.get_stats()["pending_local_rows"] == 0
+
+    def test_patch_update(self):
+        """Test updates patch matching rows, honouring where and pick."""
+        sheet = FakeWorksheet([
+            ["s1", "ada", "101", "1", "Pending", "", ""],
+            ["s2", "ada", "101", "2", "Pending", "", ""]
+        ])
+        snapshot = make_snapshot(sheet, ttl=60)
+        snapshot.records()
+
+        updated = snapshot.patch_update("username", ("ada",), {"status": "Graded", "grade": 9},
+                                        where=lambda r: r["status"] == "Pending", pick=-1)
+
+        assert updated == 1
+        assert [r["status"] for r in snapshot.records()] == ["Pending", "Graded"]
+        assert snapshot.lookup("submission_id", "s2")[0]["grade"] == 9
+
+    def test_patch_before_load_is_ignored(self):
+        """Test patches before the first load do nothing (the load will include them)."""
+        sheet = FakeWorksheet([])
+        snapshot = make_snapshot(sheet)
+        snapshot.patch_append(["s1", "ada", "101", "1", "", "", ""])
+
+        assert snapshot.get_stats()["rows"] == 0
+
+    def test_column_letter(self):
+        """Test A1 column letters."""
+        assert [_column_letter(n) for n in (1, 12, 26, 27, 52)] == ["A", "L", "Z", "AA", "AZ"]
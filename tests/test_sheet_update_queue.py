@@ -0,0 +1,129 @@
+"""
+Unit tests for SheetUpdateQueue.
+
+Tests row lookup through the snapshot index, coalescing several updates
+into one batch_update, and recovery when rows move in the sheet.
+"""
+import re
+
+from avap_bot.utils.sheet_snapshot import WorksheetSnapshot
+from avap_bot.utils.sheet_update_queue import SheetUpdateQueue
+
+HEADER = ["submission_id", "username", "module", "status", "grade", "comments"]
+
+
+class FakeWorksheet:
+    """Grid of text cells supporting the reads and writes the queue uses."""
+
+    def __init__(self, rows):
+        self.values = [HEADER] + [list(row) for row in rows]
+        self.batch_updates = []
+        self.batch_gets = 0
+
+    def get_all_values(self):
+        return [list(row) for row in self.values]
+
+    def get_values(self, range_name):
+        first_row = int(range_name.split(":")[0][1:])
+        return [list(row) for row in self.values[first_row - 1:]]
+
+    def _cell(self, a1):
+        letter, row = re.match(r"([A-Z]+)(\d+)", a1).groups()
+        return int(row) - 1, ord(letter) - 65
+
+    def batch_get(self, ranges):
+        self.batch_gets += 1
+        result = []
+        for a1 in ranges:
+            row, col = self._cell(a1)
+            result.append([[self.values[row][col]]] if row < len(self.values) else [])
+        return result
+
+    def batch_update(self, data, raw=True):
+        self.batch_updates.append(data)
+        for item in data:
+            row, col = self._cell(item["range"])
+            self.values[row][col] = str(item["values"][0][0])
+
+
+def make_queue(sheet, **kwargs):
+    snapshot = WorksheetSnapshot(
+        "submissions",
+        lambda: sheet,
+        {"submission_id": ("submission_id",), "username": ("username",), "username_module": ("username", "module")},
+        ttl=60
+    )
+    return SheetUpdateQueue(snapshot, lambda: sheet, flush_interval=60, **kwargs)
+
+
+class TestSheetUpdateQueue:
+    """Test SheetUpdateQueue functionality."""
+
+    def test_updates_coalesced_into_one_batch_update(self):
+        """Test updates from several graders are written with a single request."""
+        sheet = FakeWorksheet([
+            ["s1", "ada", "1", "Pending", "", ""],
+            ["s2", "bob", "1", "Pending", "", ""]
+        ])
+        queue = make_queue(sheet)
+        first = queue.submit("username_module", ("ada", "1"), {"status": "Graded", "grade": 8, "comments": "Nice"})
+        second = queue.submit("submission_id", ("s2",), {"status": "Graded", "grade": 6})
+
+        assert queue.flush() == 5
+        assert first.result() == 1 and second.result() == 1
+        assert len(sheet.batch_updates) == 1
+        assert sheet.values[1][3:] == ["Graded", "8", "Nice"]
+        assert sheet.values[2][3:5] == ["Graded", "6"]
+        assert queue.snapshot.lookup("submission_id", "s1")[0]["grade"] == 8
+
+    def test_missing_row_resolves_to_zero(self):
+        """Test an update matching no row reports 0 without writing."""
+        sheet = FakeWorksheet([["s1", "ada", "1", "Pending", "", ""]])
+        queue = make_queue(sheet)
+        future = queue.submit("submission_id", ("nope",), {"status": "Graded"})
+
+        queue.flush()
+
+        assert future.result() == 0
+        assert sheet.batch_updates == []
+
+    def test_same_student_updates_pick_different_rows(self):
+        """Test two 'latest pending' updates in one window hit two rows."""
+        sheet = FakeWorksheet([
+            ["q1", "ada", "1", "Pending", "", ""],
+            ["q2", "ada", "1", "Pending", "", ""]
+        ])
+        queue = make_queue(sheet)
+        pending = lambda r: r.get("status") == "Pending"
+        queue.submit("username", ("ada",), {"status": "Answered"}, where=pending, pick=-1)
+        queue.submit("username", ("ada",), {"status": "Answered"}, where=pending, pick=-1)
+
+        queue.flush()
+
+        assert [row[3] for row in sheet.values[1:]] == ["Answered", "Answered"]
+
+    def test_moved_rows_trigger_reload(self):
+        """Test a row inserted in the sheet after loading is detected and the right row written."""
+        sheet = FakeWorksheet([["s1", "ada", "1", "Pending", "", ""]])
+        queue = make_queue(sheet)
+        queue.snapshot.records()
+        sheet.values.insert(1, ["s0", "zed", "2", "Pending", "", ""])
+        future = queue.submit("submission_id", ("s1",), {"status": "Graded"})
+
+        queue.flush()
+
+        assert future.result() == 1
+        assert sheet.values[2][3] == "Graded"
+        assert sheet.values[1][3] == "Pending"
+        assert queue.get_stats()["relocations"] == 1
+
+    def test_default_columns_used_when_header_lacks_field(self):
+        """Test fields missing from the header fall back to fixed column numbers."""
+        sheet = FakeWorksheet([["s1", "ada", "1", "Pending", "", ""]])
+        sheet.values[0][5] = "notes"
+        queue = make_queue(sheet, default_columns={"comments": 6})
+        queue.submit("submission_id", ("s1",), {"comments": "Well done"})
+
+        queue.flush()
+
+        assert sheet.values[1][5] == "Well done"
@@ -0,0 +1,135 @@
+"""
+Unit tests for SheetsGateway.
+
+Tests retries with Retry-After, non-retryable errors, append retries, priority ordering
+of token waiters and the gspread proxies.
+"""
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from avap_bot.utils.sheets_gateway import (
+    BACKGROUND,
+    INTERACTIVE,
+    GatedSpreadsheet,
+    GatedWorksheet,
+    SheetsGateway,
+    TokenBucket
+)
+
+
+class FakeAPIError(Exception):
+    """Stand-in for gspread.exceptions.APIError."""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.response = MagicMock(status_code=status, headers={"Retry-After": retry_after} if retry_after else {})
+
+
+def flaky(errors, result="ok"):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    fn.calls = calls
+    return fn
+
+
+class TestSheetsGateway:
+    """Test SheetsGateway functionality."""
+
+    def test_retries_throttled_call_honouring_retry_after(self):
+        """Test a 429 is retried after the server's Retry-After delay."""
+        gateway = SheetsGateway(reads_per_minute=6000)
+        fn = flaky([FakeAPIError(429, retry_after="2")])
+
+        with patch("avap_bot.utils.sheets_gateway.time.sleep") as sleep:
+            assert gateway.call("read", fn) == "ok"
+
+        sleep.assert_called_once_with(2.0)
+        stats = gateway.get_stats()
+        assert stats["throttled"] == 1 and stats["retries"] == 1
+        assert stats["read"]["requests_total"] == 2
+
+    def test_server_errors_back_off_then_give_up(self):
+        """Test 5xx errors are retried with backoff and re-raised once retries run out."""
+        gateway = SheetsGateway(writes_per_minute=6000, max_retries=2, base_backoff=0.5)
+        fn = flaky([FakeAPIError(503)] * 3)
+
+        with patch("avap_bot.utils.sheets_gateway.time.sleep") as sleep, pytest.raises(FakeAPIError):
+            gateway.call("write", fn)
+
+        delays = [c.args[0] for c in sleep.call_args_list]
+        assert len(delays) == 2 and delays[1] > delays[0] * 1.3
+        assert gateway.get_stats()["failures"] == 1
+
+    def test_client_errors_not_retried(self):
+        """Test a 400 fails immediately."""
+        gateway = SheetsGateway()
+        fn = flaky([FakeAPIError(400)])
+
+        with pytest.raises(FakeAPIError):
+            gateway.call("write", fn)
+
+        assert len(fn.calls) == 1
+
+    def test_appends_retried_only_when_throttled(self):
+        """Test an append is retried after a 429 but not after a 5xx or timeout."""
+        gateway = SheetsGateway(writes_per_minute=6000)
+        worksheet = MagicMock()
+        worksheet.append_rows.side_effect = [FakeAPIError(429), None, FakeAPIError(500), TimeoutError()]
+        sheet = GatedWorksheet(worksheet, gateway)
+
+        with patch("avap_bot.utils.sheets_gateway.time.sleep"):
+            sheet.append_rows([["a"]])
+            with pytest.raises(FakeAPIError):
+                sheet.append_rows([["b"]])
+            with pytest.raises(TimeoutError):
+                sheet.append_rows([["c"]])
+
+        assert worksheet.append_rows.call_count == 4
+        assert gateway.get_stats()["retries"] == 1
+
+    def test_interactive_waiters_served_first(self):
+        """Test that when tokens are scarce, interactive callers get them before background ones."""
+        bucket = TokenBucket(per_minute=600, burst=1)  # one token every 0.1s
+        bucket.acquire()
+        order = []
+
+        def take(priority, label):
+            bucket.acquire(priority)
+            order.append(label)
+
+        background = threading.Thread(target=take, args=(BACKGROUND, "background"))
+        background.start()
+        time.sleep(0.02)
+        interactive = threading.Thread(target=take, args=(INTERACTIVE, "interactive"))
+        interactive.start()
+        background.join(2)
+        interactive.join(2)
+
+        assert order == ["interactive", "background"]
+
+    def test_proxies_route_api_methods(self):
+        """Test gated objects send reads/writes through the gateway and wrap worksheets."""
+        gateway = SheetsGateway()
+        worksheet = MagicMock(title="submissions")
+        spreadsheet = MagicMock()
+        spreadsheet.worksheet.return_value = worksheet
+        gated = GatedSpreadsheet(spreadsheet, gateway).with_priority(BACKGROUND)
+
+        sheet = gated.worksheet("submissions")
+        sheet.append_rows([["a"]])
+        gated.del_worksheet(sheet)
+
+        assert isinstance(sheet, GatedWorksheet) and sheet.title == "submissions"
+        worksheet.append_rows.assert_called_once_with([["a"]])
+        spreadsheet.del_worksheet.assert_called_once_with(worksheet)
+        stats = gateway.get_stats()
+        assert stats["read"]["requests_total"] == 1 and stats["write"]["requests_total"] == 2
+        assert stats["queued"]["background"]["count"] == 3
@@ -0,0 +1,112 @@
+"""
+Unit tests for StatsSnapshot.
+
+Tests background refresh, coalescing of concurrent refreshes, staleness
+and on-demand refresh, keeping the last good snapshot on failure and the
+RPC and count fallbacks of the default loader.
+"""
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+from avap_bot.services import supabase_service
+from avap_bot.services.postgrest_client import PostgrestError
+from avap_bot.services.stats_service import StatsSnapshot
+
+
+def counting_loader(*results):
+    """Loader returning the given results in turn, counting its calls"""
+    return AsyncMock(side_effect=list(results))
+
+
+class TestStatsSnapshot:
+    """Test StatsSnapshot functionality."""
+
+    async def test_refresh_then_served_from_memory(self):
+        """Test a background refresh fills the snapshot and get() does not query again."""
+        loader = counting_loader({"total_users": 3})
+        snapshot = StatsSnapshot(loader, max_age=60)
+
+        assert await snapshot.refresh() is True
+        result = await snapshot.get()
+
+        assert result["stats"] == {"total_users": 3}
+        assert result["stale"] is False and result["refreshed_at"] is not None
+        assert loader.await_count == 1
+        assert snapshot.get_stats()["served"] == 1
+
+    async def test_concurrent_refreshes_share_one_load(self):
+        """Test refreshes waiting on a running one reuse its result."""
+        release = asyncio.Event()
+
+        async def slow_loader():
+            await release.wait()
+            return {"total_users": 1}
+
+        loader = AsyncMock(side_effect=slow_loader)
+        snapshot = StatsSnapshot(loader)
+        refreshes = [asyncio.ensure_future(snapshot.refresh()) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await asyncio.gather(*refreshes) == [True] * 5
+        assert loader.await_count == 1
+
+    async def test_old_snapshot_is_refreshed_on_demand(self):
+        """Test get() reloads a snapshot older than max_age."""
+        loader = counting_loader({"total_users": 1}, {"total_users": 2})
+        snapshot = StatsSnapshot(loader, max_age=60)
+        await snapshot.refresh()
+        snapshot._refreshed_at -= 120
+
+        result = await snapshot.get()
+
+        assert result["stats"] == {"total_users": 2}
+        assert result["stale"] is False
+        assert loader.await_count == 2
+
+    async def test_failed_refresh_keeps_last_snapshot_marked_stale(self):
+        """Test an empty or failing reload keeps serving old data flagged as stale."""
+        loader = counting_loader({"total_users": 1}, {}, RuntimeError("database down"))
+        snapshot = StatsSnapshot(loader, max_age=60)
+        await snapshot.refresh()
+        snapshot._refreshed_at -= 120
+
+        first = await snapshot.get()
+        second = await snapshot.get()
+
+        assert first["stats"] == second["stats"] == {"total_users": 1}
+        assert first["stale"] is True and second["age_seconds"] >= 120
+        assert snapshot.get_stats()["failures"] == 2
+
+    async def test_never_loaded(self):
+        """Test a snapshot that never loaded reports no data and no age."""
+        snapshot = StatsSnapshot(counting_loader({}))
+
+        result = await snapshot.get()
+
+        assert result == {"stats": {}, "refreshed_at": None, "age_seconds": None, "stale": True}
+
+
+class TestDefaultLoader:
+    """Test the snapshot over get_bot_statistics_async."""
+
+    async def test_rpc_result_is_used(self):
+        """Test the single RPC answer fills the snapshot without count queries."""
+        client = Mock(rpc=AsyncMock(return_value={"total_users": "4", "total_wins": None}), count=AsyncMock())
+        snapshot = StatsSnapshot(supabase_service.get_bot_statistics_async)
+        with patch.object(supabase_service, "get_async_postgrest", return_value=client):
+            result = await snapshot.get()
+
+        assert result["stats"] == {"total_users": 4, "total_wins": 0}
+        client.count.assert_not_awaited()
+
+    async def test_missing_rpc_falls_back_to_counts(self):
+        """Test a missing SQL function falls back to one count per statistic."""
+        client = Mock(rpc=AsyncMock(side_effect=PostgrestError(404, "missing")), count=AsyncMock(return_value=7))
+        snapshot = StatsSnapshot(supabase_service.get_bot_statistics_async)
+        with patch.object(supabase_service, "get_async_postgrest", return_value=client):
+            result = await snapshot.get()
+
+        assert set(result["stats"]) == set(supabase_service._BOT_STATISTICS_COUNTS)
+        assert set(result["stats"].values()) == {7}
+        assert client.count.await_count == len(supabase_service._BOT_STATISTICS_COUNTS)
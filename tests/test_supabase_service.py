@@ -0,0 +1,264 @@
+"""
+Unit tests for the async Supabase service functions.
+
+Tests run against a fake AsyncPostgrestClient, so no Supabase project is
+needed: statistics (RPC, count fallback and errors), keyset streaming of
+verified users and FAQs, counts, cached lookups, exact student removal,
+match requests and tip listing.
+"""
+import httpx
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from avap_bot.services import supabase_service
+from avap_bot.services.postgrest_client import AsyncPostgrestClient, PostgrestError
+
+
+class FakePostgrest(AsyncPostgrestClient):
+    """
+    AsyncPostgrestClient over in-memory tables.
+
+    Only select, count and rpc are replaced, so iter_rows runs its real
+    keyset paging over them. eq. and gt. filters are supported; errors
+    maps a method name to the exception it raises.
+    """
+
+    def __init__(self, tables=None, rpc_result=None, errors=None):
+        super().__init__("https://example.supabase.co", "key")
+        self.tables = tables or {}
+        self.rpc_result = rpc_result
+        self.errors_by_method = errors or {}
+        self.calls = []
+
+    def _fail(self, method):
+        self.calls.append(method)
+        if method in self.errors_by_method:
+            raise self.errors_by_method[method]
+
+    def _rows(self, table, filters):
+        rows = self.tables.get(table, [])
+        for column, condition in filters or []:
+            op, value = condition.split(".", 1)
+            if op == "eq":
+                rows = [r for r in rows if str(r.get(column)) == value]
+            elif op == "gt":
+                rows = [r for r in rows if str(r.get(column)) > value]
+        return rows
+
+    async def select(self, table, columns="*", filters=None, order=None, limit=None, offset=None):
+        self._fail("select")
+        rows = sorted(self._rows(table, filters), key=lambda r: str(r.get("id")))
+        return [dict(r) for r in rows[:limit]]
+
+    async def count(self, table, filters=None):
+        self._fail("count")
+        return len(self._rows(table, filters))
+
+    async def rpc(self, function, args=None):
+        self._fail("rpc")
+        return self.rpc_result
+
+
+USERS = [
+    {"id": "u1", "telegram_id": 11, "status": "verified"},
+    {"id": "u2", "telegram_id": None, "status": "verified"},
+    {"id": "u3", "telegram_id": 33, "status": "removed"},
+    {"id": "u4", "telegram_id": 44, "status": "verified"},
+    {"id": "u5", "telegram_id": 55, "status": "verified"},
+]
+
+
+def fake_postgrest(**methods):
+    """A stand-in AsyncPostgrestClient whose methods are AsyncMocks"""
+    client = Mock()
+    for name, result in methods.items():
+        setattr(client, name, result if isinstance(result, AsyncMock) else AsyncMock(return_value=result))
+    return client
+
+
+class TestRemoveStudentRecord:
+    """Test removal of the exact row an admin confirmed."""
+
+    async def test_deletes_only_the_confirmed_row(self):
+        """Test the delete targets the confirmed table and id and clears cached state."""
+        row = {"id": "v-1", "telegram_id": 42, "email": "a@b.co", "phone": "080"}
+        client = fake_postgrest(delete=[row])
+        with patch.object(supabase_service, "get_async_postgrest", return_value=client), \
+                patch.object(supabase_service, "forget_identity") as forget, \
+                patch.object(supabase_service, "invalidate_verified_user") as invalidate:
+            assert await supabase_service.remove_student_record_async("verified_users", "v-1") is True
+
+        client.delete.assert_awaited_once_with("verified_users", [("id", "eq.v-1")])
+        forget.assert_called_once_with("a@b.co", "080")
+        invalidate.assert_called_once_with(42)
+
+    async def test_missing_row_and_unknown_table(self):
+        """Test an already-removed row returns False and other tables are refused."""
+        client = fake_postgrest(delete=[])
+        with patch.object(supabase_service, "get_async_postgrest", return_value=client):
+            assert await supabase_service.remove_student_record_async("pending_verifications", 3) is False
+            with pytest.raises(ValueError):
+                await supabase_service.remove_student_record_async("tips", 3)
+        client.delete.assert_awaited_once_with("pending_verifications", [("id", "eq.3")])
+
+
+class TestAddMatchRequest:
+    """Test match requests are written directly."""
+
+    async def test_inserts_directly_not_through_buffer(self):
+        """Test a match request is inserted at once and never queued in the write-behind buffer."""
+        client = fake_postgrest(insert=[{}])
+        with patch.object(supabase_service, "get_async_postgrest", return_value=client), \
+                patch.object(supabase_service.insert_buffer, "submit") as submit:
+            match_id = await supabase_service.add_match_request_async(42, "ada")
+
+        submit.assert_not_called()
+        table, payload = client.insert.await_args.args
+        assert table == "match_requests"
+        assert payload["match_id"] == match_id and payload["username"] == "ada"
+
+    async def test_retries_without_missing_username_column(self):
+        """Test a rejected username column is retried once without it."""
+        insert = AsyncMock(side_effect=[supabase_service.PostgrestError(400, "column username does not exist"), [{}]])
+        client = fake_postgrest(insert=insert)
+        with patch.object(supabase_service, "get_async_postgrest", return_value=client):
+            await supabase_service.add_match_request_async(42, "ada")
+
+        assert insert.await_count == 2
+        assert "username" not in insert.await_args.args[1]
+
+
+class TestTips:
+    """Test the tip listing queries."""
+
+    async def test_recent_tips_and_count(self):
+        """Test /list_tips fetches only the newest page and counts the rest."""
+        client = fake_postgrest(select=[{"id": 1}], count=25)
+        with patch.object(supabase_service, "get_async_postgrest", return_value=client):
+            assert await supabase_service.get_recent_tips_async(10) == [{"id": 1}]
+            assert await supabase_service.count_tips_async() == 25
+
+        assert client.select.await_args.kwargs["order"] == "created_at.desc"
+        assert client.select.await_args.kwargs["limit"] == 10
+
+    async def test_random_tip_fetches_one_row_at_random_offset(self):
+        """Test /send_tip counts tips and fetches a single row instead of the table."""
+        client = fake_postgrest(select=[{"id": 3}], count=25)
+        with patch.object(supabase_service, "get_async_postgrest", return_value=client), \
+                patch.object(supabase_service.random, "randrange", return_value=7):
+            assert await supabase_service.get_random_tip_async() == {"id": 3}
+
+        kwargs = client.select.await_args.kwargs
+        assert kwargs["limit"] == 1
+        assert kwargs["offset"] == 7
+        assert kwargs["columns"] == supabase_service.TIP_COLUMNS
+
+    async def test_sent_count_fallback_reports_unwritten_tips(self):
+        """Test the per-tip fallback raises only the deltas it could not write."""
+        client = fake_postgrest(
+            rpc=AsyncMock(side_effect=PostgrestError(404, "missing")),
+            select=AsyncMock(return_value=[{"sent_count": 4}]),
+            update=AsyncMock(side_effect=[[{"id": 1}], httpx.ConnectError("down")])
+        )
+        with patch.object(supabase_service, "get_async_postgrest", return_value=client):
+            with pytest.raises(supabase_service.PartialFlushError) as exc:
+                await supabase_service.increment_tip_sent_counts_async({1: 2, 2: 5})
+
+        assert exc.value.unwritten == {2: 5}
+        assert client.update.await_args_list[0].args[1] == {"sent_count": 6}
+
+    async def test_random_tip_without_tips(self):
+        """Test no select is made when there are no tips."""
+        client = fake_postgrest(select=[], count=0)
+        with patch.object(supabase_service, "get_async_postgrest", return_value=client):
+            assert await supabase_service.get_random_tip_async() is None
+
+        client.select.assert_not_awaited()
+
+
+class TestAsyncApi:
+    """Test the async statistics, streaming and count functions."""
+
+    def use(self, client):
+        return patch.object(supabase_service, "get_async_postgrest", return_value=client)
+
+    async def test_statistics_from_rpc(self):
+        """Test an installed get_bot_statistics answers in one call with ints."""
+        client = FakePostgrest(rpc_result={"total_users": "5", "total_wins": None})
+        with self.use(client):
+            stats = await supabase_service.get_bot_statistics_async()
+
+        assert stats == {"total_users": 5, "total_wins": 0}
+        assert client.calls == ["rpc"]
+
+    async def test_statistics_fall_back_to_counts(self):
+        """Test a missing or failing RPC falls back to concurrent counts."""
+        for error in (PostgrestError(404, "missing"), httpx.ConnectError("refused")):
+            client = FakePostgrest(tables={"verified_users": USERS}, errors={"rpc": error})
+            with self.use(client):
+                stats = await supabase_service.get_bot_statistics_async()
+
+            assert stats["total_users"] == 5
+            assert stats["verified_users"] == 4
+            assert stats["removed_users"] == 1
+            assert stats["total_wins"] == 0
+
+    async def test_statistics_failure_returns_empty(self):
+        """Test failing RPC and counts return {} so the stats snapshot keeps its data."""
+        client = FakePostgrest(errors={"rpc": PostgrestError(404, "missing"), "count": PostgrestError(503, "down")})
+        with self.use(client):
+            assert await supabase_service.get_bot_statistics_async() == {}
+
+    async def test_stream_verified_users_by_page(self):
+        """Test verified users stream in id order across keyset pages and resume after an id."""
+        client = FakePostgrest(tables={"verified_users": USERS})
+        with self.use(client), patch.object(supabase_service, "STREAM_PAGE_SIZE", 2):
+            users = [u["id"] async for u in supabase_service.iter_verified_users_async()]
+            resumed = [u["id"] async for u in supabase_service.iter_verified_users_async(after="u2")]
+            telegram_ids = [t async for t in supabase_service.iter_verified_telegram_ids_async()]
+
+        assert users == ["u1", "u2", "u4", "u5"]
+        assert resumed == ["u4", "u5"]
+        assert telegram_ids == [11, 44, 55]
+        assert client.pages_streamed == 3 + 2 + 3
+
+    async def test_stream_faqs(self):
+        """Test FAQs stream through the same keyset pages."""
+        client = FakePostgrest(tables={"faqs": [{"id": f"f{i}", "question": "q", "answer": "a"} for i in range(3)]})
+        with self.use(client):
+            faqs = [faq async for faq in supabase_service.iter_faqs_async()]
+
+        assert [faq["id"] for faq in faqs] == ["f0", "f1", "f2"]
+
+    async def test_stream_error_propagates(self):
+        """Test a failing page ends the stream with the error instead of a partial list."""
+        client = FakePostgrest(tables={"verified_users": USERS}, errors={"select": PostgrestError(500, "boom")})
+        with self.use(client):
+            with pytest.raises(PostgrestError):
+                [u async for u in supabase_service.iter_verified_users_async()]
+            assert await supabase_service.get_all_verified_telegram_ids_async() == []
+
+    async def test_count_verified_users(self):
+        """Test counting sends no rows and returns 0 on error."""
+        client = FakePostgrest(tables={"verified_users": USERS})
+        with self.use(client):
+            assert await supabase_service.count_verified_users_async() == 4
+
+        failing = FakePostgrest(errors={"count": httpx.ReadTimeout("slow")})
+        with self.use(failing):
+            assert await supabase_service.count_verified_users_async() == 0
+
+    async def test_find_verified_by_telegram_is_cached(self):
+        """Test a lookup is cached, and a failed lookup returns None without caching."""
+        supabase_service.invalidate_verified_user()
+        failing = FakePostgrest(errors={"select": PostgrestError(503, "down")})
+        client = FakePostgrest(tables={"verified_users": USERS})
+        try:
+            with self.use(failing):
+                assert await supabase_service.find_verified_by_telegram_async(44) is None
+            with self.use(client):
+                assert (await supabase_service.find_verified_by_telegram_async(44))["id"] == "u4"
+                assert await supabase_service.find_verified_by_telegram_async(44) is not None
+            assert client.calls == ["select"]
+        finally:
+            supabase_service.invalidate_verified_user()
@@ -0,0 +1,67 @@
+"""
+Unit tests for TTLCache.
+
+Tests expiry, negative caching, LRU eviction and invalidation
+(including results loaded across a concurrent invalidation).
+"""
+import time
+
+from avap_bot.utils.ttl_cache import TTLCache
+
+
+class TestTTLCache:
+    """Test TTLCache functionality."""
+
+    def test_hit_and_miss(self):
+        """Test lookups are counted as hits and misses."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        assert cache.get(1) == (False, None)
+        cache.set(1, {"name": "Ada"})
+        assert cache.get(1) == (True, {"name": "Ada"})
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+
+    def test_negative_entry_uses_short_ttl(self):
+        """Test a cached None expires after negative_ttl."""
+        cache = TTLCache(maxsize=10, ttl=60, negative_ttl=0.05)
+        cache.set(1, None)
+        assert cache.get(1) == (True, None)
+        time.sleep(0.06)
+        assert cache.get(1) == (False, None)
+        assert cache.get_stats()["negative_hits"] == 1
+
+    def test_negative_caching_disabled(self):
+        """Test negative_ttl=0 does not store None."""
+        cache = TTLCache(maxsize=10, ttl=60, negative_ttl=0)
+        assert cache.set(1, None) is False
+        assert cache.get(1) == (False, None)
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted first."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set(1, "a")
+        cache.set(2, "b")
+        cache.get(1)
+        cache.set(3, "c")
+
+        assert cache.get(2) == (False, None)
+        assert cache.get(1) == (True, "a")
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_invalidate_removes_entry(self):
+        """Test an invalidated user is looked up again."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set(42, {"status": "verified"})
+        assert cache.invalidate(42) is True
+        assert cache.get(42) == (False, None)
+
+    def test_stale_load_is_not_cached(self):
+        """Test a value loaded before an invalidation is discarded."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        epoch = cache.epoch
+        cache.invalidate(42)  # e.g. the student is removed while the query runs
+        assert cache.set(42, {"status": "verified"}, epoch=epoch) is False
+        assert cache.get(42) == (False, None)
@@ -0,0 +1,53 @@
+"""
+Unit tests for UpdateDeduplicator.
+
+Tests the bounded update_id window, hit counting and persistence
+across restarts.
+"""
+
+from avap_bot.utils.update_dedup import UpdateDeduplicator
+
+
+class TestUpdateDeduplicator:
+    """Test UpdateDeduplicator functionality."""
+
+    def test_duplicate_is_rejected(self):
+        """Test a redelivered update id is reported as duplicate."""
+        dedup = UpdateDeduplicator(window=10)
+        assert dedup.check_and_add(1) is True
+        assert dedup.check_and_add(1) is False
+
+        stats = dedup.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_window_evicts_oldest(self):
+        """Test the window only remembers the most recent ids."""
+        dedup = UpdateDeduplicator(window=3)
+        for update_id in range(1, 5):
+            dedup.check_and_add(update_id)
+
+        assert 1 not in dedup
+        assert 4 in dedup
+        assert dedup.get_stats()["size"] == 3
+        assert dedup.check_and_add(1) is True
+
+    def test_discard_allows_redelivery(self):
+        """Test a discarded id is accepted again."""
+        dedup = UpdateDeduplicator(window=10)
+        dedup.check_and_add(7)
+        dedup.discard(7)
+        assert dedup.check_and_add(7) is True
+
+    def test_persistence_across_restarts(self, tmp_path):
+        """Test the window is restored from the persistence file."""
+        path = str(tmp_path / "dedup.json")
+        dedup = UpdateDeduplicator(window=10, persist_path=path)
+        dedup.check_and_add(100)
+        dedup.check_and_add(101)
+        assert dedup.save() is True
+        assert dedup.save() is False
+
+        restored = UpdateDeduplicator(window=10, persist_path=path)
+        assert restored.check_and_add(101) is False
+        assert restored.check_and_add(102) is True
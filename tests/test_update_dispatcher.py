@@ -0,0 +1,75 @@
+"""
+Unit tests for UpdateDispatcher.
+
+Tests that updates from one user stay ordered while different users
+are processed concurrently within the configured limit.
+"""
+import asyncio
+from types import SimpleNamespace
+
+from avap_bot.utils.update_dispatcher import UpdateDispatcher
+
+
+def make_update(update_id, user_id=None, chat_id=None):
+    """Build a minimal update-like object."""
+    user = SimpleNamespace(id=user_id) if user_id is not None else None
+    chat = SimpleNamespace(id=chat_id) if chat_id is not None else None
+    return SimpleNamespace(update_id=update_id, effective_user=user, effective_chat=chat)
+
+
+class TestUpdateDispatcher:
+    """Test UpdateDispatcher functionality."""
+
+    def test_shard_key(self):
+        """Test user id is preferred over chat id and update id."""
+        assert UpdateDispatcher.shard_key(make_update(1, user_id=5, chat_id=9)) == ("user", 5)
+        assert UpdateDispatcher.shard_key(make_update(2, chat_id=9)) == ("chat", 9)
+        assert UpdateDispatcher.shard_key(make_update(3)) == ("update", 3)
+
+    async def test_same_user_updates_stay_ordered(self):
+        """Test a slow first update does not let later ones overtake it."""
+        seen = []
+
+        async def process(update):
+            await asyncio.sleep(0.02 if update.update_id == 1 else 0)
+            seen.append(update.update_id)
+
+        dispatcher = UpdateDispatcher(process, max_concurrency=4)
+        for update_id in range(1, 6):
+            await dispatcher.dispatch(make_update(update_id, user_id=42))
+        await dispatcher.stop()
+
+        assert seen == [1, 2, 3, 4, 5]
+        assert dispatcher.get_stats()["active_lanes"] == 0
+
+    async def test_different_users_run_concurrently(self):
+        """Test concurrency across users is bounded by max_concurrency."""
+        async def process(update):
+            await asyncio.sleep(0.01)
+
+        dispatcher = UpdateDispatcher(process, max_concurrency=3)
+        for user_id in range(10):
+            await dispatcher.dispatch(make_update(user_id, user_id=user_id))
+        await dispatcher.stop()
+
+        stats = dispatcher.get_stats()
+        assert stats["processed"] == 10
+        assert stats["peak_in_flight"] == 3
+
+    async def test_backpressure_waits_for_capacity(self):
+        """Test dispatch waits once max_pending updates are outstanding."""
+        release = asyncio.Event()
+
+        async def process(update):
+            await release.wait()
+
+        dispatcher = UpdateDispatcher(process, max_concurrency=2, max_pending=2)
+        await dispatcher.dispatch(make_update(1, user_id=1))
+        blocked = asyncio.create_task(dispatcher.dispatch(make_update(2, user_id=2)))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+
+        release.set()
+        await asyncio.wait_for(blocked, timeout=1)
+        await dispatcher.stop()
+        assert dispatcher.get_stats()["backpressure_waits"] == 1
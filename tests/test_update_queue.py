@@ -0,0 +1,92 @@
+"""
+Unit tests for UpdateQueue.
+
+Tests that webhook updates are acknowledged without waiting for the
+handler pipeline and that backpressure is reported correctly.
+"""
+import asyncio
+from unittest.mock import Mock
+
+from avap_bot.utils.update_queue import UpdateQueue
+
+
+class TestUpdateQueue:
+    """Test UpdateQueue functionality."""
+
+    async def test_enqueue_returns_before_processing(self):
+        """Test enqueue does not wait for the processor."""
+        release = asyncio.Event()
+        processed = []
+
+        async def process(update):
+            await release.wait()
+            processed.append(update)
+
+        queue = UpdateQueue(process, maxsize=10)
+        await queue.start()
+
+        assert queue.enqueue(Mock(update_id=1)) is True
+        await asyncio.sleep(0)
+        assert processed == []
+
+        release.set()
+        await queue.stop()
+        assert len(processed) == 1
+        assert queue.get_stats()["processed"] == 1
+
+    async def test_full_queue_drops_update(self):
+        """Test updates beyond maxsize are rejected and counted."""
+        async def process(update):
+            pass
+
+        queue = UpdateQueue(process, maxsize=2)
+        assert queue.enqueue(Mock(update_id=1)) is True
+        assert queue.enqueue(Mock(update_id=2)) is True
+        assert queue.enqueue(Mock(update_id=3)) is False
+
+        stats = queue.get_stats()
+        assert stats["depth"] == 2
+        assert stats["dropped"] == 1
+
+        await queue.start()
+        await queue.stop()
+        assert queue.get_stats()["depth"] == 0
+
+    async def test_processor_errors_do_not_stop_worker(self):
+        """Test a failing update is counted and the worker keeps running."""
+        processed = []
+
+        async def process(update):
+            if update.update_id == 1:
+                raise RuntimeError("handler failed")
+            processed.append(update.update_id)
+
+        queue = UpdateQueue(process)
+        await queue.start()
+        queue.enqueue(Mock(update_id=1))
+        queue.enqueue(Mock(update_id=2))
+        await queue.stop()
+
+        assert processed == [2]
+        stats = queue.get_stats()
+        assert stats["failed"] == 1
+        assert stats["processed"] == 1
+        assert stats["running"] is False
+
+    async def test_wait_for_room_returns_once_drained(self):
+        """Test a poller blocked on a full queue resumes after a worker frees a slot."""
+        release = asyncio.Event()
+
+        async def process(update):
+            await release.wait()
+
+        queue = UpdateQueue(process, maxsize=1)
+        assert queue.enqueue(Mock(update_id=1)) is True
+        waiter = asyncio.ensure_future(queue.wait_for_room(initial_delay=0.01))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+
+        await queue.start()
+        await asyncio.wait_for(waiter, timeout=1)
+        release.set()
+        await queue.stop()
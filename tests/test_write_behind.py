@@ -0,0 +1,108 @@
+"""
+Unit tests for WriteBehindBuffer.
+
+Tests size- and time-triggered bulk flushes, futures resolving to the
+inserted rows, retries, dead-lettering and the final flush on stop.
+"""
+import asyncio
+import json
+import pytest
+
+from avap_bot.utils.write_behind import WriteBehindBuffer, WriteBehindError
+
+
+class FakeError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class RecordingWriter:
+    """Writer that records batches and can fail on demand."""
+
+    def __init__(self, failures=None):
+        self.batches = []
+        self.failures = list(failures or [])
+
+    async def __call__(self, table, rows):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.batches.append((table, list(rows)))
+        return [dict(row, id=f"{table}-{len(self.batches)}-{i}") for i, row in enumerate(rows)]
+
+
+class TestWriteBehindBuffer:
+    """Test WriteBehindBuffer functionality."""
+
+    async def test_full_batch_is_written_in_one_insert(self):
+        """Test reaching batch_size flushes without waiting for the interval."""
+        writer = RecordingWriter()
+        buffer = WriteBehindBuffer(writer, flush_interval=10, batch_size=5)
+        futures = [await buffer.submit("questions", {"n": i}) for i in range(5)]
+
+        rows = await asyncio.wait_for(asyncio.gather(*futures), timeout=1)
+
+        assert len(writer.batches) == 1
+        assert [r["n"] for r in rows] == list(range(5))
+        assert rows[0]["id"] == "questions-1-0"
+        await buffer.stop()
+
+    async def test_interval_flush_and_stop(self):
+        """Test partial batches go out on the interval and stop() flushes the rest."""
+        writer = RecordingWriter()
+        buffer = WriteBehindBuffer(writer, flush_interval=0.02, batch_size=100)
+        first = await buffer.submit("questions", {"n": 1})
+        await asyncio.wait_for(first, timeout=1)
+
+        buffer.flush_interval = 10
+        await asyncio.sleep(0.05)
+        last = await buffer.submit("broadcast_history", {"n": 2})
+        await buffer.stop()
+
+        assert last.done() and last.result()["n"] == 2
+        assert buffer.get_stats()["pending"] == 0
+
+    async def test_transient_error_is_retried(self):
+        """Test server errors are retried before giving up."""
+        writer = RecordingWriter(failures=[FakeError(503)])
+        buffer = WriteBehindBuffer(writer, flush_interval=0.01, retry_backoff=0.001)
+
+        row = await asyncio.wait_for(await buffer.submit("questions", {"n": 1}), timeout=1)
+
+        assert row["n"] == 1
+        assert buffer.get_stats()["retries"] == 1
+        await buffer.stop()
+
+    async def test_rejected_rows_are_dead_lettered(self, tmp_path):
+        """Test rows the database rejects go to the dead-letter file without blocking the batch."""
+        path = tmp_path / "dead.jsonl"
+        writer = RecordingWriter(failures=[FakeError(400), FakeError(400)])
+        buffer = WriteBehindBuffer(writer, flush_interval=10, batch_size=2, dead_letter_path=str(path))
+        bad = await buffer.submit("questions", {"n": "bad"})
+        good = await buffer.submit("questions", {"n": "good"})
+
+        assert (await asyncio.wait_for(good, timeout=1))["n"] == "good"
+        with pytest.raises(WriteBehindError):
+            await bad
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert lines[0]["table"] == "questions" and lines[0]["row"] == {"n": "bad"}
+        await buffer.stop()
+
+    async def test_memory_is_bounded(self):
+        """Test submit() waits once max_pending rows are buffered."""
+        release = asyncio.Event()
+
+        async def slow_writer(table, rows):
+            await release.wait()
+            return rows
+
+        buffer = WriteBehindBuffer(slow_writer, flush_interval=0.01, max_pending=2)
+        await buffer.submit("questions", {"n": 1})
+        await buffer.submit("questions", {"n": 2})
+        third = asyncio.ensure_future(buffer.submit("questions", {"n": 3}))
+        await asyncio.sleep(0.05)
+
+        assert not third.done()
+        release.set()
+        await asyncio.wait_for(third, timeout=1)
+        await buffer.stop()